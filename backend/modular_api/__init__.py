@@ -57,6 +57,11 @@ def create_app(config_name='default'):
     # 注册蓝图
     register_blueprints(app)
 
+    # 在后台线程预热模型，进程可以立即开始监听端口（与路由使用同一服务实例）
+    if Config.MODEL_WARMUP_ON_START:
+        from services.model import get_model_service
+        get_model_service()
+
     # 注册错误处理器
     register_error_handlers(app)
 
@@ -72,6 +77,7 @@ def register_blueprints(app):
     from .routes.search import bp as search_bp
     from .routes.chat import bp as chat_bp
     from .routes.roadtrip import bp as roadtrip_bp
+    from .routes.jobs import bp as jobs_bp
 
     app.register_blueprint(main_bp)
     app.register_blueprint(preference_bp)
@@ -81,6 +87,7 @@ def register_blueprints(app):
     app.register_blueprint(search_bp, url_prefix='/api/search')
     app.register_blueprint(chat_bp, url_prefix='/api')
     app.register_blueprint(roadtrip_bp, url_prefix='/api')
+    app.register_blueprint(jobs_bp, url_prefix='/api')
 
 def register_error_handlers(app):
     """注册错误处理器"""
@@ -0,0 +1,413 @@
+"""
+攻略语料批量导入工具
+流式读取JSON/JSONL文件，按批次经过 清洗 -> 向量化 -> 写入 三个阶段，
+长文档在清洗后切分为段落；各阶段在独立线程中并行执行，通过有界队列衔接；每批写入后记录断点，中断后可续传
+
+用法:
+    python -m modular_api.ingest raw_data.json guides.jsonl --batch-size 64
+"""
+
+import hashlib
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHECKPOINT_PATH = './data/ingest_checkpoint.json'
+
+# 顶层为对象时，依次尝试这些字段作为记录列表
+RECORD_LIST_KEYS = ('guides', 'data', 'items', 'records')
+
+_SENTINEL = object()
+
+
+@dataclass
+class IngestBatch:
+    """在各阶段之间流转的一批文档"""
+    path: str
+    end_offset: int
+    ids: List[str] = field(default_factory=list)
+    texts: List[str] = field(default_factory=list)
+    metadatas: List[Dict[str, Any]] = field(default_factory=list)
+    embeddings: Optional[List[List[float]]] = None
+    documents: int = 0
+    skipped: int = 0
+    duplicates: int = 0
+
+
+def _iter_json_array(f, chunk_size: int = 1 << 16) -> Iterator[Any]:
+    """逐个解析顶层JSON数组中的元素，不把整个文件读入内存"""
+    decoder = json.JSONDecoder()
+    buffer = f.read(chunk_size).lstrip()
+    if not buffer.startswith('['):
+        raise ValueError("JSON文件顶层不是数组")
+    pos = 1
+    eof = False
+    while True:
+        # 跳过空白和分隔符
+        while pos < len(buffer) and buffer[pos] in ' \t\r\n,':
+            pos += 1
+        if pos < len(buffer) and buffer[pos] == ']':
+            return
+        if pos >= len(buffer) and eof:
+            raise ValueError("JSON数组未正常结束")
+        try:
+            if pos >= len(buffer):
+                raise json.JSONDecodeError("需要更多数据", buffer, pos)
+            item, end = decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            chunk = f.read(chunk_size)
+            eof = not chunk
+            buffer = buffer[pos:] + chunk
+            pos = 0
+            continue
+        yield item
+        buffer = buffer[end:]
+        pos = 0
+
+
+def iter_records(path: str) -> Iterator[Any]:
+    """
+    流式读取JSON/JSONL文件中的记录
+
+    Args:
+        path: 文件路径（.jsonl/.ndjson按行解析；.json支持顶层数组或包含记录列表的对象）
+
+    Returns:
+        记录迭代器
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        if path.endswith(('.jsonl', '.ndjson')):
+            for line in f:
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
+            return
+
+        head = f.read(1)
+        while head and head.isspace():
+            head = f.read(1)
+        f.seek(0)
+        if head == '[':
+            yield from _iter_json_array(f)
+        elif head == '{':
+            data = json.load(f)
+            for key in RECORD_LIST_KEYS:
+                if isinstance(data.get(key), list):
+                    yield from data[key]
+                    return
+            yield data
+
+
+def make_document_id(record: Dict[str, Any], text: str) -> str:
+    """生成确定性的文档ID，重复导入同一记录会覆盖而不是重复写入"""
+    if record.get('id'):
+        return str(record['id'])
+    digest = hashlib.sha256(f"{record.get('destination', '')}\n{text}".encode('utf-8')).hexdigest()
+    return f"guide_{digest[:32]}"
+
+
+def build_metadata(record: Dict[str, Any], text: str, source_file: str) -> Dict[str, Any]:
+    """构建与/upload-guide一致的元数据"""
+    images = record.get('images') or []
+    return {
+        'images': json.dumps(images, ensure_ascii=False) if not isinstance(images, str) else images,
+        'destination': record.get('destination') or '',
+        'original_text_length': len(text),
+        'title': record.get('title') or '',
+        'source': record.get('source') or 'ingest',
+        'source_file': os.path.basename(source_file)
+    }
+
+
+class IngestCheckpoint:
+    """导入断点，记录每个文件已处理的记录数"""
+
+    def __init__(self, path: Optional[str]):
+        self.path = path
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        if path and os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                self.entries = json.load(f)
+
+    def get_offset(self, source: str) -> int:
+        """获取文件的续传位置，文件被截短或替换时从头开始"""
+        entry = self.entries.get(os.path.abspath(source))
+        if not entry:
+            return 0
+        if os.path.getsize(source) < entry.get('size', 0):
+            logger.warning(f"文件已变小，忽略断点从头导入: {source}")
+            return 0
+        return int(entry.get('offset', 0))
+
+    def update(self, source: str, offset: int):
+        """记录进度（原子写入，进程中断也不会损坏断点文件）"""
+        self.entries[os.path.abspath(source)] = {
+            'offset': offset,
+            'size': os.path.getsize(source),
+            'updated_at': datetime.now().isoformat()
+        }
+        if not self.path:
+            return
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.entries, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def reset(self, sources: List[str]):
+        """清除指定文件的断点"""
+        for source in sources:
+            self.entries.pop(os.path.abspath(source), None)
+
+
+class IngestPipeline:
+    """三阶段并行的批量导入流水线"""
+
+    def __init__(self, vector_service, batch_size: int = 64, queue_size: int = 4,
+                 checkpoint_path: Optional[str] = DEFAULT_CHECKPOINT_PATH, log_every: int = 10):
+        self.vector_service = vector_service
+        self.model_service = vector_service.model_service
+        self.batch_size = max(1, batch_size)
+        self.queue_size = max(1, queue_size)
+        self.checkpoint = IngestCheckpoint(checkpoint_path)
+        self.log_every = log_every
+        self._stop = threading.Event()
+        self._error = None
+        # 向量服务启用了近重复索引时，在清洗阶段查重，重复文档不进入向量化
+        self.dedup = getattr(vector_service, 'dedup_index', None) is not None
+        self.stats = {'files': 0, 'read': 0, 'skipped': 0, 'duplicates': 0, 'resumed_from': 0,
+                      'written': 0, 'passages': 0, 'failed': 0, 'batches': 0}
+
+    def run(self, paths: List[str], resume: bool = True) -> Dict[str, Any]:
+        """
+        导入文件
+
+        Args:
+            paths: JSON/JSONL文件列表
+            resume: 是否从断点续传
+
+        Returns:
+            导入统计（含docs_per_sec）
+        """
+        if not resume:
+            self.checkpoint.reset(paths)
+        clean_queue = queue.Queue(maxsize=self.queue_size)
+        encode_queue = queue.Queue(maxsize=self.queue_size)
+        write_queue = queue.Queue(maxsize=self.queue_size)
+
+        stages = [
+            threading.Thread(target=self._stage, args=(self._read, None, clean_queue, paths),
+                             name='ingest-read', daemon=True),
+            threading.Thread(target=self._stage, args=(self._clean, clean_queue, encode_queue),
+                             name='ingest-clean', daemon=True),
+            threading.Thread(target=self._stage, args=(self._encode, encode_queue, write_queue),
+                             name='ingest-encode', daemon=True),
+        ]
+        started = time.monotonic()
+        for stage in stages:
+            stage.start()
+
+        try:
+            # 写入阶段在主线程执行，保证断点按文件顺序推进
+            while True:
+                batch = write_queue.get()
+                if batch is _SENTINEL:
+                    break
+                self._write(batch)
+                if self.log_every and self.stats['batches'] % self.log_every == 0:
+                    self._log_progress(started)
+        except BaseException:
+            self._stop.set()
+            raise
+        finally:
+            self._stop.set()
+            for stage in stages:
+                stage.join(timeout=5)
+
+        if self._error is not None:
+            raise self._error
+
+        elapsed = time.monotonic() - started
+        self.stats['seconds'] = round(elapsed, 3)
+        self.stats['docs_per_sec'] = round(self.stats['written'] / elapsed, 2) if elapsed > 0 else 0.0
+        logger.info(f"导入完成: {self.stats}")
+        return dict(self.stats)
+
+    def _stage(self, work, input_queue, output_queue, *args):
+        """运行一个阶段，异常时通知下游结束并记录错误"""
+        try:
+            if input_queue is None:
+                for batch in work(*args):
+                    self._put(output_queue, batch)
+            else:
+                while not self._stop.is_set():
+                    batch = input_queue.get()
+                    if batch is _SENTINEL:
+                        break
+                    self._put(output_queue, work(batch))
+        except Exception as e:
+            logger.error(f"导入阶段{threading.current_thread().name}失败: {str(e)}")
+            self._error = e
+            self._stop.set()
+        finally:
+            self._put(output_queue, _SENTINEL, force=True)
+
+    def _put(self, target_queue, item, force: bool = False):
+        """带停止检查的阻塞入队，避免下游失败后上游永久阻塞"""
+        while True:
+            if self._stop.is_set() and not force:
+                return
+            try:
+                target_queue.put(item, timeout=0.5)
+                return
+            except queue.Full:
+                if force and self._stop.is_set():
+                    # 下游已停止消费，丢弃最旧的一批为结束标记腾出位置
+                    try:
+                        target_queue.get_nowait()
+                    except queue.Empty:
+                        pass
+
+    def _read(self, paths: List[str]) -> Iterator[IngestBatch]:
+        """读取阶段：流式解析文件并按批次切分"""
+        for path in paths:
+            self.stats['files'] += 1
+            offset = self.checkpoint.get_offset(path)
+            if offset:
+                logger.info(f"从断点续传: {path}, 已处理{offset}条")
+                self.stats['resumed_from'] += offset
+
+            batch = IngestBatch(path=path, end_offset=offset)
+            seen = set()
+            for index, record in enumerate(iter_records(path)):
+                if self._stop.is_set():
+                    return
+                if index < offset:
+                    continue
+                self.stats['read'] += 1
+                batch.end_offset = index + 1
+                text = (record.get('text') or record.get('content') or '') if isinstance(record, dict) else ''
+                if not isinstance(text, str) or not text.strip():
+                    batch.skipped += 1
+                    continue
+                doc_id = make_document_id(record, text)
+                if doc_id in seen:
+                    # 同一批内重复的ID只保留第一条
+                    batch.skipped += 1
+                    continue
+                seen.add(doc_id)
+                batch.ids.append(doc_id)
+                batch.texts.append(text)
+                batch.metadatas.append(build_metadata(record, text, path))
+                if len(batch.ids) >= self.batch_size:
+                    yield batch
+                    batch = IngestBatch(path=path, end_offset=batch.end_offset)
+                    seen = set()
+            if batch.ids or batch.end_offset > offset:
+                yield batch
+
+    def _clean(self, batch: IngestBatch) -> IngestBatch:
+        """清洗阶段：nlp.pipe批量清洗、近重复检测，并把长文档切分为段落"""
+        if batch.texts:
+            clean_texts = self.model_service.clean_texts(batch.texts)
+            metadatas, ids = batch.metadatas, batch.ids
+            if self.dedup:
+                duplicate_of = self.vector_service.claim_documents(clean_texts, ids)
+                keep = [i for i, existing in enumerate(duplicate_of) if existing is None]
+                batch.duplicates = len(ids) - len(keep)
+                clean_texts = [clean_texts[i] for i in keep]
+                metadatas = [metadatas[i] for i in keep]
+                ids = [ids[i] for i in keep]
+            batch.documents = len(ids)
+            batch.texts, batch.metadatas, batch.ids = self.vector_service.expand_passages(
+                clean_texts, metadatas, ids)
+        return batch
+
+    def _encode(self, batch: IngestBatch) -> IngestBatch:
+        """向量化阶段：按存储配置生成向量"""
+        if batch.texts:
+            batch.embeddings = self.vector_service.embed_texts(batch.texts)
+        return batch
+
+    def _write(self, batch: IngestBatch):
+        """写入阶段：upsert到向量库，整批失败时逐条重试，然后推进断点"""
+        self.stats['batches'] += 1
+        self.stats['skipped'] += batch.skipped
+        self.stats['duplicates'] += batch.duplicates
+        if batch.ids:
+            self.stats['passages'] += len(batch.ids)
+            try:
+                self.vector_service.add_embeddings(batch.texts, batch.embeddings, batch.metadatas,
+                                                   ids=batch.ids, upsert=True)
+                self.stats['written'] += batch.documents
+            except Exception as e:
+                logger.warning(f"批量写入失败，逐条重试: {str(e)}")
+                failed_parents = set()
+                for i, doc_id in enumerate(batch.ids):
+                    try:
+                        self.vector_service.add_embeddings([batch.texts[i]], [batch.embeddings[i]],
+                                                           [batch.metadatas[i]], ids=[doc_id], upsert=True)
+                    except Exception as item_error:
+                        logger.error(f"写入段落失败: {doc_id}, 错误: {str(item_error)}")
+                        failed_parents.add(batch.metadatas[i].get('parent_id', doc_id))
+                if self.dedup and failed_parents:
+                    self.vector_service.release_documents(list(failed_parents))
+                self.stats['failed'] += len(failed_parents)
+                self.stats['written'] += batch.documents - len(failed_parents)
+        self.checkpoint.update(batch.path, batch.end_offset)
+
+    def _log_progress(self, started: float):
+        """输出进度和吞吐"""
+        elapsed = time.monotonic() - started
+        rate = self.stats['written'] / elapsed if elapsed > 0 else 0.0
+        logger.info(f"导入进度: 已写入{self.stats['written']}条, 跳过{self.stats['skipped']}条, "
+                    f"重复{self.stats['duplicates']}条, "
+                    f"失败{self.stats['failed']}条, {rate:.1f} docs/s")
+
+
+def main():
+    """命令行入口"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description='攻略语料批量导入工具')
+    parser.add_argument('paths', nargs='+', help='JSON/JSONL文件路径')
+    parser.add_argument('--batch-size', type=int, default=64, help='每批文档数')
+    parser.add_argument('--queue-size', type=int, default=4, help='阶段间队列长度（批）')
+    parser.add_argument('--checkpoint', default=DEFAULT_CHECKPOINT_PATH, help='断点文件路径')
+    parser.add_argument('--no-resume', action='store_true', help='忽略断点从头导入')
+    parser.add_argument('--allow-degraded', action='store_true', help='模型降级（模拟向量）时仍然导入')
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+
+    from modular_api.services.model import STATE_READY, get_model_service
+    from modular_api.services.vector import get_vector_service
+
+    model_service = get_model_service()
+    model_service.wait_until_ready()
+    if model_service.state != STATE_READY and not args.allow_degraded:
+        parser.exit(1, f"模型状态为{model_service.state}，导入的向量质量无法保证；确认无误可加 --allow-degraded\n")
+
+    pipeline = IngestPipeline(get_vector_service(), batch_size=args.batch_size,
+                              queue_size=args.queue_size, checkpoint_path=args.checkpoint)
+    stats = pipeline.run(args.paths, resume=not args.no_resume)
+    print(json.dumps(stats, ensure_ascii=False, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -11,11 +11,11 @@ import os
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from services.auth import auth_required, optional_auth
-from services.cache import api_response_cache
+from services.cache import api_response_cache, cache_completed_stream
 from services.model import get_model_service
 from utils.monitoring import performance_monitor
+from utils.streaming import wants_event_stream, sse_event, sse_response
 from utils.config import Config
-from utils.database_optimizer import db_operation
 
 try:
     from .. import limiter
@@ -79,7 +79,7 @@ def add_message_to_conversation(conversation_id, role, content):
 def chat():
     """
     AI聊天接口
-    处理用户消息并返回AI响应
+    处理用户消息并返回AI响应；请求头 Accept: text/event-stream 时以SSE逐段推送
     """
     try:
         data = request.get_json()
@@ -124,8 +124,14 @@ def chat():
 
 请给出有用、友好的回复，如果是旅行相关问题，尽量提供具体实用的建议。
 """
+        # 只有开启聊天语义缓存时，不依赖历史对话和额外信息的首轮消息才走语义缓存
+        cache_intent = (message if Config.CHAT_SEMANTIC_CACHE_ENABLED and not conversation_history and not context
+                        else None)
+        if wants_event_stream():
+            return sse_response(stream_chat_events(model_service, prompt, message, conversation_id, cache_intent))
+
         try:
-            response = model_service.generate_response(prompt)
+            response = model_service.generate_response(prompt, cache_intent=cache_intent, route_type='chat')
         except Exception as model_error:
             logger.warning(f"模型生成失败，使用模拟响应: {model_error}")
             response = generate_mock_travel_response(message)
@@ -150,6 +156,44 @@ def chat():
             'message': f'处理消息时出错: {str(e)}'
         }), 500
 
+def stream_chat_events(model_service, prompt, message, conversation_id, cache_intent=None):
+    """
+    流式聊天事件：meta（会话ID）-> token（文本增量）... -> done（与JSON接口相同的响应体）
+
+    对话历史和响应缓存在流完整结束后才写入；大模型在输出任何内容前失败时回退到模拟回复，
+    输出中途失败时发送error事件，不保存不完整的回复
+    """
+    yield sse_event('meta', {'conversation_id': conversation_id})
+
+    parts = []
+    try:
+        for delta in model_service.stream_response(prompt, cache_intent=cache_intent, route_type='chat'):
+            parts.append(delta)
+            yield sse_event('token', {'text': delta})
+    except Exception as model_error:
+        if parts:
+            logger.error(f"流式生成中断: conversation_id={conversation_id}, error={model_error}")
+            yield sse_event('error', {'status': 'error', 'message': '生成中断，请重试'})
+            return
+        logger.warning(f"模型生成失败，使用模拟响应: {model_error}")
+        parts = [generate_mock_travel_response(message)]
+        yield sse_event('token', {'text': parts[0]})
+
+    response = ''.join(parts)
+    add_message_to_conversation(conversation_id, 'user', message)
+    add_message_to_conversation(conversation_id, 'assistant', response)
+
+    body = {
+        'status': 'success',
+        'data': {
+            'response': response,
+            'conversation_id': conversation_id
+        }
+    }
+    cache_completed_stream(body)
+    logger.info(f"流式聊天完成: conversation_id={conversation_id}, message_len={len(message)}")
+    yield sse_event('done', body)
+
 @bp.route('/chat/history', methods=['POST'])
 @optional_auth
 @performance_monitor
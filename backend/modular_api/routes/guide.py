@@ -4,20 +4,23 @@
 """
 
 from flask import Blueprint, request, jsonify
-import chromadb
-import uuid
 import json
 import logging
 import os
 import sys
+import uuid
 
 # 导入服务模块
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from services.model import get_model_service
+from services.model import get_model_service, ModelNotReadyError
+from services.vector import get_vector_service
 from services.database import get_db_connection
 from services.auth import auth_required, optional_auth
-from services.cache import api_response_cache, query_cache
+from services.cache import api_response_cache, query_cache, cache_completed_stream
+from services.context_assembler import ContextAssembler
+from services.jobs import wants_async, submit_async_job
 from utils.monitoring import performance_monitor
+from utils.streaming import wants_event_stream, sse_event, sse_response
 from utils.config import Config
 try:
     from .. import limiter
@@ -26,12 +29,6 @@ except ImportError:
 
 logger = logging.getLogger(__name__)
 
-# 初始化ChromaDB
-def get_chroma_collection():
-    """获取ChromaDB集合"""
-    client = chromadb.PersistentClient(path=os.getenv('CHROMA_PATH', './chroma_db'))
-    return client.get_or_create_collection(name="travel_guides")
-
 bp = Blueprint('guide', __name__)
 
 @bp.route('/generate-guide', methods=['POST'])
@@ -41,7 +38,8 @@ bp = Blueprint('guide', __name__)
 def generate_guide():
     """
     生成旅游攻略
-    根据用户的目的地和偏好生成旅游攻略
+    根据用户的目的地和偏好生成旅游攻略；请求头 Accept: text/event-stream 时检索完成后以SSE逐段推送；
+    请求头 Prefer: respond-async（或查询参数 async=1）时提交后台任务，立即返回任务ID，通过 /api/jobs/<job_id> 获取结果
     """
     try:
         data = request.get_json()
@@ -54,40 +52,130 @@ def generate_guide():
         if not destination or not preferences:
             return jsonify({"status": "error", "message": "缺少目的地或偏好参数"}), 400
         
+        if wants_async():
+            return submit_async_job('guide', lambda: run_guide_job(destination, preferences))
+        
         # 获取模型服务
         model_service = get_model_service()
+        if not model_service.is_ready():
+            raise ModelNotReadyError("模型正在加载中，请稍后重试")
         
-        # 记录用户偏好到数据库
-        conn = get_db_connection()
-        c = conn.cursor()
-        c.execute("INSERT INTO preferences (destination, preferences) VALUES (?, ?)", 
-                  (destination, preferences))
-        conn.commit()
-        conn.close()
-        
-        # 向量检索相关攻略
-        query_text = f"{preferences} {destination}"
-        query_embedding = model_service.encode_text([query_text])[0].tolist()
-        
-        collection = get_chroma_collection()
-        results = collection.query(query_embeddings=[query_embedding], n_results=5)
-        
-        context = " ".join(results['documents'][0]) if results['documents'] else ""
-        
-        # 生成攻略（这里可以集成大模型API）
-        guide = f"基于{preferences}的{destination}旅游攻略：{context}。建议游览主要景点，品尝当地美食。"
+        prepared = prepare_guide(destination, preferences)
+        if wants_event_stream():
+            return sse_response(stream_guide_events(model_service, prepared, preferences, destination))
         
-        return jsonify({
-            "status": "success", 
-            "guide": guide, 
-            "images": [],
-            "context_length": len(context),
-            "retrieved_docs": len(results['documents'][0]) if results['documents'] else 0
-        })
+        return jsonify(build_guide(model_service, prepared, preferences, destination))
+    except ModelNotReadyError as e:
+        return jsonify({"status": "error", "message": str(e), "error_code": "MODEL_LOADING"}), 503, {"Retry-After": "5"}
     except Exception as e:
         logger.error(f"生成攻略失败: {str(e)}")
         return jsonify({"status": "error", "message": str(e)}), 500
 
+def prepare_guide(destination, preferences):
+    """
+    记录用户偏好、检索相关攻略并组装提示词
+    
+    Returns:
+        prompt、fallback_guide、context、context_budget、retrieved_docs
+    """
+    # 记录用户偏好到数据库
+    conn = get_db_connection()
+    c = conn.cursor()
+    c.execute("INSERT INTO preferences (destination, preferences) VALUES (?, ?)", 
+              (destination, preferences))
+    conn.commit()
+    conn.close()
+    
+    # 向量检索相关攻略（经由向量服务，与入库使用同一存储配置）；可单独为攻略生成开启MMR重排
+    # （避免上下文被同一景点的近似帖子占满）和交叉编码器重排（受耗时预算限制）
+    query_text = f"{preferences} {destination}"
+    results = get_vector_service().search_similar(query_text, limit=5, diversify=Config.GUIDE_MMR_ENABLED,
+                                                  rerank=Config.GUIDE_RERANK_ENABLED)
+    
+    # 按token预算组装上下文（去掉近重复句子），提示词长度与检索到的攻略长短无关
+    assembled = ContextAssembler(
+        budget_tokens=Config.GUIDE_CONTEXT_TOKEN_BUDGET,
+        max_passage_share=Config.GUIDE_CONTEXT_MAX_PASSAGE_SHARE,
+        duplicate_threshold=Config.GUIDE_CONTEXT_DUPLICATE_THRESHOLD
+    ).assemble(query_text, results['results'])
+    context = assembled['text']
+    
+    # 以检索到的攻略为参考调用大模型生成；大模型不可用时回退到模板攻略
+    prompt = f"""
+请为用户生成一份{destination}旅游攻略。
+
+用户偏好：{preferences}
+
+参考资料（来自用户分享的攻略）：
+{context}
+
+请结合参考资料给出具体的景点、美食和行程安排建议，回复简洁实用。
+"""
+    return {
+        "prompt": prompt,
+        "fallback_guide": f"基于{preferences}的{destination}旅游攻略：{context}。建议游览主要景点，品尝当地美食。",
+        "context": context,
+        "context_budget": {key: value for key, value in assembled['report'].items() if key != 'passages'},
+        "retrieved_docs": results['total']
+    }
+
+def guide_body(guide, prepared):
+    """攻略接口的响应体（同步、流式和异步任务共用）"""
+    return {
+        "status": "success",
+        "guide": guide,
+        "images": [],
+        "context_length": len(prepared['context']),
+        "context_budget": prepared['context_budget'],
+        "retrieved_docs": prepared['retrieved_docs']
+    }
+
+def build_guide(model_service, prepared, preferences, destination):
+    """调用大模型生成攻略，失败时回退到模板攻略"""
+    try:
+        # 同一目的地下措辞不同但含义相近的偏好复用已生成的攻略
+        guide = model_service.generate_response(prepared['prompt'], cache_intent=preferences, route_type='guide',
+                                                destination=destination)
+    except Exception as model_error:
+        logger.warning(f"模型生成失败，使用模板攻略: {model_error}")
+        guide = prepared['fallback_guide']
+    return guide_body(guide, prepared)
+
+def run_guide_job(destination, preferences):
+    """异步任务：等待模型加载完成后执行与同步接口相同的流程"""
+    model_service = get_model_service()
+    if not model_service.wait_until_ready(Config.JOB_MODEL_WAIT_SECONDS):
+        raise ModelNotReadyError("模型加载超时，请稍后重试")
+    return build_guide(model_service, prepare_guide(destination, preferences), preferences, destination)
+
+def stream_guide_events(model_service, prepared, preferences=None, destination=''):
+    """
+    流式攻略事件：meta（检索信息）-> token（文本增量）... -> done（与JSON接口相同的响应体）
+    
+    大模型在输出任何内容前失败时回退到模板攻略；输出中途失败时发送error事件，不写入响应缓存
+    """
+    yield sse_event('meta', {"context_length": len(prepared['context']), "context_budget": prepared['context_budget'],
+                             "retrieved_docs": prepared['retrieved_docs']})
+    
+    parts = []
+    try:
+        for delta in model_service.stream_response(prepared['prompt'], cache_intent=preferences, route_type='guide',
+                                                   destination=destination):
+            parts.append(delta)
+            yield sse_event('token', {"text": delta})
+    except Exception as model_error:
+        if parts:
+            logger.error(f"流式生成攻略中断: {model_error}")
+            yield sse_event('error', {"status": "error", "message": "生成中断，请重试"})
+            return
+        logger.warning(f"模型生成失败，使用模板攻略: {model_error}")
+        parts = [prepared['fallback_guide']]
+        yield sse_event('token', {"text": parts[0]})
+    
+    body = guide_body("".join(parts), prepared)
+    cache_completed_stream(body)
+    yield sse_event('done', body)
+
 @bp.route('/upload-guide', methods=['POST'])
 @auth_required
 def upload_guide():
@@ -110,34 +198,32 @@ def upload_guide():
         # 获取模型服务
         model_service = get_model_service()
         
-        # 清洗文本
-        clean_text = model_service.clean_text(text)
-        
-        # 向量化
-        embedding = model_service.encode_text([clean_text])[0].tolist()
-        
-        # 存入ChromaDB
-        id_ = str(uuid.uuid4())
+        # 清洗、向量化并存入ChromaDB
         metadata = {
             "images": json.dumps(images),
             "destination": destination,
             "original_text_length": len(text)
         }
-        
-        collection = get_chroma_collection()
-        collection.add(
-            documents=[clean_text], 
-            embeddings=[embedding], 
-            metadatas=[metadata], 
-            ids=[id_]
-        )
+        doc_id = str(uuid.uuid4())
+        stored_id = get_vector_service().add_document(text, metadata, doc_id)
+        if stored_id != doc_id:
+            # 与已有攻略近重复：不写入新文档，本次提交的图片和目的地也不会保存
+            return jsonify({
+                "status": "duplicate",
+                "message": "攻略与已有攻略重复，未重复保存",
+                "id": stored_id,
+                "duplicate_of": stored_id,
+                "model_info": model_service.get_model_info()
+            })
         
         return jsonify({
             "status": "success", 
             "message": "攻略已上传", 
-            "id": id_,
+            "id": doc_id,
             "model_info": model_service.get_model_info()
         })
+    except ModelNotReadyError as e:
+        return jsonify({"status": "error", "message": str(e), "error_code": "MODEL_LOADING"}), 503, {"Retry-After": "5"}
     except Exception as e:
         logger.error(f"上传攻略失败: {str(e)}")
         return jsonify({"status": "error", "message": str(e)}), 500
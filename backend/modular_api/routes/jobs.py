@@ -0,0 +1,57 @@
+"""
+任务路由模块
+查询异步任务（攻略生成、自驾游规划）的状态和结果
+"""
+
+from flask import Blueprint, request, jsonify
+import logging
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from services.auth import optional_auth
+from services.jobs import get_job_manager, JobManager, TERMINAL_STATES
+from utils.config import Config
+
+logger = logging.getLogger(__name__)
+
+bp = Blueprint('jobs', __name__)
+
+@bp.route('/jobs/<job_id>', methods=['GET'])
+@optional_auth
+def get_job(job_id):
+    """
+    查询任务状态
+    查询参数 wait=秒数 时长轮询：任务结束或等待超时后返回（不超过JOB_MAX_WAIT_SECONDS）
+    """
+    try:
+        try:
+            wait = float(request.args.get('wait', 0))
+        except ValueError:
+            return jsonify({'status': 'error', 'message': 'wait必须是数字'}), 400
+        wait = min(max(wait, 0.0), Config.JOB_MAX_WAIT_SECONDS)
+
+        manager = get_job_manager()
+        job = manager.wait(job_id, wait) if wait > 0 else manager.get(job_id)
+        # 任务只对提交者可见；不存在、已过期和无权查看都返回404
+        if job is None or (job['user_id'] and job['user_id'] != getattr(request, 'user_id', None)):
+            return jsonify({
+                'status': 'error',
+                'message': '任务不存在或已过期',
+                'error_code': 'JOB_NOT_FOUND'
+            }), 404
+
+        response = jsonify({
+            'status': 'success',
+            'job': JobManager.to_public(job)
+        })
+        if job['state'] not in TERMINAL_STATES:
+            response.headers['Retry-After'] = '1'
+        return response
+
+    except Exception as e:
+        logger.error(f"查询任务失败: {str(e)}")
+        return jsonify({
+            'status': 'error',
+            'message': f'查询任务时出错: {str(e)}'
+        }), 500
@@ -7,10 +7,12 @@ from flask import Blueprint, jsonify, request
 import logging
 import sys
 import os
+from datetime import datetime
 
 # 导入认证装饰器
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from services.auth import auth_required, optional_auth
+from services.model import get_model_service
 
 logger = logging.getLogger(__name__)
 
@@ -57,15 +59,20 @@ def home():
 @bp.route('/health')
 @optional_auth
 def health_check():
-    """健康检查端点 - 简化版"""
+    """健康检查端点 - 报告模型的真实加载状态（loading/ready/degraded）"""
     try:
-        # 简化版健康检查，避免服务依赖问题
+        model_status = get_model_service().get_status()
+        overall = {
+            'ready': 'healthy',
+            'loading': 'starting',
+        }.get(model_status['state'], 'degraded')
+
         status = {
-            "status": "healthy",
-            "timestamp": "2026-01-28T12:15:00Z",
+            "status": overall,
+            "timestamp": datetime.utcnow().isoformat() + 'Z',
             "services": {
                 "database": "check_skipped",
-                "model_service": "check_skipped", 
+                "model_service": model_status,
                 "authentication": "operational",
                 "message": "Backend service is running"
             }
@@ -77,5 +84,5 @@ def health_check():
         return jsonify({
             "status": "unhealthy",
             "error": str(e),
-            "timestamp": "2026-01-28T12:15:00Z"
-        }), 500
\ No newline at end of file
+            "timestamp": datetime.utcnow().isoformat() + 'Z'
+        }), 500
@@ -12,6 +12,7 @@ import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from services.auth import auth_required, optional_auth
 from services.cache import api_response_cache
+from services.jobs import wants_async, submit_async_job
 from services.model import get_model_service
 from utils.monitoring import performance_monitor
 from utils.config import Config
@@ -237,7 +238,8 @@ def generate_mock_roadtrip_guide(start, destination, preferences, route_type, ro
 def plan_roadtrip():
     """
     自驾游路线规划
-    根据起点、终点和偏好生成路线规划和攻略
+    根据起点、终点和偏好生成路线规划和攻略；
+    请求头 Prefer: respond-async（或查询参数 async=1）时提交后台任务，立即返回任务ID，通过 /api/jobs/<job_id> 获取结果
     """
     try:
         data = request.get_json()
@@ -264,36 +266,10 @@ def plan_roadtrip():
                 'message': '路线类型必须是 fastest/scenic/balanced'
             }), 400
 
-        route_id = str(uuid.uuid4())
+        if wants_async():
+            return submit_async_job('roadtrip', lambda: build_roadtrip(start, destination, preferences, route_type))
 
-        waypoints = generate_route_waypoints(start, destination, route_type)
-
-        route_info = calculate_route_info(start, destination, route_type, waypoints)
-
-        guide = generate_roadtrip_guide(start, destination, preferences, route_type, route_info)
-
-        sample_images = [
-            "https://example.com/scenery1.jpg",
-            "https://example.com/scenery2.jpg"
-        ]
-
-        save_route_cache(route_id, {
-            'route': route_info,
-            'guide': guide,
-            'preferences': preferences,
-            'route_type': route_type
-        })
-
-        logger.info(f"自驾游路线规划完成: route_id={route_id}, start={start}, destination={destination}")
-
-        return jsonify({
-            'status': 'success',
-            'route': route_info,
-            'guide': guide,
-            'images': sample_images,
-            'distance_km': route_info['total_distance_km'],
-            'estimated_hours': route_info['estimated_time_hours']
-        })
+        return jsonify(build_roadtrip(start, destination, preferences, route_type))
 
     except Exception as e:
         logger.error(f"自驾游路线规划失败: {str(e)}")
@@ -302,6 +278,39 @@ def plan_roadtrip():
             'message': f'路线规划失败: {str(e)}'
         }), 500
 
+def build_roadtrip(start, destination, preferences, route_type):
+    """规划路线并生成攻略，返回接口响应体（同步接口和异步任务共用）"""
+    route_id = str(uuid.uuid4())
+
+    waypoints = generate_route_waypoints(start, destination, route_type)
+
+    route_info = calculate_route_info(start, destination, route_type, waypoints)
+
+    guide = generate_roadtrip_guide(start, destination, preferences, route_type, route_info)
+
+    sample_images = [
+        "https://example.com/scenery1.jpg",
+        "https://example.com/scenery2.jpg"
+    ]
+
+    save_route_cache(route_id, {
+        'route': route_info,
+        'guide': guide,
+        'preferences': preferences,
+        'route_type': route_type
+    })
+
+    logger.info(f"自驾游路线规划完成: route_id={route_id}, start={start}, destination={destination}")
+
+    return {
+        'status': 'success',
+        'route': route_info,
+        'guide': guide,
+        'images': sample_images,
+        'distance_km': route_info['total_distance_km'],
+        'estimated_hours': route_info['estimated_time_hours']
+    }
+
 @bp.route('/roadtrip/<route_id>', methods=['GET'])
 @optional_auth
 @performance_monitor
@@ -12,6 +12,8 @@ import sys
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from services.auth import auth_required, optional_auth
 from services.vector import get_vector_service
+from services.model import ModelNotReadyError
+from utils.config import Config
 
 logger = logging.getLogger(__name__)
 
@@ -36,6 +38,10 @@ def search_guides():
         query = data.get('query')
         filters = data.get('filters', {})
         limit = data.get('limit', 5)
+        diversify = data.get('diversify')
+        mmr_lambda = data.get('mmr_lambda')
+        rerank = data.get('rerank')
+        rerank_budget_ms = data.get('rerank_budget_ms')
 
         if not query:
             return jsonify({
@@ -49,7 +55,11 @@ def search_guides():
         search_results = vector_service.search_similar(
             query=query,
             limit=limit,
-            filters=filters
+            filters=filters,
+            diversify=diversify,
+            mmr_lambda=mmr_lambda,
+            rerank=rerank,
+            rerank_budget_ms=rerank_budget_ms
         )
         
         logger.info(f"搜索攻略: query={query}, filters={filters}, limit={limit}, 结果数={len(search_results['results'])}")
@@ -59,10 +69,92 @@ def search_guides():
             'data': search_results
         })
 
+    except ModelNotReadyError as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e),
+            'error_code': 'MODEL_LOADING'
+        }), 503, {'Retry-After': '5'}
     except Exception as e:
         logger.error(f"搜索攻略失败: {str(e)}")
         return jsonify({
             'status': 'error',
             'message': '搜索攻略失败',
             'error_code': 'SEARCH_ERROR'
-        }), 500
\ No newline at end of file
+        }), 500
+
+@bp.route('/guides/batch', methods=['POST'])
+@auth_required
+def search_guides_batch():
+    """
+    批量搜索旅游攻略
+    一次请求携带多个查询（各自的过滤条件和数量），一次编码、按过滤条件合并检索，结果按请求顺序返回
+    """
+    try:
+        data = request.get_json()
+        if not data:
+            return jsonify({
+                'status': 'error',
+                'message': '请求体为空',
+                'error_code': 'EMPTY_REQUEST'
+            }), 400
+
+        queries = data.get('queries')
+        if not isinstance(queries, list) or not queries:
+            return jsonify({
+                'status': 'error',
+                'message': '缺少查询列表',
+                'error_code': 'MISSING_QUERIES'
+            }), 400
+
+        if len(queries) > Config.SEARCH_BATCH_MAX_QUERIES:
+            return jsonify({
+                'status': 'error',
+                'message': f'单次最多{Config.SEARCH_BATCH_MAX_QUERIES}个查询',
+                'error_code': 'TOO_MANY_QUERIES'
+            }), 400
+
+        batch = []
+        for index, item in enumerate(queries):
+            if not isinstance(item, dict) or not item.get('query'):
+                return jsonify({
+                    'status': 'error',
+                    'message': f'第{index + 1}个查询缺少搜索关键词',
+                    'error_code': 'MISSING_QUERY'
+                }), 400
+            batch.append({
+                'query': item['query'],
+                'filters': item.get('filters', {}),
+                'limit': item.get('limit', 5),
+                'diversify': item.get('diversify'),
+                'mmr_lambda': item.get('mmr_lambda'),
+                'rerank': item.get('rerank'),
+                'rerank_budget_ms': item.get('rerank_budget_ms')
+            })
+
+        vector_service = get_vector_service()
+        search_results = vector_service.search_batch(batch)
+
+        logger.info(f"批量搜索攻略: 查询数={len(batch)}, 结果数={[result['total'] for result in search_results]}")
+
+        return jsonify({
+            'status': 'success',
+            'data': {
+                'results': search_results,
+                'total': len(search_results)
+            }
+        })
+
+    except ModelNotReadyError as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e),
+            'error_code': 'MODEL_LOADING'
+        }), 503, {'Retry-After': '5'}
+    except Exception as e:
+        logger.error(f"批量搜索攻略失败: {str(e)}")
+        return jsonify({
+            'status': 'error',
+            'message': '批量搜索攻略失败',
+            'error_code': 'SEARCH_ERROR'
+        }), 500
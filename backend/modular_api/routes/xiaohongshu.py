@@ -3,7 +3,7 @@
 """
 
 from flask import Blueprint, request, jsonify
-from services.model import get_model_service
+from services.model import get_model_service, ModelNotReadyError
 
 xiaohongshu_bp = Blueprint('xiaohongshu', __name__)
 
@@ -23,5 +23,7 @@ def vectorize():
             "status": "success",
             "vector": vectors.tolist()
         })
+    except ModelNotReadyError as e:
+        return jsonify({"error_code": "MODEL_LOADING", "message": str(e), "status": "error"}), 503, {"Retry-After": "5"}
     except Exception as e:
         return jsonify({"error_code": "MODEL_ERROR", "message": str(e), "status": "error"}), 500
\ No newline at end of file
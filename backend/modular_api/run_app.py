@@ -63,6 +63,11 @@ def create_app(config_name='default'):
     register_blueprints(app)
     logger.info(">>> 蓝图注册完成")
 
+    # 在后台线程预热模型，进程可以立即开始监听端口
+    if Config.MODEL_WARMUP_ON_START:
+        from services.model import get_model_service
+        get_model_service()
+
     # 注册错误处理器
     register_error_handlers(app)
 
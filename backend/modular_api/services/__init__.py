@@ -4,7 +4,7 @@
 from .auth import get_auth_service, AuthService
 from .cache import get_cache_service, CacheService
 from .database import get_db_connection, init_db
-from .model import get_model_service, ModelService
+from .model import get_model_service, ModelService, ModelNotReadyError
 from .vector import get_vector_service, VectorService
 from .scraper import get_scraper_service, ScraperService
 
@@ -17,6 +17,7 @@ __all__ = [
     'init_db',
     'get_model_service',
     'ModelService',
+    'ModelNotReadyError',
     'get_vector_service',
     'VectorService',
     'get_scraper_service',
@@ -11,6 +11,12 @@ from functools import wraps
 import hashlib
 import time
 
+try:
+    from utils.streaming import wants_event_stream, sse_event, sse_response
+except ImportError:
+    from modular_api.utils.streaming import wants_event_stream, sse_event, sse_response
+from .jobs import wants_async
+
 logger = logging.getLogger(__name__)
 
 class CacheService:
@@ -153,13 +159,13 @@ def api_response_cache(ttl: int = 300, prefix: str = "api"):
         @wraps(func)
         def wrapper(*args, **kwargs):
             # 从请求中提取参数
-            from flask import request
+            from flask import request, g, make_response
             
-            # 构建缓存键
+            # 构建缓存键（async参数只决定执行方式，同步和异步请求共用缓存）
             cache_params = {
                 "path": request.path,
                 "method": request.method,
-                "query": dict(request.args),
+                "query": {name: value for name, value in request.args.items() if name != 'async'},
                 "data": request.get_json() if request.is_json else {}
             }
             
@@ -169,14 +175,34 @@ def api_response_cache(ttl: int = 300, prefix: str = "api"):
             
             key = cache_key_builder(prefix, **cache_params)
             
+            # 流式请求：命中时以单个done事件回放缓存的JSON；未命中时由路由在流结束后调用cache_completed_stream写入
+            if wants_event_stream():
+                cached_response = cache.get(key)
+                if cached_response is not None:
+                    logger.debug(f"缓存命中（流式回放）: {key}")
+                    return sse_response(iter([sse_event('done', cached_response.get_json())]))
+                g.api_cache_key = key
+                g.api_cache_ttl = ttl
+                return func(*args, **kwargs)
+            
+            # 异步请求：命中时直接返回完整结果；未命中时不缓存202响应，由后台任务完成后写入同一个键
+            if wants_async():
+                cached_response = cache.get(key)
+                if cached_response is not None:
+                    logger.debug(f"缓存命中（异步请求）: {key}")
+                    return cached_response
+                g.api_cache_key = key
+                g.api_cache_ttl = ttl
+                return func(*args, **kwargs)
+            
             # 尝试从缓存获取
             cached_response = cache.get(key)
             if cached_response is not None:
                 logger.debug(f"缓存命中: {key}")
                 return cached_response
             
-            # 执行函数
-            response = func(*args, **kwargs)
+            # 执行函数（路由可能返回 (body, status[, headers]) 元组，统一转换为响应对象再判断状态码）
+            response = make_response(func(*args, **kwargs))
             
             # 缓存成功响应（仅缓存2xx状态码）
             if response.status_code >= 200 and response.status_code < 300:
@@ -193,6 +219,33 @@ def api_response_cache(ttl: int = 300, prefix: str = "api"):
         return wrapper
     return decorator
 
+def cache_completed_stream(body: dict) -> bool:
+    """
+    流式响应完成后，把与非流式接口相同的JSON响应写入api_response_cache
+    
+    :param body: 非流式接口返回的JSON内容
+    :return: 是否写入成功（未经api_response_cache装饰或缓存不可用时为False）
+    """
+    from flask import g
+    
+    key = g.get('api_cache_key')
+    if key is None:
+        return False
+    return cache_response_body(key, body, g.get('api_cache_ttl', 300))
+
+def cache_response_body(key: str, body: dict, ttl: int = 300) -> bool:
+    """
+    把JSON响应体以api_response_cache的格式写入指定缓存键（需要应用上下文）
+    
+    :param key: api_response_cache构建的缓存键
+    :param body: 响应体
+    :param ttl: 缓存时间（秒）
+    :return: 是否写入成功
+    """
+    from flask import jsonify
+    
+    return cache.set(key, jsonify(body), ttl)
+
 def query_cache(ttl: int = 600, key_prefix: str = "query"):
     """
     查询缓存装饰器
@@ -0,0 +1,137 @@
+"""
+文本分段模块
+把长攻略切分为带重叠的段落，每段控制在embedding模型的token窗口内
+"""
+
+import math
+import re
+from dataclasses import dataclass
+from typing import Iterable, List, Optional, Tuple
+
+# 中英文句末标点（文本清洗时保留，作为分段和上下文组装的句子边界）
+SENTENCE_END_CHARS = '。！？!?；;'
+# 句子边界：句末标点或换行
+SENTENCE_PATTERN = re.compile(rf'[^{SENTENCE_END_CHARS}\n]*(?:[{SENTENCE_END_CHARS}]+|\n+|$)')
+# 计费单元：拉丁字母/数字串、空白、单个其他字符（汉字、标点等）
+UNIT_PATTERN = re.compile(r'[A-Za-z0-9_]+|\s+|.', re.S)
+
+
+@dataclass
+class Passage:
+    """分段结果，start/end为在原文中的字符偏移"""
+    text: str
+    start: int
+    end: int
+    index: int
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    估算BERT WordPiece的token数（all-MiniLM-L6-v2词表下汉字约一字一token）
+
+    Args:
+        text: 文本
+
+    Returns:
+        估算的token数（偏保守）
+    """
+    return sum(_unit_cost(unit) for unit in UNIT_PATTERN.findall(text))
+
+
+def _unit_cost(unit: str) -> int:
+    if unit.isspace():
+        return 0
+    if len(unit) > 1:
+        return max(1, math.ceil(len(unit) / 5))
+    return 1
+
+
+def join_passages(passages: Iterable[Tuple[str, Optional[int]]]) -> str:
+    """
+    按原文偏移把段落拼回全文，去掉重叠部分
+
+    Args:
+        passages: 按段落序号排列的 (段落文本, 在原文中的起始偏移)，偏移未知时直接拼接
+
+    Returns:
+        拼接后的全文
+    """
+    content = ''
+    for text, start in passages:
+        if start is None:
+            start = len(content)
+        content += text[max(0, len(content) - start):]
+    return content
+
+
+class TextChunker:
+    """按句子边界打包、超长句子按token硬切分的重叠分段器"""
+
+    def __init__(self, max_tokens: int = 200, overlap_tokens: int = 32):
+        if max_tokens <= 0:
+            raise ValueError("max_tokens必须大于0")
+        self.max_tokens = max_tokens
+        self.overlap_tokens = max(0, min(overlap_tokens, max_tokens // 2))
+
+    def split(self, text: str) -> List[Passage]:
+        """
+        切分文本
+
+        Args:
+            text: 已清洗的文本
+
+        Returns:
+            段落列表；短文本返回只有一段的列表，空文本返回空列表
+        """
+        if not text or not text.strip():
+            return []
+        spans = self._spans(text)
+        if sum(cost for _, _, cost in spans) <= self.max_tokens:
+            return [Passage(text=text, start=0, end=len(text), index=0)]
+
+        passages = []
+        i = 0
+        while i < len(spans):
+            j = i
+            total = 0
+            while j < len(spans) and (j == i or total + spans[j][2] <= self.max_tokens):
+                total += spans[j][2]
+                j += 1
+            start, end = spans[i][0], spans[j - 1][1]
+            passages.append(Passage(text=text[start:end], start=start, end=end, index=len(passages)))
+            if j >= len(spans):
+                break
+            # 回退若干片段作为下一段的重叠部分，至少前进一个片段
+            k = j
+            overlap = 0
+            while k - 1 > i and overlap + spans[k - 1][2] <= self.overlap_tokens:
+                k -= 1
+                overlap += spans[k][2]
+            i = k
+        return passages
+
+    def _spans(self, text: str):
+        """把文本拆成 (start, end, cost) 片段：优先整句，超长句按计费单元切开"""
+        spans = []
+        for match in SENTENCE_PATTERN.finditer(text):
+            start, end = match.span()
+            if start == end:
+                continue
+            sentence = match.group()
+            cost = estimate_tokens(sentence)
+            if cost <= self.max_tokens:
+                spans.append((start, end, cost))
+                continue
+            # 超长句子：以overlap大小为粒度切成小片段，交给打包逻辑组合
+            piece = max(1, self.overlap_tokens or self.max_tokens // 4)
+            piece_start = start
+            piece_cost = 0
+            for unit in UNIT_PATTERN.finditer(sentence):
+                unit_cost = _unit_cost(unit.group())
+                if piece_cost and piece_cost + unit_cost > piece:
+                    spans.append((piece_start, start + unit.start(), piece_cost))
+                    piece_start = start + unit.start()
+                    piece_cost = 0
+                piece_cost += unit_cost
+            spans.append((piece_start, end, piece_cost))
+        return spans
@@ -0,0 +1,129 @@
+"""
+ChromaDB集合管理模块
+进程内每个数据库路径只创建一个PersistentClient，集合句柄打开一次后复用；
+记录冷启动（首次打开）和热访问的耗时，便于观察客户端构建对请求延迟的影响
+"""
+
+import logging
+import threading
+import time
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class CollectionManager:
+    """线程安全的ChromaDB客户端与集合句柄管理器"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._client = None
+        self._collections: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            'client_init_ms': None,
+            'cold_opens': 0,
+            'warm_hits': 0,
+            'collections': {}
+        }
+
+    def get_client(self):
+        """获取（必要时创建）ChromaDB客户端"""
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    import chromadb
+                    started = time.perf_counter()
+                    self._client = chromadb.PersistentClient(path=self.path)
+                    self._stats['client_init_ms'] = round((time.perf_counter() - started) * 1000, 3)
+                    logger.info(f"ChromaDB客户端初始化成功，路径: {self.path}, 耗时: {self._stats['client_init_ms']}ms")
+        return self._client
+
+    def get_collection(self, name: str, metadata: Optional[Dict[str, Any]] = None):
+        """
+        获取集合句柄，首次访问时打开（不存在则创建），之后直接复用
+
+        Args:
+            name: 集合名称
+            metadata: 创建集合时使用的元数据
+
+        Returns:
+            ChromaDB集合对象
+        """
+        started = time.perf_counter()
+        collection = self._collections.get(name)
+        if collection is not None:
+            self._record(name, started, cold=False)
+            return collection
+
+        client = self.get_client()
+        with self._lock:
+            collection = self._collections.get(name)
+            if collection is None:
+                collection = client.get_or_create_collection(name=name, metadata=metadata)
+                self._collections[name] = collection
+                self._record(name, started, cold=True)
+                logger.info(f"ChromaDB集合获取成功: {name}")
+                return collection
+        self._record(name, started, cold=False)
+        return collection
+
+    def _record(self, name: str, started: float, cold: bool):
+        """记录一次集合访问耗时"""
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        with self._stats_lock:
+            entry = self._stats['collections'].setdefault(name, {
+                'cold_open_ms': None, 'warm_hits': 0, 'warm_total_ms': 0.0
+            })
+            if cold:
+                self._stats['cold_opens'] += 1
+                entry['cold_open_ms'] = round(elapsed_ms, 3)
+            else:
+                self._stats['warm_hits'] += 1
+                entry['warm_hits'] += 1
+                entry['warm_total_ms'] += elapsed_ms
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取冷/热访问耗时统计"""
+        with self._stats_lock:
+            collections = {}
+            for name, entry in self._stats['collections'].items():
+                hits = entry['warm_hits']
+                collections[name] = {
+                    'cold_open_ms': entry['cold_open_ms'],
+                    'warm_hits': hits,
+                    'warm_avg_ms': round(entry['warm_total_ms'] / hits, 4) if hits else None
+                }
+            return {
+                'path': self.path,
+                'client_init_ms': self._stats['client_init_ms'],
+                'cold_opens': self._stats['cold_opens'],
+                'warm_hits': self._stats['warm_hits'],
+                'collections': collections
+            }
+
+
+# 进程内按数据库路径共享的管理器
+_managers: Dict[str, CollectionManager] = {}
+_managers_lock = threading.Lock()
+
+
+def get_collection_manager(path: Optional[str] = None) -> CollectionManager:
+    """获取指定路径的集合管理器（单例，默认使用Config.CHROMA_PATH）"""
+    if path is None:
+        from modular_api.utils.config import Config
+        path = Config.CHROMA_PATH
+    manager = _managers.get(path)
+    if manager is None:
+        with _managers_lock:
+            manager = _managers.get(path)
+            if manager is None:
+                manager = CollectionManager(path)
+                _managers[path] = manager
+    return manager
+
+
+def get_collection_manager_stats() -> Dict[str, Any]:
+    """所有集合管理器的统计信息（用于监控端点）"""
+    return {path: manager.get_stats() for path, manager in list(_managers.items())}
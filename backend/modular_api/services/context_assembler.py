@@ -0,0 +1,146 @@
+"""
+上下文组装模块
+把检索到的攻略段落组装成受token预算约束的大模型上下文：
+按句切分（没有句子边界的长文本按token窗口切分）、去掉近重复句子，按检索排名分配预算，
+段落超出份额时优先保留与查询重合度高的句子，并报告预算的使用情况，使生成攻略的提示词长度和调用成本可预期
+"""
+
+import logging
+from typing import Any, Dict, List, Sequence
+
+from .chunker import SENTENCE_PATTERN, TextChunker, estimate_tokens
+from .dedup import normalize_text
+
+logger = logging.getLogger(__name__)
+
+
+def char_bigrams(text: str) -> set:
+    """规范化文本的字符二元组集合（单字文本返回自身）"""
+    normalized = normalize_text(text)
+    if len(normalized) < 2:
+        return {normalized} if normalized else set()
+    return {normalized[i:i + 2] for i in range(len(normalized) - 1)}
+
+
+def jaccard(a: set, b: set) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+class ContextAssembler:
+    """按token预算组装上下文（token数沿用分段模块的估算，汉字约一字一token，偏保守）"""
+
+    def __init__(self, budget_tokens: int = 1200, max_passage_share: float = 0.5,
+                 duplicate_threshold: float = 0.8, max_sentence_tokens: int = 64):
+        """
+        Args:
+            budget_tokens: 上下文的token预算
+            max_passage_share: 第一轮分配时单个段落最多占用的预算比例，避免排名靠前的长文独占上下文
+            duplicate_threshold: 两个句子字符二元组的Jaccard相似度不低于该值时视为近重复
+            max_sentence_tokens: 单个句子的token上限，超出时（如没有标点的旧段落）按窗口切成多个片段
+        """
+        self.budget_tokens = max(1, int(budget_tokens))
+        self.max_passage_share = min(1.0, max(0.0, float(max_passage_share)))
+        self.duplicate_threshold = float(duplicate_threshold)
+        self.window_chunker = TextChunker(max(1, int(max_sentence_tokens)), overlap_tokens=0)
+
+    def assemble(self, query: str, passages: Sequence[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        组装上下文
+
+        Args:
+            query: 检索查询（用于给句子打分）
+            passages: 按检索排名排列的结果，每项包含content，可选id
+
+        Returns:
+            {'text': 上下文文本, 'report': 预算使用情况}
+        """
+        query_bigrams = char_bigrams(query)
+        candidates = []
+        kept_bigrams: List[set] = []
+        input_tokens = 0
+        duplicates = 0
+
+        # 句子级去重：与排名更靠前的已有句子近重复的句子直接丢弃
+        for rank, passage in enumerate(passages):
+            sentences = []
+            for position, sentence in enumerate(self.split_sentences(passage.get('content') or '')):
+                tokens = estimate_tokens(sentence)
+                input_tokens += tokens
+                bigrams = char_bigrams(sentence)
+                if not bigrams or any(jaccard(bigrams, other) >= self.duplicate_threshold for other in kept_bigrams):
+                    duplicates += 1
+                    continue
+                kept_bigrams.append(bigrams)
+                sentences.append({
+                    'text': sentence,
+                    'tokens': tokens,
+                    'position': position,
+                    'overlap': len(bigrams & query_bigrams),
+                    'selected': False
+                })
+            # 与查询重合度高的句子优先，重合度相同时保持原文顺序
+            sentences.sort(key=lambda item: (-item['overlap'], item['position']))
+            candidates.append({'id': passage.get('id'), 'rank': rank, 'sentences': sentences, 'selected': []})
+
+        # 第一轮按排名给每个段落不超过份额的预算，第二轮用剩余预算按排名补齐
+        remaining = self.budget_tokens
+        share = max(1, int(self.budget_tokens * self.max_passage_share))
+        for cap in (share, None):
+            for candidate in candidates:
+                used = sum(item['tokens'] for item in candidate['selected'])
+                limit = remaining if cap is None else min(remaining, cap - used)
+                for item in candidate['sentences']:
+                    if item['selected'] or item['tokens'] > limit:
+                        continue
+                    item['selected'] = True
+                    candidate['selected'].append(item)
+                    limit -= item['tokens']
+                    remaining -= item['tokens']
+
+        blocks = []
+        passage_reports = []
+        for candidate in candidates:
+            selected = sorted(candidate['selected'], key=lambda item: item['position'])
+            tokens = sum(item['tokens'] for item in selected)
+            if selected:
+                blocks.append(''.join(item['text'] for item in selected))
+            passage_reports.append({
+                'id': candidate['id'],
+                'rank': candidate['rank'],
+                'tokens': tokens,
+                'sentences': len(selected),
+                'truncated': len(selected) < len(candidate['sentences'])
+            })
+
+        used_tokens = self.budget_tokens - remaining
+        report = {
+            'budget_tokens': self.budget_tokens,
+            'used_tokens': used_tokens,
+            'utilization': round(used_tokens / self.budget_tokens, 4),
+            'input_tokens': input_tokens,
+            'passages_total': len(candidates),
+            'passages_used': len(blocks),
+            'truncated_passages': sum(1 for item in passage_reports if item['truncated'] and item['sentences']),
+            'dropped_passages': sum(1 for item in passage_reports if not item['sentences']),
+            'duplicate_sentences': duplicates,
+            'passages': passage_reports
+        }
+        logger.info(f"上下文组装完成: 预算={self.budget_tokens}, 使用={used_tokens}, 输入={input_tokens}, "
+                    f"段落={len(blocks)}/{len(candidates)}, 去重句子={duplicates}")
+        return {'text': '\n'.join(blocks), 'report': report}
+
+    def split_sentences(self, text: str) -> List[str]:
+        """按中英文句末标点和换行切句，超长句子按token窗口切分，去掉首尾空白"""
+        sentences = []
+        for match in SENTENCE_PATTERN.finditer(text):
+            sentence = match.group().strip()
+            if not sentence:
+                continue
+            if estimate_tokens(sentence) <= self.window_chunker.max_tokens:
+                sentences.append(sentence)
+            else:
+                # 窗口片段保留边界处的空白，拼接时词之间不会粘连
+                sentences.extend(piece.text for piece in self.window_chunker.split(sentence) if piece.text.strip())
+        return sentences
@@ -0,0 +1,280 @@
+"""
+近重复检测模块
+对清洗后的全文计算64位SimHash，按分段（banded LSH）存入SQLite；
+同一篇小红书笔记被多个关键词或多次爬取、或重复上传时，在向量化之前就能识别出来
+"""
+
+import hashlib
+import logging
+import os
+import re
+import sqlite3
+import threading
+import unicodedata
+from collections import Counter
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .chunker import join_passages
+
+logger = logging.getLogger(__name__)
+
+FINGERPRINT_BITS = 64
+SHINGLE_SIZE = 3
+
+_NON_WORD = re.compile(r'[\W_]+')
+_BIT_SHIFTS = np.arange(FINGERPRINT_BITS, dtype=np.uint64)
+
+
+def normalize_text(text: str) -> str:
+    """去掉空白和标点、统一全半角和大小写，排版差异不影响指纹"""
+    return _NON_WORD.sub('', unicodedata.normalize('NFKC', text or '').lower())
+
+
+def simhash(text: str, shingle_size: int = SHINGLE_SIZE) -> int:
+    """
+    计算文本的64位SimHash（字符n-gram，按出现次数加权）
+
+    Args:
+        text: 文本
+        shingle_size: n-gram长度
+
+    Returns:
+        无符号64位指纹，空文本返回0
+    """
+    normalized = normalize_text(text)
+    if not normalized:
+        return 0
+    if len(normalized) <= shingle_size:
+        shingles = Counter([normalized])
+    else:
+        shingles = Counter(normalized[i:i + shingle_size] for i in range(len(normalized) - shingle_size + 1))
+
+    hashes = np.array([int.from_bytes(hashlib.blake2b(shingle.encode('utf-8'), digest_size=8).digest(), 'little')
+                       for shingle in shingles], dtype=np.uint64)
+    weights = np.array(list(shingles.values()), dtype=np.float64)
+    bits = ((hashes[:, None] >> _BIT_SHIFTS) & np.uint64(1)).astype(np.float64)
+    votes = weights @ (bits * 2.0 - 1.0)
+    return sum(1 << int(bit) for bit in np.flatnonzero(votes > 0))
+
+
+def hamming_distance(a: int, b: int) -> int:
+    return bin(a ^ b).count('1')
+
+
+def _to_signed(value: int) -> int:
+    """SQLite INTEGER是有符号64位"""
+    return value - (1 << 64) if value >= (1 << 63) else value
+
+
+def _to_unsigned(value: int) -> int:
+    return value + (1 << 64) if value < 0 else value
+
+
+def band_layout(max_distance: int) -> List[Tuple[int, int]]:
+    """
+    把64位指纹切成max_distance + 1段，返回每段的 (起始位, 位数)
+
+    海明距离不超过max_distance的两个指纹至少有一段完全相同（抽屉原理），
+    因此只需按段值查找候选，不会漏掉近重复文档
+    """
+    bands = max(1, min(max_distance + 1, FINGERPRINT_BITS // 4))
+    layout, offset = [], 0
+    for band in range(bands):
+        width = FINGERPRINT_BITS // bands + (1 if band < FINGERPRINT_BITS % bands else 0)
+        layout.append((offset, width))
+        offset += width
+    return layout
+
+
+class NearDuplicateIndex:
+    """SimHash近重复索引，按分段值查找候选后再精确比较海明距离"""
+
+    def __init__(self, db_path: str, max_distance: int = 6):
+        self.db_path = db_path
+        self.max_distance = max_distance
+        self.layout = band_layout(max_distance)
+        self._lock = threading.Lock()
+        self._stats = {'checked': 0, 'duplicates': 0}
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute('''CREATE TABLE IF NOT EXISTS dedup_fingerprints
+                              (doc_id TEXT PRIMARY KEY,
+                               fingerprint INTEGER NOT NULL,
+                               created_at DATETIME DEFAULT CURRENT_TIMESTAMP)''')
+        self._conn.execute('''CREATE TABLE IF NOT EXISTS dedup_bands
+                              (band INTEGER NOT NULL,
+                               value INTEGER NOT NULL,
+                               doc_id TEXT NOT NULL)''')
+        self._conn.execute('CREATE INDEX IF NOT EXISTS idx_dedup_bands ON dedup_bands (band, value)')
+        self._conn.execute('CREATE INDEX IF NOT EXISTS idx_dedup_bands_doc ON dedup_bands (doc_id)')
+        self._conn.execute('CREATE TABLE IF NOT EXISTS dedup_meta (key TEXT PRIMARY KEY, value TEXT)')
+        self._ensure_layout()
+        self._conn.commit()
+        logger.info(f"近重复索引已打开: {db_path}, 阈值={max_distance}, 分段数={len(self.layout)}")
+
+    def _ensure_layout(self):
+        """阈值变化导致分段方式改变时，用已存的指纹重建分段表"""
+        layout = ','.join(f'{offset}:{width}' for offset, width in self.layout)
+        row = self._conn.execute("SELECT value FROM dedup_meta WHERE key = 'layout'").fetchone()
+        if row and row[0] == layout:
+            return
+        if row:
+            logger.info("近重复索引分段方式变化，重建分段表")
+            self._conn.execute('DELETE FROM dedup_bands')
+            for doc_id, fingerprint in self._conn.execute('SELECT doc_id, fingerprint FROM dedup_fingerprints').fetchall():
+                self._insert_bands(doc_id, _to_unsigned(fingerprint))
+        self._conn.execute("INSERT OR REPLACE INTO dedup_meta (key, value) VALUES ('layout', ?)", (layout,))
+
+    def _bands(self, fingerprint: int) -> List[int]:
+        return [(fingerprint >> offset) & ((1 << width) - 1) for offset, width in self.layout]
+
+    def check_and_add(self, doc_ids: Sequence[str], texts: Sequence[str]) -> List[Optional[str]]:
+        """
+        查重并登记新文档（按顺序处理，同一批内的重复也能识别）
+
+        与自身ID匹配不算重复，同一ID再次写入时更新其指纹
+
+        Args:
+            doc_ids: 文档ID列表
+            texts: 清洗后的全文
+
+        Returns:
+            每篇文档重复的已有文档ID，新文档为None
+        """
+        duplicate_of = []
+        with self._lock:
+            for doc_id, text in zip(doc_ids, texts):
+                fingerprint = simhash(text)
+                match = self._nearest(fingerprint, exclude=doc_id) if fingerprint else None
+                self._stats['checked'] += 1
+                if match is not None:
+                    self._stats['duplicates'] += 1
+                    duplicate_of.append(match)
+                    continue
+                self._insert(doc_id, fingerprint)
+                duplicate_of.append(None)
+            self._conn.commit()
+        return duplicate_of
+
+    def _nearest(self, fingerprint: int, exclude: str) -> Optional[str]:
+        """海明距离最近且不超过阈值的已有文档"""
+        clauses = ' OR '.join(['(band = ? AND value = ?)'] * len(self.layout))
+        params = [item for band, value in enumerate(self._bands(fingerprint)) for item in (band, value)]
+        rows = self._conn.execute(f'''SELECT DISTINCT f.doc_id, f.fingerprint
+                                      FROM dedup_bands b JOIN dedup_fingerprints f ON f.doc_id = b.doc_id
+                                      WHERE {clauses}''', params).fetchall()
+        best, best_distance = None, self.max_distance + 1
+        for doc_id, stored in rows:
+            if doc_id == exclude:
+                continue
+            distance = hamming_distance(fingerprint, _to_unsigned(stored))
+            if distance < best_distance:
+                best, best_distance = doc_id, distance
+        return best
+
+    def _insert(self, doc_id: str, fingerprint: int):
+        self._conn.execute('DELETE FROM dedup_bands WHERE doc_id = ?', (doc_id,))
+        self._conn.execute('INSERT OR REPLACE INTO dedup_fingerprints (doc_id, fingerprint) VALUES (?, ?)',
+                           (doc_id, _to_signed(fingerprint)))
+        self._insert_bands(doc_id, fingerprint)
+
+    def _insert_bands(self, doc_id: str, fingerprint: int):
+        self._conn.executemany('INSERT INTO dedup_bands (band, value, doc_id) VALUES (?, ?, ?)',
+                               [(band, value, doc_id) for band, value in enumerate(self._bands(fingerprint))])
+
+    def remove(self, doc_ids: Sequence[str]):
+        """移除文档（删除文档或写入失败回滚时调用）"""
+        with self._lock:
+            for doc_id in doc_ids:
+                self._conn.execute('DELETE FROM dedup_bands WHERE doc_id = ?', (doc_id,))
+                self._conn.execute('DELETE FROM dedup_fingerprints WHERE doc_id = ?', (doc_id,))
+            self._conn.commit()
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute('SELECT COUNT(*) FROM dedup_fingerprints').fetchone()[0]
+
+    def clear(self):
+        """清空索引"""
+        with self._lock:
+            self._conn.execute('DELETE FROM dedup_bands')
+            self._conn.execute('DELETE FROM dedup_fingerprints')
+            self._conn.commit()
+
+    def rebuild_from_collection(self, collection, batch_size: int = 1000) -> int:
+        """
+        从Chroma集合重建索引：按父文档拼回全文后计算指纹
+
+        已存在的近重复文档都会保留在集合中，这里只登记，不做删除
+
+        Returns:
+            登记的文档数
+        """
+        documents: Dict[str, List] = {}
+        total = collection.count()
+        for offset in range(0, total, batch_size):
+            page = collection.get(offset=offset, limit=batch_size, include=['documents', 'metadatas'])
+            for passage_id, text, metadata in zip(page['ids'], page['documents'], page['metadatas']):
+                metadata = metadata or {}
+                parent_id = metadata.get('parent_id') or passage_id
+                documents.setdefault(parent_id, []).append(
+                    (metadata.get('chunk_index', 0), text, metadata.get('chunk_start')))
+
+        with self._lock:
+            for doc_id, passages in documents.items():
+                passages.sort(key=lambda item: item[0])
+                self._insert(doc_id, simhash(join_passages((text, start) for _, text, start in passages)))
+            self._conn.commit()
+        logger.info(f"近重复索引重建完成: {len(documents)} 篇")
+        return len(documents)
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats = dict(self._stats)
+        stats['documents'] = self.count()
+        stats['max_distance'] = self.max_distance
+        stats['path'] = self.db_path
+        return stats
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def default_index_path(chroma_path: str, collection_name: str) -> str:
+    """默认索引路径：与Chroma数据放在同一目录"""
+    return os.path.join(chroma_path, f"dedup_{collection_name}.sqlite3")
+
+
+def main():
+    """命令行入口：从Chroma集合重建近重复索引"""
+    import argparse
+
+    from modular_api.services.collection_manager import get_collection_manager
+    from modular_api.utils.config import Config
+
+    parser = argparse.ArgumentParser(description='近重复索引重建工具')
+    parser.add_argument('--collection', default='travel_guides', help='集合名称')
+    parser.add_argument('--output', default=None, help='索引路径（默认放在CHROMA_PATH下）')
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+
+    path = args.output or default_index_path(Config.CHROMA_PATH, args.collection)
+    collection = get_collection_manager(Config.CHROMA_PATH).get_collection(args.collection)
+    index = NearDuplicateIndex(path, Config.DEDUP_MAX_DISTANCE)
+    index.clear()
+    total = index.rebuild_from_collection(collection)
+    print(f"近重复索引重建完成: {total} 篇, 输出 {path}")
+
+
+if __name__ == '__main__':
+    main()
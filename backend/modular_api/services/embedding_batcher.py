@@ -0,0 +1,169 @@
+"""
+Embedding微批处理模块
+将多个请求线程并发发起的encode调用合并为一次批量前向计算
+"""
+
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingBatcher:
+    """
+    Embedding微批调度器
+
+    调用方线程把待编码文本放入队列后阻塞等待；调度线程在max_wait_ms时间窗口内
+    尽量收集更多请求（最多max_batch_size条文本），合并为一次encode_fn调用，
+    再按顺序把每个调用方自己的那几行向量切回给它。
+    encode_fn可以并行执行时（如进程池后端），dispatch_threads>1允许多个批次同时在途。
+    """
+
+    def __init__(self, encode_fn: Callable[[List[str]], Any],
+                 max_batch_size: int = 32, max_wait_ms: float = 5.0,
+                 dispatch_threads: int = 1):
+        self._encode_fn = encode_fn
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self.dispatch_threads = max(1, int(dispatch_threads))
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._queue: "queue.Queue[Tuple[List[str], Future]]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._running = False
+        # 入队与停止互斥，保证停止后不会再有请求进入无人处理的队列
+        self._submit_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            'requests': 0,
+            'texts': 0,
+            'batches': 0,
+            'max_observed_batch': 0,
+            'errors': 0
+        }
+
+    def start(self):
+        """启动调度线程"""
+        if self._running:
+            return
+        self._running = True
+        if self.dispatch_threads > 1:
+            self._executor = ThreadPoolExecutor(max_workers=self.dispatch_threads,
+                                                thread_name_prefix='embedding-dispatch')
+        self._thread = threading.Thread(target=self._run, name='embedding-batcher', daemon=True)
+        self._thread.start()
+        logger.info(f"Embedding微批调度器已启动: max_batch_size={self.max_batch_size}, "
+                    f"max_wait={self.max_wait * 1000:.1f}ms")
+
+    def stop(self, timeout: float = 5.0):
+        """停止调度线程，队列中剩余的请求会以异常结束"""
+        with self._submit_lock:
+            self._running = False
+        if self._thread:
+            self._thread.join(timeout=timeout)
+            self._thread = None
+        if self._executor:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        while True:
+            try:
+                _, future = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            future.set_exception(RuntimeError("Embedding微批调度器已停止"))
+        logger.info("Embedding微批调度器已停止")
+
+    def is_running(self) -> bool:
+        """调度线程是否在运行"""
+        return self._running and self._thread is not None and self._thread.is_alive()
+
+    def encode(self, texts: List[str], timeout: Optional[float] = None) -> np.ndarray:
+        """
+        提交文本并等待属于本次调用的向量
+
+        Args:
+            texts: 文本列表
+            timeout: 最长等待时间（秒），None表示一直等待
+
+        Returns:
+            形状为 (len(texts), dim) 的向量数组
+        """
+        # 本身已经是大批量（如批量入库），或调度线程不可用，直接在调用方线程编码
+        if len(texts) >= self.max_batch_size or threading.current_thread() is self._thread:
+            return np.asarray(self._encode_fn(texts))
+
+        future: Future = Future()
+        with self._submit_lock:
+            queued = self.is_running()
+            if queued:
+                self._queue.put((texts, future))
+        if not queued:
+            return np.asarray(self._encode_fn(texts))
+        return future.result(timeout=timeout)
+
+    def _run(self):
+        """调度线程主循环"""
+        while self._running:
+            try:
+                first = self._queue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+
+            batch = [first]
+            count = len(first[0])
+            deadline = time.perf_counter() + self.max_wait
+
+            # 在等待窗口内继续收集请求，直到凑满一个批次
+            while count < self.max_batch_size:
+                remaining = deadline - time.perf_counter()
+                try:
+                    item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                batch.append(item)
+                count += len(item[0])
+
+            if self._executor is not None:
+                self._executor.submit(self._dispatch, batch)
+            else:
+                self._dispatch(batch)
+
+    def _dispatch(self, batch: List[Tuple[List[str], Future]]):
+        """执行一次合并后的encode，并把结果分发给各调用方"""
+        texts = [text for item_texts, _ in batch for text in item_texts]
+        try:
+            vectors = np.asarray(self._encode_fn(texts))
+        except Exception as e:
+            logger.error(f"批量编码失败: batch_size={len(texts)}, 错误: {e}")
+            with self._stats_lock:
+                self._stats['errors'] += 1
+            for _, future in batch:
+                future.set_exception(e)
+            return
+
+        offset = 0
+        for item_texts, future in batch:
+            future.set_result(vectors[offset:offset + len(item_texts)])
+            offset += len(item_texts)
+
+        with self._stats_lock:
+            self._stats['requests'] += len(batch)
+            self._stats['texts'] += len(texts)
+            self._stats['batches'] += 1
+            self._stats['max_observed_batch'] = max(self._stats['max_observed_batch'], len(texts))
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取调度统计信息"""
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats['avg_batch_size'] = stats['texts'] / stats['batches'] if stats['batches'] else 0
+        stats['max_batch_size'] = self.max_batch_size
+        stats['max_wait_ms'] = self.max_wait * 1000
+        stats['dispatch_threads'] = self.dispatch_threads
+        stats['queue_size'] = self._queue.qsize()
+        return stats
@@ -0,0 +1,265 @@
+"""
+Embedding缓存模块
+以“模型名 + 文本哈希”为键的两级缓存：内存LRU（按字节预算淘汰）+ SQLite持久化存储（按条数上限淘汰）
+"""
+
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# 磁盘命中的访问时间先记在内存里，攒够条数或超过间隔（秒）后再批量写回，读路径不再逐次提交
+TOUCH_FLUSH_BATCH = 1000
+TOUCH_FLUSH_INTERVAL = 30.0
+
+
+class EmbeddingCache:
+    """两级embedding缓存"""
+
+    def __init__(self, db_path: Optional[str] = None, memory_budget_bytes: int = 64 * 1024 * 1024,
+                 max_disk_entries: int = 500000):
+        """
+        Args:
+            db_path: SQLite文件路径，为空时只使用内存层
+            memory_budget_bytes: 内存层的字节预算
+            max_disk_entries: 磁盘层最多保存的条数，超出时淘汰最久未使用的条目（0表示不限制）
+        """
+        self.db_path = db_path
+        self.memory_budget_bytes = max(0, int(memory_budget_bytes))
+        self.max_disk_entries = max(0, int(max_disk_entries))
+        self._memory: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._memory_bytes = 0
+        self._lock = threading.Lock()
+        self._conn = None
+        # 磁盘层条数（打开时统计一次，写入和淘汰时增减）及待写回的访问时间
+        self._disk_entries = 0
+        self._pending_touches: Dict[str, float] = {}
+        self._last_touch_flush = time.monotonic()
+        self._stats = {
+            'memory_hits': 0,
+            'disk_hits': 0,
+            'misses': 0,
+            'writes': 0,
+            'evictions': 0,
+            'disk_evictions': 0
+        }
+        if db_path:
+            self._initialize_disk_store()
+
+    def _initialize_disk_store(self):
+        """初始化磁盘存储（SQLite，向量以float32二进制保存）"""
+        try:
+            db_dir = os.path.dirname(self.db_path)
+            if db_dir:
+                os.makedirs(db_dir, exist_ok=True)
+            self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('PRAGMA synchronous=NORMAL')
+            self._conn.execute('''CREATE TABLE IF NOT EXISTS embedding_cache
+                                  (key TEXT PRIMARY KEY,
+                                   model TEXT NOT NULL,
+                                   dim INTEGER NOT NULL,
+                                   vector BLOB NOT NULL,
+                                   created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                                   accessed_at REAL)''')
+            # 旧版本建的表没有访问时间列，补上后按写入顺序视为最久未使用
+            columns = {row[1] for row in self._conn.execute('PRAGMA table_info(embedding_cache)')}
+            if 'accessed_at' not in columns:
+                self._conn.execute('ALTER TABLE embedding_cache ADD COLUMN accessed_at REAL')
+            self._conn.execute('CREATE INDEX IF NOT EXISTS idx_embedding_cache_accessed ON embedding_cache (accessed_at)')
+            self._conn.commit()
+            self._disk_entries = self._conn.execute('SELECT COUNT(*) FROM embedding_cache').fetchone()[0]
+            logger.info(f"Embedding磁盘缓存已打开: {self.db_path}")
+        except Exception as e:
+            logger.warning(f"Embedding磁盘缓存初始化失败，仅使用内存缓存: {e}")
+            self._conn = None
+
+    @staticmethod
+    def make_key(model_name: str, text: str) -> str:
+        """构建缓存键：模型名 + 文本内容哈希"""
+        digest = hashlib.sha256(text.encode('utf-8')).hexdigest()
+        return f"{model_name}:{digest}"
+
+    def get_many(self, model_name: str, texts: Sequence[str]) -> List[Optional[np.ndarray]]:
+        """
+        批量查询缓存
+
+        Args:
+            model_name: 模型标识
+            texts: 文本列表
+
+        Returns:
+            与texts一一对应的向量列表，未命中的位置为None；命中的向量与缓存共享且只读
+        """
+        keys = [self.make_key(model_name, text) for text in texts]
+        results: List[Optional[np.ndarray]] = [None] * len(keys)
+        disk_lookup = {}
+
+        with self._lock:
+            for i, key in enumerate(keys):
+                vector = self._memory.get(key)
+                if vector is not None:
+                    self._memory.move_to_end(key)
+                    results[i] = vector
+                    self._stats['memory_hits'] += 1
+                else:
+                    disk_lookup.setdefault(key, []).append(i)
+
+            if disk_lookup and self._conn is not None:
+                for key, vector in self._read_disk(list(disk_lookup.keys())).items():
+                    for i in disk_lookup.pop(key):
+                        results[i] = vector
+                        self._stats['disk_hits'] += 1
+                    self._remember(key, vector)
+
+            self._stats['misses'] += sum(len(positions) for positions in disk_lookup.values())
+
+        return results
+
+    def put_many(self, model_name: str, texts: Sequence[str], vectors: Any):
+        """
+        批量写入缓存
+
+        Args:
+            model_name: 模型标识
+            texts: 文本列表
+            vectors: 与texts对应的向量矩阵
+        """
+        vectors = np.asarray(vectors, dtype=np.float32)
+        rows = []
+        with self._lock:
+            for text, vector in zip(texts, vectors):
+                key = self.make_key(model_name, text)
+                vector = np.array(vector, dtype=np.float32)
+                self._remember(key, vector)
+                rows.append((key, model_name, int(vector.shape[0]), vector.tobytes(), time.time()))
+            self._stats['writes'] += len(rows)
+
+            if rows and self._conn is not None:
+                try:
+                    # 攒下的访问时间随本次写入一起提交
+                    self._flush_touches(commit=False)
+                    inserted = self._conn.executemany(
+                        'INSERT OR IGNORE INTO embedding_cache (key, model, dim, vector, accessed_at) '
+                        'VALUES (?, ?, ?, ?, ?)',
+                        rows
+                    ).rowcount
+                    if inserted < len(rows):
+                        # 少数已存在的键（其他进程刚写入）覆盖为本次的向量
+                        self._conn.executemany(
+                            'UPDATE embedding_cache SET model = ?, dim = ?, vector = ?, accessed_at = ? WHERE key = ?',
+                            [(model, dim, blob, accessed_at, key) for key, model, dim, blob, accessed_at in rows]
+                        )
+                    self._disk_entries += inserted
+                    self._prune_disk()
+                    self._conn.commit()
+                except Exception as e:
+                    logger.warning(f"写入Embedding磁盘缓存失败: {e}")
+
+    def _read_disk(self, keys: List[str]) -> Dict[str, np.ndarray]:
+        """从磁盘读取一批键（调用方需持有锁）"""
+        found = {}
+        try:
+            # SQLite单条语句的参数数量有限，分块查询
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                placeholders = ','.join('?' * len(chunk))
+                rows = self._conn.execute(
+                    f'SELECT key, vector FROM embedding_cache WHERE key IN ({placeholders})', chunk
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype=np.float32).copy()
+            if found:
+                # 记录访问时间（延迟批量写回），磁盘层按最久未使用淘汰
+                now = time.time()
+                self._pending_touches.update(dict.fromkeys(found, now))
+                if (len(self._pending_touches) >= TOUCH_FLUSH_BATCH
+                        or time.monotonic() - self._last_touch_flush >= TOUCH_FLUSH_INTERVAL):
+                    self._flush_touches()
+        except Exception as e:
+            logger.warning(f"读取Embedding磁盘缓存失败: {e}")
+        return found
+
+    def _flush_touches(self, commit: bool = True):
+        """把攒下的访问时间写回磁盘层（调用方需持有锁）"""
+        self._last_touch_flush = time.monotonic()
+        if not self._pending_touches:
+            return
+        touches = [(accessed_at, key) for key, accessed_at in self._pending_touches.items()]
+        self._pending_touches.clear()
+        self._conn.executemany('UPDATE embedding_cache SET accessed_at = ? WHERE key = ?', touches)
+        if commit:
+            self._conn.commit()
+
+    def _prune_disk(self):
+        """磁盘层超出条数上限时淘汰最久未使用的条目，一次降到上限的90%（调用方需持有锁）"""
+        if not self.max_disk_entries or self._disk_entries <= self.max_disk_entries:
+            return
+        # 只在需要淘汰时精确计数一次，校正其他进程写入带来的偏差
+        self._disk_entries = self._conn.execute('SELECT COUNT(*) FROM embedding_cache').fetchone()[0]
+        if self._disk_entries <= self.max_disk_entries:
+            return
+        excess = self._disk_entries - int(self.max_disk_entries * 0.9)
+        deleted = self._conn.execute(
+            'DELETE FROM embedding_cache WHERE key IN '
+            '(SELECT key FROM embedding_cache ORDER BY accessed_at IS NOT NULL, accessed_at LIMIT ?)',
+            (excess,)
+        ).rowcount
+        self._disk_entries -= deleted
+        self._stats['disk_evictions'] += deleted
+        logger.info(f"Embedding磁盘缓存超出上限{self.max_disk_entries}条，淘汰{deleted}条")
+
+    def _remember(self, key: str, vector: np.ndarray):
+        """写入内存LRU并按字节预算淘汰（调用方需持有锁）"""
+        if self.memory_budget_bytes <= 0:
+            return
+        # 命中时直接返回同一个数组，设为只读以免调用方原地修改污染缓存
+        vector.flags.writeable = False
+        old = self._memory.pop(key, None)
+        if old is not None:
+            self._memory_bytes -= old.nbytes
+        self._memory[key] = vector
+        self._memory_bytes += vector.nbytes
+        while self._memory_bytes > self.memory_budget_bytes and self._memory:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= evicted.nbytes
+            self._stats['evictions'] += 1
+
+    def clear_memory(self):
+        """清空内存层（磁盘层保留）"""
+        with self._lock:
+            self._memory.clear()
+            self._memory_bytes = 0
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取缓存命中统计"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['memory_entries'] = len(self._memory)
+            stats['memory_bytes'] = self._memory_bytes
+            stats['memory_budget_bytes'] = self.memory_budget_bytes
+            stats['max_disk_entries'] = self.max_disk_entries
+            stats['disk_entries'] = self._disk_entries if self._conn is not None else None
+            stats['pending_touches'] = len(self._pending_touches)
+        lookups = stats['memory_hits'] + stats['disk_hits'] + stats['misses']
+        stats['hit_rate'] = (stats['memory_hits'] + stats['disk_hits']) / lookups if lookups else 0
+        return stats
+
+    def close(self):
+        """关闭磁盘存储"""
+        with self._lock:
+            if self._conn is not None:
+                try:
+                    self._flush_touches()
+                except Exception as e:
+                    logger.warning(f"写回Embedding磁盘缓存访问时间失败: {e}")
+                self._conn.close()
+                self._conn = None
@@ -0,0 +1,324 @@
+"""
+Embedding进程池模块
+多个子进程各自持有一份embedding模型，请求通过队列下发，
+结果通过multiprocessing.shared_memory回传，避免向量矩阵的pickle开销；
+完成通知经每个子进程独立的管道回传，子进程崩溃不会卡住其他子进程的通知
+"""
+
+import itertools
+import logging
+import math
+import multiprocessing as mp
+import threading
+import time
+from concurrent.futures import Future
+from multiprocessing import connection, shared_memory
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# 每个子任务的最小文本数，太小的切分只会增加IPC开销
+MIN_TEXTS_PER_JOB = 16
+
+# 收集线程检查子进程存活的最长间隔（秒）；子进程退出时会被立即唤醒
+LIVENESS_INTERVAL = 1.0
+
+
+def _load_worker_model(model_spec: Dict[str, Any]):
+    """在子进程中加载embedding模型"""
+    backend = model_spec.get('backend', 'torch')
+    threads = int(model_spec.get('threads', 1))
+
+    # 自定义模型工厂（'模块路径:函数名'），便于测试或接入其他模型
+    if model_spec.get('factory'):
+        import importlib
+        module_name, func_name = model_spec['factory'].split(':')
+        return getattr(importlib.import_module(module_name), func_name)()
+
+    if backend in ('onnx', 'onnx-int8'):
+        from .onnx_embedding import OnnxEmbeddingModel
+        return OnnxEmbeddingModel.from_pretrained(
+            model_spec['onnx_path'],
+            quantized=backend == 'onnx-int8',
+            source_model=model_spec.get('model_path'),
+            num_threads=threads
+        )
+
+    import torch
+    from sentence_transformers import SentenceTransformer
+    # 每个进程限制计算线程数，避免N个进程互相抢占CPU
+    torch.set_num_threads(max(1, threads))
+    try:
+        return SentenceTransformer(model_spec['model_path'], device='cpu')
+    except Exception:
+        return SentenceTransformer(model_spec['model_name'], device='cpu')
+
+
+def _worker_main(worker_id: int, model_spec: Dict[str, Any], request_queue, result_conn, current_jobs):
+    """
+    子进程入口：加载模型后循环处理编码请求
+
+    结果通过本进程独占的管道同步发送（不经过multiprocessing.Queue的后台线程和共享写锁），
+    进程在任意时刻崩溃都不会留下其他子进程需要等待的锁
+    """
+    try:
+        model = _load_worker_model(model_spec)
+        dim = int(np.asarray(model.encode(['warmup'])).shape[1])
+    except Exception as e:
+        result_conn.send(('failed', worker_id, None, str(e)))
+        return
+    result_conn.send(('ready', worker_id, dim, None))
+
+    while True:
+        job = request_queue.get()
+        if job is None:
+            break
+        job_id, texts, shm_name, row_offset = job
+        # 同步记下本进程正在处理的任务，子进程崩溃时父进程据此让该任务立即失败
+        current_jobs[worker_id] = job_id
+        try:
+            vectors = np.asarray(model.encode(texts), dtype=np.float32)
+            shm = shared_memory.SharedMemory(name=shm_name)
+            try:
+                # 共享内存由父进程创建和释放，子进程只负责写入
+                target = np.ndarray((row_offset + len(texts), dim), dtype=np.float32, buffer=shm.buf)
+                target[row_offset:row_offset + len(texts)] = vectors
+                del target
+            finally:
+                shm.close()
+            result_conn.send(('done', job_id, len(texts), None))
+        except Exception as e:
+            result_conn.send(('error', job_id, None, str(e)))
+        current_jobs[worker_id] = -1
+
+
+class EmbeddingWorkerPool:
+    """Embedding子进程池，接口与SentenceTransformer.encode兼容"""
+
+    def __init__(self, num_workers: int, model_spec: Dict[str, Any],
+                 start_timeout: float = 300.0, job_timeout: float = 60.0):
+        self.num_workers = max(1, int(num_workers))
+        self.model_spec = dict(model_spec)
+        self.start_timeout = start_timeout
+        self.job_timeout = job_timeout
+        self.dim = None
+        self._ctx = mp.get_context('spawn')
+        self._request_queue = self._ctx.Queue()
+        self._processes: Dict[int, Any] = {}
+        # 每个子进程一条结果管道（父进程持有读端）
+        self._result_conns: Dict[int, Any] = {}
+        self._pending: Dict[int, Future] = {}
+        self._pending_lock = threading.Lock()
+        self._job_ids = itertools.count()
+        self._collector = None
+        self._running = False
+        self._ready_workers = set()
+        # 每个子进程正在处理的任务ID（-1表示空闲），由子进程写入共享内存
+        self._current_jobs = self._ctx.Array('q', [-1] * self.num_workers, lock=False)
+        self._ready_event = threading.Event()
+        self._stats_lock = threading.Lock()
+        self._stats = {'requests': 0, 'jobs': 0, 'texts': 0, 'errors': 0, 'restarts': 0}
+
+    def start(self) -> bool:
+        """
+        启动子进程并等待模型加载
+
+        Returns:
+            是否至少有一个子进程就绪
+        """
+        self._running = True
+        for worker_id in range(self.num_workers):
+            self._spawn_worker(worker_id)
+        self._collector = threading.Thread(target=self._collect_results, name='embedding-pool-collector',
+                                           daemon=True)
+        self._collector.start()
+
+        deadline = time.monotonic() + self.start_timeout
+        while time.monotonic() < deadline and len(self._ready_workers) < self.num_workers:
+            if not any(p.is_alive() for p in self._processes.values()):
+                break
+            self._ready_event.wait(0.5)
+            self._ready_event.clear()
+
+        if not self._ready_workers:
+            logger.error("Embedding进程池启动失败：没有子进程完成模型加载")
+            self.stop()
+            return False
+        logger.info(f"Embedding进程池已启动: 就绪进程={len(self._ready_workers)}/{self.num_workers}, dim={self.dim}")
+        return True
+
+    def _spawn_worker(self, worker_id: int):
+        """启动（或重启）一个子进程"""
+        reader, writer = self._ctx.Pipe(duplex=False)
+        process = self._ctx.Process(
+            target=_worker_main,
+            args=(worker_id, self.model_spec, self._request_queue, writer, self._current_jobs),
+            name=f'embedding-worker-{worker_id}',
+            daemon=True
+        )
+        process.start()
+        # 父进程关闭写端，子进程退出后读端收到EOF
+        writer.close()
+        old_reader = self._result_conns.get(worker_id)
+        if old_reader is not None:
+            old_reader.close()
+        self._processes[worker_id] = process
+        self._result_conns[worker_id] = reader
+
+    def encode(self, texts: List[str], timeout: Optional[float] = None) -> np.ndarray:
+        """
+        把文本分发给子进程编码，大批量会切分到多个子进程并行计算
+
+        Args:
+            texts: 文本列表
+            timeout: 等待超时（秒），默认取job_timeout
+
+        Returns:
+            形状为 (len(texts), dim) 的float32向量
+        """
+        if isinstance(texts, str):
+            texts = [texts]
+        texts = list(texts)
+        if not self._running or self.dim is None:
+            raise RuntimeError("Embedding进程池未启动")
+        if not texts:
+            return np.zeros((0, self.dim), dtype=np.float32)
+
+        n = len(texts)
+        shm = shared_memory.SharedMemory(create=True, size=n * self.dim * 4)
+        futures = []
+        try:
+            chunk = max(MIN_TEXTS_PER_JOB, math.ceil(n / self.num_workers))
+            for offset in range(0, n, chunk):
+                job_id = next(self._job_ids)
+                future: Future = Future()
+                with self._pending_lock:
+                    self._pending[job_id] = future
+                futures.append((job_id, future))
+                self._request_queue.put((job_id, texts[offset:offset + chunk], shm.name, offset))
+
+            # 所有子任务共用一个截止时间，最坏等待时间与切分数量无关
+            deadline = time.monotonic() + (timeout or self.job_timeout)
+            for _, future in futures:
+                future.result(timeout=max(0.0, deadline - time.monotonic()))
+
+            result = np.ndarray((n, self.dim), dtype=np.float32, buffer=shm.buf).copy()
+            with self._stats_lock:
+                self._stats['requests'] += 1
+                self._stats['jobs'] += len(futures)
+                self._stats['texts'] += n
+            return result
+        except Exception:
+            with self._stats_lock:
+                self._stats['errors'] += 1
+            raise
+        finally:
+            with self._pending_lock:
+                for job_id, _ in futures:
+                    self._pending.pop(job_id, None)
+            shm.close()
+            shm.unlink()
+
+    def _collect_results(self):
+        """
+        收集子进程结果，并在子进程意外退出时重启
+
+        同时等待各结果管道和已就绪子进程的sentinel：子进程退出会立即唤醒本线程，
+        每轮循环都检查存活状态，其他子进程持续返回结果时崩溃也能及时发现
+        """
+        while self._running:
+            conns = {conn: worker_id for worker_id, conn in list(self._result_conns.items())}
+            sentinels = [process.sentinel for worker_id, process in list(self._processes.items())
+                         if worker_id in self._ready_workers]
+            try:
+                ready = connection.wait(list(conns) + sentinels, timeout=LIVENESS_INTERVAL)
+            except OSError:
+                # 重启时旧管道被关闭，重新构建等待列表
+                continue
+            for handle in ready:
+                if handle in conns:
+                    self._drain(conns[handle], handle)
+            self._restart_dead_workers()
+
+    def _drain(self, worker_id: int, conn):
+        """读取一条管道中已到达的全部消息；子进程退出（EOF）后不再等待该管道"""
+        try:
+            while conn.poll():
+                self._handle_message(*conn.recv())
+        except (EOFError, OSError):
+            if self._result_conns.get(worker_id) is conn:
+                del self._result_conns[worker_id]
+
+    def _handle_message(self, kind: str, key: int, payload: Any, error: Optional[str]):
+        if kind == 'ready':
+            self.dim = payload
+            with self._stats_lock:
+                self._ready_workers.add(key)
+            self._ready_event.set()
+        elif kind == 'failed':
+            logger.error(f"Embedding子进程{key}模型加载失败: {error}")
+            self._ready_event.set()
+        else:
+            with self._pending_lock:
+                future = self._pending.get(key)
+            if future is None or future.done():
+                return
+            if kind == 'done':
+                future.set_result(payload)
+            else:
+                future.set_exception(RuntimeError(f"子进程编码失败: {error}"))
+
+    def _restart_dead_workers(self):
+        """重启已就绪但意外退出的子进程，并让它正在处理的任务立即失败"""
+        for worker_id, process in list(self._processes.items()):
+            if self._running and worker_id in self._ready_workers and not process.is_alive():
+                logger.warning(f"Embedding子进程{worker_id}已退出(exitcode={process.exitcode})，正在重启")
+                # 先处理退出前已经发出的结果，再判断哪个任务没有完成
+                conn = self._result_conns.get(worker_id)
+                if conn is not None:
+                    self._drain(worker_id, conn)
+                with self._stats_lock:
+                    self._ready_workers.discard(worker_id)
+                    self._stats['restarts'] += 1
+                job_id = self._current_jobs[worker_id]
+                self._current_jobs[worker_id] = -1
+                if job_id >= 0:
+                    with self._pending_lock:
+                        future = self._pending.get(job_id)
+                    if future is not None and not future.done():
+                        future.set_exception(RuntimeError(f"Embedding子进程{worker_id}在编码时退出"))
+                self._spawn_worker(worker_id)
+
+    def stop(self, timeout: float = 5.0):
+        """停止所有子进程"""
+        self._running = False
+        for _ in self._processes:
+            self._request_queue.put(None)
+        for process in self._processes.values():
+            process.join(timeout=timeout)
+            if process.is_alive():
+                process.terminate()
+        self._processes.clear()
+        if self._collector is not None and self._collector is not threading.current_thread():
+            self._collector.join(timeout=LIVENESS_INTERVAL * 2)
+        for conn in self._result_conns.values():
+            conn.close()
+        self._result_conns.clear()
+        with self._pending_lock:
+            for future in self._pending.values():
+                if not future.done():
+                    future.set_exception(RuntimeError("Embedding进程池已停止"))
+            self._pending.clear()
+        logger.info("Embedding进程池已停止")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取进程池统计信息"""
+        with self._stats_lock:
+            stats = dict(self._stats)
+            stats['ready_workers'] = len(self._ready_workers)
+        stats['workers'] = self.num_workers
+        stats['alive_workers'] = sum(1 for p in self._processes.values() if p.is_alive())
+        stats['dim'] = self.dim
+        return stats
@@ -0,0 +1,193 @@
+"""
+哈希向量化embedding模块
+字符n-gram特征哈希 + 次线性TF（可选IDF加权），全部用NumPy向量化计算；
+结果确定、无需模型文件，作为transformer不可用时的兜底引擎，也可用于压测和低资源部署
+"""
+
+import logging
+import os
+from typing import Iterable, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# 64位哈希常量（splitmix64）
+_HASH_BASE = np.uint64(0x100000001B3)
+_MIX_1 = np.uint64(0xBF58476D1CE4E5B9)
+_MIX_2 = np.uint64(0x94D049BB133111EB)
+_NGRAM_SALT = np.uint64(0x9E3779B97F4A7C15)
+
+
+def _mix(values: np.ndarray) -> np.ndarray:
+    """splitmix64终结函数，打散rolling hash的低位相关性"""
+    values = values ^ (values >> np.uint64(30))
+    values = values * _MIX_1
+    values = values ^ (values >> np.uint64(27))
+    values = values * _MIX_2
+    return values ^ (values >> np.uint64(31))
+
+
+class HashingEmbeddingModel:
+    """字符n-gram哈希向量化模型，接口与SentenceTransformer.encode兼容"""
+
+    def __init__(self, dim: int = 384, ngram_range=(1, 3), idf: Optional[np.ndarray] = None):
+        self.dim = int(dim)
+        self.ngram_range = (int(ngram_range[0]), int(ngram_range[1]))
+        self.idf = None
+        if idf is not None:
+            self.set_idf(idf)
+
+    @classmethod
+    def load(cls, dim: int = 384, idf_path: Optional[str] = None) -> 'HashingEmbeddingModel':
+        """创建模型，IDF文件存在且维度一致时加载IDF权重"""
+        model = cls(dim=dim)
+        if idf_path and os.path.exists(idf_path):
+            with np.load(idf_path) as data:
+                idf = data['idf']
+                ngram_range = tuple(int(n) for n in data['ngram_range'])
+            if len(idf) == dim:
+                model.ngram_range = ngram_range
+                model.set_idf(idf)
+                logger.info(f"哈希向量化IDF加载成功: {idf_path}")
+            else:
+                logger.warning(f"哈希向量化IDF维度不匹配({len(idf)} != {dim})，不使用IDF")
+        return model
+
+    def set_idf(self, idf: np.ndarray):
+        idf = np.asarray(idf, dtype=np.float32)
+        if idf.shape != (self.dim,):
+            raise ValueError(f"IDF维度应为{self.dim}，实际为{idf.shape}")
+        self.idf = idf
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.dim
+
+    def _hash_features(self, texts: List[str]):
+        """
+        计算全部文本的n-gram哈希
+
+        Returns:
+            (行号数组, 桶下标数组, 符号数组)
+        """
+        rows, hashes = [], []
+        for row, text in enumerate(texts):
+            # 首尾补空格，让词边界也参与n-gram
+            normalized = f" {' '.join(str(text).lower().split())} "
+            codes = np.frombuffer(normalized.encode('utf-32-le'), dtype=np.uint32).astype(np.uint64)
+            for n in range(self.ngram_range[0], self.ngram_range[1] + 1):
+                count = len(codes) - n + 1
+                if count <= 0:
+                    continue
+                # rolling hash：h = ((c0 * B + c1) * B + c2) ...，按n-gram长度加盐
+                h = np.full(count, _NGRAM_SALT, dtype=np.uint64) * np.uint64(n)
+                for offset in range(n):
+                    h = h * _HASH_BASE + codes[offset:offset + count]
+                hashes.append(h)
+                rows.append(np.full(count, row, dtype=np.int64))
+        if not hashes:
+            empty = np.zeros(0, dtype=np.int64)
+            return empty, empty, np.zeros(0, dtype=np.float32)
+        mixed = _mix(np.concatenate(hashes))
+        buckets = (mixed % np.uint64(self.dim)).astype(np.int64)
+        # 最高位决定符号，碰撞的特征期望上相互抵消
+        signs = np.where((mixed >> np.uint64(63)) == 1, -1.0, 1.0).astype(np.float32)
+        return np.concatenate(rows), buckets, signs
+
+    def _term_frequencies(self, texts: List[str]) -> np.ndarray:
+        """计算带符号的哈希词频矩阵"""
+        rows, buckets, signs = self._hash_features(texts)
+        flat = np.bincount(rows * self.dim + buckets, weights=signs, minlength=len(texts) * self.dim)
+        return flat.reshape(len(texts), self.dim).astype(np.float32)
+
+    def encode(self, texts, batch_size: int = 256, normalize_embeddings: bool = True, **kwargs) -> np.ndarray:
+        """
+        将文本编码为向量
+
+        Args:
+            texts: 文本或文本列表
+            batch_size: 每批处理的文本数（控制中间数组大小）
+            normalize_embeddings: 是否做L2归一化
+
+        Returns:
+            形状为 (len(texts), dim) 的float32向量
+        """
+        if isinstance(texts, str):
+            texts = [texts]
+        texts = list(texts)
+        if not texts:
+            return np.zeros((0, self.dim), dtype=np.float32)
+
+        outputs = []
+        for start in range(0, len(texts), max(1, batch_size)):
+            tf = self._term_frequencies(texts[start:start + batch_size])
+            # 次线性TF：sign(x) * log(1 + |x|)
+            vectors = np.sign(tf) * np.log1p(np.abs(tf))
+            if self.idf is not None:
+                vectors *= self.idf
+            if normalize_embeddings:
+                norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+                vectors /= np.clip(norms, 1e-12, None)
+            outputs.append(vectors)
+        return np.vstack(outputs).astype(np.float32)
+
+    def fit(self, texts: Iterable[str], batch_size: int = 256) -> 'HashingEmbeddingModel':
+        """
+        在语料上统计各哈希桶的文档频率并计算IDF
+
+        Args:
+            texts: 语料文本
+            batch_size: 每批处理的文本数
+        """
+        texts = list(texts)
+        df = np.zeros(self.dim, dtype=np.float64)
+        for start in range(0, len(texts), max(1, batch_size)):
+            tf = self._term_frequencies(texts[start:start + batch_size])
+            df += (tf != 0).sum(axis=0)
+        self.set_idf(np.log((1 + len(texts)) / (1 + df)) + 1.0)
+        return self
+
+    def save_idf(self, path: str):
+        """保存IDF权重"""
+        if self.idf is None:
+            raise ValueError("尚未计算IDF")
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        np.savez(path, idf=self.idf, ngram_range=np.asarray(self.ngram_range))
+        logger.info(f"哈希向量化IDF已保存: {path}")
+
+
+def main():
+    """命令行入口：从ChromaDB中的文档统计IDF"""
+    import argparse
+
+    import chromadb
+
+    from modular_api.utils.config import Config
+
+    parser = argparse.ArgumentParser(description='哈希向量化IDF统计工具')
+    parser.add_argument('--chroma-path', default=Config.CHROMA_PATH, help='ChromaDB路径')
+    parser.add_argument('--collection', default='travel_guides', help='集合名称')
+    parser.add_argument('--dim', type=int, default=Config.EMBEDDING_HASHING_DIM, help='向量维度')
+    parser.add_argument('--output', default=Config.EMBEDDING_HASHING_IDF_PATH, help='IDF输出路径')
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+
+    collection = chromadb.PersistentClient(path=args.chroma_path).get_collection(name=args.collection)
+    documents = []
+    total = collection.count()
+    for offset in range(0, total, 1000):
+        documents.extend(collection.get(offset=offset, limit=1000, include=['documents'])['documents'])
+
+    model = HashingEmbeddingModel(dim=args.dim).fit(documents)
+    model.save_idf(args.output)
+    print(f"IDF统计完成: {len(documents)} 篇文档, dim={args.dim}, 输出 {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,448 @@
+"""
+后台任务模块
+耗时的检索+生成流程（攻略生成、自驾游规划）可以作为异步任务提交：
+提交接口立即返回任务ID，任务在有界线程池中执行，客户端轮询或长轮询任务状态接口获取结果。
+任务状态和结果保存在SQLite中并按TTL过期，同一主机上的多个worker进程都能查询；
+执行任务的进程定期为排队和执行中的任务写心跳，其他进程只把心跳中断的任务判定为失败
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional
+
+from modular_api.utils.config import Config
+from modular_api.utils.monitoring import percentile
+
+logger = logging.getLogger(__name__)
+
+# 任务状态
+JOB_QUEUED = 'queued'
+JOB_RUNNING = 'running'
+JOB_SUCCEEDED = 'succeeded'
+JOB_FAILED = 'failed'
+TERMINAL_STATES = (JOB_SUCCEEDED, JOB_FAILED)
+TERMINAL_PLACEHOLDERS = ', '.join('?' * len(TERMINAL_STATES))
+
+
+class JobQueueFullError(RuntimeError):
+    """等待执行的任务已达上限"""
+    pass
+
+
+def wants_async() -> bool:
+    """客户端是否请求异步执行（请求头 Prefer: respond-async 或查询参数 async=1/true）"""
+    from flask import request
+
+    prefer = request.headers.get('Prefer', '')
+    if any(token.strip().lower() == 'respond-async' for token in prefer.split(',')):
+        return True
+    return request.args.get('async', '').lower() in ('1', 'true', 'yes')
+
+
+def _isoformat(timestamp: Optional[float]) -> Optional[str]:
+    return datetime.utcfromtimestamp(timestamp).isoformat() + 'Z' if timestamp else None
+
+
+class JobStore:
+    """任务状态的SQLite存储（WAL模式，多个进程共享）"""
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('''CREATE TABLE IF NOT EXISTS jobs
+                              (id TEXT PRIMARY KEY,
+                               kind TEXT NOT NULL,
+                               state TEXT NOT NULL,
+                               user_id TEXT,
+                               result TEXT,
+                               error TEXT,
+                               created_at REAL NOT NULL,
+                               updated_at REAL NOT NULL,
+                               expires_at REAL NOT NULL,
+                               heartbeat_at REAL)''')
+        # 旧版本建的表没有心跳列，补上后按updated_at判断
+        columns = {row[1] for row in self._conn.execute('PRAGMA table_info(jobs)')}
+        if 'heartbeat_at' not in columns:
+            self._conn.execute('ALTER TABLE jobs ADD COLUMN heartbeat_at REAL')
+        self._conn.execute('CREATE INDEX IF NOT EXISTS idx_jobs_expires_at ON jobs (expires_at)')
+        self._conn.commit()
+
+    def create(self, job_id: str, kind: str, user_id: Optional[str], ttl_seconds: float):
+        now = time.time()
+        with self._lock:
+            self._conn.execute('''INSERT INTO jobs (id, kind, state, user_id, created_at, updated_at, expires_at,
+                                                    heartbeat_at)
+                                  VALUES (?, ?, ?, ?, ?, ?, ?, ?)''',
+                               (job_id, kind, JOB_QUEUED, user_id, now, now, now + ttl_seconds, now))
+            self._conn.commit()
+
+    def update(self, job_id: str, state: str, ttl_seconds: float, result: Any = None,
+               error: Optional[str] = None) -> bool:
+        """
+        更新任务状态；结束状态的任务从完成时刻起重新计算TTL
+
+        Returns:
+            是否更新成功；任务已处于结束状态（如已被判定为中断）时不再修改，返回False
+        """
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                f'''UPDATE jobs SET state = ?, result = ?, error = ?, updated_at = ?, expires_at = ?, heartbeat_at = ?
+                    WHERE id = ? AND state NOT IN ({TERMINAL_PLACEHOLDERS})''',
+                (state, json.dumps(result, ensure_ascii=False) if result is not None else None,
+                 error, now, now + ttl_seconds, now, job_id) + TERMINAL_STATES)
+            self._conn.commit()
+        return cursor.rowcount > 0
+
+    def heartbeat(self, job_ids) -> int:
+        """为本进程排队和执行中的任务写心跳"""
+        job_ids = list(job_ids)
+        if not job_ids:
+            return 0
+        with self._lock:
+            cursor = self._conn.execute(
+                f'''UPDATE jobs SET heartbeat_at = ?
+                    WHERE id IN ({','.join('?' * len(job_ids))}) AND state NOT IN ({TERMINAL_PLACEHOLDERS})''',
+                (time.time(), *job_ids) + TERMINAL_STATES)
+            self._conn.commit()
+        return cursor.rowcount
+
+    def fail_stale(self, job_id: str, stale_seconds: float, ttl_seconds: float, error: str) -> bool:
+        """心跳中断超过stale_seconds的未结束任务标记为失败（判断和更新在同一条语句中完成）"""
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                f'''UPDATE jobs SET state = ?, error = ?, updated_at = ?, expires_at = ?
+                    WHERE id = ? AND state NOT IN ({TERMINAL_PLACEHOLDERS})
+                      AND COALESCE(heartbeat_at, updated_at) < ?''',
+                (JOB_FAILED, error, now, now + ttl_seconds, job_id) + TERMINAL_STATES + (now - stale_seconds,))
+            self._conn.commit()
+        return cursor.rowcount > 0
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """读取未过期的任务"""
+        with self._lock:
+            row = self._conn.execute('''SELECT id, kind, state, user_id, result, error, created_at, updated_at, expires_at,
+                                               heartbeat_at
+                                        FROM jobs WHERE id = ? AND expires_at > ?''',
+                                     (job_id, time.time())).fetchone()
+        if row is None:
+            return None
+        keys = ('id', 'kind', 'state', 'user_id', 'result', 'error', 'created_at', 'updated_at', 'expires_at',
+                'heartbeat_at')
+        job = dict(zip(keys, row))
+        job['result'] = json.loads(job['result']) if job['result'] is not None else None
+        return job
+
+    def purge_expired(self) -> int:
+        with self._lock:
+            cursor = self._conn.execute('DELETE FROM jobs WHERE expires_at <= ?', (time.time(),))
+            self._conn.commit()
+        return cursor.rowcount
+
+    def count_by_state(self) -> Dict[str, int]:
+        with self._lock:
+            rows = self._conn.execute('SELECT state, COUNT(*) FROM jobs WHERE expires_at > ? GROUP BY state',
+                                      (time.time(),)).fetchall()
+        return dict(rows)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class JobManager:
+    """有界线程池执行后台任务，状态写入JobStore"""
+
+    def __init__(self, store: JobStore, max_workers: int = 4, max_pending: int = 32, ttl_seconds: float = 3600,
+                 stale_seconds: float = 600, poll_interval: float = 0.5, purge_interval: float = 60,
+                 heartbeat_interval: Optional[float] = None):
+        """
+        Args:
+            store: 任务状态存储
+            max_workers: 同时执行的任务数
+            max_pending: 排队等待执行的任务上限，超过时拒绝提交
+            ttl_seconds: 任务状态和结果的保留时间（秒，结束的任务从完成时刻起计算）
+            stale_seconds: 未结束的任务超过该时间没有心跳视为已中断（如执行它的进程已退出）
+            poll_interval: 长轮询其他进程的任务时查询存储的间隔（秒）
+            purge_interval: 清理过期任务的最小间隔（秒）
+            heartbeat_interval: 为本进程排队和执行中的任务写心跳的间隔（秒），默认取stale_seconds的三分之一且不超过30秒
+        """
+        self.store = store
+        self.max_workers = max(1, int(max_workers))
+        self.max_pending = max(0, int(max_pending))
+        self.ttl_seconds = float(ttl_seconds)
+        self.stale_seconds = float(stale_seconds)
+        self.poll_interval = float(poll_interval)
+        self.purge_interval = float(purge_interval)
+        self.heartbeat_interval = float(heartbeat_interval if heartbeat_interval is not None
+                                        else min(30.0, self.stale_seconds / 3))
+        self._heartbeat_thread = None
+        self._stopped = threading.Event()
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='job')
+        self._slots = threading.BoundedSemaphore(self.max_workers + self.max_pending)
+        self._events: Dict[str, threading.Event] = {}
+        self._lock = threading.Lock()
+        self._last_purge = 0.0
+        self._durations_ms = deque(maxlen=1000)
+        self._stats = {
+            'submitted': 0,
+            'rejected': 0,
+            'succeeded': 0,
+            'failed': 0,
+            'running': 0,
+            'purged': 0
+        }
+
+    def submit(self, kind: str, func: Callable[[], Dict[str, Any]], user_id: Optional[str] = None) -> Dict[str, Any]:
+        """
+        提交任务
+
+        Args:
+            kind: 任务类型（guide、roadtrip）
+            func: 无参函数，返回任务结果（与同步接口相同的响应体），抛出异常时任务失败
+            user_id: 提交任务的用户，只有该用户可以查询任务
+
+        Returns:
+            新建的任务
+
+        Raises:
+            JobQueueFullError: 排队的任务已达上限
+        """
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self._stats['rejected'] += 1
+            raise JobQueueFullError("任务队列已满，请稍后重试")
+
+        self._purge_if_due()
+        job_id = uuid.uuid4().hex
+        try:
+            self.store.create(job_id, kind, user_id, self.ttl_seconds)
+            with self._lock:
+                self._events[job_id] = threading.Event()
+                self._stats['submitted'] += 1
+            self._ensure_heartbeat()
+            self._executor.submit(self._run, job_id, kind, func)
+        except Exception:
+            self._slots.release()
+            with self._lock:
+                self._events.pop(job_id, None)
+            raise
+        logger.info(f"任务已提交: job_id={job_id}, kind={kind}")
+        return self.get(job_id)
+
+    def _run(self, job_id: str, kind: str, func: Callable[[], Dict[str, Any]]):
+        started = time.perf_counter()
+        outcome = JOB_FAILED
+        with self._lock:
+            self._stats['running'] += 1
+        try:
+            if not self.store.update(job_id, JOB_RUNNING, self.ttl_seconds):
+                logger.warning(f"任务在开始执行前已结束（被判定为中断），跳过执行: job_id={job_id}")
+            else:
+                result = func()
+                if self.store.update(job_id, JOB_SUCCEEDED, self.ttl_seconds, result=result):
+                    outcome = JOB_SUCCEEDED
+                else:
+                    logger.warning(f"任务已被判定为中断，丢弃执行结果: job_id={job_id}")
+        except Exception as e:
+            logger.error(f"任务执行失败: job_id={job_id}, kind={kind}, error={e}")
+            try:
+                self.store.update(job_id, JOB_FAILED, self.ttl_seconds, error=str(e) or type(e).__name__)
+            except Exception as store_error:
+                logger.error(f"任务状态写入失败: job_id={job_id}, error={store_error}")
+        finally:
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            with self._lock:
+                self._stats['running'] -= 1
+                self._stats[outcome] += 1
+                self._durations_ms.append(elapsed_ms)
+                event = self._events.pop(job_id, None)
+            self._slots.release()
+            if event is not None:
+                event.set()
+        logger.info(f"任务结束: job_id={job_id}, kind={kind}, state={outcome}, 耗时={elapsed_ms:.0f}ms")
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """
+        查询任务（已过期或不存在时返回None）
+
+        长时间没有心跳的未结束任务（执行它的进程已退出）标记为失败
+        """
+        job = self.store.get(job_id)
+        if job is None:
+            return None
+        if (job['state'] not in TERMINAL_STATES and job_id not in self._events
+                and self.store.fail_stale(job_id, self.stale_seconds, self.ttl_seconds,
+                                          "任务超时或服务已重启，请重新提交")):
+            job = self.store.get(job_id)
+        return job
+
+    def _ensure_heartbeat(self):
+        """首次提交任务时启动心跳线程"""
+        if self._heartbeat_thread is not None:
+            return
+        with self._lock:
+            if self._heartbeat_thread is None:
+                self._heartbeat_thread = threading.Thread(target=self._heartbeat_loop, name='job-heartbeat',
+                                                          daemon=True)
+                self._heartbeat_thread.start()
+
+    def _heartbeat_loop(self):
+        while not self._stopped.wait(self.heartbeat_interval):
+            with self._lock:
+                job_ids = list(self._events)
+            try:
+                self.store.heartbeat(job_ids)
+            except Exception as e:
+                logger.warning(f"任务心跳写入失败: {e}")
+
+    def wait(self, job_id: str, timeout: float) -> Optional[Dict[str, Any]]:
+        """
+        长轮询：等待任务结束或超时，返回当时的任务状态
+
+        Args:
+            job_id: 任务ID
+            timeout: 最长等待时间（秒）
+        """
+        deadline = time.monotonic() + max(0.0, timeout)
+        while True:
+            job = self.get(job_id)
+            remaining = deadline - time.monotonic()
+            if job is None or job['state'] in TERMINAL_STATES or remaining <= 0:
+                return job
+            event = self._events.get(job_id)
+            if event is not None:
+                event.wait(remaining)
+            else:
+                # 由其他进程执行的任务只能轮询存储
+                time.sleep(min(remaining, self.poll_interval))
+
+    def _purge_if_due(self):
+        now = time.monotonic()
+        if now - self._last_purge < self.purge_interval:
+            return
+        self._last_purge = now
+        try:
+            purged = self.store.purge_expired()
+        except Exception as e:
+            logger.warning(f"清理过期任务失败: {e}")
+            return
+        if purged:
+            with self._lock:
+                self._stats['purged'] += purged
+            logger.info(f"已清理过期任务: {purged}")
+
+    @staticmethod
+    def to_public(job: Dict[str, Any]) -> Dict[str, Any]:
+        """任务的对外表示（不含用户ID，时间为ISO格式）"""
+        public = {
+            'id': job['id'],
+            'kind': job['kind'],
+            'state': job['state'],
+            'created_at': _isoformat(job['created_at']),
+            'updated_at': _isoformat(job['updated_at']),
+            'expires_at': _isoformat(job['expires_at'])
+        }
+        if job['state'] == JOB_SUCCEEDED:
+            public['result'] = job['result']
+        if job['state'] == JOB_FAILED:
+            public['error'] = job['error']
+        return public
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取提交、拒绝、成功、失败次数和执行耗时"""
+        with self._lock:
+            stats = dict(self._stats)
+            durations = list(self._durations_ms)
+            stats['in_flight'] = len(self._events)
+        stats['max_workers'] = self.max_workers
+        stats['max_pending'] = self.max_pending
+        stats['ttl_seconds'] = self.ttl_seconds
+        stats['duration_p50_ms'] = percentile(durations, 0.5)
+        stats['duration_p95_ms'] = percentile(durations, 0.95)
+        try:
+            stats['stored'] = self.store.count_by_state()
+        except Exception as e:
+            stats['stored'] = {'error': str(e)}
+        return stats
+
+    def shutdown(self, wait: bool = True):
+        self._stopped.set()
+        self._executor.shutdown(wait=wait)
+
+
+def submit_async_job(kind: str, pipeline: Callable[[], Dict[str, Any]]):
+    """
+    在请求处理函数中把pipeline提交为后台任务
+
+    pipeline在应用上下文中执行；成功时结果同时写入api_response_cache（与同步请求的缓存键相同）
+
+    Args:
+        kind: 任务类型
+        pipeline: 无参函数，返回与同步接口相同的响应体
+
+    Returns:
+        202响应（带Location头）；队列已满时返回503
+    """
+    from flask import current_app, g, jsonify, request
+
+    app = current_app._get_current_object()
+    cache_key = g.get('api_cache_key')
+    cache_ttl = g.get('api_cache_ttl', 300)
+
+    def run():
+        with app.app_context():
+            body = pipeline()
+            if cache_key is not None and body.get('status') == 'success':
+                from .cache import cache_response_body
+                cache_response_body(cache_key, body, cache_ttl)
+            return body
+
+    try:
+        job = get_job_manager().submit(kind, run, user_id=getattr(request, 'user_id', None))
+    except JobQueueFullError as e:
+        return jsonify({'status': 'error', 'message': str(e), 'error_code': 'JOB_QUEUE_FULL'}), 503, \
+            {'Retry-After': '5'}
+
+    status_url = f"/api/jobs/{job['id']}"
+    return jsonify({
+        'status': 'accepted',
+        'job_id': job['id'],
+        'job': JobManager.to_public(job),
+        'status_url': status_url
+    }), 202, {'Location': status_url}
+
+
+# 全局任务管理器实例
+_job_manager = None
+_job_manager_lock = threading.Lock()
+
+
+def get_job_manager() -> JobManager:
+    """获取任务管理器实例（单例模式）"""
+    global _job_manager
+    if _job_manager is None:
+        with _job_manager_lock:
+            if _job_manager is None:
+                _job_manager = JobManager(
+                    JobStore(Config.JOB_DB_PATH),
+                    max_workers=Config.JOB_MAX_WORKERS,
+                    max_pending=Config.JOB_MAX_PENDING,
+                    ttl_seconds=Config.JOB_TTL_SECONDS,
+                    stale_seconds=Config.JOB_STALE_SECONDS
+                )
+    return _job_manager
@@ -0,0 +1,212 @@
+"""
+词法索引模块
+基于SQLite FTS5的BM25检索，与Chroma集合并列存放；
+中文按单字 + 双字切分后写入，精确地名（如“鼓浪屿”“稻城亚丁”）可以直接命中
+"""
+
+import logging
+import os
+import re
+import sqlite3
+import threading
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+CJK_PATTERN = re.compile(r'[\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]+')
+TOKEN_PATTERN = re.compile(r'[\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]+|[a-z0-9]+')
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    索引用分词：中文连续片段输出单字和相邻双字，英文/数字按单词小写输出
+
+    Args:
+        text: 文本
+
+    Returns:
+        token列表
+    """
+    tokens = []
+    for match in TOKEN_PATTERN.finditer(text.lower()):
+        run = match.group()
+        if CJK_PATTERN.fullmatch(run):
+            tokens.extend(run)
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+        else:
+            tokens.append(run)
+    return tokens
+
+
+def tokenize_query(text: str) -> List[str]:
+    """
+    查询用分词：中文只用双字（单字区分度太低），单字片段保留单字
+
+    Args:
+        text: 查询文本
+
+    Returns:
+        去重后的token列表
+    """
+    tokens = []
+    for match in TOKEN_PATTERN.finditer(text.lower()):
+        run = match.group()
+        if CJK_PATTERN.fullmatch(run) and len(run) > 1:
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+        else:
+            tokens.append(run)
+    return list(dict.fromkeys(tokens))
+
+
+def default_index_path(chroma_path: str, collection_name: str) -> str:
+    """默认索引路径：与Chroma数据放在同一目录，随数据卷一起持久化"""
+    return os.path.join(chroma_path, f"lexical_{collection_name}.sqlite3")
+
+
+class LexicalIndex:
+    """SQLite FTS5词法索引，条目与Chroma中的段落一一对应"""
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._stats = {'inserts': 0, 'queries': 0}
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute('''CREATE TABLE IF NOT EXISTS lexical_docs
+                              (rowid INTEGER PRIMARY KEY,
+                               passage_id TEXT UNIQUE NOT NULL,
+                               parent_id TEXT NOT NULL)''')
+        self._conn.execute('CREATE VIRTUAL TABLE IF NOT EXISTS lexical_fts USING fts5(tokens)')
+        self._conn.commit()
+        logger.info(f"词法索引已打开: {db_path}")
+
+    def add(self, passage_ids: Sequence[str], texts: Sequence[str], parent_ids: Optional[Sequence[str]] = None):
+        """
+        写入（或覆盖）段落
+
+        Args:
+            passage_ids: 段落ID（与Chroma中的ID一致）
+            texts: 段落文本
+            parent_ids: 父文档ID，为空时与段落ID相同
+        """
+        parent_ids = parent_ids or passage_ids
+        with self._lock:
+            for passage_id, text, parent_id in zip(passage_ids, texts, parent_ids):
+                row = self._conn.execute('SELECT rowid FROM lexical_docs WHERE passage_id = ?',
+                                         (passage_id,)).fetchone()
+                if row:
+                    rowid = row[0]
+                    self._conn.execute('UPDATE lexical_docs SET parent_id = ? WHERE rowid = ?', (parent_id, rowid))
+                    self._conn.execute('DELETE FROM lexical_fts WHERE rowid = ?', (rowid,))
+                else:
+                    rowid = self._conn.execute('INSERT INTO lexical_docs (passage_id, parent_id) VALUES (?, ?)',
+                                               (passage_id, parent_id)).lastrowid
+                self._conn.execute('INSERT INTO lexical_fts (rowid, tokens) VALUES (?, ?)',
+                                   (rowid, ' '.join(tokenize(text))))
+            self._conn.commit()
+            self._stats['inserts'] += len(passage_ids)
+
+    def delete(self, passage_ids: Sequence[str]):
+        """删除段落"""
+        with self._lock:
+            for passage_id in passage_ids:
+                row = self._conn.execute('SELECT rowid FROM lexical_docs WHERE passage_id = ?',
+                                         (passage_id,)).fetchone()
+                if row:
+                    self._conn.execute('DELETE FROM lexical_fts WHERE rowid = ?', (row[0],))
+                    self._conn.execute('DELETE FROM lexical_docs WHERE rowid = ?', (row[0],))
+            self._conn.commit()
+
+    def search(self, query: str, limit: int = 10) -> List[Tuple[str, str, float]]:
+        """
+        BM25检索
+
+        Args:
+            query: 查询文本
+            limit: 返回的段落数
+
+        Returns:
+            [(段落ID, 父文档ID, bm25分数)]，按相关度从高到低排列
+        """
+        tokens = tokenize_query(query)
+        if not tokens:
+            return []
+        match = ' OR '.join(f'"{token}"' for token in tokens)
+        with self._lock:
+            self._stats['queries'] += 1
+            rows = self._conn.execute('''SELECT d.passage_id, d.parent_id, bm25(lexical_fts) AS score
+                                         FROM lexical_fts JOIN lexical_docs d ON d.rowid = lexical_fts.rowid
+                                         WHERE lexical_fts MATCH ?
+                                         ORDER BY score LIMIT ?''', (match, limit)).fetchall()
+        # FTS5的bm25分数越小越相关，取反后越大越相关
+        return [(passage_id, parent_id, -score) for passage_id, parent_id, score in rows]
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute('SELECT COUNT(*) FROM lexical_docs').fetchone()[0]
+
+    def clear(self):
+        """清空索引"""
+        with self._lock:
+            self._conn.execute('DELETE FROM lexical_docs')
+            self._conn.execute('DELETE FROM lexical_fts')
+            self._conn.commit()
+
+    def rebuild_from_collection(self, collection, batch_size: int = 1000) -> int:
+        """
+        从Chroma集合重建索引（用于已有数据的回填）
+
+        Returns:
+            写入的段落数
+        """
+        total = collection.count()
+        for offset in range(0, total, batch_size):
+            page = collection.get(offset=offset, limit=batch_size, include=['documents', 'metadatas'])
+            parent_ids = [(metadata or {}).get('parent_id') or passage_id
+                          for passage_id, metadata in zip(page['ids'], page['metadatas'])]
+            self.add(page['ids'], page['documents'], parent_ids)
+        logger.info(f"词法索引重建完成: {total} 条")
+        return total
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats = dict(self._stats)
+        stats['documents'] = self.count()
+        stats['path'] = self.db_path
+        return stats
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def main():
+    """命令行入口：从Chroma集合重建词法索引"""
+    import argparse
+
+    from modular_api.services.collection_manager import get_collection_manager
+    from modular_api.utils.config import Config
+
+    parser = argparse.ArgumentParser(description='词法索引重建工具')
+    parser.add_argument('--collection', default='travel_guides', help='集合名称')
+    parser.add_argument('--output', default=None, help='索引路径（默认放在CHROMA_PATH下）')
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+
+    path = args.output or default_index_path(Config.CHROMA_PATH, args.collection)
+    collection = get_collection_manager(Config.CHROMA_PATH).get_collection(args.collection)
+    index = LexicalIndex(path)
+    index.clear()
+    total = index.rebuild_from_collection(collection)
+    print(f"词法索引重建完成: {total} 条, 输出 {path}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,427 @@
+"""
+大模型客户端模块
+按提供商封装对话补全接口（阿里云DashScope、DeepSeek均为OpenAI兼容协议）：
+- 每个提供商一个长连接池（requests.Session + HTTPAdapter），复用TCP/TLS连接
+- 连接/读取分别超时，连接错误、超时、429和5xx有限次重试（指数退避 + 全抖动）
+- 按LLM_PROVIDERS顺序故障转移，记录每次调用的耗时和token数
+- 支持流式输出（SSE），首个token之前的失败同样重试和故障转移
+"""
+
+import json
+import logging
+import random
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from modular_api.utils.config import Config
+from modular_api.utils.monitoring import percentile
+
+logger = logging.getLogger(__name__)
+
+# 可重试的HTTP状态码（限流和服务端错误）
+RETRYABLE_STATUS = frozenset({408, 429, 500, 502, 503, 504})
+
+
+class LLMError(RuntimeError):
+    """大模型调用失败（所有提供商均不可用或返回错误）"""
+    pass
+
+
+class LLMNotConfiguredError(LLMError):
+    """没有配置任何可用的大模型提供商"""
+    pass
+
+
+class LLMBackend:
+    """OpenAI兼容的对话补全后端"""
+
+    name = 'openai'
+    default_base_url = ''
+    default_model = ''
+
+    def __init__(self, api_key: str = '', base_url: Optional[str] = None, model: Optional[str] = None,
+                 pool_size: int = 10, connect_timeout: float = 3.05, read_timeout: float = 60.0):
+        self.api_key = api_key
+        self.base_url = (base_url or self.default_base_url).rstrip('/')
+        self.model = model or self.default_model
+        self.timeout = (connect_timeout, read_timeout)
+        self.session = requests.Session()
+        # 重试由客户端统一处理（带抖动），连接池不做自动重试
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.session.headers.update({'Content-Type': 'application/json'})
+        if api_key:
+            self.session.headers['Authorization'] = f'Bearer {api_key}'
+
+    @property
+    def endpoint(self) -> str:
+        return f"{self.base_url}/chat/completions"
+
+    def build_payload(self, messages: List[Dict[str, str]], options: Dict[str, Any],
+                      stream: bool = False) -> Dict[str, Any]:
+        """构建请求体（流式请求要求在最后一个分片中返回token用量）"""
+        payload = {
+            'model': options.get('model') or self.model,
+            'messages': messages,
+            'temperature': options.get('temperature', Config.LLM_TEMPERATURE),
+            'max_tokens': options.get('max_tokens', Config.LLM_MAX_TOKENS)
+        }
+        if stream:
+            payload['stream'] = True
+            payload['stream_options'] = {'include_usage': True}
+        return payload
+
+    @staticmethod
+    def parse_response(data: Dict[str, Any]) -> Dict[str, Any]:
+        """解析响应体，返回文本和token用量"""
+        try:
+            text = data['choices'][0]['message']['content'] or ''
+        except (KeyError, IndexError, TypeError):
+            raise LLMError(f"无法解析模型响应: {json.dumps(data, ensure_ascii=False)[:200]}")
+        usage = data.get('usage') or {}
+        return {
+            'text': text,
+            'model': data.get('model'),
+            'prompt_tokens': int(usage.get('prompt_tokens') or 0),
+            'completion_tokens': int(usage.get('completion_tokens') or 0)
+        }
+
+    def post(self, payload: Dict[str, Any], stream: bool = False) -> requests.Response:
+        return self.session.post(self.endpoint, json=payload, timeout=self.timeout, stream=stream)
+
+    def close(self):
+        self.session.close()
+
+
+class DashScopeBackend(LLMBackend):
+    """阿里云DashScope（通义千问，OpenAI兼容模式）"""
+
+    name = 'dashscope'
+    default_base_url = 'https://dashscope.aliyuncs.com/compatible-mode/v1'
+    default_model = 'qwen-turbo'
+
+
+class DeepSeekBackend(LLMBackend):
+    """DeepSeek"""
+
+    name = 'deepseek'
+    default_base_url = 'https://api.deepseek.com'
+    default_model = 'deepseek-chat'
+
+
+class StubBackend(LLMBackend):
+    """本地桩服务（llm_stub），离线开发和测试使用，不需要API Key"""
+
+    name = 'stub'
+    default_base_url = 'http://127.0.0.1:8765/v1'
+    default_model = 'stub-chat'
+
+
+BACKENDS = {
+    'dashscope': DashScopeBackend,
+    'deepseek': DeepSeekBackend,
+    'stub': StubBackend
+}
+
+
+class _RetryableError(Exception):
+    """单次请求失败但可以重试"""
+
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class LLMClient:
+    """大模型客户端：按顺序尝试各提供商，单个提供商内有限次重试"""
+
+    def __init__(self, backends: List[LLMBackend], max_retries: int = 2,
+                 backoff_base: float = 0.5, backoff_max: float = 8.0):
+        self.backends = backends
+        self.max_retries = max(0, int(max_retries))
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._lock = threading.Lock()
+        self._stats = {backend.name: self._empty_stats() for backend in backends}
+
+    @staticmethod
+    def _empty_stats() -> Dict[str, Any]:
+        return {
+            'calls': 0,
+            'successes': 0,
+            'failures': 0,
+            'retries': 0,
+            'prompt_tokens': 0,
+            'completion_tokens': 0,
+            'streams': 0,
+            'latencies_ms': deque(maxlen=1000),
+            'first_token_ms': deque(maxlen=1000)
+        }
+
+    @property
+    def available(self) -> bool:
+        return bool(self.backends)
+
+    def chat(self, messages: List[Dict[str, str]], **options) -> Dict[str, Any]:
+        """
+        对话补全
+
+        Args:
+            messages: OpenAI格式的消息列表
+            **options: model、temperature、max_tokens
+
+        Returns:
+            {'text', 'provider', 'model', 'prompt_tokens', 'completion_tokens', 'latency_ms', 'attempts'}
+        """
+        if not self.backends:
+            raise LLMNotConfiguredError("未配置大模型提供商（LLM_PROVIDERS及对应API Key）")
+
+        errors = []
+        for backend in self.backends:
+            try:
+                return self._call_backend(backend, messages, options)
+            except LLMError as e:
+                errors.append(f"{backend.name}: {e}")
+                logger.warning(f"大模型提供商{backend.name}调用失败，尝试下一个: {e}")
+        raise LLMError('; '.join(errors))
+
+    @staticmethod
+    def build_messages(prompt: str, system_prompt: Optional[str] = None) -> List[Dict[str, str]]:
+        """单轮对话的消息列表"""
+        messages = [{'role': 'system', 'content': system_prompt}] if system_prompt else []
+        messages.append({'role': 'user', 'content': prompt})
+        return messages
+
+    def generate(self, prompt: str, system_prompt: Optional[str] = None, **options) -> str:
+        """单轮生成，返回文本"""
+        return self.chat(self.build_messages(prompt, system_prompt), **options)['text']
+
+    def stream(self, messages: List[Dict[str, str]], **options) -> Iterator[str]:
+        """
+        流式对话补全，逐个产出文本增量
+
+        建立连接和等待响应头阶段的失败按提供商重试和故障转移；
+        开始产出文本后出错直接抛出LLMError（已输出的内容无法撤回）
+
+        Args:
+            messages: OpenAI格式的消息列表
+            **options: model、temperature、max_tokens
+
+        Yields:
+            文本增量
+        """
+        if not self.backends:
+            raise LLMNotConfiguredError("未配置大模型提供商（LLM_PROVIDERS及对应API Key）")
+
+        errors = []
+        for backend in self.backends:
+            started = time.perf_counter()
+            try:
+                response, attempts = self._open(backend, backend.build_payload(messages, options, stream=True),
+                                                stream=True)
+            except LLMError as e:
+                self._record(backend.name, calls=1, failures=1)
+                errors.append(f"{backend.name}: {e}")
+                logger.warning(f"大模型提供商{backend.name}流式调用失败，尝试下一个: {e}")
+                continue
+            yield from self._consume_stream(backend, response, started, attempts)
+            return
+        raise LLMError('; '.join(errors))
+
+    def _consume_stream(self, backend: LLMBackend, response: requests.Response, started: float,
+                        attempts: int) -> Iterator[str]:
+        """解析SSE响应（data: {...}，以[DONE]结束），产出文本增量并在结束时记录统计"""
+        usage = {}
+        first_token_ms = None
+        try:
+            with response:
+                for line in response.iter_lines():
+                    line = line.decode('utf-8') if isinstance(line, bytes) else line
+                    if not line.startswith('data:'):
+                        continue
+                    data = line[5:].strip()
+                    if data == '[DONE]':
+                        # 不提前break：读完响应体后连接才能放回连接池
+                        continue
+                    chunk = json.loads(data)
+                    usage = chunk.get('usage') or usage
+                    for choice in chunk.get('choices') or []:
+                        delta = (choice.get('delta') or {}).get('content')
+                        if delta:
+                            if first_token_ms is None:
+                                first_token_ms = (time.perf_counter() - started) * 1000
+                            yield delta
+        except (requests.RequestException, ValueError) as e:
+            self._record(backend.name, calls=1, failures=1)
+            raise LLMError(f"流式响应中断: {e}")
+
+        latency_ms = (time.perf_counter() - started) * 1000
+        prompt_tokens = int(usage.get('prompt_tokens') or 0)
+        completion_tokens = int(usage.get('completion_tokens') or 0)
+        self._record(backend.name, calls=1, successes=1, streams=1, prompt_tokens=prompt_tokens,
+                     completion_tokens=completion_tokens, latency_ms=latency_ms, first_token_ms=first_token_ms)
+        logger.info(f"大模型流式调用: provider={backend.name}, 首token={first_token_ms or 0:.0f}ms, "
+                    f"总耗时={latency_ms:.0f}ms, tokens={prompt_tokens}+{completion_tokens}, 尝试次数={attempts}")
+
+    def _call_backend(self, backend: LLMBackend, messages: List[Dict[str, str]],
+                      options: Dict[str, Any]) -> Dict[str, Any]:
+        """在单个提供商上执行请求（含重试），失败抛出LLMError"""
+        started = time.perf_counter()
+        try:
+            response, attempts = self._open(backend, backend.build_payload(messages, options))
+            result = backend.parse_response(self._json(response))
+        except LLMError:
+            self._record(backend.name, calls=1, failures=1)
+            raise
+
+        latency_ms = (time.perf_counter() - started) * 1000
+        result.update({'provider': backend.name, 'latency_ms': round(latency_ms, 1), 'attempts': attempts})
+        self._record(backend.name, calls=1, successes=1, prompt_tokens=result['prompt_tokens'],
+                     completion_tokens=result['completion_tokens'], latency_ms=latency_ms)
+        logger.info(f"大模型调用: provider={backend.name}, model={result['model']}, "
+                    f"耗时={latency_ms:.0f}ms, tokens={result['prompt_tokens']}+{result['completion_tokens']}, "
+                    f"尝试次数={attempts}")
+        return result
+
+    def _open(self, backend: LLMBackend, payload: Dict[str, Any],
+              stream: bool = False) -> Tuple[requests.Response, int]:
+        """发送请求直到得到成功的响应头（含重试），返回(响应, 尝试次数)"""
+        last_error = None
+        for attempt in range(self.max_retries + 1):
+            if attempt > 0:
+                self._sleep_before_retry(attempt, getattr(last_error, 'retry_after', None))
+                self._record(backend.name, retries=1)
+            try:
+                return self._send(backend, payload, stream), attempt + 1
+            except _RetryableError as e:
+                last_error = e
+        raise LLMError(f"重试{self.max_retries}次后仍失败: {last_error}")
+
+    @staticmethod
+    def _send(backend: LLMBackend, payload: Dict[str, Any], stream: bool = False) -> requests.Response:
+        """发送一次请求，按错误类型区分可重试和不可重试"""
+        try:
+            response = backend.post(payload, stream=stream)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            raise _RetryableError(f"{type(e).__name__}: {e}")
+        except requests.RequestException as e:
+            raise LLMError(str(e))
+
+        if response.status_code in RETRYABLE_STATUS:
+            retry_after = response.headers.get('Retry-After')
+            try:
+                retry_after = float(retry_after) if retry_after else None
+            except ValueError:
+                retry_after = None
+            response.close()
+            raise _RetryableError(f"HTTP {response.status_code}", retry_after)
+        if response.status_code >= 400:
+            raise LLMError(f"HTTP {response.status_code}: {response.text[:200]}")
+        return response
+
+    @staticmethod
+    def _json(response: requests.Response) -> Dict[str, Any]:
+        try:
+            return response.json()
+        except ValueError:
+            raise LLMError(f"响应不是JSON: {response.text[:200]}")
+
+    def _sleep_before_retry(self, attempt: int, retry_after: Optional[float]):
+        """指数退避 + 全抖动；服务端给出Retry-After时以其为下限（不超过退避上限）"""
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** (attempt - 1))))
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, self.backoff_max))
+        time.sleep(delay)
+
+    def _record(self, provider: str, latency_ms: Optional[float] = None,
+                first_token_ms: Optional[float] = None, **counters):
+        with self._lock:
+            stats = self._stats.setdefault(provider, self._empty_stats())
+            for key, value in counters.items():
+                stats[key] += value
+            if latency_ms is not None:
+                stats['latencies_ms'].append(latency_ms)
+            if first_token_ms is not None:
+                stats['first_token_ms'].append(first_token_ms)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """各提供商的调用次数、重试次数、耗时分位数和token累计"""
+        report = {}
+        with self._lock:
+            for provider, stats in self._stats.items():
+                entry = {key: value for key, value in stats.items() if key not in ('latencies_ms', 'first_token_ms')}
+                entry['latency_p50_ms'] = percentile(stats['latencies_ms'], 0.5)
+                entry['latency_p95_ms'] = percentile(stats['latencies_ms'], 0.95)
+                entry['first_token_p50_ms'] = percentile(stats['first_token_ms'], 0.5)
+                report[provider] = entry
+        return {
+            'providers': [backend.name for backend in self.backends],
+            'stats': report
+        }
+
+    def close(self):
+        for backend in self.backends:
+            backend.close()
+
+
+def create_backends_from_config() -> List[LLMBackend]:
+    """按LLM_PROVIDERS顺序创建后端，跳过未配置API Key的提供商"""
+    keys = {
+        'dashscope': Config.ALIYUN_DASHSCOPE_API_KEY,
+        'deepseek': Config.DEEPSEEK_API_KEY,
+        'stub': ''
+    }
+    base_urls = {
+        'dashscope': Config.DASHSCOPE_BASE_URL,
+        'deepseek': Config.DEEPSEEK_BASE_URL,
+        'stub': Config.LLM_STUB_URL
+    }
+    models = {
+        'dashscope': Config.DASHSCOPE_MODEL,
+        'deepseek': Config.DEEPSEEK_MODEL,
+        'stub': None
+    }
+    backends = []
+    for name in [item.strip().lower() for item in Config.LLM_PROVIDERS.split(',') if item.strip()]:
+        if name not in BACKENDS:
+            logger.warning(f"未知的大模型提供商: {name}")
+            continue
+        if name != 'stub' and not keys[name]:
+            logger.info(f"大模型提供商{name}未配置API Key，跳过")
+            continue
+        backends.append(BACKENDS[name](
+            api_key=keys[name],
+            base_url=base_urls[name] or None,
+            model=models[name] or None,
+            pool_size=Config.LLM_POOL_SIZE,
+            connect_timeout=Config.LLM_CONNECT_TIMEOUT,
+            read_timeout=Config.LLM_READ_TIMEOUT
+        ))
+    return backends
+
+
+# 全局大模型客户端实例
+_llm_client = None
+_llm_client_lock = threading.Lock()
+
+
+def get_llm_client() -> LLMClient:
+    """获取大模型客户端实例（单例模式，进程内共享连接池）"""
+    global _llm_client
+    if _llm_client is None:
+        with _llm_client_lock:
+            if _llm_client is None:
+                _llm_client = LLMClient(
+                    create_backends_from_config(),
+                    max_retries=Config.LLM_MAX_RETRIES,
+                    backoff_base=Config.LLM_BACKOFF_BASE,
+                    backoff_max=Config.LLM_BACKOFF_MAX
+                )
+                logger.info(f"大模型客户端初始化: providers={[b.name for b in _llm_client.backends]}")
+    return _llm_client
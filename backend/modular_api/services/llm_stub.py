@@ -0,0 +1,198 @@
+"""
+大模型桩服务模块
+本地OpenAI兼容的对话补全服务，离线开发和测试时代替DashScope/DeepSeek：
+- 回复内容由最后一条用户消息确定性生成，并返回token用量；stream=true时按SSE分片输出
+- 可注入延迟和若干次失败（状态码、Retry-After），用于验证超时和重试
+- 记录请求数和客户端连接，用于验证连接复用
+"""
+
+import json
+import logging
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def stub_reply(messages: List[Dict[str, str]]) -> str:
+    """桩回复：复述最后一条用户消息"""
+    last = next((message.get('content') or '' for message in reversed(messages)
+                 if message.get('role') == 'user'), '')
+    return f"【桩回复】已收到：{last.strip()[:200]}"
+
+
+def count_tokens(text: str) -> int:
+    """粗略的token计数（中文按字、其余按空白分词）"""
+    cjk = sum(1 for char in text if '\u4e00' <= char <= '\u9fff')
+    return cjk + len(''.join(' ' if '\u4e00' <= char <= '\u9fff' else char for char in text).split())
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+
+    def _send_json(self, status: int, body: Dict[str, Any], headers: Optional[Dict[str, str]] = None):
+        data = json.dumps(body, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(data)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _write_chunk(self, data: bytes):
+        """HTTP/1.1分块编码写出一块（保持长连接）"""
+        self.wfile.write(f"{len(data):x}\r\n".encode('ascii') + data + b"\r\n")
+        self.wfile.flush()
+
+    def _send_stream(self, payload: Dict[str, Any], text: str, prompt_tokens: int):
+        """按OpenAI流式格式逐段输出，最后附带token用量和[DONE]"""
+        stub = self.server.stub
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream; charset=utf-8')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        model = payload.get('model') or 'stub-chat'
+        for start in range(0, len(text), stub.stream_chunk_chars):
+            if stub.stream_delay:
+                time.sleep(stub.stream_delay)
+            delta = {'content': text[start:start + stub.stream_chunk_chars]}
+            chunk = {'model': model, 'choices': [{'index': 0, 'delta': delta}]}
+            self._write_chunk(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode('utf-8'))
+        if (payload.get('stream_options') or {}).get('include_usage'):
+            usage = {'prompt_tokens': prompt_tokens, 'completion_tokens': count_tokens(text),
+                     'total_tokens': prompt_tokens + count_tokens(text)}
+            chunk = {'model': model, 'choices': [], 'usage': usage}
+            self._write_chunk(f"data: {json.dumps(chunk)}\n\n".encode('utf-8'))
+        self._write_chunk(b"data: [DONE]\n\n")
+        self._write_chunk(b"")
+
+    def do_POST(self):
+        stub = self.server.stub
+        length = int(self.headers.get('Content-Length') or 0)
+        try:
+            payload = json.loads(self.rfile.read(length) or b'{}')
+        except ValueError:
+            self._send_json(400, {'error': {'message': 'invalid json'}})
+            return
+
+        stub.record(self.client_address, payload)
+        if not self.path.rstrip('/').endswith('/chat/completions'):
+            self._send_json(404, {'error': {'message': f'unknown path {self.path}'}})
+            return
+
+        failure = stub.next_failure()
+        if failure is not None:
+            status, retry_after = failure
+            headers = {'Retry-After': str(retry_after)} if retry_after is not None else None
+            self._send_json(status, {'error': {'message': f'injected failure {status}'}}, headers)
+            return
+
+        if stub.delay:
+            time.sleep(stub.delay)
+
+        messages = payload.get('messages') or []
+        text = stub_reply(messages)
+        prompt_tokens = sum(count_tokens(message.get('content') or '') for message in messages)
+        if payload.get('stream'):
+            self._send_stream(payload, text, prompt_tokens)
+            return
+        self._send_json(200, {
+            'id': f'stub-{stub.requests}',
+            'object': 'chat.completion',
+            'model': payload.get('model') or 'stub-chat',
+            'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': text}, 'finish_reason': 'stop'}],
+            'usage': {
+                'prompt_tokens': prompt_tokens,
+                'completion_tokens': count_tokens(text),
+                'total_tokens': prompt_tokens + count_tokens(text)
+            }
+        })
+
+
+class LLMStubServer:
+    """在后台线程运行的桩服务（端口为0时自动分配）"""
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, delay: float = 0.0,
+                 stream_delay: float = 0.0, stream_chunk_chars: int = 4):
+        self.delay = delay
+        # 流式输出时每个分片之前的延迟（模拟逐token生成）和每个分片的字符数
+        self.stream_delay = stream_delay
+        self.stream_chunk_chars = max(1, stream_chunk_chars)
+        self.requests = 0
+        self.payloads: List[Dict[str, Any]] = []
+        self.connections = set()
+        self._failures: List[tuple] = []
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), _StubHandler)
+        self._server.daemon_threads = True
+        self._server.stub = self
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self) -> 'LLMStubServer':
+        self._thread = threading.Thread(target=self._server.serve_forever, name='llm-stub', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def fail_next(self, count: int, status: int = 503, retry_after: Optional[float] = None):
+        """接下来count个请求返回指定错误"""
+        with self._lock:
+            self._failures.extend([(status, retry_after)] * count)
+
+    def next_failure(self) -> Optional[tuple]:
+        with self._lock:
+            return self._failures.pop(0) if self._failures else None
+
+    def record(self, client_address, payload: Dict[str, Any]):
+        with self._lock:
+            self.requests += 1
+            self.payloads.append(payload)
+            self.connections.add(client_address)
+
+
+def main():
+    """命令行入口：启动桩服务（配合 LLM_PROVIDERS=stub 使用）"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description='大模型桩服务（OpenAI兼容）')
+    parser.add_argument('--host', default='127.0.0.1', help='监听地址')
+    parser.add_argument('--port', type=int, default=8765, help='监听端口')
+    parser.add_argument('--delay', type=float, default=0.0, help='每个请求的模拟延迟（秒）')
+    parser.add_argument('--stream-delay', type=float, default=0.05, help='流式输出每个分片的模拟延迟（秒）')
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+
+    server = LLMStubServer(args.host, args.port, args.delay, args.stream_delay)
+    print(f"大模型桩服务已启动: {server.base_url}（设置 LLM_PROVIDERS=stub 并将 LLM_STUB_URL 指向该地址）")
+    try:
+        server._server.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,45 @@
+"""
+最大边际相关（MMR）重排模块
+在相关度和结果之间的差异度之间折中，避免top-k被同一景点的近似帖子占满
+"""
+
+from typing import List
+
+import numpy as np
+
+
+def mmr_select(query_embedding, candidate_embeddings, k: int, lambda_mult: float = 0.7) -> List[int]:
+    """
+    MMR选择：每一步选 λ·sim(q, d) - (1-λ)·max sim(d, 已选) 最大的候选
+
+    Args:
+        query_embedding: 查询向量
+        candidate_embeddings: 候选向量矩阵（按相关度排序的候选）
+        k: 选择数量
+        lambda_mult: λ，1为纯相关度排序，0为纯多样性
+
+    Returns:
+        选中的候选下标（按选择顺序）
+    """
+    candidates = np.asarray(candidate_embeddings, dtype=np.float32)
+    if candidates.ndim != 2 or len(candidates) == 0 or k <= 0:
+        return []
+    query = np.asarray(query_embedding, dtype=np.float32)
+    candidates = candidates / np.maximum(np.linalg.norm(candidates, axis=1, keepdims=True), 1e-12)
+    query = query / max(float(np.linalg.norm(query)), 1e-12)
+
+    relevance = candidates @ query
+    similarity = candidates @ candidates.T
+    k = min(k, len(candidates))
+
+    selected = []
+    max_similarity = np.zeros(len(candidates), dtype=np.float32)
+    available = np.ones(len(candidates), dtype=bool)
+    for _ in range(k):
+        scores = lambda_mult * relevance - (1.0 - lambda_mult) * max_similarity if selected else relevance.copy()
+        scores[~available] = -np.inf
+        best = int(np.argmax(scores))
+        selected.append(best)
+        available[best] = False
+        max_similarity = np.maximum(max_similarity, similarity[best])
+    return selected
@@ -4,26 +4,131 @@
 """
 
 import os
+import time
 import logging
+import threading
 import numpy as np
-from sentence_transformers import SentenceTransformer
-import spacy
+
+try:
+    from utils.config import Config
+except ImportError:
+    from modular_api.utils.config import Config
+
+from .chunker import SENTENCE_END_CHARS
+from .embedding_batcher import EmbeddingBatcher
+from .embedding_cache import EmbeddingCache
+from .llm_client import get_llm_client
+from .semantic_cache import get_semantic_cache, make_scope, normalize_intent
 
 logger = logging.getLogger(__name__)
 
+# 模型就绪状态
+STATE_LOADING = 'loading'
+STATE_READY = 'ready'
+STATE_DEGRADED = 'degraded'
+
+
+# 文本清洗用不到的spaCy组件
+NLP_PRUNED_COMPONENTS = ['parser', 'ner']
+
+
+class ModelNotReadyError(RuntimeError):
+    """模型仍在后台加载中"""
+    pass
+
+
 class ModelService:
     """模型服务类，管理所有AI模型"""
     
-    def __init__(self):
+    def __init__(self, background=None):
         self.model = None
         self.nlp = None
         self.use_real_model = False
-        self._initialize_models()
+        self.model_name = Config.EMBEDDING_MODEL_NAME
+        self.embedding_backend = None
+        self.batcher = None
+        self.worker_pool = None
+        self.embedding_cache = None
+        self.state = STATE_LOADING
+        self.load_times = {}
+        self.load_error = None
+        self._ready_event = threading.Event()
+        self._warmup_thread = None
+        
+        if background is None:
+            background = Config.MODEL_WARMUP_ASYNC
+        if background:
+            self.start_warmup()
+        else:
+            self._warmup()
+    
+    def start_warmup(self):
+        """在后台线程加载模型，调用方立即返回"""
+        if self._warmup_thread is not None:
+            return
+        self._warmup_thread = threading.Thread(target=self._warmup, name='model-warmup', daemon=True)
+        self._warmup_thread.start()
+        logger.info("模型开始后台预热")
+    
+    def _warmup(self):
+        """加载全部模型并更新就绪状态"""
+        started = time.perf_counter()
+        try:
+            self._initialize_models()
+        except Exception as e:
+            logger.error(f"模型预热失败: {e}")
+            self.load_error = str(e)
+        self.load_times['total'] = round(time.perf_counter() - started, 3)
+        
+        if self.load_error or not self.use_real_model or self.nlp is None:
+            self.state = STATE_DEGRADED
+        else:
+            self.state = STATE_READY
+        self._ready_event.set()
+        logger.info(f"模型预热完成: state={self.state}, 耗时={self.load_times}")
     
     def _initialize_models(self):
         """初始化所有模型"""
-        self._initialize_embedding_model()
-        self._initialize_nlp_model()
+        self._timed('embedding', self._initialize_embedding_model)
+        self._initialize_batcher()
+        self._initialize_embedding_cache()
+        self._timed('nlp', self._initialize_nlp_model)
+    
+    def _timed(self, name, func):
+        """执行加载函数并记录耗时（秒）"""
+        started = time.perf_counter()
+        try:
+            func()
+        finally:
+            self.load_times[name] = round(time.perf_counter() - started, 3)
+            logger.info(f"模型加载耗时: {name}={self.load_times[name]}s")
+    
+    def is_ready(self):
+        """模型是否已完成加载（ready或degraded）"""
+        return self._ready_event.is_set()
+    
+    def wait_until_ready(self, timeout=None):
+        """
+        阻塞等待模型加载完成
+        
+        Args:
+            timeout: 最长等待时间（秒），None表示一直等待
+            
+        Returns:
+            是否已完成加载
+        """
+        return self._ready_event.wait(timeout)
+    
+    def get_status(self):
+        """获取模型就绪状态和各模型加载耗时"""
+        return {
+            "state": self.state,
+            "load_times": dict(self.load_times),
+            "embedding_backend": self.embedding_backend,
+            "use_real_model": self.use_real_model,
+            "nlp_available": self.nlp is not None,
+            "error": self.load_error
+        }
     
     def _initialize_embedding_model(self):
         """初始化embedding模型"""
@@ -32,51 +137,149 @@ class ModelService:
         os.environ["TRANSFORMERS_OFFLINE"] = "1"
         os.environ["HF_HUB_OFFLINE"] = "1"
         
-        # 默认模型名称
-        model_name = 'all-MiniLM-L6-v2'
-        cache_path = r'C:\Users\Administrator\.cache\huggingface\hub\models--sentence-transformers--all-MiniLM-L6-v2'
+        # 配置为ONNX后端时优先使用ONNX Runtime，失败再回退到PyTorch
+        backend = Config.EMBEDDING_BACKEND.lower()
+        
+        # 哈希向量化模式：不加载transformer，适用于压测和低资源部署
+        if backend == 'hashing':
+            self._load_hashing_model()
+            self.use_real_model = True
+            return
+        
+        # 进程池模式：由N个子进程各自持有模型，编码吞吐随CPU核数扩展
+        if Config.EMBEDDING_WORKERS > 0 and self._start_worker_pool(backend):
+            return
+        
+        if backend in ('onnx', 'onnx-int8'):
+            if self._load_onnx_model(Config.EMBEDDING_ONNX_PATH, quantized=backend == 'onnx-int8',
+                                     source_model=Config.EMBEDDING_MODEL_PATH):
+                return
+            logger.warning("ONNX后端加载失败，回退到PyTorch模型")
         
+        self._load_torch_model()
+    
+    def _start_worker_pool(self, backend):
+        """启动embedding进程池，成功返回True"""
         try:
-            # 尝试从配置获取模型路径
-            try:
-                from utils.config import Config
-                cache_path = Config.EMBEDDING_MODEL_PATH
-                model_name = Config.EMBEDDING_MODEL_NAME
-            except ImportError:
-                logger.warning("无法导入配置，使用默认模型路径")
+            from .embedding_pool import EmbeddingWorkerPool
+            pool = EmbeddingWorkerPool(
+                Config.EMBEDDING_WORKERS,
+                model_spec={
+                    'backend': backend,
+                    'model_path': Config.EMBEDDING_MODEL_PATH,
+                    'model_name': Config.EMBEDDING_MODEL_NAME,
+                    'onnx_path': Config.EMBEDDING_ONNX_PATH,
+                    'threads': Config.EMBEDDING_WORKER_THREADS
+                },
+                job_timeout=Config.EMBEDDING_WORKER_TIMEOUT
+            )
+            if not pool.start():
+                return False
+            self.model = pool
+            self.worker_pool = pool
+            self.use_real_model = True
+            self.embedding_backend = backend
+            if backend != 'torch':
+                self.model_name = f"{Config.EMBEDDING_MODEL_NAME}@{backend}"
+            logger.info(f"模型加载成功（进程池, workers={Config.EMBEDDING_WORKERS}, backend={backend}）")
+            return True
+        except Exception as e:
+            logger.warning(f"Embedding进程池启动失败，回退到进程内模型: {e}")
+            return False
+    
+    def _load_onnx_model(self, model_dir, quantized=False, source_model=None):
+        """加载ONNX Runtime后端，成功返回True"""
+        try:
+            from .onnx_embedding import OnnxEmbeddingModel
+            self.model = OnnxEmbeddingModel.from_pretrained(
+                model_dir,
+                quantized=quantized,
+                source_model=source_model,
+                num_threads=Config.EMBEDDING_ONNX_THREADS
+            )
+            self.use_real_model = True
+            self.embedding_backend = 'onnx-int8' if quantized else 'onnx'
+            # int8量化后的向量与fp32存在微小差异，缓存键需要区分
+            self.model_name = f"{Config.EMBEDDING_MODEL_NAME}@{self.embedding_backend}"
+            logger.info(f"模型加载成功（ONNX Runtime, {self.embedding_backend}）")
+            return True
+        except Exception as e:
+            logger.warning(f"ONNX模型加载失败: {model_dir}, 错误: {e}")
+            return False
+    
+    def _load_torch_model(self):
+        """加载PyTorch版SentenceTransformer（按缓存路径、标准名称、本地ONNX的顺序尝试）"""
+        cache_path = Config.EMBEDDING_MODEL_PATH
+        model_name = Config.EMBEDDING_MODEL_NAME
+        
+        try:
+            # 延迟导入，ONNX后端不需要加载PyTorch
+            from sentence_transformers import SentenceTransformer
             
             # 尝试直接缓存路径（用户确认可用的路径）
             logger.info("尝试从缓存路径加载模型...")
             self.model = SentenceTransformer(cache_path)
             logger.info("模型加载成功（直接缓存路径）")
             self.use_real_model = True
+            self.embedding_backend = 'torch'
             
         except Exception as e1:
             logger.warning(f"直接缓存路径加载失败，尝试标准模型名称: {e1}")
             try:
                 # 尝试标准模型名称（应该从缓存加载）
+                from sentence_transformers import SentenceTransformer
                 self.model = SentenceTransformer(model_name)
                 logger.info("模型加载成功（从HuggingFace缓存）")
                 self.use_real_model = True
+                self.embedding_backend = 'torch'
                 
             except Exception as e2:
                 logger.warning(f"标准模型加载失败，尝试ONNX模型: {e2}")
-                try:
-                    # 最后尝试本地ONNX模型
-                    local_onnx_path = r'C:\Users\Administrator\.cache\chroma\onnx_models\all-MiniLM-L6-v2\onnx'
-                    self.model = SentenceTransformer(local_onnx_path)
-                    logger.info("模型加载成功（本地ONNX模型）")
-                    self.use_real_model = True
-                    
-                except Exception as e3:
-                    logger.warning(f"所有模型加载失败，使用模拟模式: {e3}")
+                # 最后尝试chroma下载的本地ONNX模型（model.onnx + tokenizer.json）
+                local_onnx_path = os.path.join(os.path.expanduser('~'), '.cache', 'chroma',
+                                               'onnx_models', 'all-MiniLM-L6-v2', 'onnx')
+                if not self._load_onnx_model(local_onnx_path):
+                    logger.warning("所有模型加载失败，使用哈希向量化兜底（与transformer向量不可混用）")
                     self.use_real_model = False
-                    self.model = MockModel()
+                    self._load_hashing_model()
+    
+    def _load_hashing_model(self):
+        """加载哈希向量化引擎（确定性的字符n-gram TF-IDF向量）"""
+        from .hashing_embedding import HashingEmbeddingModel
+        self.model = HashingEmbeddingModel.load(Config.EMBEDDING_HASHING_DIM, Config.EMBEDDING_HASHING_IDF_PATH)
+        self.embedding_backend = 'hashing'
+        self.model_name = f"hashing-{Config.EMBEDDING_HASHING_DIM}"
+        logger.info(f"哈希向量化引擎已启用: dim={Config.EMBEDDING_HASHING_DIM}, idf={self.model.idf is not None}")
+    
+    def _initialize_batcher(self):
+        """初始化embedding微批调度器，把并发的单条encode合并为批量前向计算"""
+        if not Config.EMBEDDING_BATCH_ENABLED or self.model is None:
+            return
+        self.batcher = EmbeddingBatcher(
+            self.model.encode,
+            max_batch_size=Config.EMBEDDING_BATCH_MAX_SIZE,
+            max_wait_ms=Config.EMBEDDING_BATCH_MAX_WAIT_MS,
+            # 进程池模式下每个子进程都可以同时处理一个批次
+            dispatch_threads=self.worker_pool.num_workers if self.worker_pool else 1
+        )
+        self.batcher.start()
+    
+    def _initialize_embedding_cache(self):
+        """初始化embedding缓存（哈希向量化比查缓存还快，不做缓存）"""
+        if not Config.EMBEDDING_CACHE_ENABLED or self.embedding_backend == 'hashing':
+            return
+        self.embedding_cache = EmbeddingCache(
+            db_path=Config.EMBEDDING_CACHE_PATH or None,
+            memory_budget_bytes=int(Config.EMBEDDING_CACHE_MEMORY_MB * 1024 * 1024),
+            max_disk_entries=Config.EMBEDDING_CACHE_DISK_MAX_ENTRIES
+        )
     
     def _initialize_nlp_model(self):
         """初始化NLP模型"""
         try:
-            self.nlp = spacy.load("zh_core_web_sm")
+            import spacy
+            # 清洗只用到词形、停用词和标点，不加载句法分析和实体识别组件
+            self.nlp = spacy.load("zh_core_web_sm", exclude=NLP_PRUNED_COMPONENTS)
             logger.info("NLP模型加载成功")
         except Exception as e:
             logger.error(f"NLP模型加载失败: {e}")
@@ -95,9 +298,30 @@ class ModelService:
         if isinstance(texts, str):
             texts = [texts]
         
+        if not self.is_ready():
+            raise ModelNotReadyError("模型正在加载中，请稍后重试")
+        
         if self.model is None:
             raise RuntimeError("模型未正确初始化")
-            
+        
+        if self.embedding_cache is None or not texts:
+            return self._encode_uncached(texts)
+        
+        # 先查缓存，只对未命中的文本（去重后）做前向计算
+        vectors = self.embedding_cache.get_many(self.model_name, texts)
+        missing = list(dict.fromkeys(text for text, vector in zip(texts, vectors) if vector is None))
+        if missing:
+            encoded = np.asarray(self._encode_uncached(missing), dtype=np.float32)
+            self.embedding_cache.put_many(self.model_name, missing, encoded)
+            encoded_by_text = dict(zip(missing, encoded))
+            vectors = [vector if vector is not None else encoded_by_text[text]
+                       for text, vector in zip(texts, vectors)]
+        return np.vstack(vectors)
+    
+    def _encode_uncached(self, texts):
+        """直接调用模型编码（经过微批调度器）"""
+        if self.batcher is not None:
+            return self.batcher.encode(texts)
         return self.model.encode(texts)
     
     def clean_text(self, text):
@@ -110,46 +334,171 @@ class ModelService:
         Returns:
             清洗后的文本
         """
+        return self.clean_texts([text])[0]
+    
+    def clean_texts(self, texts, batch_size=None, n_process=None):
+        """
+        批量清洗文本（基于nlp.pipe）
+        
+        Args:
+            texts: 文本列表
+            batch_size: nlp.pipe的批大小，默认取配置
+            n_process: 进程数，批量入库时可大于1，默认取配置
+            
+        Returns:
+            与输入一一对应的清洗后文本列表
+        """
+        texts = list(texts)
         if not self.nlp:
             logger.warning("NLP模型未初始化，返回原文本")
+            return texts
+        
+        try:
+            docs = self.nlp.pipe(
+                texts,
+                batch_size=batch_size or Config.NLP_PIPE_BATCH_SIZE,
+                n_process=n_process or Config.NLP_PIPE_N_PROCESS
+            )
+            return [self._doc_to_clean_text(doc, text) for doc, text in zip(docs, texts)]
+        except Exception as e:
+            logger.error(f"批量文本清洗失败，逐条处理: {e}")
+        
+        cleaned = []
+        for text in texts:
+            try:
+                cleaned.append(self._doc_to_clean_text(self.nlp(text), text))
+            except Exception as e:
+                logger.error(f"文本清洗失败: {e}")
+                cleaned.append(text)
+        return cleaned
+    
+    @staticmethod
+    def _doc_to_clean_text(doc, text):
+        """
+        保留非停用词、非标点token的词形；句末标点和换行原样保留，
+        分段和上下文组装仍能按句切分
+        """
+        parts = []
+        has_words = False
+        for token in doc:
+            if token.is_punct or token.is_space:
+                if token.text in SENTENCE_END_CHARS and parts and parts[-1] != '\n':
+                    parts[-1] += token.text
+                elif '\n' in token.text and parts and parts[-1] != '\n':
+                    parts.append('\n')
+            elif not token.is_stop and token.lemma_.strip():
+                parts.append(token.lemma_)
+                has_words = True
+        # 如果清洗后没有词，返回原始文本
+        if not has_words:
             return text
+        return ' '.join(parts).replace(' \n ', '\n').strip()
+    
+    def generate_response(self, prompt, system_prompt=None, cache_intent=None, route_type='chat',
+                          destination='', **options):
+        """
+        调用大模型生成回复（按LLM_PROVIDERS顺序故障转移）
+        
+        Args:
+            prompt: 用户提示词
+            system_prompt: 系统提示词
+            cache_intent: 用户意图原文；提供时先查语义缓存，含义相近的请求直接复用回复
+            route_type: 语义缓存作用域的路由类型
+            destination: 语义缓存作用域的目的地
+            **options: temperature、max_tokens、model
             
+        Returns:
+            生成的文本
+            
+        Raises:
+            LLMError: 未配置提供商或全部调用失败，调用方回退到模板回复
+        """
+        probe, hit = self._semantic_lookup(cache_intent, route_type, destination)
+        if hit is not None:
+            return hit['response']
+        response = get_llm_client().generate(prompt, system_prompt=system_prompt, **options)
+        self._semantic_store(probe, response)
+        return response
+    
+    def stream_response(self, prompt, system_prompt=None, cache_intent=None, route_type='chat',
+                        destination='', **options):
+        """
+        流式调用大模型，返回文本增量的迭代器（迭代时才发起请求）；语义缓存命中时一次性返回缓存的回复
+        
+        Raises:
+            LLMError: 迭代过程中抛出；尚未产出文本时调用方可以回退到模板回复
+        """
+        probe, hit = self._semantic_lookup(cache_intent, route_type, destination)
+        if hit is not None:
+            return iter([hit['response']])
+        client = get_llm_client()
+        stream = client.stream(client.build_messages(prompt, system_prompt), **options)
+        if probe is None:
+            return stream
+        return self._store_completed_stream(stream, probe)
+    
+    def _store_completed_stream(self, stream, probe):
+        """透传文本增量，流完整结束后写入语义缓存"""
+        parts = []
+        for delta in stream:
+            parts.append(delta)
+            yield delta
+        self._semantic_store(probe, ''.join(parts))
+    
+    def _semantic_lookup(self, intent, route_type, destination):
+        """
+        向量化规范化后的意图并查询语义缓存
+        
+        Returns:
+            (probe, hit)：probe为写入缓存所需的(向量, 作用域, 意图)，未开启或向量化失败时为None；
+            hit为命中的缓存条目
+        """
+        if not intent or not Config.SEMANTIC_CACHE_ENABLED:
+            return None, None
+        normalized = normalize_intent(intent)
+        if not normalized:
+            return None, None
         try:
-            doc = self.nlp(text)
-            clean_text = " ".join([token.lemma_ for token in doc if not token.is_stop and not token.is_punct])
-            # 如果清洗后为空或只包含空格，返回原始文本
-            if not clean_text.strip():
-                return text
-            return clean_text
+            vector = self.encode_text([normalized])[0]
         except Exception as e:
-            logger.error(f"文本清洗失败: {e}")
-            return text
+            logger.warning(f"语义缓存向量化失败，直接调用大模型: {e}")
+            return None, None
+        scope = make_scope(route_type, destination)
+        hit = get_semantic_cache().lookup(vector, scope)
+        if hit is not None:
+            logger.info(f"语义缓存命中: scope={scope}, similarity={hit['similarity']}, "
+                        f"intent={normalized[:50]}, cached_intent={hit['intent'][:50]}")
+        return (vector, scope, normalized), hit
+    
+    def _semantic_store(self, probe, response):
+        if probe is not None:
+            vector, scope, normalized = probe
+            get_semantic_cache().put(vector, scope, normalized, response)
     
     def get_model_info(self):
         """获取模型信息"""
         return {
+            "state": self.state,
+            "load_times": dict(self.load_times),
             "use_real_model": self.use_real_model,
             "nlp_available": self.nlp is not None,
-            "embedding_model_type": "real" if self.use_real_model else "mock"
+            "embedding_model_type": "real" if self.use_real_model else "fallback",
+            "embedding_backend": self.embedding_backend,
+            "embedding_batching": self.batcher.get_stats() if self.batcher else {"enabled": False},
+            "embedding_workers": self.worker_pool.get_stats() if self.worker_pool else {"enabled": False},
+            "embedding_cache": self.embedding_cache.get_stats() if self.embedding_cache else {"enabled": False}
         }
 
 
-class MockModel:
-    """模拟模型类，当真实模型加载失败时使用"""
-    
-    def encode(self, texts):
-        """生成模拟的向量"""
-        import numpy as np
-        # 返回随机向量（384维）
-        return np.random.rand(len(texts), 384)
-
-
 # 全局模型服务实例
 model_service = None
+_model_service_lock = threading.Lock()
 
 def get_model_service():
-    """获取模型服务实例（单例模式）"""
+    """获取模型服务实例（单例模式，首次调用时在后台开始加载模型）"""
     global model_service
     if model_service is None:
-        model_service = ModelService()
+        with _model_service_lock:
+            if model_service is None:
+                model_service = ModelService()
     return model_service
\ No newline at end of file
@@ -0,0 +1,251 @@
+"""
+ONNX Runtime embedding模块
+提供与sentence-transformers（all-MiniLM-L6-v2）等价的ONNX推理后端，
+支持导出ONNX模型以及int8动态量化，运行时不依赖PyTorch
+"""
+
+import json
+import logging
+import os
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+FP32_MODEL_FILE = 'model.onnx'
+INT8_MODEL_FILE = 'model_int8.onnx'
+TOKENIZER_FILE = 'tokenizer.json'
+EMBEDDING_CONFIG_FILE = 'embedding_config.json'
+
+# 未找到导出配置时的默认值（与all-MiniLM-L6-v2一致）
+DEFAULT_EMBEDDING_CONFIG = {
+    'max_seq_length': 256,
+    'pooling': 'mean',
+    'normalize': True
+}
+
+
+class OnnxEmbeddingModel:
+    """基于ONNX Runtime的句向量模型，接口与SentenceTransformer.encode兼容"""
+
+    def __init__(self, model_dir: str, quantized: bool = False, num_threads: int = 0,
+                 batch_size: int = 32):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        self.model_dir = model_dir
+        self.quantized = quantized
+        self.batch_size = batch_size
+        self.config = self._load_config(model_dir)
+
+        model_file = os.path.join(model_dir, INT8_MODEL_FILE if quantized else FP32_MODEL_FILE)
+        if not os.path.exists(model_file):
+            raise FileNotFoundError(f"ONNX模型文件不存在: {model_file}")
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if num_threads > 0:
+            options.intra_op_num_threads = num_threads
+        self.session = ort.InferenceSession(model_file, sess_options=options,
+                                            providers=['CPUExecutionProvider'])
+        self.input_names = [node.name for node in self.session.get_inputs()]
+
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_dir, TOKENIZER_FILE))
+        self.tokenizer.enable_truncation(max_length=self.config['max_seq_length'])
+        pad_token = '[PAD]'
+        pad_id = self.tokenizer.token_to_id(pad_token)
+        if pad_id is None:
+            pad_id, pad_token = 0, self.tokenizer.id_to_token(0)
+        self.tokenizer.enable_padding(pad_id=pad_id, pad_token=pad_token)
+
+        logger.info(f"ONNX embedding模型加载成功: {model_file}, 输入={self.input_names}")
+
+    @staticmethod
+    def _load_config(model_dir: str) -> Dict[str, Any]:
+        """读取导出时保存的池化/归一化配置"""
+        config = dict(DEFAULT_EMBEDDING_CONFIG)
+        config_path = os.path.join(model_dir, EMBEDDING_CONFIG_FILE)
+        if os.path.exists(config_path):
+            with open(config_path, 'r', encoding='utf-8') as f:
+                config.update(json.load(f))
+        return config
+
+    def encode(self, texts: List[str], batch_size: Optional[int] = None) -> np.ndarray:
+        """
+        将文本编码为向量
+
+        Args:
+            texts: 文本列表
+            batch_size: 每次推理的批大小
+
+        Returns:
+            形状为 (len(texts), dim) 的float32向量
+        """
+        if isinstance(texts, str):
+            texts = [texts]
+        batch_size = batch_size or self.batch_size
+        outputs = []
+        for start in range(0, len(texts), batch_size):
+            outputs.append(self._encode_batch(texts[start:start + batch_size]))
+        if not outputs:
+            dim = self.session.get_outputs()[0].shape[-1]
+            return np.zeros((0, dim if isinstance(dim, int) else 0), dtype=np.float32)
+        return np.vstack(outputs)
+
+    def _encode_batch(self, texts: List[str]) -> np.ndarray:
+        """对一个批次做分词、推理和池化"""
+        encodings = self.tokenizer.encode_batch(list(texts))
+        input_ids = np.array([e.ids for e in encodings], dtype=np.int64)
+        attention_mask = np.array([e.attention_mask for e in encodings], dtype=np.int64)
+        feeds = {'input_ids': input_ids, 'attention_mask': attention_mask}
+        if 'token_type_ids' in self.input_names:
+            feeds['token_type_ids'] = np.array([e.type_ids for e in encodings], dtype=np.int64)
+        feeds = {name: value for name, value in feeds.items() if name in self.input_names}
+
+        token_embeddings = self.session.run(None, feeds)[0]
+
+        if self.config['pooling'] == 'cls':
+            embeddings = token_embeddings[:, 0]
+        else:
+            mask = attention_mask[..., None].astype(np.float32)
+            embeddings = (token_embeddings * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+
+        if self.config['normalize']:
+            norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+            embeddings = embeddings / np.clip(norms, 1e-12, None)
+        return embeddings.astype(np.float32)
+
+    @classmethod
+    def from_pretrained(cls, model_dir: str, quantized: bool = False,
+                        source_model: Optional[str] = None, **kwargs) -> 'OnnxEmbeddingModel':
+        """
+        加载ONNX模型，缺失时从sentence-transformers模型导出（一次性，需要PyTorch）
+
+        Args:
+            model_dir: ONNX模型目录
+            quantized: 是否使用int8量化模型
+            source_model: 导出所用的sentence-transformers模型路径或名称
+        """
+        if not os.path.exists(os.path.join(model_dir, FP32_MODEL_FILE)):
+            if not source_model:
+                raise FileNotFoundError(f"ONNX模型不存在且未指定导出源: {model_dir}")
+            export_onnx_model(source_model, model_dir)
+        if quantized and not os.path.exists(os.path.join(model_dir, INT8_MODEL_FILE)):
+            quantize_onnx_model(model_dir)
+        return cls(model_dir, quantized=quantized, **kwargs)
+
+
+def export_onnx_model(source_model: Any, output_dir: str, opset_version: int = 14) -> str:
+    """
+    把sentence-transformers模型的Transformer部分导出为ONNX
+
+    Args:
+        source_model: SentenceTransformer实例，或其路径/名称
+        output_dir: 输出目录
+        opset_version: ONNX opset版本
+
+    Returns:
+        导出的ONNX文件路径
+    """
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    st_model = source_model
+    if not isinstance(st_model, SentenceTransformer):
+        st_model = SentenceTransformer(source_model, device='cpu')
+
+    transformer = st_model._first_module()
+    auto_model = transformer.auto_model.eval()
+    tokenizer = transformer.tokenizer
+
+    os.makedirs(output_dir, exist_ok=True)
+    tokenizer.save_pretrained(output_dir)
+
+    dummy = tokenizer(['旅游攻略 travel guide'], return_tensors='pt', padding=True)
+    input_names = [name for name in ('input_ids', 'attention_mask', 'token_type_ids') if name in dummy]
+
+    class _LastHiddenState(torch.nn.Module):
+        def __init__(self, model):
+            super().__init__()
+            self.model = model
+
+        def forward(self, *inputs):
+            return self.model(**dict(zip(input_names, inputs)))[0]
+
+    output_path = os.path.join(output_dir, FP32_MODEL_FILE)
+    dynamic_axes = {name: {0: 'batch', 1: 'sequence'} for name in input_names}
+    dynamic_axes['last_hidden_state'] = {0: 'batch', 1: 'sequence'}
+    with torch.no_grad():
+        torch.onnx.export(
+            _LastHiddenState(auto_model),
+            tuple(dummy[name] for name in input_names),
+            output_path,
+            input_names=input_names,
+            output_names=['last_hidden_state'],
+            dynamic_axes=dynamic_axes,
+            opset_version=opset_version,
+            do_constant_folding=True
+        )
+
+    # 保存池化/归一化方式，保证推理结果与原模型一致
+    pooling = 'mean'
+    normalize = False
+    for module in st_model._modules.values():
+        module_type = type(module).__name__
+        if module_type == 'Pooling' and getattr(module, 'pooling_mode_cls_token', False):
+            pooling = 'cls'
+        elif module_type == 'Normalize':
+            normalize = True
+    with open(os.path.join(output_dir, EMBEDDING_CONFIG_FILE), 'w', encoding='utf-8') as f:
+        json.dump({
+            'max_seq_length': int(st_model.max_seq_length or DEFAULT_EMBEDDING_CONFIG['max_seq_length']),
+            'pooling': pooling,
+            'normalize': normalize
+        }, f, ensure_ascii=False, indent=2)
+
+    logger.info(f"ONNX模型导出成功: {output_path}")
+    return output_path
+
+
+def quantize_onnx_model(model_dir: str) -> str:
+    """
+    对ONNX模型做int8动态量化（权重量化，激活值运行时量化）
+
+    Args:
+        model_dir: 包含model.onnx的目录
+
+    Returns:
+        量化后的模型路径
+    """
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    input_path = os.path.join(model_dir, FP32_MODEL_FILE)
+    output_path = os.path.join(model_dir, INT8_MODEL_FILE)
+    quantize_dynamic(input_path, output_path, weight_type=QuantType.QInt8)
+    logger.info(f"ONNX模型int8量化完成: {output_path}")
+    return output_path
+
+
+def main():
+    """命令行入口：导出并（可选）量化embedding模型"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description='导出ONNX embedding模型')
+    parser.add_argument('--source', required=True, help='sentence-transformers模型路径或名称')
+    parser.add_argument('--output', required=True, help='ONNX模型输出目录')
+    parser.add_argument('--quantize', action='store_true', help='同时生成int8量化模型')
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+
+    export_onnx_model(args.source, args.output)
+    if args.quantize:
+        quantize_onnx_model(args.output)
+
+
+if __name__ == '__main__':
+    main()
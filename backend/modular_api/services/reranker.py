@@ -0,0 +1,263 @@
+"""
+交叉编码器重排模块
+对向量检索的top-N候选逐对打分后重新排序，只在调用方显式开启时使用；
+每次请求有严格的耗时预算，预算不足时剩余候选保持向量检索的顺序
+"""
+
+import os
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from .search_cache import SearchResultCache
+from modular_api.utils.config import Config
+
+logger = logging.getLogger(__name__)
+
+
+class PairScoreCache:
+    """(查询哈希, 文档ID) -> 交叉编码器得分的LRU缓存，集合版本变化时整体失效"""
+
+    def __init__(self, max_entries: int = 10000):
+        self.max_entries = max(1, int(max_entries))
+        self._entries: OrderedDict = OrderedDict()
+        self._version: Optional[int] = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def sync_version(self, version: Optional[int]):
+        """集合内容变化后文档ID对应的文本可能已更新，清空旧得分"""
+        if version is None:
+            return
+        with self._lock:
+            if self._version is not None and version != self._version:
+                self._entries.clear()
+            self._version = version
+
+    def get(self, key: Tuple[str, str]) -> Optional[float]:
+        with self._lock:
+            score = self._entries.get(key)
+            if score is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return score
+
+    def put(self, key: Tuple[str, str], score: float):
+        with self._lock:
+            self._entries[key] = score
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+def query_hash(query: str) -> str:
+    """规范化后的查询文本哈希，作为得分缓存键的一部分"""
+    return hashlib.sha1(SearchResultCache.normalize_query(query).encode('utf-8')).hexdigest()[:16]
+
+
+class CrossEncoderReranker:
+    """交叉编码器重排器（模型在后台线程加载，加载完成前直接返回向量检索顺序）"""
+
+    def __init__(self, model=None, batch_size: int = 8, cache_entries: int = 10000):
+        """
+        Args:
+            model: 已加载的打分模型（需提供predict(pairs)），为None时调用start_loading加载本地模型
+            batch_size: 每批打分的候选数，预算按批检查
+            cache_entries: 得分缓存的最大条目数
+        """
+        self.model = model
+        self.batch_size = max(1, int(batch_size))
+        self.cache = PairScoreCache(cache_entries)
+        self.load_error = None
+        # 单个(查询, 文档)对的打分耗时估计（毫秒，指数滑动平均）
+        self.pair_ms: Optional[float] = None
+        self._ready_event = threading.Event()
+        self._load_thread = None
+        self._lock = threading.Lock()
+        self._stats = {
+            'requests': 0,
+            'applied': 0,
+            'budget_exhausted': 0,
+            'not_ready': 0,
+            'pairs_scored': 0,
+            'total_ms': 0.0
+        }
+        if model is not None:
+            self._ready_event.set()
+
+    def start_loading(self):
+        """在后台线程加载交叉编码器，调用方立即返回"""
+        with self._lock:
+            if self._load_thread is not None or self._ready_event.is_set():
+                return
+            self._load_thread = threading.Thread(target=self._load, name='reranker-load', daemon=True)
+            self._load_thread.start()
+        logger.info("交叉编码器开始后台加载")
+
+    def _load(self):
+        """加载本地交叉编码器（先按本地路径，再按模型名称从HuggingFace缓存加载）"""
+        started = time.perf_counter()
+        os.environ["TRANSFORMERS_OFFLINE"] = "1"
+        os.environ["HF_HUB_OFFLINE"] = "1"
+        try:
+            from sentence_transformers import CrossEncoder
+            try:
+                model = CrossEncoder(Config.RERANK_MODEL_PATH, max_length=Config.RERANK_MAX_LENGTH)
+            except Exception as e:
+                logger.warning(f"交叉编码器本地路径加载失败，尝试模型名称: {e}")
+                model = CrossEncoder(Config.RERANK_MODEL_NAME, max_length=Config.RERANK_MAX_LENGTH)
+            self.model = model
+            # 预热一批，得到初始的单对耗时估计，避免首个请求超出预算
+            self._predict([('预热', '预热')] * self.batch_size)
+            logger.info(f"交叉编码器加载成功，耗时{time.perf_counter() - started:.2f}s，"
+                        f"单对打分约{self.pair_ms:.2f}ms")
+        except Exception as e:
+            logger.error(f"交叉编码器加载失败，重排将回退到向量检索顺序: {e}")
+            self.model = None
+            self.load_error = str(e)
+        self._ready_event.set()
+
+    def is_ready(self) -> bool:
+        """模型是否已加载成功"""
+        return self._ready_event.is_set() and self.model is not None
+
+    def wait_until_ready(self, timeout=None) -> bool:
+        """阻塞等待加载结束，返回模型是否可用"""
+        self._ready_event.wait(timeout)
+        return self.is_ready()
+
+    def _predict(self, pairs: List[Tuple[str, str]]) -> List[float]:
+        """对一批(查询, 文档)打分，并更新单对耗时估计"""
+        started = time.perf_counter()
+        scores = self.model.predict(pairs)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        per_pair = elapsed_ms / max(1, len(pairs))
+        self.pair_ms = per_pair if self.pair_ms is None else 0.8 * self.pair_ms + 0.2 * per_pair
+        return [float(score) for score in scores]
+
+    def rerank(self, query: str, items: List[Dict[str, Any]], budget_ms: float,
+               version: Optional[int] = None) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+        """
+        在耗时预算内对候选重排
+
+        按向量检索顺序分批打分，预计下一批会超出预算时停止；
+        已打分的最长前缀按交叉编码器得分重排，其余候选保持原顺序接在后面
+
+        Args:
+            query: 查询文本
+            items: 向量检索结果（按相关度降序，需包含id和content）
+            budget_ms: 本次重排的耗时预算（毫秒）
+            version: 集合版本号，变化时清空得分缓存
+
+        Returns:
+            (重排后的结果列表, 重排信息)
+        """
+        started = time.perf_counter()
+        info = {
+            'applied': False,
+            'candidates': len(items),
+            'reranked': 0,
+            'scored': 0,
+            'cached': 0,
+            'budget_ms': budget_ms,
+            'budget_exhausted': False
+        }
+        if not items:
+            return items, self._finish(info, started)
+        if not self.is_ready():
+            info['reason'] = 'model_loading' if self.load_error is None else 'model_unavailable'
+            return items, self._finish(info, started)
+
+        self.cache.sync_version(version)
+        qhash = query_hash(query)
+        scores: List[Optional[float]] = []
+        for item in items:
+            score = self.cache.get((qhash, item['id']))
+            scores.append(score)
+            if score is not None:
+                info['cached'] += 1
+
+        missing = [i for i, score in enumerate(scores) if score is None]
+        for start in range(0, len(missing), self.batch_size):
+            batch = missing[start:start + self.batch_size]
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            if elapsed_ms + (self.pair_ms or 0.0) * len(batch) > budget_ms:
+                info['budget_exhausted'] = True
+                break
+            try:
+                batch_scores = self._predict([(query, items[i].get('content') or '') for i in batch])
+            except Exception as e:
+                logger.warning(f"交叉编码器打分失败，保持向量检索顺序: {e}")
+                info['reason'] = 'predict_failed'
+                break
+            for i, score in zip(batch, batch_scores):
+                scores[i] = score
+                self.cache.put((qhash, items[i]['id']), score)
+            info['scored'] += len(batch)
+
+        # 只重排连续打完分的前缀，未打分的候选不与已打分的比较
+        prefix = next((i for i, score in enumerate(scores) if score is None), len(items))
+        if prefix > 0:
+            head = sorted(range(prefix), key=lambda i: scores[i], reverse=True)
+            for i in head:
+                items[i]['rerank_score'] = round(scores[i], 6)
+            items = [items[i] for i in head] + items[prefix:]
+        info['reranked'] = prefix
+        info['applied'] = prefix > 0
+        return items, self._finish(info, started)
+
+    def _finish(self, info: Dict[str, Any], started: float) -> Dict[str, Any]:
+        """记录耗时并累计统计"""
+        info['elapsed_ms'] = round((time.perf_counter() - started) * 1000, 3)
+        with self._lock:
+            self._stats['requests'] += 1
+            self._stats['applied'] += int(info['applied'])
+            self._stats['budget_exhausted'] += int(info['budget_exhausted'])
+            self._stats['not_ready'] += int(info.get('reason') in ('model_loading', 'model_unavailable'))
+            self._stats['pairs_scored'] += info['scored']
+            self._stats['total_ms'] += info['elapsed_ms']
+        return info
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取重排统计"""
+        with self._lock:
+            stats = dict(self._stats)
+        requests = stats['requests']
+        lookups = self.cache.hits + self.cache.misses
+        stats.update({
+            'ready': self.is_ready(),
+            'error': self.load_error,
+            'model': Config.RERANK_MODEL_NAME if self.model is not None else None,
+            'pair_ms': round(self.pair_ms, 4) if self.pair_ms is not None else None,
+            'avg_ms': round(stats['total_ms'] / requests, 3) if requests else None,
+            'total_ms': round(stats['total_ms'], 3),
+            'cache_entries': len(self.cache),
+            'cache_hit_rate': round(self.cache.hits / lookups, 4) if lookups else None
+        })
+        return stats
+
+
+# 全局重排器实例
+_reranker = None
+_reranker_lock = threading.Lock()
+
+
+def get_reranker() -> CrossEncoderReranker:
+    """获取重排器实例（单例模式，首次调用时在后台开始加载模型）"""
+    global _reranker
+    if _reranker is None:
+        with _reranker_lock:
+            if _reranker is None:
+                _reranker = CrossEncoderReranker(batch_size=Config.RERANK_BATCH_SIZE,
+                                                 cache_entries=Config.RERANK_CACHE_MAX_ENTRIES)
+                _reranker.start_loading()
+    return _reranker
@@ -247,6 +247,8 @@ class ScraperService:
                 
                 # 处理爬取结果
                 if results:
+                    # 模型在后台预热，向量化之前需要等待加载完成
+                    self.model_service.wait_until_ready()
                     processed_data = self._process_scraped_data(results, task_data['user_id'])
                     
                     # 更新任务状态为完成
@@ -471,52 +473,62 @@ class ScraperService:
             处理后的数据
         """
         processed_data = []
+        raw_data = [item for item in raw_data if item.get('content')]
+        if not raw_data:
+            return processed_data
         
-        for item in raw_data:
-            try:
-                # 文本清洗
-                clean_text = self.model_service.clean_text(item['content'])
-                
-                # 生成向量嵌入
-                embedding = self.model_service.encode_text([clean_text])[0].tolist()
-                
-                # 准备向量存储文档
-                doc_id = f"doc_{int(time.time())}_{hash(clean_text) & 0xFFFFFFFF}"
-                metadata = {
-                    'user_id': user_id,
-                    'source': item.get('source', 'xiaohongshu'),
-                    'keyword': item.get('keyword', ''),
-                    'author': item.get('author', ''),
-                    'title': item.get('title', ''),
-                    'crawled_at': item.get('crawled_at', datetime.now().isoformat()),
-                    'processed_at': datetime.now().isoformat()
-                }
-                
-                # 添加到向量数据库
-                self.vector_service.collection.add(
-                    embeddings=[embedding],
-                    documents=[clean_text],
-                    metadatas=[metadata],
-                    ids=[doc_id]
-                )
-                
-                # 构建处理后的数据记录
-                processed_item = {
-                    'doc_id': doc_id,
-                    'title': item['title'],
-                    'content_preview': clean_text[:200] + '...' if len(clean_text) > 200 else clean_text,
-                    'keyword': item.get('keyword', ''),
-                    'source': item.get('source', 'xiaohongshu'),
-                    'vector_stored': True
-                }
-                
-                processed_data.append(processed_item)
-                logger.debug(f"数据向量化存储成功: doc_id={doc_id}")
-                
-            except Exception as e:
-                logger.error(f"处理爬取数据失败: {item.get('title', 'unknown')}, 错误: {str(e)}")
+        # 批量文本清洗（nlp.pipe）
+        clean_texts = self.model_service.clean_texts([item['content'] for item in raw_data])
+        
+        # 准备向量存储文档
+        doc_ids = []
+        metadatas = []
+        for item, clean_text in zip(raw_data, clean_texts):
+            doc_ids.append(f"doc_{int(time.time())}_{hash(clean_text) & 0xFFFFFFFF}")
+            metadatas.append({
+                'user_id': user_id,
+                'source': item.get('source', 'xiaohongshu'),
+                'keyword': item.get('keyword', ''),
+                'author': item.get('author', ''),
+                'title': item.get('title', ''),
+                'crawled_at': item.get('crawled_at', datetime.now().isoformat()),
+                'processed_at': datetime.now().isoformat()
+            })
+        
+        # 批量向量化并写入向量数据库，整批失败时逐条重试，避免一条坏数据拖垮整批
+        # 同一笔记被多个关键词或多次爬取时，近重复文档返回已有文档ID，不再重复向量化
+        try:
+            stored_ids = self.vector_service.add_documents(clean_texts, metadatas, ids=doc_ids, clean=False)
+        except Exception as e:
+            logger.warning(f"批量存储爬取数据失败，逐条重试: {str(e)}")
+            stored_ids = []
+            for item, clean_text, metadata, doc_id in zip(raw_data, clean_texts, metadatas, doc_ids):
+                try:
+                    stored_ids.extend(self.vector_service.add_documents([clean_text], [metadata], ids=[doc_id], clean=False))
+                except Exception as item_error:
+                    logger.error(f"处理爬取数据失败: {item.get('title', 'unknown')}, 错误: {str(item_error)}")
+                    stored_ids.append(None)
+        
+        duplicates = 0
+        for item, clean_text, doc_id, stored_id in zip(raw_data, clean_texts, doc_ids, stored_ids):
+            if stored_id is None:
+                continue
+            # 构建处理后的数据记录
+            record = {
+                'doc_id': stored_id,
+                'title': item.get('title', ''),
+                'content_preview': clean_text[:200] + '...' if len(clean_text) > 200 else clean_text,
+                'keyword': item.get('keyword', ''),
+                'source': item.get('source', 'xiaohongshu'),
+                'vector_stored': True
+            }
+            if stored_id != doc_id:
+                record['duplicate'] = True
+                duplicates += 1
+            processed_data.append(record)
+            logger.debug(f"数据向量化存储成功: doc_id={stored_id}")
         
-        logger.info(f"数据处理完成: 共处理{len(processed_data)}条数据")
+        logger.info(f"数据处理完成: 共处理{len(processed_data)}条数据, 其中近重复{duplicates}条")
         return processed_data
     
     def get_task_status(self, task_id: str) -> Optional[Dict]:
@@ -1121,10 +1133,16 @@ class ScraperService:
         logger.info("爬虫服务已停止")
 
 
-# 全局爬虫服务实例
-scraper_service = ScraperService()
+# 全局爬虫服务实例（延迟创建，避免导入路由时就加载模型和向量库）
+scraper_service = None
+_scraper_service_lock = threading.Lock()
 
 
 def get_scraper_service():
     """获取爬虫服务实例（单例模式）"""
+    global scraper_service
+    if scraper_service is None:
+        with _scraper_service_lock:
+            if scraper_service is None:
+                scraper_service = ScraperService()
     return scraper_service
\ No newline at end of file
@@ -0,0 +1,160 @@
+"""
+检索结果缓存模块
+以“集合版本 + 规范化查询 + 过滤条件 + 返回数量”为键的进程内LRU缓存；
+集合每次写入/删除都会递增版本号，旧结果自然失效，无需依赖TTL
+"""
+
+import copy
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class CollectionVersion:
+    """
+    集合版本计数器
+
+    保存在SQLite中，同一主机上的多个worker进程和导入工具共享同一个版本号
+    """
+
+    def __init__(self, db_path: str, name: str):
+        self.db_path = db_path
+        self.name = name
+        self._lock = threading.Lock()
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('''CREATE TABLE IF NOT EXISTS collection_versions
+                              (name TEXT PRIMARY KEY,
+                               version INTEGER NOT NULL DEFAULT 0,
+                               updated_at DATETIME DEFAULT CURRENT_TIMESTAMP)''')
+        self._conn.execute('INSERT OR IGNORE INTO collection_versions (name, version) VALUES (?, 0)', (name,))
+        self._conn.commit()
+
+    def get(self) -> int:
+        """当前版本号"""
+        with self._lock:
+            row = self._conn.execute('SELECT version FROM collection_versions WHERE name = ?',
+                                     (self.name,)).fetchone()
+        return row[0] if row else 0
+
+    def bump(self) -> int:
+        """递增版本号（集合内容发生变化时调用）"""
+        with self._lock:
+            self._conn.execute('''UPDATE collection_versions
+                                  SET version = version + 1, updated_at = CURRENT_TIMESTAMP
+                                  WHERE name = ?''', (self.name,))
+            self._conn.commit()
+            row = self._conn.execute('SELECT version FROM collection_versions WHERE name = ?',
+                                     (self.name,)).fetchone()
+        return row[0]
+
+
+class SearchResultCache:
+    """检索结果LRU缓存，统计命中率和节省的耗时"""
+
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max(1, int(max_entries))
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._version = None
+        self._stats = {
+            'hits': 0,
+            'misses': 0,
+            'invalidations': 0,
+            'evictions': 0,
+            'saved_ms': 0.0,
+            'miss_ms': 0.0
+        }
+
+    @staticmethod
+    def normalize_query(query: str) -> str:
+        """规范化查询：全半角统一、小写、合并空白"""
+        return ' '.join(unicodedata.normalize('NFKC', query or '').lower().split())
+
+    @classmethod
+    def make_key(cls, query: str, filters: Optional[Dict[str, Any]], limit: int, **options) -> str:
+        """构建缓存键（空值过滤条件与未传过滤条件等价）"""
+        clean_filters = {key: value for key, value in (filters or {}).items() if value}
+        return json.dumps([cls.normalize_query(query), clean_filters, int(limit), options],
+                          ensure_ascii=False, sort_keys=True, default=str)
+
+    def get(self, key: str, version: int) -> Optional[Dict[str, Any]]:
+        """
+        查询缓存
+
+        Args:
+            key: make_key生成的键
+            version: 当前集合版本
+
+        Returns:
+            缓存的结果副本，未命中返回None
+        """
+        started = time.perf_counter()
+        with self._lock:
+            self._sync_version(version)
+            entry = self._entries.get(key)
+            if entry is None:
+                self._stats['misses'] += 1
+                return None
+            self._entries.move_to_end(key)
+            result = copy.deepcopy(entry['result'])
+            lookup_ms = (time.perf_counter() - started) * 1000
+            self._stats['hits'] += 1
+            self._stats['saved_ms'] += max(0.0, entry['compute_ms'] - lookup_ms)
+            return result
+
+    def put(self, key: str, version: int, result: Dict[str, Any], compute_ms: float):
+        """
+        写入缓存
+
+        Args:
+            key: make_key生成的键
+            version: 计算结果时的集合版本
+            result: 检索结果
+            compute_ms: 计算结果的耗时（毫秒）
+        """
+        with self._lock:
+            self._sync_version(version)
+            if version != self._version:
+                return
+            self._stats['miss_ms'] += compute_ms
+            self._entries[key] = {'result': copy.deepcopy(result), 'compute_ms': compute_ms}
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats['evictions'] += 1
+
+    def _sync_version(self, version: int):
+        """版本变化时清空旧结果"""
+        if self._version is None:
+            self._version = version
+        elif version > self._version:
+            if self._entries:
+                self._stats['invalidations'] += 1
+            self._entries.clear()
+            self._version = version
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取命中率和节省的耗时"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['entries'] = len(self._entries)
+            stats['version'] = self._version
+        total = stats['hits'] + stats['misses']
+        stats['hit_rate'] = round(stats['hits'] / total, 4) if total else 0.0
+        stats['avg_miss_ms'] = round(stats['miss_ms'] / stats['misses'], 3) if stats['misses'] else None
+        stats['saved_ms'] = round(stats['saved_ms'], 3)
+        stats['miss_ms'] = round(stats['miss_ms'], 3)
+        stats['max_entries'] = self.max_entries
+        return stats
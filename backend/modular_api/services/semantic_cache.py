@@ -0,0 +1,212 @@
+"""
+语义回复缓存模块
+以用户意图的向量为键缓存大模型回复：同一路由类型、同一目的地下，
+措辞不同但含义相近的请求（余弦相似度不低于阈值）直接复用已生成的回复。
+条目按TTL过期，总数超过上限时淘汰最久未命中的条目
+"""
+
+import logging
+import threading
+import time
+import unicodedata
+from collections import OrderedDict, deque
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import numpy as np
+
+from modular_api.utils.config import Config
+from modular_api.utils.monitoring import percentile
+
+logger = logging.getLogger(__name__)
+
+# 相似度分布统计的分桶下界（最后一个桶为[0.99, 1.0]）
+SIMILARITY_BUCKETS = [0.0, 0.5, 0.6, 0.7, 0.8, 0.85, 0.9, 0.92, 0.95, 0.97, 0.99]
+
+
+def normalize_intent(text: str) -> str:
+    """规范化用户意图：全半角统一、小写、标点替换为空白并合并空白"""
+    text = unicodedata.normalize('NFKC', text or '').lower()
+    text = ''.join(' ' if unicodedata.category(char).startswith('P') else char for char in text)
+    return ' '.join(text.split())
+
+
+def make_scope(route_type: str, destination: str = '') -> Tuple[str, str]:
+    """缓存作用域：只在相同路由类型、相同目的地的条目之间比较相似度"""
+    return route_type or '', ''.join(unicodedata.normalize('NFKC', destination or '').split()).lower()
+
+
+class SemanticResponseCache:
+    """按作用域分组的语义缓存（向量在写入时归一化，查询为一次矩阵乘法）"""
+
+    def __init__(self, threshold: float = 0.92, ttl_seconds: float = 3600, max_entries: int = 2000,
+                 clock: Callable[[], float] = time.time):
+        """
+        Args:
+            threshold: 命中所需的最低余弦相似度
+            ttl_seconds: 条目有效期（秒）
+            max_entries: 条目总数上限，超出时按LRU淘汰
+            clock: 时间函数（测试时可替换）
+        """
+        self.threshold = float(threshold)
+        self.ttl_seconds = float(ttl_seconds)
+        self.max_entries = max(1, int(max_entries))
+        self.clock = clock
+        # 条目ID -> 条目，顺序即LRU顺序；作用域 -> 条目ID集合
+        self._entries: "OrderedDict[int, Dict[str, Any]]" = OrderedDict()
+        self._scopes: Dict[Tuple[str, str], Dict[int, None]] = {}
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self._similarities = deque(maxlen=1000)
+        self._histogram = [0] * len(SIMILARITY_BUCKETS)
+        self._stats = {
+            'lookups': 0,
+            'hits': 0,
+            'misses': 0,
+            'empty_scope': 0,
+            'stores': 0,
+            'expirations': 0,
+            'evictions': 0
+        }
+
+    @staticmethod
+    def _unit(vector) -> np.ndarray:
+        vector = np.asarray(vector, dtype=np.float32).ravel()
+        norm = float(np.linalg.norm(vector))
+        return vector / norm if norm > 0 else vector
+
+    def lookup(self, vector, scope: Tuple[str, str]) -> Optional[Dict[str, Any]]:
+        """
+        查找作用域内最相似且未过期的条目
+
+        Args:
+            vector: 规范化意图的向量
+            scope: make_scope生成的作用域
+
+        Returns:
+            命中时返回 {'response', 'intent', 'similarity'}，否则返回None
+        """
+        query = self._unit(vector)
+        with self._lock:
+            self._stats['lookups'] += 1
+            self._expire_scope(scope)
+            entry_ids = list(self._scopes.get(scope, ()))
+            if not entry_ids:
+                self._stats['misses'] += 1
+                self._stats['empty_scope'] += 1
+                return None
+
+            matrix = np.vstack([self._entries[entry_id]['vector'] for entry_id in entry_ids])
+            similarities = matrix @ query
+            best = int(np.argmax(similarities))
+            similarity = float(similarities[best])
+            self._record_similarity(similarity)
+            if similarity < self.threshold:
+                self._stats['misses'] += 1
+                return None
+
+            entry_id = entry_ids[best]
+            entry = self._entries[entry_id]
+            self._entries.move_to_end(entry_id)
+            entry['hits'] += 1
+            self._stats['hits'] += 1
+            return {'response': entry['response'], 'intent': entry['intent'], 'similarity': round(similarity, 4)}
+
+    def put(self, vector, scope: Tuple[str, str], intent: str, response: str):
+        """
+        写入一条回复
+
+        Args:
+            vector: 规范化意图的向量
+            scope: make_scope生成的作用域
+            intent: 规范化后的意图文本（用于排查）
+            response: 大模型生成的完整回复
+        """
+        if not response:
+            return
+        with self._lock:
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = {
+                'vector': self._unit(vector),
+                'scope': scope,
+                'intent': intent,
+                'response': response,
+                'created_at': self.clock(),
+                'hits': 0
+            }
+            self._scopes.setdefault(scope, {})[entry_id] = None
+            self._stats['stores'] += 1
+            while len(self._entries) > self.max_entries:
+                oldest_id = next(iter(self._entries))
+                self._remove(oldest_id)
+                self._stats['evictions'] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._scopes.clear()
+
+    def _expire_scope(self, scope: Tuple[str, str]):
+        """删除作用域内已过期的条目（查询时惰性清理）"""
+        deadline = self.clock() - self.ttl_seconds
+        for entry_id in [entry_id for entry_id in self._scopes.get(scope, ())
+                         if self._entries[entry_id]['created_at'] <= deadline]:
+            self._remove(entry_id)
+            self._stats['expirations'] += 1
+
+    def _remove(self, entry_id: int):
+        entry = self._entries.pop(entry_id)
+        scope_entries = self._scopes.get(entry['scope'])
+        if scope_entries is not None:
+            scope_entries.pop(entry_id, None)
+            if not scope_entries:
+                del self._scopes[entry['scope']]
+
+    def _record_similarity(self, similarity: float):
+        """记录每次查询的最高相似度，用于调整阈值"""
+        self._similarities.append(similarity)
+        for index in range(len(SIMILARITY_BUCKETS) - 1, -1, -1):
+            if similarity >= SIMILARITY_BUCKETS[index]:
+                self._histogram[index] += 1
+                break
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取命中率、条目数和最高相似度的分布"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['entries'] = len(self._entries)
+            stats['scopes'] = len(self._scopes)
+            similarities = list(self._similarities)
+            histogram = list(self._histogram)
+        stats['hit_rate'] = round(stats['hits'] / stats['lookups'], 4) if stats['lookups'] else 0.0
+        stats['threshold'] = self.threshold
+        stats['ttl_seconds'] = self.ttl_seconds
+        stats['max_entries'] = self.max_entries
+        stats['similarity_p50'] = percentile(similarities, 0.5, digits=4)
+        stats['similarity_p90'] = percentile(similarities, 0.9, digits=4)
+        # 阈值以下但相似度较高的查询数，阈值偏高时这个数会很大
+        stats['near_misses'] = sum(1 for value in similarities if self.threshold - 0.05 <= value < self.threshold)
+        stats['similarity_histogram'] = {
+            f"{low:.2f}-{SIMILARITY_BUCKETS[index + 1] if index + 1 < len(SIMILARITY_BUCKETS) else 1.0:.2f}": count
+            for index, (low, count) in enumerate(zip(SIMILARITY_BUCKETS, histogram))
+        }
+        return stats
+
+
+# 全局语义缓存实例
+_semantic_cache = None
+_semantic_cache_lock = threading.Lock()
+
+
+def get_semantic_cache() -> SemanticResponseCache:
+    """获取语义回复缓存实例（单例模式）"""
+    global _semantic_cache
+    if _semantic_cache is None:
+        with _semantic_cache_lock:
+            if _semantic_cache is None:
+                _semantic_cache = SemanticResponseCache(
+                    threshold=Config.SEMANTIC_CACHE_THRESHOLD,
+                    ttl_seconds=Config.SEMANTIC_CACHE_TTL,
+                    max_entries=Config.SEMANTIC_CACHE_MAX_ENTRIES
+                )
+    return _semantic_cache
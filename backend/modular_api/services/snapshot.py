@@ -0,0 +1,313 @@
+"""
+向量存储快照模块
+把集合（ID、向量、文本、元数据）导出为列式npz文件，并按大批量导入任意后端：
+- 新节点启动时直接加载快照，不需要重新向量化
+- 在线备份：导出前后检查集合版本号，期间有写入则重试，保证快照对应同一个版本
+
+文件布局（均为numpy数组，不使用pickle）：
+- manifest: JSON清单（格式版本、集合、条目数、维度、存储配置、向量空间、向量校验和）
+- embeddings: float32矩阵 (N, dim)
+- ids / documents / metadatas: UTF-8拼接后的字节数组 + 偏移数组（*_data, *_offsets），
+  documents另有documents_null标记原本为None的文本
+"""
+
+import hashlib
+import json
+import logging
+import os
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .vector_backend import NumpyBackend, VectorBackend
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_FORMAT_VERSION = 1
+# 导入时必须一致的清单字段，否则快照中的向量与本节点的查询向量不在同一空间
+COMPATIBILITY_FIELDS = ('profile', 'vector_space', 'dim')
+
+
+class SnapshotError(Exception):
+    """快照文件损坏、版本不支持或与当前向量配置不兼容"""
+    pass
+
+
+def describe_vector_space(profile_name: str) -> Dict[str, Any]:
+    """
+    当前配置的向量空间描述（写入快照清单，导入时用于兼容性检查）
+
+    哈希向量化与transformer向量不可混用；ONNX与PyTorch使用同一模型，视为同一空间
+    """
+    from modular_api.utils.config import Config
+
+    backend = Config.EMBEDDING_BACKEND.lower()
+    return {
+        'profile': profile_name,
+        'vector_space': 'hashing' if backend == 'hashing' else Config.EMBEDDING_MODEL_NAME
+    }
+
+
+def _pack_strings(values: Sequence[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """字符串列表 -> (UTF-8字节拼接, 偏移数组)"""
+    encoded = [value.encode('utf-8') for value in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    if encoded:
+        np.cumsum([len(item) for item in encoded], out=offsets[1:])
+    return np.frombuffer(b''.join(encoded), dtype=np.uint8), offsets
+
+
+def _unpack_strings(data: np.ndarray, offsets: np.ndarray) -> List[str]:
+    """_pack_strings的逆操作"""
+    raw = data.tobytes()
+    bounds = offsets.tolist()
+    return [raw[bounds[i]:bounds[i + 1]].decode('utf-8') for i in range(len(bounds) - 1)]
+
+
+def _checksum(embeddings: np.ndarray) -> str:
+    return hashlib.sha256(np.ascontiguousarray(embeddings).tobytes()).hexdigest()
+
+
+def _read_collection(backend: VectorBackend, batch_size: int) -> Dict[str, Any]:
+    """分页读出集合全部条目"""
+    ids, documents, metadatas, embeddings = [], [], [], []
+    offset = 0
+    while True:
+        page = backend.get(offset=offset, limit=batch_size, include=['embeddings', 'documents', 'metadatas'])
+        if len(page['ids']) == 0:
+            break
+        ids.extend(page['ids'])
+        documents.extend(page['documents'] if page.get('documents') is not None else [None] * len(page['ids']))
+        metadatas.extend(page['metadatas'] if page.get('metadatas') is not None else [{}] * len(page['ids']))
+        embeddings.append(np.asarray(page['embeddings'], dtype=np.float32))
+        offset += len(page['ids'])
+        if len(page['ids']) < batch_size:
+            break
+    return {'ids': ids, 'documents': documents, 'metadatas': metadatas, 'embeddings': embeddings}
+
+
+def export_snapshot(backend: VectorBackend, path: str, manifest: Optional[Dict[str, Any]] = None,
+                    collection_version=None, batch_size: int = 5000, max_attempts: int = 3,
+                    compress: bool = False) -> Dict[str, Any]:
+    """
+    导出集合快照（先写临时文件再原子替换，导出失败不会破坏已有快照）
+
+    Args:
+        backend: 向量存储后端
+        path: 快照文件路径（.npz）
+        manifest: 附加到清单的字段（集合名、存储配置、向量空间等）
+        collection_version: 集合版本号（CollectionVersion），提供时保证导出期间没有写入
+        batch_size: 每页读取的条目数
+        max_attempts: 导出期间有写入时的最大尝试次数
+        compress: 是否压缩（float32向量压缩率很低，默认不压缩以换取速度）
+
+    Returns:
+        快照清单
+    """
+    started = time.perf_counter()
+    for attempt in range(1, max_attempts + 1):
+        version = collection_version.get() if collection_version is not None else None
+        data = _read_collection(backend, batch_size)
+        if collection_version is None or collection_version.get() == version:
+            break
+        logger.warning(f"导出期间集合有写入，重新导出（第{attempt}次）")
+    else:
+        raise SnapshotError(f"集合持续写入，{max_attempts}次尝试均未得到一致的快照")
+
+    embeddings = np.concatenate(data['embeddings']) if data['embeddings'] else np.zeros((0, 0), np.float32)
+    info = dict(manifest or {})
+    info.update({
+        'format_version': SNAPSHOT_FORMAT_VERSION,
+        'count': len(data['ids']),
+        'dim': int(embeddings.shape[1]) if len(embeddings) else None,
+        'collection_version': version,
+        'embeddings_sha256': _checksum(embeddings),
+        'created_at': datetime.utcnow().isoformat() + 'Z'
+    })
+
+    ids_data, ids_offsets = _pack_strings(data['ids'])
+    documents_null = np.array([document is None for document in data['documents']], dtype=bool)
+    documents_data, documents_offsets = _pack_strings([document or '' for document in data['documents']])
+    metadatas_data, metadatas_offsets = _pack_strings(
+        [json.dumps(metadata or {}, ensure_ascii=False) for metadata in data['metadatas']])
+
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    save = np.savez_compressed if compress else np.savez
+    with open(tmp_path, 'wb') as f:
+        save(f,
+             manifest=np.frombuffer(json.dumps(info, ensure_ascii=False).encode('utf-8'), dtype=np.uint8),
+             embeddings=embeddings,
+             ids_data=ids_data, ids_offsets=ids_offsets,
+             documents_data=documents_data, documents_offsets=documents_offsets, documents_null=documents_null,
+             metadatas_data=metadatas_data, metadatas_offsets=metadatas_offsets)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+    elapsed = time.perf_counter() - started
+    logger.info(f"快照导出完成: {path}, {info['count']} 条, 耗时{elapsed:.2f}s")
+    return info
+
+
+def read_manifest(path: str) -> Dict[str, Any]:
+    """只读取快照清单（npz按成员懒加载，不会读入向量）"""
+    try:
+        with np.load(path, allow_pickle=False) as archive:
+            return json.loads(archive['manifest'].tobytes().decode('utf-8'))
+    except (OSError, KeyError, ValueError) as e:
+        raise SnapshotError(f"无法读取快照清单 {path}: {e}")
+
+
+def load_snapshot(path: str, verify: bool = True) -> Dict[str, Any]:
+    """
+    读取快照
+
+    Args:
+        path: 快照文件路径
+        verify: 是否校验向量的sha256
+
+    Returns:
+        {'manifest', 'ids', 'embeddings', 'documents', 'metadatas'}
+    """
+    try:
+        with np.load(path, allow_pickle=False) as archive:
+            manifest = json.loads(archive['manifest'].tobytes().decode('utf-8'))
+            if manifest.get('format_version') != SNAPSHOT_FORMAT_VERSION:
+                raise SnapshotError(f"不支持的快照格式版本: {manifest.get('format_version')}")
+            embeddings = archive['embeddings']
+            ids = _unpack_strings(archive['ids_data'], archive['ids_offsets'])
+            documents = _unpack_strings(archive['documents_data'], archive['documents_offsets'])
+            for index in np.flatnonzero(archive['documents_null']):
+                documents[index] = None
+            metadatas = [json.loads(item) for item in
+                         _unpack_strings(archive['metadatas_data'], archive['metadatas_offsets'])]
+    except SnapshotError:
+        raise
+    except (OSError, KeyError, ValueError) as e:
+        raise SnapshotError(f"快照文件损坏 {path}: {e}")
+
+    if len(ids) != manifest['count'] or len(embeddings) != manifest['count']:
+        raise SnapshotError(f"快照条目数与清单不一致: {path}")
+    if verify and _checksum(embeddings) != manifest['embeddings_sha256']:
+        raise SnapshotError(f"快照向量校验失败: {path}")
+    return {'manifest': manifest, 'ids': ids, 'embeddings': embeddings,
+            'documents': documents, 'metadatas': metadatas}
+
+
+def check_compatible(manifest: Dict[str, Any], expected: Dict[str, Any]):
+    """检查快照与当前向量配置是否兼容，不兼容时抛出SnapshotError"""
+    for field in COMPATIBILITY_FIELDS:
+        if expected.get(field) is None or manifest.get(field) is None:
+            continue
+        if manifest[field] != expected[field]:
+            raise SnapshotError(f"快照{field}={manifest[field]}与当前配置{expected[field]}不一致")
+
+
+def import_snapshot(backend: VectorBackend, path: str, expected: Optional[Dict[str, Any]] = None,
+                    batch_size: int = 5000) -> int:
+    """
+    把快照批量写入后端（upsert，可重复执行）
+
+    Args:
+        backend: 目标后端
+        path: 快照文件路径
+        expected: 当前向量配置（profile、vector_space、dim），不一致时拒绝导入
+        batch_size: 每批写入的条目数（ChromaDB单批上限约5000）
+
+    Returns:
+        导入的条目数
+    """
+    started = time.perf_counter()
+    snapshot = load_snapshot(path)
+    check_compatible(snapshot['manifest'], expected or {})
+
+    # NumPy后端直接接收矩阵切片，其他后端（ChromaDB）需要列表
+    native = isinstance(backend, NumpyBackend)
+    ids, embeddings = snapshot['ids'], snapshot['embeddings']
+    for start in range(0, len(ids), batch_size):
+        end = start + batch_size
+        batch = embeddings[start:end]
+        backend.upsert(ids=ids[start:end], embeddings=batch if native else batch.tolist(),
+                       documents=snapshot['documents'][start:end], metadatas=snapshot['metadatas'][start:end])
+
+    elapsed = time.perf_counter() - started
+    logger.info(f"快照导入完成: {path}, {len(ids)} 条, 耗时{elapsed:.2f}s "
+                f"({len(ids) / max(elapsed, 1e-9):.0f} 条/秒)")
+    return len(ids)
+
+
+def clear_collection(backend: VectorBackend, batch_size: int = 5000) -> int:
+    """删除集合全部条目（导入前替换整个集合时使用）"""
+    removed = 0
+    while True:
+        page = backend.get(limit=batch_size, include=[])
+        if len(page['ids']) == 0:
+            return removed
+        backend.delete(ids=page['ids'])
+        removed += len(page['ids'])
+
+
+def main():
+    """命令行入口：导出、导入快照，查看快照清单"""
+    import argparse
+
+    from modular_api.services.collection_manager import get_collection_manager
+    from modular_api.services.dedup import NearDuplicateIndex, default_index_path as default_dedup_path
+    from modular_api.services.lexical_index import LexicalIndex, default_index_path
+    from modular_api.services.search_cache import CollectionVersion
+    from modular_api.services.vector_backend import create_configured_backend
+    from modular_api.utils.config import Config
+
+    parser = argparse.ArgumentParser(description='向量存储快照工具（导出、导入、查看）')
+    parser.add_argument('command', choices=['export', 'import', 'info'],
+                        help='export: 在线导出当前集合; import: 把快照写入当前集合; info: 查看快照清单')
+    parser.add_argument('path', help='快照文件路径（.npz）')
+    parser.add_argument('--collection', default='travel_guides', help='集合名称')
+    parser.add_argument('--replace', action='store_true', help='导入前清空集合')
+    parser.add_argument('--compress', action='store_true', help='导出时压缩')
+    parser.add_argument('--batch-size', type=int, default=Config.SNAPSHOT_BATCH_SIZE, help='每批读写的条目数')
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+
+    if args.command == 'info':
+        print(json.dumps(read_manifest(args.path), ensure_ascii=False, indent=2))
+        return
+
+    backend = create_configured_backend(get_collection_manager(Config.CHROMA_PATH), args.collection)
+    version = CollectionVersion(os.path.join(Config.CHROMA_PATH, 'collection_versions.sqlite3'), args.collection)
+    vector_space = describe_vector_space(Config.VECTOR_STORAGE_PROFILE)
+
+    if args.command == 'export':
+        manifest = dict(vector_space, collection=args.collection)
+        info = export_snapshot(backend, args.path, manifest, version, args.batch_size, compress=args.compress)
+        print(json.dumps(info, ensure_ascii=False, indent=2))
+        return
+
+    if args.replace:
+        print(f"已清空集合: {clear_collection(backend, args.batch_size)} 条")
+    total = import_snapshot(backend, args.path, vector_space, args.batch_size)
+
+    # 派生索引随集合重建，并通知API进程的检索缓存失效
+    if Config.HYBRID_SEARCH_ENABLED:
+        index = LexicalIndex(Config.LEXICAL_INDEX_PATH or default_index_path(Config.CHROMA_PATH, args.collection))
+        index.clear()
+        index.rebuild_from_collection(backend)
+    if Config.DEDUP_ENABLED:
+        index = NearDuplicateIndex(Config.DEDUP_INDEX_PATH or default_dedup_path(Config.CHROMA_PATH, args.collection),
+                                   Config.DEDUP_MAX_DISTANCE)
+        index.clear()
+        index.rebuild_from_collection(backend)
+    version.bump()
+    print(f"快照导入完成: {args.path} -> {args.collection}, {total} 条")
+
+
+if __name__ == '__main__':
+    main()
@@ -4,48 +4,255 @@
 """
 
 import os
+import json
 import logging
-import chromadb
+import threading
+import time
 from typing import List, Dict, Any, Optional, Tuple
 import numpy as np
 
 from .model import get_model_service
+from .vector_profile import StorageProfile
+from .chunker import TextChunker, join_passages
+from .collection_manager import get_collection_manager
+from .vector_backend import VectorBackend, create_configured_backend
+from .lexical_index import LexicalIndex, default_index_path
+from .search_cache import CollectionVersion, SearchResultCache
+from .mmr import mmr_select
+from .reranker import get_reranker
+from .dedup import NearDuplicateIndex, default_index_path as default_dedup_path
+from .snapshot import SnapshotError, describe_vector_space, export_snapshot, import_snapshot
 from modular_api.utils.config import Config
 
 logger = logging.getLogger(__name__)
 
+COLLECTION_NAME = "travel_guides"
+COLLECTION_METADATA = {"description": "旅游攻略向量数据库"}
+
+# 构造参数的默认值：按全局配置创建对应组件（显式传入None表示不使用该组件）
+_FROM_CONFIG = object()
+
 class VectorService:
     """向量数据库服务类"""
     
-    def __init__(self):
-        self.client = None
-        self.collection = None
-        self.model_service = None
+    def __init__(self, model_service=_FROM_CONFIG, collection_manager=_FROM_CONFIG,
+                 collection_name: Optional[str] = None, profile: Optional[StorageProfile] = None,
+                 backend=_FROM_CONFIG, chunker=_FROM_CONFIG, lexical_index=_FROM_CONFIG,
+                 dedup_index=_FROM_CONFIG, search_cache=_FROM_CONFIG, collection_version=_FROM_CONFIG,
+                 reranker: Optional[Any] = None):
+        """
+        Args:
+            model_service: 模型服务，默认取全局实例
+            collection_manager: ChromaDB集合管理器，默认取Config.CHROMA_PATH对应的共享实例
+            collection_name: 集合名，默认由向量存储配置推导
+            profile: 向量存储配置，默认按Config.VECTOR_STORAGE_PROFILE加载
+            backend: 向量存储后端，默认按配置创建；为None时直接使用ChromaDB集合
+            chunker: 分段器，默认按Config.CHUNK_ENABLED创建
+            lexical_index: 词法索引，默认按Config.HYBRID_SEARCH_ENABLED打开
+            dedup_index: 入库近重复索引，默认按Config.DEDUP_ENABLED打开
+            search_cache: 检索结果缓存，与collection_version都未传入时按Config.SEARCH_CACHE_ENABLED创建
+            collection_version: 检索结果缓存依赖的集合版本号
+            reranker: 交叉编码器重排器（为None时首次按请求重排时取全局实例）
+        """
+        self.collection_manager = collection_manager
+        self.collection_name = collection_name
+        self.profile = profile
+        self.chunker = chunker
+        # 向量存储后端（为None时直接使用ChromaDB集合）
+        self.backend = backend
+        self.lexical_index = lexical_index
+        # 检索结果缓存及其依赖的集合版本号（未启用时为None）
+        self.search_cache = search_cache
+        self.collection_version = collection_version
+        # 入库近重复索引（未启用时为None）
+        self.dedup_index = dedup_index
+        self.reranker = reranker
+        self.model_service = model_service
         self._initialize()
     
     def _initialize(self):
-        """初始化向量数据库服务"""
+        """初始化向量数据库服务（只创建构造时没有传入的依赖）"""
         try:
-            # 初始化ChromaDB客户端
-            self.client = chromadb.PersistentClient(path=Config.CHROMA_PATH)
-            logger.info(f"ChromaDB客户端初始化成功，路径: {Config.CHROMA_PATH}")
+            # 进程内共享的ChromaDB客户端和集合句柄
+            if self.collection_manager is _FROM_CONFIG:
+                self.collection_manager = get_collection_manager(Config.CHROMA_PATH)
+            
+            # 加载向量存储配置（降维配置使用单独的集合）
+            if self.profile is None:
+                self.profile = self._load_profile()
+            if self.collection_name is None:
+                self.collection_name = self.profile.collection_name(COLLECTION_NAME)
+            
+            if self.chunker is _FROM_CONFIG:
+                self.chunker = (TextChunker(Config.CHUNK_MAX_TOKENS, Config.CHUNK_OVERLAP_TOKENS)
+                                if Config.CHUNK_ENABLED else None)
+            
+            # 向量存储后端
+            if self.backend is _FROM_CONFIG:
+                self.backend = self._create_backend()
+                logger.info(f"向量存储后端: {self.backend.name}, 条目数: {self.backend.count()}")
+            
+            # 新节点从快照加载数据（在派生索引之前，词法/近重复索引会从集合自动回填）
+            snapshot_loaded = Config.SNAPSHOT_LOAD_ON_STARTUP and self._load_startup_snapshot()
+            
+            # 词法索引（混合检索）
+            if self.lexical_index is _FROM_CONFIG:
+                self.lexical_index = self._load_lexical_index() if Config.HYBRID_SEARCH_ENABLED else None
+            
+            # 入库近重复检测
+            if self.dedup_index is _FROM_CONFIG:
+                self.dedup_index = self._load_dedup_index() if Config.DEDUP_ENABLED else None
             
-            # 获取或创建集合
-            self.collection = self.client.get_or_create_collection(
-                name="travel_guides",
-                metadata={"description": "旅游攻略向量数据库"}
-            )
-            logger.info(f"ChromaDB集合获取成功: travel_guides")
+            # 检索结果缓存（按集合版本失效）
+            if self.search_cache is _FROM_CONFIG and self.collection_version is _FROM_CONFIG:
+                self.search_cache = self.collection_version = None
+                if Config.SEARCH_CACHE_ENABLED:
+                    self._init_search_cache()
+            else:
+                if self.search_cache is _FROM_CONFIG:
+                    self.search_cache = None
+                if self.collection_version is _FROM_CONFIG:
+                    self.collection_version = None
+            if snapshot_loaded:
+                self._bump_version()
             
             # 获取模型服务
-            self.model_service = get_model_service()
-            logger.info("模型服务获取成功")
+            if self.model_service is _FROM_CONFIG:
+                self.model_service = get_model_service()
+                logger.info("模型服务获取成功")
             
         except Exception as e:
             logger.error(f"向量数据库服务初始化失败: {str(e)}")
             raise
     
-    def search_similar(self, query: str, limit: int = 5, filters: Optional[Dict] = None) -> Dict[str, Any]:
+    @property
+    def client(self):
+        """共享的ChromaDB客户端"""
+        return self.collection_manager.get_client()
+    
+    @property
+    def collection(self):
+        """当前向量存储后端（接口与ChromaDB集合一致；默认为集合管理器缓存的共享集合句柄）"""
+        if self.backend is not None:
+            return self.backend
+        return self.collection_manager.get_collection(self.collection_name, metadata=COLLECTION_METADATA)
+    
+    def _create_backend(self) -> VectorBackend:
+        """按配置创建向量存储后端（ChromaDB集合会预先打开，首个请求不再承担冷启动开销）"""
+        return create_configured_backend(self.collection_manager, self.collection_name, COLLECTION_METADATA)
+    
+    def _load_profile(self) -> StorageProfile:
+        """加载向量存储配置，PCA投影不可用时回退到float32"""
+        try:
+            profile = StorageProfile.from_config(Config.VECTOR_STORAGE_PROFILE, Config.VECTOR_PCA_PATH)
+            logger.info(f"向量存储配置: {profile.name}")
+            return profile
+        except Exception as e:
+            logger.error(f"向量存储配置{Config.VECTOR_STORAGE_PROFILE}加载失败，回退到float32: {str(e)}")
+            return StorageProfile('float32')
+    
+    def _load_lexical_index(self) -> Optional[LexicalIndex]:
+        """打开与集合并列存放的词法索引，索引为空而集合有数据时自动回填"""
+        try:
+            path = Config.LEXICAL_INDEX_PATH or default_index_path(Config.CHROMA_PATH, self.collection_name)
+            index = LexicalIndex(path)
+            if index.count() == 0 and self.collection.count() > 0:
+                logger.info("词法索引为空，从ChromaDB集合回填")
+                index.rebuild_from_collection(self.collection)
+            return index
+        except Exception as e:
+            logger.error(f"词法索引初始化失败，仅使用向量检索: {str(e)}")
+            return None
+    
+    def _load_dedup_index(self) -> Optional[NearDuplicateIndex]:
+        """打开近重复索引，索引为空而集合有数据时自动回填"""
+        try:
+            path = Config.DEDUP_INDEX_PATH or default_dedup_path(Config.CHROMA_PATH, self.collection_name)
+            index = NearDuplicateIndex(path, Config.DEDUP_MAX_DISTANCE)
+            if index.count() == 0 and self.collection.count() > 0:
+                logger.info("近重复索引为空，从ChromaDB集合回填")
+                index.rebuild_from_collection(self.collection)
+            return index
+        except Exception as e:
+            logger.error(f"近重复索引初始化失败，入库不做查重: {str(e)}")
+            return None
+    
+    def _snapshot_manifest(self) -> Dict[str, Any]:
+        """快照清单中描述当前集合和向量空间的字段"""
+        manifest = describe_vector_space(self.profile.name)
+        manifest['collection'] = self.collection_name
+        if self.profile.target_dim:
+            manifest['dim'] = self.profile.target_dim
+        return manifest
+    
+    def _load_startup_snapshot(self) -> bool:
+        """集合为空且配置的快照存在时导入快照，成功返回True"""
+        path = Config.SNAPSHOT_PATH
+        if not path or not os.path.exists(path):
+            logger.warning(f"启动快照不存在，跳过加载: {path}")
+            return False
+        if self.collection.count() > 0:
+            logger.info("集合已有数据，跳过启动快照加载")
+            return False
+        try:
+            total = import_snapshot(self.collection, path, self._snapshot_manifest(), Config.SNAPSHOT_BATCH_SIZE)
+            return total > 0
+        except SnapshotError as e:
+            logger.error(f"启动快照加载失败，集合保持为空: {str(e)}")
+            return False
+    
+    def export_snapshot(self, path: str) -> Dict[str, Any]:
+        """
+        在线导出当前集合快照（导出期间有写入时按集合版本号重试）
+        
+        Args:
+            path: 快照文件路径（.npz）
+        
+        Returns:
+            快照清单
+        """
+        return export_snapshot(self.collection, path, self._snapshot_manifest(), self.collection_version,
+                               Config.SNAPSHOT_BATCH_SIZE)
+    
+    def _init_search_cache(self):
+        """初始化检索结果缓存，版本号与Chroma数据放在同一目录，导入工具写入后API进程也能感知"""
+        try:
+            self.collection_version = CollectionVersion(
+                os.path.join(Config.CHROMA_PATH, 'collection_versions.sqlite3'), self.collection_name)
+            self.search_cache = SearchResultCache(Config.SEARCH_CACHE_MAX_ENTRIES)
+        except Exception as e:
+            logger.error(f"检索结果缓存初始化失败，不使用缓存: {str(e)}")
+            self.collection_version = None
+            self.search_cache = None
+    
+    def _bump_version(self):
+        """集合内容变化后递增版本号，使已缓存的检索结果失效"""
+        if self.collection_version is None:
+            return
+        try:
+            self.collection_version.bump()
+        except Exception as e:
+            logger.warning(f"集合版本号更新失败，清空本进程检索缓存: {str(e)}")
+            self.search_cache = SearchResultCache(self.search_cache.max_entries) if self.search_cache else None
+    
+    def embed_texts(self, texts: List[str]) -> List[List[float]]:
+        """
+        向量化文本并按存储配置变换（入库和查询共用，保证两侧一致）
+        
+        Args:
+            texts: 已清洗的文本列表
+        
+        Returns:
+            可直接写入ChromaDB的向量列表
+        """
+        embeddings = self.model_service.encode_text(texts)
+        if not self.profile.is_identity:
+            embeddings = self.profile.transform(embeddings)
+        return embeddings.tolist()
+    
+    def search_similar(self, query: str, limit: int = 5, filters: Optional[Dict] = None,
+                       diversify: Optional[bool] = None, mmr_lambda: Optional[float] = None,
+                       rerank: Optional[bool] = None, rerank_budget_ms: Optional[float] = None) -> Dict[str, Any]:
         """
         搜索相似的旅游攻略
         
@@ -53,108 +260,594 @@ class VectorService:
             query: 搜索查询文本
             limit: 返回结果数量
             filters: 过滤条件
+            diversify: 是否做MMR多样性重排（默认取Config.MMR_ENABLED）
+            mmr_lambda: MMR的λ，越小越偏向多样性（默认取Config.MMR_LAMBDA）
+            rerank: 是否用交叉编码器重排top-N候选（默认取Config.RERANK_ENABLED）
+            rerank_budget_ms: 重排耗时预算（毫秒，默认取Config.RERANK_BUDGET_MS）
         
         Returns:
-            搜索结果字典
+            搜索结果字典（开启重排时附带rerank信息）
         """
+        mmr_lambda = self._resolve_mmr(diversify, mmr_lambda)
+        rerank_budget = self._resolve_rerank(rerank, rerank_budget_ms)
+        if self.search_cache is None or self.collection_version is None:
+            return self._search_uncached(query, limit, filters, mmr_lambda, rerank_budget)
+        
+        # 先查缓存，命中时不再向量化查询文本和访问ChromaDB
+        version = self.collection_version.get()
+        cache_key = SearchResultCache.make_key(query, filters, limit, mmr_lambda=mmr_lambda,
+                                               rerank=rerank_budget is not None)
+        cached = self.search_cache.get(cache_key, version)
+        if cached is not None:
+            cached['query'] = query
+            return cached
+        
+        started = time.perf_counter()
+        search_results = self._search_uncached(query, limit, filters, mmr_lambda, rerank_budget)
+        if self._is_cacheable(search_results):
+            self.search_cache.put(cache_key, version, search_results, (time.perf_counter() - started) * 1000)
+        return search_results
+    
+    def _search_uncached(self, query: str, limit: int, filters: Optional[Dict],
+                         mmr_lambda: Optional[float] = None,
+                         rerank_budget: Optional[float] = None) -> Dict[str, Any]:
+        """执行一次完整检索（不经过结果缓存）"""
         try:
             # 向量化查询文本
-            query_embedding = self.model_service.encode_text([query])[0].tolist()
+            query_embedding = self.embed_texts([query])[0]
             
-            # 构建查询参数
-            query_params = {
-                "query_embeddings": [query_embedding],
-                "n_results": limit
-            }
+            where = self._build_where(filters)
+            fetch_limit = self._fetch_limit(limit, mmr_lambda, rerank_budget)
+            n_results = self._candidate_count(fetch_limit)
+            results = self.collection.query(**self._query_params(
+                [query_embedding], n_results, where, with_embeddings=mmr_lambda is not None))
+            formatted_results = self._rank_results(query, query_embedding, fetch_limit, where, results, n_results)
+            formatted_results, rerank_info = self._apply_rerank(query, formatted_results, rerank_budget)
+            formatted_results = self._finalize_results(query_embedding, formatted_results, limit, mmr_lambda)
             
-            # 添加过滤条件
-            if filters:
-                where_clause = {}
-                for key, value in filters.items():
-                    if value:  # 只添加非空过滤条件
-                        where_clause[key] = value
-                
-                if where_clause:
-                    query_params["where"] = where_clause
-            
-            # 执行查询
-            results = self.collection.query(**query_params)
-            
-            # 格式化结果
-            formatted_results = []
-            if results['documents'] and len(results['documents'][0]) > 0:
-                for i in range(len(results['documents'][0])):
-                    doc = results['documents'][0][i]
-                    metadata = results['metadatas'][0][i] if results['metadatas'] else {}
-                    distance = results['distances'][0][i] if results['distances'] else None
-                    
-                    # 解析元数据中的images字段
-                    images = []
-                    if metadata and 'images' in metadata:
-                        try:
-                            import json
-                            images = json.loads(metadata['images'])
-                        except:
-                            images = metadata.get('images', [])
-                    
-                    formatted_results.append({
-                        "id": results['ids'][0][i],
-                        "content": doc,
-                        "score": 1.0 - (distance if distance else 0),  # 将距离转换为相似度分数
-                        "metadata": {
-                            "destination": metadata.get('destination', ''),
-                            "images": images,
-                            "original_text_length": metadata.get('original_text_length', 0)
-                        }
-                    })
-            
-            return {
+            search_results = {
                 "query": query,
                 "results": formatted_results,
                 "total": len(formatted_results)
             }
+            if rerank_info is not None:
+                search_results["rerank"] = rerank_info
+            return search_results
             
         except Exception as e:
             logger.error(f"向量搜索失败: {str(e)}")
             raise
     
-    def add_document(self, text: str, metadata: Dict[str, Any]) -> str:
+    def search_batch(self, queries: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        批量搜索：一次编码全部查询，过滤条件相同的查询合并为一次ChromaDB查询
+        
+        Args:
+            queries: 查询列表，每项包含query、limit（默认5），
+                以及可选的filters、diversify、mmr_lambda、rerank、rerank_budget_ms
+        
+        Returns:
+            与queries顺序一致的搜索结果字典列表，单条结果与search_similar相同
+        """
+        try:
+            responses: List[Optional[Dict[str, Any]]] = [None] * len(queries)
+            use_cache = self.search_cache is not None and self.collection_version is not None
+            version = self.collection_version.get() if use_cache else None
+            
+            # 先查缓存，只有未命中的查询需要编码和检索
+            pending = []
+            for position, item in enumerate(queries):
+                query, limit, filters = item['query'], item.get('limit', 5), item.get('filters')
+                mmr_lambda = self._resolve_mmr(item.get('diversify'), item.get('mmr_lambda'))
+                rerank_budget = self._resolve_rerank(item.get('rerank'), item.get('rerank_budget_ms'))
+                cache_key = SearchResultCache.make_key(query, filters, limit, mmr_lambda=mmr_lambda,
+                                                       rerank=rerank_budget is not None) if use_cache else None
+                cached = self.search_cache.get(cache_key, version) if use_cache else None
+                if cached is not None:
+                    cached['query'] = query
+                    responses[position] = cached
+                else:
+                    pending.append({
+                        'position': position,
+                        'query': query,
+                        'limit': limit,
+                        'where': self._build_where(filters),
+                        'cache_key': cache_key,
+                        'mmr_lambda': mmr_lambda,
+                        'rerank_budget': rerank_budget
+                    })
+            if not pending:
+                return responses
+            
+            started = time.perf_counter()
+            embeddings = self.embed_texts([entry['query'] for entry in pending])
+            
+            # 按过滤条件分组，每组一次多向量查询
+            groups: Dict[str, List[int]] = {}
+            for index, entry in enumerate(pending):
+                groups.setdefault(json.dumps(entry['where'], ensure_ascii=False, sort_keys=True), []).append(index)
+            
+            for members in groups.values():
+                where = pending[members[0]]['where']
+                fetch_limits = [self._fetch_limit(pending[index]['limit'], pending[index]['mmr_lambda'],
+                                                  pending[index]['rerank_budget']) for index in members]
+                counts = [self._candidate_count(fetch_limit) for fetch_limit in fetch_limits]
+                with_embeddings = any(pending[index]['mmr_lambda'] is not None for index in members)
+                results = self.collection.query(**self._query_params(
+                    [embeddings[index] for index in members], max(counts), where, with_embeddings=with_embeddings))
+                for row, (index, fetch_limit, n_results) in enumerate(zip(members, fetch_limits, counts)):
+                    entry = pending[index]
+                    # 截取与单条查询相同数量的候选，保证结果与search_similar一致
+                    sliced = {key: [value[row][:n_results]] if value is not None else value
+                              for key, value in results.items()
+                              if key in ('ids', 'documents', 'metadatas', 'distances', 'embeddings')}
+                    formatted_results = self._rank_results(entry['query'], embeddings[index], fetch_limit, where,
+                                                           sliced, n_results)
+                    formatted_results, rerank_info = self._apply_rerank(entry['query'], formatted_results,
+                                                                        entry['rerank_budget'])
+                    formatted_results = self._finalize_results(embeddings[index], formatted_results,
+                                                               entry['limit'], entry['mmr_lambda'])
+                    response = {
+                        "query": entry['query'],
+                        "results": formatted_results,
+                        "total": len(formatted_results)
+                    }
+                    if rerank_info is not None:
+                        response["rerank"] = rerank_info
+                    responses[entry['position']] = response
+            
+            if use_cache:
+                # 批量耗时按未命中的查询平均分摊
+                compute_ms = (time.perf_counter() - started) * 1000 / len(pending)
+                for entry in pending:
+                    if self._is_cacheable(responses[entry['position']]):
+                        self.search_cache.put(entry['cache_key'], version, responses[entry['position']], compute_ms)
+            
+            logger.info(f"批量搜索: 查询数={len(queries)}, 缓存未命中={len(pending)}, 分组数={len(groups)}")
+            return responses
+            
+        except Exception as e:
+            logger.error(f"批量向量搜索失败: {str(e)}")
+            raise
+    
+    @staticmethod
+    def _build_where(filters: Optional[Dict]) -> Optional[Dict[str, Any]]:
+        """构建ChromaDB过滤条件（只保留非空条件）"""
+        where_clause = {key: value for key, value in (filters or {}).items() if value}
+        return where_clause or None
+    
+    def _candidate_count(self, limit: int) -> int:
+        """首轮查询的候选数：混合检索或分段时多取一些，折叠/融合后再截断到limit"""
+        if self.lexical_index is not None or self.chunker is not None:
+            return limit * max(1, Config.CHUNK_SEARCH_OVERFETCH)
+        return limit
+    
+    @staticmethod
+    def _query_params(query_embeddings: List[List[float]], n_results: int,
+                      where: Optional[Dict[str, Any]], with_embeddings: bool = False) -> Dict[str, Any]:
+        """构建collection.query参数"""
+        query_params = {
+            "query_embeddings": query_embeddings,
+            "n_results": n_results
+        }
+        if where:
+            query_params["where"] = where
+        if with_embeddings:
+            query_params["include"] = ["metadatas", "documents", "distances", "embeddings"]
+        return query_params
+    
+    @staticmethod
+    def _resolve_mmr(diversify: Optional[bool], mmr_lambda: Optional[float]) -> Optional[float]:
+        """解析MMR参数，返回λ；不做多样性重排时返回None"""
+        if diversify is None:
+            diversify = Config.MMR_ENABLED
+        if not diversify:
+            return None
+        lambda_mult = Config.MMR_LAMBDA if mmr_lambda is None else float(mmr_lambda)
+        return min(1.0, max(0.0, lambda_mult))
+    
+    @staticmethod
+    def _fetch_limit(limit: int, mmr_lambda: Optional[float], rerank_budget: Optional[float] = None) -> int:
+        """MMR和交叉编码器重排需要从更大的候选集中挑选"""
+        fetch_limit = limit * max(1, Config.MMR_FETCH_FACTOR) if mmr_lambda is not None else limit
+        if rerank_budget is not None:
+            fetch_limit = max(fetch_limit, Config.RERANK_TOP_N)
+        return fetch_limit
+    
+    @staticmethod
+    def _resolve_rerank(rerank: Optional[bool], rerank_budget_ms: Optional[float]) -> Optional[float]:
+        """解析重排参数，返回本次的耗时预算（毫秒）；不重排时返回None"""
+        if rerank is None:
+            rerank = Config.RERANK_ENABLED
+        if not rerank:
+            return None
+        budget_ms = Config.RERANK_BUDGET_MS if rerank_budget_ms is None else float(rerank_budget_ms)
+        return min(Config.RERANK_MAX_BUDGET_MS, max(0.0, budget_ms))
+    
+    @staticmethod
+    def _is_cacheable(search_results: Dict[str, Any]) -> bool:
+        """重排因预算耗尽或模型未就绪而不完整的结果不写入缓存，下次请求可以得到完整重排"""
+        rerank_info = search_results.get('rerank')
+        return rerank_info is None or (not rerank_info['budget_exhausted'] and 'reason' not in rerank_info)
+    
+    def _apply_rerank(self, query: str, items: List[Dict[str, Any]],
+                      rerank_budget: Optional[float]) -> Tuple[List[Dict[str, Any]], Optional[Dict[str, Any]]]:
+        """用交叉编码器重排前RERANK_TOP_N个候选，不重排时原样返回"""
+        if rerank_budget is None:
+            return items, None
+        reranker = self.reranker or get_reranker()
+        version = self.collection_version.get() if self.collection_version is not None else None
+        top_n = max(1, Config.RERANK_TOP_N)
+        head, rerank_info = reranker.rerank(query, items[:top_n], rerank_budget, version)
+        return head + items[top_n:], rerank_info
+    
+    def _finalize_results(self, query_embedding: List[float], items: List[Dict[str, Any]], limit: int,
+                          mmr_lambda: Optional[float]) -> List[Dict[str, Any]]:
+        """按需做MMR重排并截断到limit，去掉内部使用的段落向量"""
+        if mmr_lambda is not None and len(items) > limit:
+            with_vectors = [item for item in items if item.get('_embedding') is not None]
+            if len(with_vectors) == len(items):
+                order = mmr_select(query_embedding, [item['_embedding'] for item in items], limit, mmr_lambda)
+                items = [items[i] for i in order]
+            else:
+                logger.warning("部分候选缺少向量，跳过MMR重排")
+        items = items[:limit]
+        for item in items:
+            item.pop('_embedding', None)
+        return items
+    
+    def _rank_results(self, query: str, query_embedding: List[float], limit: int,
+                      where: Optional[Dict[str, Any]], results: Dict[str, Any],
+                      n_results: int) -> List[Dict[str, Any]]:
+        """
+        把首轮查询结果整理为最终结果
+        
+        Args:
+            query: 查询文本
+            query_embedding: 查询向量
+            limit: 返回结果数量
+            where: 过滤条件
+            results: 首轮collection.query的单条查询结果
+            n_results: 首轮查询的候选数
+        
+        Returns:
+            格式化后的结果列表
+        """
+        if self.lexical_index is not None:
+            # 混合检索：向量和词法两路召回，按倒数排名融合，不再需要扩大范围重查
+            dense_results = self._format_results(results, n_results)
+            lexical_hits = self.lexical_index.search(query, n_results * 2)
+            return self._fuse_results(dense_results, lexical_hits, query_embedding, limit, where)
+        
+        if self.chunker is None:
+            return self._format_results(results, limit)
+        
+        # 启用分段时多取一些段落，折叠到文档后不足limit则扩大范围重查
+        max_results = n_results * 8
+        while True:
+            formatted_results = self._format_results(results, limit)
+            returned = len(results['ids'][0]) if results['ids'] else 0
+            if len(formatted_results) >= limit or returned < n_results or n_results >= max_results:
+                return formatted_results
+            n_results *= 2
+            results = self.collection.query(**self._query_params(
+                [query_embedding], n_results, where, with_embeddings=results.get('embeddings') is not None))
+    
+    def _format_results(self, results: Dict[str, Any], limit: int) -> List[Dict[str, Any]]:
+        """格式化查询结果，同一文档的多个段落只保留得分最高的一段"""
+        formatted_results = []
+        seen_parents = set()
+        if results['documents'] and len(results['documents'][0]) > 0:
+            for i in range(len(results['documents'][0])):
+                metadata = (results['metadatas'][0][i] if results['metadatas'] else None) or {}
+                distance = results['distances'][0][i] if results['distances'] else None
+                
+                # 结果按距离升序返回，首次出现的段落即该文档的最佳段落
+                item = self._format_item(results['ids'][0][i], results['documents'][0][i], metadata, distance)
+                if item['id'] in seen_parents:
+                    continue
+                if results.get('embeddings') is not None:
+                    item['_embedding'] = results['embeddings'][0][i]
+                seen_parents.add(item['id'])
+                formatted_results.append(item)
+                if len(formatted_results) >= limit:
+                    break
+        return formatted_results
+    
+    def _format_item(self, passage_id: str, doc: str, metadata: Dict[str, Any],
+                     distance: Optional[float]) -> Dict[str, Any]:
+        """格式化单个段落命中，ID折叠为父文档ID"""
+        # 解析元数据中的images字段
+        images = []
+        if metadata and 'images' in metadata:
+            try:
+                import json
+                images = json.loads(metadata['images'])
+            except:
+                images = metadata.get('images', [])
+        
+        return {
+            "id": metadata.get('parent_id') or passage_id,
+            "content": doc,
+            "score": 1.0 - (distance if distance else 0),  # 将距离转换为相似度分数
+            "chunk_index": metadata.get('chunk_index', 0),
+            "metadata": {
+                "destination": metadata.get('destination', ''),
+                "images": images,
+                "original_text_length": metadata.get('original_text_length', 0)
+            }
+        }
+    
+    def _fuse_results(self, dense_results: List[Dict[str, Any]], lexical_hits: List[Tuple[str, str, float]],
+                      query_embedding: List[float], limit: int,
+                      where: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        """
+        倒数排名融合（RRF）：score = Σ 1 / (k + rank)
+        
+        Args:
+            dense_results: 向量检索结果（已按文档折叠）
+            lexical_hits: 词法检索命中的段落 [(段落ID, 父文档ID, 分数)]
+            query_embedding: 查询向量（用于计算仅词法命中文档的相似度）
+            limit: 返回结果数量
+            where: 过滤条件（词法命中需要按元数据再过滤一次）
+        
+        Returns:
+            融合后的结果列表
+        """
+        k = Config.HYBRID_RRF_K
+        fused = {}
+        for rank, item in enumerate(dense_results, start=1):
+            fused[item['id']] = 1.0 / (k + rank)
+        
+        lexical_best = {}
+        for passage_id, parent_id, _ in lexical_hits:
+            if parent_id in lexical_best:
+                continue
+            lexical_best[parent_id] = passage_id
+            fused[parent_id] = fused.get(parent_id, 0.0) + 1.0 / (k + len(lexical_best))
+        
+        ranked = sorted(fused, key=fused.get, reverse=True)
+        by_id = {item['id']: item for item in dense_results}
+        dense_ids = set(by_id)
+        
+        # 只有词法命中的文档需要从ChromaDB补取内容
+        missing = [lexical_best[parent_id] for parent_id in ranked if parent_id not in by_id]
+        if missing:
+            fetched = self.collection.get(ids=missing, include=['documents', 'metadatas', 'embeddings'])
+            query_vector = np.asarray(query_embedding, dtype=np.float32)
+            for passage_id, doc, metadata, embedding in zip(fetched['ids'], fetched['documents'],
+                                                             fetched['metadatas'], fetched['embeddings']):
+                metadata = metadata or {}
+                if where and any(metadata.get(key) != value for key, value in where.items()):
+                    continue
+                # 与ChromaDB默认的平方L2距离保持一致
+                distance = float(np.sum((np.asarray(embedding, dtype=np.float32) - query_vector) ** 2))
+                item = self._format_item(passage_id, doc, metadata, distance)
+                item['_embedding'] = embedding
+                by_id[item['id']] = item
+        
+        fused_results = []
+        for parent_id in ranked:
+            item = by_id.get(parent_id)
+            if item is None:
+                continue
+            item['rrf_score'] = round(fused[parent_id], 6)
+            item['sources'] = []
+            if parent_id in dense_ids:
+                item['sources'].append('vector')
+            if parent_id in lexical_best:
+                item['sources'].append('lexical')
+            fused_results.append(item)
+            if len(fused_results) >= limit:
+                break
+        return fused_results
+    
+    def add_document(self, text: str, metadata: Dict[str, Any], doc_id: Optional[str] = None) -> str:
         """
         添加文档到向量数据库
         
         Args:
             text: 文档文本
             metadata: 文档元数据
+            doc_id: 文档ID，为空时自动生成
         
         Returns:
-            文档ID
+            文档ID；与已有文档近重复时为已有文档的ID（本次文档不写入）
+        """
+        return self.add_documents([text], [metadata], ids=[doc_id] if doc_id else None)[0]
+    
+    def add_documents(self, texts: List[str], metadatas: List[Dict[str, Any]],
+                      ids: Optional[List[str]] = None, clean: bool = True,
+                      upsert: bool = False, dedup: bool = True) -> List[str]:
+        """
+        批量添加文档到向量数据库（批量清洗、一次编码、一次写入）
+        
+        Args:
+            texts: 文档文本列表
+            metadatas: 与texts对应的元数据列表
+            ids: 文档ID列表，为空时自动生成
+            clean: 是否先做文本清洗（调用方已清洗时传False）
+            upsert: 是否覆盖已存在的ID（用于可重复执行的导入）
+            dedup: 是否在向量化之前做近重复检测
+        
+        Returns:
+            文档ID列表；近重复文档不再写入，返回已有文档的ID
         """
         try:
-            # 清洗文本
-            clean_text = self.model_service.clean_text(text)
+            if not texts:
+                return []
             
-            # 向量化文本
-            embedding = self.model_service.encode_text([clean_text])[0].tolist()
+            # 清洗文本
+            clean_texts = self.model_service.clean_texts(texts) if clean else list(texts)
             
             # 生成唯一ID
-            import uuid
-            doc_id = str(uuid.uuid4())
+            if ids is None:
+                import uuid
+                ids = [str(uuid.uuid4()) for _ in texts]
             
-            # 存储到ChromaDB
-            self.collection.add(
-                documents=[clean_text],
-                embeddings=[embedding],
-                metadatas=[metadata],
-                ids=[doc_id]
-            )
+            # 近重复检测：重复文档映射到已有文档，不再编码和写入
+            duplicate_of = self.claim_documents(clean_texts, ids) if dedup else [None] * len(ids)
+            new_positions = [i for i, existing in enumerate(duplicate_of) if existing is None]
+            if new_positions:
+                new_ids = [ids[i] for i in new_positions]
+                try:
+                    # 长文本切分为段落
+                    passage_texts, passage_metadatas, passage_ids = self.expand_passages(
+                        [clean_texts[i] for i in new_positions], [metadatas[i] for i in new_positions], new_ids)
+                    
+                    # 向量化文本
+                    embeddings = self.embed_texts(passage_texts)
+                    
+                    self.add_embeddings(passage_texts, embeddings, passage_metadatas, ids=passage_ids, upsert=upsert)
+                except Exception:
+                    if dedup:
+                        self.release_documents(new_ids)
+                    raise
             
-            logger.info(f"文档添加成功: ID={doc_id}, 长度={len(clean_text)}")
-            return doc_id
+            if len(new_positions) < len(ids):
+                logger.info(f"跳过近重复文档: {len(ids) - len(new_positions)}篇")
+            return [existing or doc_id for doc_id, existing in zip(ids, duplicate_of)]
             
         except Exception as e:
             logger.error(f"添加文档失败: {str(e)}")
             raise
     
+    def claim_documents(self, texts: List[str], ids: List[str]) -> List[Optional[str]]:
+        """
+        近重复检测，并登记新文档的指纹（写入失败时调用release_documents撤销）
+        
+        Args:
+            texts: 已清洗的全文
+            ids: 文档ID列表
+        
+        Returns:
+            每篇文档重复的已有文档ID，新文档为None
+        """
+        if self.dedup_index is None:
+            return [None] * len(ids)
+        try:
+            return self.dedup_index.check_and_add(ids, texts)
+        except Exception as e:
+            logger.warning(f"近重复检测失败，按新文档处理: {str(e)}")
+            return [None] * len(ids)
+    
+    def release_documents(self, ids: List[str]):
+        """撤销登记的文档指纹"""
+        if self.dedup_index is None:
+            return
+        try:
+            self.dedup_index.remove(ids)
+        except Exception as e:
+            logger.warning(f"近重复索引回滚失败: {str(e)}")
+    
+    def expand_passages(self, texts: List[str], metadatas: List[Dict[str, Any]],
+                        ids: List[str]) -> Tuple[List[str], List[Dict[str, Any]], List[str]]:
+        """
+        把文档切分为段落，每个段落带上父文档ID和段落序号
+        
+        只有一段的文档沿用原ID，多段文档的段落ID为 "{文档ID}#{序号}"
+        
+        Args:
+            texts: 已清洗的文档文本列表
+            metadatas: 文档元数据列表
+            ids: 文档ID列表
+        
+        Returns:
+            (段落文本列表, 段落元数据列表, 段落ID列表)
+        """
+        if self.chunker is None:
+            return list(texts), list(metadatas), list(ids)
+        
+        passage_texts, passage_metadatas, passage_ids = [], [], []
+        for text, metadata, doc_id in zip(texts, metadatas, ids):
+            passages = self.chunker.split(text) or [None]
+            for passage in passages:
+                passage_metadata = dict(metadata or {})
+                passage_metadata.update({
+                    'parent_id': doc_id,
+                    'chunk_index': passage.index if passage else 0,
+                    'chunk_count': len(passages),
+                    'chunk_start': passage.start if passage else 0
+                })
+                passage_texts.append(passage.text if passage else text)
+                passage_metadatas.append(passage_metadata)
+                passage_ids.append(doc_id if len(passages) == 1 else f"{doc_id}#{passage.index}")
+        return passage_texts, passage_metadatas, passage_ids
+    
+    def add_embeddings(self, texts: List[str], embeddings: List[List[float]], metadatas: List[Dict[str, Any]],
+                       ids: Optional[List[str]] = None, upsert: bool = False) -> List[str]:
+        """
+        写入已清洗、已向量化的文档（供分阶段的批量导入使用）
+        
+        Args:
+            texts: 已清洗的文档文本列表
+            embeddings: embed_texts返回的向量列表
+            metadatas: 元数据列表
+            ids: 文档ID列表，为空时自动生成
+            upsert: 是否覆盖已存在的ID
+        
+        Returns:
+            文档ID列表
+        """
+        # 生成唯一ID
+        if ids is None:
+            import uuid
+            ids = [str(uuid.uuid4()) for _ in texts]
+        
+        # 存储到ChromaDB
+        write = self.collection.upsert if upsert else self.collection.add
+        write(
+            documents=texts,
+            embeddings=embeddings,
+            metadatas=metadatas,
+            ids=ids
+        )
+        
+        # 同步写入词法索引（辅助索引，失败不影响主流程）
+        if self.lexical_index is not None:
+            try:
+                parent_ids = [(metadata or {}).get('parent_id') or doc_id for doc_id, metadata in zip(ids, metadatas)]
+                self.lexical_index.add(ids, texts, parent_ids)
+            except Exception as e:
+                logger.warning(f"词法索引写入失败: {str(e)}")
+        
+        self._bump_version()
+        logger.info(f"文档添加成功: 数量={len(ids)}, 总长度={sum(len(t) for t in texts)}")
+        return ids
+    
+    def delete_documents(self, doc_ids: List[str]) -> int:
+        """
+        删除文档（包括其全部段落）
+        
+        Args:
+            doc_ids: 文档ID列表
+        
+        Returns:
+            删除的段落数
+        """
+        try:
+            if not doc_ids:
+                return 0
+            passage_ids = list(self.collection.get(ids=list(doc_ids), include=[])['ids'])
+            for doc_id in doc_ids:
+                passage_ids.extend(self.collection.get(where={'parent_id': doc_id}, include=[])['ids'])
+            passage_ids = list(dict.fromkeys(passage_ids))
+            if passage_ids:
+                self.collection.delete(ids=passage_ids)
+                if self.lexical_index is not None:
+                    try:
+                        self.lexical_index.delete(passage_ids)
+                    except Exception as e:
+                        logger.warning(f"词法索引删除失败: {str(e)}")
+                self._bump_version()
+            self.release_documents(list(doc_ids))
+            logger.info(f"文档删除成功: 文档数={len(doc_ids)}, 段落数={len(passage_ids)}")
+            return len(passage_ids)
+            
+        except Exception as e:
+            logger.error(f"删除文档失败: {str(e)}")
+            raise
+    
     def get_document(self, doc_id: str) -> Optional[Dict[str, Any]]:
         """
         根据ID获取文档
@@ -166,14 +859,25 @@ class VectorService:
             文档信息或None
         """
         try:
-            # 从ChromaDB获取文档
+            # 从ChromaDB获取文档（未分段或只有一段的文档直接按ID命中）
             result = self.collection.get(ids=[doc_id])
             
-            if not result['documents'] or len(result['documents']) == 0:
-                return None
+            if result['documents']:
+                content = result['documents'][0]
+                metadata = result['metadatas'][0] if result['metadatas'] else {}
+            else:
+                # 多段文档：按段落偏移拼回原文，去掉重叠部分
+                result = self.collection.get(where={'parent_id': doc_id})
+                if not result['documents']:
+                    return None
+                passages = sorted(zip(result['documents'], result['metadatas']),
+                                  key=lambda item: item[1].get('chunk_index', 0))
+                content = join_passages((text, passage_metadata.get('chunk_start'))
+                                        for text, passage_metadata in passages)
+                metadata = passages[0][1]
             
             # 解析元数据
-            metadata = result['metadatas'][0] if result['metadatas'] else {}
+            metadata = metadata or {}
             images = []
             if metadata and 'images' in metadata:
                 try:
@@ -184,7 +888,7 @@ class VectorService:
             
             return {
                 "id": doc_id,
-                "content": result['documents'][0],
+                "content": content,
                 "metadata": {
                     "destination": metadata.get('destination', ''),
                     "images": images,
@@ -201,21 +905,39 @@ class VectorService:
         try:
             count = self.collection.count()
             return {
-                "name": "travel_guides",
+                "name": self.collection_name,
                 "count": count,
+                "backend": self.collection.get_stats() if self.backend is not None else {"backend": "chroma"},
+                "storage_profile": self.profile.describe(),
+                "collection_manager": self.collection_manager.get_stats(),
+                "lexical_index": self.lexical_index.get_stats() if self.lexical_index else {"enabled": False},
+                "search_cache": self.get_search_cache_stats(),
+                "dedup_index": self.dedup_index.get_stats() if self.dedup_index else {"enabled": False},
                 "model_info": self.model_service.get_model_info()
             }
         except Exception as e:
             logger.error(f"获取集合信息失败: {str(e)}")
             raise
+    
+    def get_search_cache_stats(self) -> Dict[str, Any]:
+        """检索结果缓存的命中率与节省的耗时"""
+        if self.search_cache is None:
+            return {"enabled": False}
+        stats = self.search_cache.get_stats()
+        stats["enabled"] = True
+        stats["collection_version"] = self.collection_version.get()
+        return stats
 
 
 # 全局向量服务实例
 vector_service = None
+_vector_service_lock = threading.Lock()
 
 def get_vector_service():
-    """获取向量服务实例（单例模式）"""
+    """获取向量服务实例（单例模式，线程安全）"""
     global vector_service
     if vector_service is None:
-        vector_service = VectorService()
+        with _vector_service_lock:
+            if vector_service is None:
+                vector_service = VectorService()
     return vector_service
\ No newline at end of file
@@ -0,0 +1,914 @@
+"""
+向量存储后端模块
+VectorService通过统一接口（与ChromaDB集合相同的add/upsert/query/get/delete/count）访问向量存储：
+- ChromaBackend: 默认后端，转发到共享的ChromaDB集合句柄
+- NumpyBackend: 进程内后端，向量保存在内存映射的float32矩阵中，元数据保存在SQLite旁路文件中；
+  查询是一次矩阵乘法 + argpartition取top-k，过滤条件转换为布尔掩码，没有Chroma的单次调用开销
+- PartitionedBackend: 在上述任一后端之上按目的地分区，带目的地过滤的查询只访问对应分片
+"""
+
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows没有fcntl，只能单进程写入
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_QUERY_INCLUDE = ('metadatas', 'documents', 'distances')
+DEFAULT_GET_INCLUDE = ('metadatas', 'documents')
+
+
+class VectorBackend(ABC):
+    """向量存储后端接口（参数与返回结构与ChromaDB集合保持一致）"""
+
+    name = 'base'
+
+    @abstractmethod
+    def add(self, ids: List[str], embeddings: List[List[float]], documents: List[str],
+            metadatas: List[Dict[str, Any]]):
+        """写入新条目（已存在的ID保持不变）"""
+
+    @abstractmethod
+    def upsert(self, ids: List[str], embeddings: List[List[float]], documents: List[str],
+               metadatas: List[Dict[str, Any]]):
+        """写入或覆盖条目"""
+
+    @abstractmethod
+    def query(self, query_embeddings: List[List[float]], n_results: int = 10,
+              where: Optional[Dict[str, Any]] = None, include: Sequence[str] = DEFAULT_QUERY_INCLUDE) -> Dict[str, Any]:
+        """按平方L2距离返回每个查询向量的最近邻"""
+
+    @abstractmethod
+    def get(self, ids: Optional[List[str]] = None, where: Optional[Dict[str, Any]] = None,
+            limit: Optional[int] = None, offset: Optional[int] = None,
+            include: Sequence[str] = DEFAULT_GET_INCLUDE) -> Dict[str, Any]:
+        """按ID或过滤条件读取条目"""
+
+    @abstractmethod
+    def delete(self, ids: Optional[List[str]] = None, where: Optional[Dict[str, Any]] = None):
+        """删除条目"""
+
+    @abstractmethod
+    def count(self) -> int:
+        """条目数"""
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {'backend': self.name, 'count': self.count()}
+
+
+class ChromaBackend(VectorBackend):
+    """ChromaDB后端：每次调用从集合管理器取共享的集合句柄"""
+
+    name = 'chroma'
+
+    def __init__(self, collection_manager, collection_name: str, metadata: Optional[Dict[str, Any]] = None):
+        self.collection_manager = collection_manager
+        self.collection_name = collection_name
+        self.metadata = metadata
+
+    @property
+    def collection(self):
+        return self.collection_manager.get_collection(self.collection_name, metadata=self.metadata)
+
+    def add(self, ids, embeddings, documents, metadatas):
+        return self.collection.add(ids=ids, embeddings=embeddings, documents=documents, metadatas=metadatas)
+
+    def upsert(self, ids, embeddings, documents, metadatas):
+        return self.collection.upsert(ids=ids, embeddings=embeddings, documents=documents, metadatas=metadatas)
+
+    def query(self, query_embeddings, n_results=10, where=None, include=DEFAULT_QUERY_INCLUDE):
+        return self.collection.query(query_embeddings=query_embeddings, n_results=n_results,
+                                     where=where, include=list(include))
+
+    def get(self, ids=None, where=None, limit=None, offset=None, include=DEFAULT_GET_INCLUDE):
+        return self.collection.get(ids=ids, where=where, limit=limit, offset=offset, include=list(include))
+
+    def delete(self, ids=None, where=None):
+        return self.collection.delete(ids=ids, where=where)
+
+    def count(self) -> int:
+        return self.collection.count()
+
+
+def _matches(metadata: Dict[str, Any], where: Dict[str, Any]) -> bool:
+    """判断单条元数据是否满足过滤条件（支持等值、$eq/$ne/$in/$nin/$gt/$gte/$lt/$lte和$and/$or）"""
+    for key, condition in where.items():
+        if key == '$and':
+            if not all(_matches(metadata, clause) for clause in condition):
+                return False
+        elif key == '$or':
+            if not any(_matches(metadata, clause) for clause in condition):
+                return False
+        elif isinstance(condition, dict):
+            value = metadata.get(key)
+            for operator, operand in condition.items():
+                if not _compare(value, operator, operand):
+                    return False
+        elif metadata.get(key) != condition:
+            return False
+    return True
+
+
+def _compare(value: Any, operator: str, operand: Any) -> bool:
+    if operator == '$eq':
+        return value == operand
+    if operator == '$ne':
+        return value != operand
+    if operator == '$in':
+        return value in operand
+    if operator == '$nin':
+        return value not in operand
+    if value is None:
+        return False
+    if operator == '$gt':
+        return value > operand
+    if operator == '$gte':
+        return value >= operand
+    if operator == '$lt':
+        return value < operand
+    if operator == '$lte':
+        return value <= operand
+    raise ValueError(f"不支持的过滤运算符: {operator}")
+
+
+class NumpyBackend(VectorBackend):
+    """
+    进程内NumPy后端
+
+    目录结构:
+        embeddings.npy  内存映射的float32矩阵（按容量倍增扩展）
+        passages.sqlite3  ID、文档、元数据旁路文件，row列对应矩阵行号；store_meta表保存下一行号和版本号
+        write.lock  目录级排他文件锁
+    删除只打墓碑标记，行号不复用
+    同一目录可以被多个进程打开（API的多个worker、导入CLI）：写入持有文件锁，行号在锁内从SQLite分配；
+    每次写入递增共享版本号，其他进程在下一次读写时发现版本变化后重新加载
+    """
+
+    name = 'numpy'
+
+    def __init__(self, path: str, initial_capacity: int = 1024):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        self.matrix_path = os.path.join(path, 'embeddings.npy')
+        self._lock_path = os.path.join(path, 'write.lock')
+        self._lock = threading.RLock()
+        self._initial_capacity = max(1, initial_capacity)
+        self._stats = {'queries': 0, 'query_ms': 0.0}
+        self._conn = sqlite3.connect(os.path.join(path, 'passages.sqlite3'), check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute('''CREATE TABLE IF NOT EXISTS passages
+                              (row INTEGER PRIMARY KEY,
+                               id TEXT UNIQUE NOT NULL,
+                               document TEXT,
+                               metadata TEXT)''')
+        self._conn.execute('CREATE TABLE IF NOT EXISTS store_meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL)')
+        self._conn.commit()
+        with self._write_lock():
+            self._conn.execute("INSERT OR IGNORE INTO store_meta (key, value) VALUES ('version', 0)")
+            self._conn.execute("INSERT OR IGNORE INTO store_meta (key, value) "
+                               "SELECT 'next_row', COALESCE(MAX(row) + 1, 0) FROM passages")
+            self._conn.commit()
+            self._load()
+
+    @contextmanager
+    def _write_lock(self):
+        """进程内锁 + 目录级排他文件锁，同一目录的所有写入者串行执行"""
+        with self._lock:
+            with open(self._lock_path, 'a') as handle:
+                if fcntl is not None:
+                    fcntl.flock(handle, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    if fcntl is not None:
+                        fcntl.flock(handle, fcntl.LOCK_UN)
+
+    def _meta(self, key: str) -> int:
+        row = self._conn.execute('SELECT value FROM store_meta WHERE key = ?', (key,)).fetchone()
+        return row[0] if row else 0
+
+    def _refresh(self):
+        """其他进程写入过（共享版本号变化）时重新加载，调用方持有self._lock"""
+        if self._meta('version') != self._version:
+            logger.info(f"NumPy向量后端检测到其他进程的写入，重新加载: {self.path}")
+            self._load()
+
+    def _commit_write(self, next_row: int):
+        """记录下一行号、递增共享版本号并提交，调用方持有写锁"""
+        self._conn.execute("UPDATE store_meta SET value = ? WHERE key = 'next_row'", (next_row,))
+        self._conn.execute("UPDATE store_meta SET value = value + 1 WHERE key = 'version'")
+        self._version = self._meta('version')
+        self._conn.commit()
+
+    def _load(self):
+        """加载旁路元数据并打开内存映射矩阵"""
+        # 先读版本号：加载期间若有新的提交，下一次读写会再加载一次
+        self._version = self._meta('version')
+        rows = self._conn.execute('SELECT row, id, document, metadata FROM passages ORDER BY row').fetchall()
+        self._size = max(self._meta('next_row'), rows[-1][0] + 1 if rows else 0)
+        self._ids: List[Optional[str]] = [None] * self._size
+        self._documents: List[Optional[str]] = [None] * self._size
+        self._metadatas: List[Dict[str, Any]] = [{} for _ in range(self._size)]
+        self._alive = np.zeros(self._size, dtype=bool)
+        self._row_of: Dict[str, int] = {}
+        for row, passage_id, document, metadata in rows:
+            self._ids[row] = passage_id
+            self._documents[row] = document
+            self._metadatas[row] = json.loads(metadata) if metadata else {}
+            self._alive[row] = True
+            self._row_of[passage_id] = row
+
+        self._matrix = None
+        self._norms = np.zeros(self._size, dtype=np.float32)
+        if os.path.exists(self.matrix_path):
+            self._matrix = np.load(self.matrix_path, mmap_mode='r+')
+            if self._matrix.shape[0] < self._size:
+                raise ValueError(f"向量矩阵行数({self._matrix.shape[0]})少于元数据行数({self._size})，数据不一致")
+            self._norms = np.zeros(self._matrix.shape[0], dtype=np.float32)
+            self._norms[:self._size] = np.einsum('ij,ij->i', self._matrix[:self._size], self._matrix[:self._size])
+        self._mask_cache: Dict[str, np.ndarray] = {}
+        self._columns: Dict[str, np.ndarray] = {}
+        logger.info(f"NumPy向量后端已打开: {self.path}, {len(self._row_of)} 条")
+
+    def _ensure_capacity(self, rows: int, dim: int):
+        """按需扩展内存映射矩阵（容量倍增，复制后原子替换）"""
+        if self._matrix is not None:
+            if self._matrix.shape[1] != dim:
+                raise ValueError(f"向量维度不一致: 期望{self._matrix.shape[1]}, 实际{dim}")
+            if self._matrix.shape[0] >= rows:
+                return
+        capacity = max(self._initial_capacity, self._matrix.shape[0] if self._matrix is not None else 0)
+        while capacity < rows:
+            capacity *= 2
+        tmp_path = self.matrix_path + '.tmp'
+        matrix = np.lib.format.open_memmap(tmp_path, mode='w+', dtype=np.float32, shape=(capacity, dim))
+        if self._matrix is not None:
+            matrix[:self._size] = self._matrix[:self._size]
+        matrix.flush()
+        del matrix
+        self._matrix = None
+        os.replace(tmp_path, self.matrix_path)
+        self._matrix = np.load(self.matrix_path, mmap_mode='r+')
+        norms = np.zeros(capacity, dtype=np.float32)
+        norms[:len(self._norms)] = self._norms
+        self._norms = norms
+
+    def _write(self, ids, embeddings, documents, metadatas, overwrite: bool):
+        if not ids:
+            return
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        if vectors.ndim != 2 or len(vectors) != len(ids):
+            raise ValueError("向量数量与ID数量不一致")
+        documents = documents if documents is not None else [None] * len(ids)
+        metadatas = metadatas if metadatas is not None else [None] * len(ids)
+        with self._write_lock():
+            self._refresh()
+            # 行号在文件锁内从SQLite分配，多个进程不会写到同一行
+            next_row = max(self._meta('next_row'), self._size)
+            targets = []
+            pending: Dict[str, int] = {}
+            for index, passage_id in enumerate(ids):
+                row = self._row_of.get(passage_id, pending.get(passage_id))
+                if row is not None and not overwrite:
+                    logger.warning(f"ID已存在，跳过写入: {passage_id}")
+                    continue
+                if row is None:
+                    row = next_row
+                    next_row += 1
+                    pending[passage_id] = row
+                targets.append((index, row))
+            if not targets:
+                return
+
+            self._ensure_capacity(next_row, vectors.shape[1])
+            if next_row > self._size:
+                grow = next_row - self._size
+                self._ids.extend([None] * grow)
+                self._documents.extend([None] * grow)
+                self._metadatas.extend({} for _ in range(grow))
+                self._alive = np.concatenate([self._alive, np.zeros(grow, dtype=bool)])
+                self._size = next_row
+
+            rows = np.array([row for _, row in targets])
+            picked = vectors[[index for index, _ in targets]]
+            self._matrix[rows] = picked
+            self._matrix.flush()
+            self._norms[rows] = np.einsum('ij,ij->i', picked, picked)
+            records = []
+            for (index, row) in targets:
+                passage_id, metadata = ids[index], metadatas[index] or {}
+                self._ids[row] = passage_id
+                self._documents[row] = documents[index]
+                self._metadatas[row] = dict(metadata)
+                self._alive[row] = True
+                self._row_of[passage_id] = row
+                records.append((row, passage_id, documents[index], json.dumps(metadata, ensure_ascii=False)))
+            self._conn.executemany('INSERT OR REPLACE INTO passages (row, id, document, metadata) VALUES (?, ?, ?, ?)',
+                                   records)
+            self._commit_write(next_row)
+            self._mask_cache.clear()
+            self._columns.clear()
+
+    def add(self, ids, embeddings, documents=None, metadatas=None):
+        self._write(ids, embeddings, documents, metadatas, overwrite=False)
+
+    def upsert(self, ids, embeddings, documents=None, metadatas=None):
+        self._write(ids, embeddings, documents, metadatas, overwrite=True)
+
+    def _where_mask(self, where: Optional[Dict[str, Any]]) -> np.ndarray:
+        """过滤条件 -> 布尔掩码（按条件缓存，写入时失效）"""
+        if not where:
+            return self._alive
+        key = json.dumps(where, ensure_ascii=False, sort_keys=True, default=str)
+        mask = self._mask_cache.get(key)
+        if mask is None or len(mask) != self._size:
+            if all(not name.startswith('$') and not isinstance(value, (dict, list)) for name, value in where.items()):
+                # 纯等值条件：按元数据列整列比较
+                mask = self._alive.copy()
+                for name, value in where.items():
+                    mask &= self._column(name) == value
+            else:
+                mask = np.fromiter((_matches(metadata, where) for metadata in self._metadatas),
+                                   dtype=bool, count=self._size) & self._alive
+            self._mask_cache[key] = mask
+        return mask
+
+    def _column(self, name: str) -> np.ndarray:
+        """元数据列（object数组，按需构建，写入时失效）"""
+        column = self._columns.get(name)
+        if column is None or len(column) != self._size:
+            column = np.empty(self._size, dtype=object)
+            column[:] = [metadata.get(name) for metadata in self._metadatas]
+            self._columns[name] = column
+        return column
+
+    def query(self, query_embeddings, n_results=10, where=None, include=DEFAULT_QUERY_INCLUDE):
+        started = time.perf_counter()
+        queries = np.asarray(query_embeddings, dtype=np.float32)
+        if queries.ndim == 1:
+            queries = queries[None, :]
+        with self._lock:
+            self._refresh()
+            size = self._size
+            candidates = np.flatnonzero(self._where_mask(where))
+            matrix = self._matrix
+            # 范数复制一份：计算期间的覆盖写入不影响本次查询
+            norms = self._norms[:size].copy()
+
+        result = {key: [] for key in ('ids', 'distances', 'documents', 'metadatas', 'embeddings')}
+        k = min(int(n_results), len(candidates))
+        if k > 0:
+            if len(candidates) == size:
+                vectors, vector_norms = matrix[:size], norms
+            else:
+                vectors, vector_norms = matrix[candidates], norms[candidates]
+            # 平方L2距离 = |q|^2 + |x|^2 - 2 q·x，与ChromaDB默认距离一致
+            distances = (np.einsum('ij,ij->i', queries, queries)[:, None] + vector_norms[None, :]
+                         - 2.0 * (queries @ vectors.T))
+            if k < distances.shape[1]:
+                top = np.argpartition(distances, k - 1, axis=1)[:, :k]
+            else:
+                top = np.tile(np.arange(distances.shape[1]), (len(queries), 1))
+            top_distances = np.take_along_axis(distances, top, axis=1)
+            order = np.argsort(top_distances, axis=1, kind='stable')
+            top = np.take_along_axis(top, order, axis=1)
+            top_distances = np.maximum(np.take_along_axis(top_distances, order, axis=1), 0.0)
+            rows = candidates[top] if len(candidates) != size else top
+        else:
+            rows = np.zeros((len(queries), 0), dtype=np.int64)
+            top_distances = np.zeros((len(queries), 0), dtype=np.float32)
+
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        with self._lock:
+            # 矩阵乘法在锁外进行，结果行在锁内取ID、文档和元数据；计算期间被删除的行跳过
+            for query_rows, query_distances in zip(rows.tolist(), top_distances.tolist()):
+                kept = [(row, distance) for row, distance in zip(query_rows, query_distances) if self._alive[row]]
+                query_rows = [row for row, _ in kept]
+                result['ids'].append([self._ids[row] for row in query_rows])
+                result['distances'].append([distance for _, distance in kept])
+                result['documents'].append([self._documents[row] for row in query_rows])
+                result['metadatas'].append([self._metadatas[row] for row in query_rows])
+                if 'embeddings' in include:
+                    result['embeddings'].append(self._matrix[query_rows].tolist() if query_rows else [])
+            self._stats['queries'] += 1
+            self._stats['query_ms'] += elapsed_ms
+        for key in ('distances', 'documents', 'metadatas', 'embeddings'):
+            if key not in include:
+                result[key] = None
+        return result
+
+    def get(self, ids=None, where=None, limit=None, offset=None, include=DEFAULT_GET_INCLUDE):
+        with self._lock:
+            self._refresh()
+            if ids is not None:
+                rows = [self._row_of[passage_id] for passage_id in dict.fromkeys(ids) if passage_id in self._row_of]
+                if where:
+                    rows = [row for row in rows if _matches(self._metadatas[row], where)]
+            else:
+                rows = np.flatnonzero(self._where_mask(where)).tolist()
+            rows = rows[offset or 0:]
+            if limit is not None:
+                rows = rows[:limit]
+            result = {
+                'ids': [self._ids[row] for row in rows],
+                'documents': [self._documents[row] for row in rows] if 'documents' in include else None,
+                'metadatas': [self._metadatas[row] for row in rows] if 'metadatas' in include else None,
+                'embeddings': self._matrix[rows].tolist() if 'embeddings' in include and rows else
+                              ([] if 'embeddings' in include else None)
+            }
+        return result
+
+    def delete(self, ids=None, where=None):
+        with self._write_lock():
+            if ids is None and not where:
+                raise ValueError("删除需要指定ids或where")
+            targets = self.get(ids=ids, where=where, include=[])['ids']
+            if not targets:
+                return
+            for passage_id in targets:
+                row = self._row_of.pop(passage_id)
+                self._alive[row] = False
+                self._ids[row] = None
+                self._documents[row] = None
+                self._metadatas[row] = {}
+            self._conn.executemany('DELETE FROM passages WHERE id = ?', [(passage_id,) for passage_id in targets])
+            self._commit_write(self._size)
+            self._mask_cache.clear()
+            self._columns.clear()
+
+    def count(self) -> int:
+        with self._lock:
+            self._refresh()
+            return len(self._row_of)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            self._refresh()
+            queries = self._stats['queries']
+            return {
+                'backend': self.name,
+                'path': self.path,
+                'count': len(self._row_of),
+                'rows': self._size,
+                'version': self._version,
+                'capacity': self._matrix.shape[0] if self._matrix is not None else 0,
+                'dim': self._matrix.shape[1] if self._matrix is not None else None,
+                'queries': queries,
+                'avg_query_ms': round(self._stats['query_ms'] / queries, 4) if queries else None
+            }
+
+    def close(self):
+        with self._lock:
+            if self._matrix is not None:
+                self._matrix.flush()
+            self._conn.close()
+
+
+# 进程内按目录共享的NumPy后端
+_numpy_backends: Dict[str, NumpyBackend] = {}
+_numpy_backends_lock = threading.Lock()
+
+
+def get_numpy_backend(path: str) -> NumpyBackend:
+    """获取指定目录的NumPy后端（单例）"""
+    backend = _numpy_backends.get(path)
+    if backend is None:
+        with _numpy_backends_lock:
+            backend = _numpy_backends.get(path)
+            if backend is None:
+                backend = NumpyBackend(path)
+                _numpy_backends[path] = backend
+    return backend
+
+
+def create_backend(kind: str, collection_manager, collection_name: str,
+                   metadata: Optional[Dict[str, Any]] = None, numpy_path: Optional[str] = None) -> VectorBackend:
+    """
+    按类型创建（打开）单个集合的后端
+
+    Args:
+        kind: chroma 或 numpy
+        collection_manager: ChromaDB集合管理器（chroma后端使用）
+        collection_name: 集合名称
+        metadata: 创建ChromaDB集合时使用的元数据
+        numpy_path: NumPy后端根目录
+    """
+    if kind == 'numpy':
+        return get_numpy_backend(os.path.join(numpy_path or './data/vector_store', collection_name))
+    if kind != 'chroma':
+        logger.warning(f"未知的向量存储后端{kind}，使用chroma")
+    # 预先打开集合，首个请求不再承担冷启动开销
+    collection_manager.get_collection(collection_name, metadata=metadata)
+    return ChromaBackend(collection_manager, collection_name, metadata)
+
+
+def normalize_partition_value(value: Any) -> str:
+    """分区键规范化：全半角统一、去空白、小写（只用于选择分片，过滤仍按原值精确匹配）"""
+    return ''.join(unicodedata.normalize('NFKC', str(value or '')).split()).lower()
+
+
+def partition_name(base: str, value: str) -> str:
+    """分区集合名称（ChromaDB集合名只允许ASCII，目的地名取哈希）"""
+    return f"{base}__p_{hashlib.sha1(value.encode('utf-8')).hexdigest()[:12]}"
+
+
+class PartitionedBackend(VectorBackend):
+    """
+    按目的地分区的后端
+
+    全部条目写入全局分片，同时按规范化后的目的地写入对应的分区分片；
+    带目的地等值过滤的查询只访问该目的地的分片，延迟取决于该目的地的数据量而不是总量。
+    规范化后相同的目的地共用一个分片，分片内的查询保留原过滤条件，结果与全局查询的精确匹配一致。
+    分区清单保存在JSON文件中，未登记的目的地回退到全局分片查询。
+    在已有数据的集合上开启分区时，新分片先从全局分片回填该目的地的已有条目，回填完成后才登记，
+    因此路由到的分片总是完整的
+    """
+
+    name = 'partitioned'
+
+    def __init__(self, global_backend: VectorBackend, shard_factory: Callable[[str], VectorBackend],
+                 registry_path: str, base_name: str, key: str = 'destination'):
+        self.global_backend = global_backend
+        self.shard_factory = shard_factory
+        self.registry_path = registry_path
+        self.base_name = base_name
+        self.key = key
+        self._lock = threading.Lock()
+        self._shards: Dict[str, VectorBackend] = {}
+        self._stats = {'routed_queries': 0, 'global_queries': 0}
+        self._registry: Dict[str, str] = {}
+        # complete为True表示全局分片的每个条目都经由分区写入（或已整体拆分），新分区无需回填
+        self._complete = False
+        if os.path.exists(registry_path):
+            with open(registry_path, 'r', encoding='utf-8') as f:
+                saved = json.load(f)
+            self._registry = saved.get('partitions', {})
+            self._complete = bool(saved.get('complete', False))
+        elif global_backend.count() == 0:
+            self._complete = True
+            self._save_registry()
+
+    def _save_registry(self):
+        registry_dir = os.path.dirname(self.registry_path)
+        if registry_dir:
+            os.makedirs(registry_dir, exist_ok=True)
+        tmp_path = self.registry_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'base': self.base_name, 'key': self.key, 'complete': self._complete,
+                       'partitions': self._registry}, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.registry_path)
+
+    def _shard(self, value: str, create: bool, backfill: bool = True) -> Optional[VectorBackend]:
+        """
+        获取分区分片，create为False时未登记的分区返回None
+
+        新建分区时（backfill为True且全局分片中可能有未分区的旧数据）先回填，再登记到分区清单
+        """
+        shard = self._shards.get(value)
+        if shard is not None:
+            return shard
+        with self._lock:
+            shard = self._shards.get(value)
+            if shard is not None:
+                return shard
+            name = self._registry.get(value)
+            if name is None:
+                if not create:
+                    return None
+                name = partition_name(self.base_name, value)
+                shard = self.shard_factory(name)
+                if backfill and not self._complete:
+                    copied = self._backfill(value, shard)
+                    logger.info(f"分区{value}从全局分片回填{copied}条")
+                self._registry[value] = name
+                self._save_registry()
+                logger.info(f"创建分区: {value} -> {name}")
+            else:
+                shard = self.shard_factory(name)
+            self._shards[value] = shard
+            return shard
+
+    def _backfill(self, value: str, shard: VectorBackend, batch_size: int = 1000) -> int:
+        """把全局分片中属于该分区的已有条目复制到分片（先只读元数据找出条目，再按ID取向量）"""
+        matched: List[str] = []
+        total = self.global_backend.count()
+        for offset in range(0, total, batch_size):
+            page = self.global_backend.get(offset=offset, limit=batch_size, include=['metadatas'])
+            matched.extend(doc_id for doc_id, metadata in zip(page['ids'], page['metadatas'])
+                           if normalize_partition_value((metadata or {}).get(self.key)) == value)
+        for start in range(0, len(matched), batch_size):
+            page = self.global_backend.get(ids=matched[start:start + batch_size],
+                                           include=['embeddings', 'documents', 'metadatas'])
+            if len(page['ids']):
+                shard.upsert(ids=page['ids'], embeddings=page['embeddings'],
+                             documents=page['documents'], metadatas=page['metadatas'])
+        return len(matched)
+
+    def _route(self, where: Optional[Dict[str, Any]]) -> Optional[VectorBackend]:
+        """过滤条件中有分区键的等值条件时返回对应分片"""
+        if not where:
+            return None
+        condition = where.get(self.key)
+        if condition is None and isinstance(where.get('$and'), list):
+            for clause in where['$and']:
+                if self.key in clause:
+                    condition = clause[self.key]
+                    break
+        if isinstance(condition, dict):
+            condition = condition.get('$eq') if set(condition) == {'$eq'} else None
+        if condition is None or isinstance(condition, (dict, list)):
+            return None
+        return self._shard(normalize_partition_value(condition), create=False)
+
+    def _write(self, ids, embeddings, documents, metadatas, upsert: bool):
+        documents = documents if documents is not None else [None] * len(ids)
+        metadatas = metadatas if metadatas is not None else [{} for _ in ids]
+
+        # 覆盖写入时目的地可能改变，先从旧分区移除
+        if upsert:
+            existing = self.global_backend.get(ids=list(ids), include=['metadatas'])
+            new_values = {doc_id: normalize_partition_value((metadata or {}).get(self.key))
+                          for doc_id, metadata in zip(ids, metadatas)}
+            moved: Dict[str, List[str]] = {}
+            for doc_id, metadata in zip(existing['ids'], existing['metadatas']):
+                old_value = normalize_partition_value((metadata or {}).get(self.key))
+                if old_value and old_value != new_values.get(doc_id):
+                    moved.setdefault(old_value, []).append(doc_id)
+            for value, moved_ids in moved.items():
+                shard = self._shard(value, create=False)
+                if shard is not None:
+                    shard.delete(ids=moved_ids)
+
+        if upsert:
+            self.global_backend.upsert(ids=ids, embeddings=embeddings, documents=documents, metadatas=metadatas)
+        else:
+            self.global_backend.add(ids=ids, embeddings=embeddings, documents=documents, metadatas=metadatas)
+
+        groups: Dict[str, List[int]] = {}
+        for index, metadata in enumerate(metadatas):
+            value = normalize_partition_value((metadata or {}).get(self.key))
+            if value:
+                groups.setdefault(value, []).append(index)
+        for value, indexes in groups.items():
+            # 新分区的回填可能已经带上了刚写入全局分片的条目，分片一律覆盖写入
+            self._shard(value, create=True).upsert(
+                ids=[ids[i] for i in indexes], embeddings=[embeddings[i] for i in indexes],
+                documents=[documents[i] for i in indexes], metadatas=[metadatas[i] for i in indexes])
+
+    def add(self, ids, embeddings, documents=None, metadatas=None):
+        self._write(ids, embeddings, documents, metadatas, upsert=False)
+
+    def upsert(self, ids, embeddings, documents=None, metadatas=None):
+        self._write(ids, embeddings, documents, metadatas, upsert=True)
+
+    def query(self, query_embeddings, n_results=10, where=None, include=DEFAULT_QUERY_INCLUDE):
+        shard = self._route(where)
+        with self._lock:
+            self._stats['routed_queries' if shard is not None else 'global_queries'] += 1
+        if shard is None:
+            return self.global_backend.query(query_embeddings=query_embeddings, n_results=n_results,
+                                             where=where, include=include)
+        # 分片内是规范化后相同的目的地，保留原过滤条件以维持精确匹配
+        return shard.query(query_embeddings=query_embeddings, n_results=n_results,
+                           where=where, include=include)
+
+    def get(self, ids=None, where=None, limit=None, offset=None, include=DEFAULT_GET_INCLUDE):
+        return self.global_backend.get(ids=ids, where=where, limit=limit, offset=offset, include=include)
+
+    def delete(self, ids=None, where=None):
+        existing = self.global_backend.get(ids=ids, where=where, include=['metadatas'])
+        groups: Dict[str, List[str]] = {}
+        for doc_id, metadata in zip(existing['ids'], existing['metadatas']):
+            value = normalize_partition_value((metadata or {}).get(self.key))
+            if value:
+                groups.setdefault(value, []).append(doc_id)
+        for value, shard_ids in groups.items():
+            shard = self._shard(value, create=False)
+            if shard is not None:
+                shard.delete(ids=shard_ids)
+        if existing['ids']:
+            self.global_backend.delete(ids=list(existing['ids']))
+
+    def count(self) -> int:
+        return self.global_backend.count()
+
+    def rebuild_partitions(self, batch_size: int = 1000) -> Dict[str, int]:
+        """
+        把全局分片中的已有数据拆分到各目的地分区（迁移工具）
+
+        Returns:
+            {目的地: 条目数}
+        """
+        counts: Dict[str, int] = {}
+        total = self.global_backend.count()
+        for offset in range(0, total, batch_size):
+            page = self.global_backend.get(offset=offset, limit=batch_size,
+                                           include=['embeddings', 'documents', 'metadatas'])
+            groups: Dict[str, List[int]] = {}
+            for index, metadata in enumerate(page['metadatas']):
+                value = normalize_partition_value((metadata or {}).get(self.key))
+                if value:
+                    groups.setdefault(value, []).append(index)
+            for value, indexes in groups.items():
+                self._shard(value, create=True, backfill=False).upsert(
+                    ids=[page['ids'][i] for i in indexes],
+                    embeddings=[page['embeddings'][i] for i in indexes],
+                    documents=[page['documents'][i] for i in indexes],
+                    metadatas=[page['metadatas'][i] for i in indexes])
+                counts[value] = counts.get(value, 0) + len(indexes)
+        with self._lock:
+            self._complete = True
+            self._save_registry()
+        logger.info(f"分区拆分完成: {len(counts)} 个分区, {sum(counts.values())} 条")
+        return counts
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            registry = dict(self._registry)
+        stats.update({
+            'backend': self.name,
+            'key': self.key,
+            'count': self.global_backend.count(),
+            'global': self.global_backend.get_stats(),
+            'partitions': len(registry),
+            'complete': self._complete,
+            'registry_path': self.registry_path
+        })
+        return stats
+
+
+def create_configured_backend(collection_manager, collection_name: str,
+                              metadata: Optional[Dict[str, Any]] = None) -> VectorBackend:
+    """按Config创建VectorService使用的后端（VECTOR_BACKEND，可选按目的地分区）"""
+    from modular_api.utils.config import Config
+
+    kind = Config.VECTOR_BACKEND
+    backend = create_backend(kind, collection_manager, collection_name, metadata, Config.VECTOR_NUMPY_PATH)
+    if not Config.VECTOR_PARTITION_ENABLED:
+        return backend
+
+    root = Config.VECTOR_NUMPY_PATH if kind == 'numpy' else Config.CHROMA_PATH
+    return PartitionedBackend(
+        backend,
+        lambda name: create_backend(kind, collection_manager, name, metadata, Config.VECTOR_NUMPY_PATH),
+        os.path.join(root, f'partitions_{collection_name}.json'),
+        collection_name,
+        key=Config.VECTOR_PARTITION_KEY
+    )
+
+def copy_collection(source: VectorBackend, target: VectorBackend, batch_size: int = 1000) -> int:
+    """
+    把一个后端的全部条目复制到另一个后端（用于切换后端）
+
+    Returns:
+        复制的条目数
+    """
+    total = source.count()
+    for offset in range(0, total, batch_size):
+        page = source.get(offset=offset, limit=batch_size, include=['embeddings', 'documents', 'metadatas'])
+        if len(page['ids']) == 0:
+            break
+        target.upsert(ids=page['ids'], embeddings=page['embeddings'],
+                      documents=page['documents'], metadatas=page['metadatas'])
+    return total
+
+
+def run_benchmark(backends: Dict[str, VectorBackend], num_docs: int = 10000, dim: int = 384,
+                  num_queries: int = 200, limit: int = 15, num_destinations: int = 50,
+                  seed: int = 0) -> Dict[str, Any]:
+    """
+    用随机单位向量对比各后端的写入吞吐、查询延迟（含过滤）和相对精确检索的召回率
+
+    Returns:
+        {后端名: 指标}
+    """
+    rng = np.random.default_rng(seed)
+    vectors = rng.standard_normal((num_docs, dim)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    ids = [f'doc_{i}' for i in range(num_docs)]
+    documents = [f'攻略{i}' for i in range(num_docs)]
+    metadatas = [{'destination': f'城市{i % num_destinations}'} for i in range(num_docs)]
+    queries = vectors[rng.choice(num_docs, num_queries, replace=False)] + \
+        rng.standard_normal((num_queries, dim)).astype(np.float32) * 0.1
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+
+    exact = np.argsort(-(queries @ vectors.T), axis=1)[:, :limit]
+    exact_ids = [{ids[row] for row in rows} for rows in exact]
+
+    report = {}
+    for name, backend in backends.items():
+        started = time.perf_counter()
+        for start in range(0, num_docs, 1000):
+            backend.upsert(ids=ids[start:start + 1000], embeddings=vectors[start:start + 1000].tolist(),
+                           documents=documents[start:start + 1000], metadatas=metadatas[start:start + 1000])
+        write_seconds = time.perf_counter() - started
+
+        latencies, filtered_latencies, recalls = [], [], []
+        for i, query in enumerate(queries):
+            embedding = [query.tolist()]
+            started = time.perf_counter()
+            result = backend.query(query_embeddings=embedding, n_results=limit)
+            latencies.append((time.perf_counter() - started) * 1000)
+            recalls.append(len(exact_ids[i] & set(result['ids'][0])) / limit)
+
+            started = time.perf_counter()
+            backend.query(query_embeddings=embedding, n_results=limit,
+                          where={'destination': f'城市{i % num_destinations}'})
+            filtered_latencies.append((time.perf_counter() - started) * 1000)
+
+        started = time.perf_counter()
+        backend.query(query_embeddings=queries.tolist(), n_results=limit)
+        batch_ms = (time.perf_counter() - started) * 1000
+
+        report[name] = {
+            'docs': num_docs,
+            'write_docs_per_sec': round(num_docs / write_seconds, 1),
+            'query_p50_ms': round(float(np.percentile(latencies, 50)), 3),
+            'query_p95_ms': round(float(np.percentile(latencies, 95)), 3),
+            'filtered_query_p50_ms': round(float(np.percentile(filtered_latencies, 50)), 3),
+            'batch_query_ms_per_query': round(batch_ms / num_queries, 3),
+            f'recall@{limit}': round(float(np.mean(recalls)), 4)
+        }
+    return report
+
+
+def main():
+    """命令行入口：后端基准测试、从ChromaDB迁移到NumPy后端、按目的地拆分分区"""
+    import argparse
+    import tempfile
+
+    from modular_api.services.collection_manager import CollectionManager, get_collection_manager
+    from modular_api.utils.config import Config
+
+    parser = argparse.ArgumentParser(description='向量存储后端工具（基准测试、后端迁移、分区拆分）')
+    parser.add_argument('command', choices=['benchmark', 'migrate', 'partition'],
+                        help='benchmark: 对比各后端; migrate: 把ChromaDB集合复制到NumPy后端; '
+                             'partition: 按目的地拆分已有集合（使用当前VECTOR_BACKEND配置）')
+    parser.add_argument('--docs', type=int, default=10000, help='基准测试文档数')
+    parser.add_argument('--dim', type=int, default=384, help='基准测试向量维度')
+    parser.add_argument('--queries', type=int, default=200, help='基准测试查询数')
+    parser.add_argument('--limit', type=int, default=15, help='每次查询返回的条目数')
+    parser.add_argument('--destinations', type=int, default=50, help='基准测试的目的地数量')
+    parser.add_argument('--partitioned', action='store_true', help='基准测试同时对比按目的地分区的后端')
+    parser.add_argument('--collection', default='travel_guides', help='迁移/拆分的集合名称')
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+
+    if args.command == 'benchmark':
+        with tempfile.TemporaryDirectory() as tmp:
+            manager = CollectionManager(os.path.join(tmp, 'chroma'))
+            backends = {
+                'chroma': ChromaBackend(manager, 'benchmark'),
+                'numpy': NumpyBackend(os.path.join(tmp, 'numpy'))
+            }
+            if args.partitioned:
+                backends['chroma_partitioned'] = PartitionedBackend(
+                    ChromaBackend(manager, 'benchmark_p'), lambda name: ChromaBackend(manager, name),
+                    os.path.join(tmp, 'chroma_partitions.json'), 'benchmark_p')
+                backends['numpy_partitioned'] = PartitionedBackend(
+                    NumpyBackend(os.path.join(tmp, 'numpy_p')),
+                    lambda name: NumpyBackend(os.path.join(tmp, 'numpy_p', name)),
+                    os.path.join(tmp, 'numpy_partitions.json'), 'benchmark_p')
+            report = run_benchmark(backends, num_docs=args.docs, dim=args.dim, num_queries=args.queries,
+                                   limit=args.limit, num_destinations=args.destinations)
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+
+    elif args.command == 'migrate':
+        source = ChromaBackend(get_collection_manager(Config.CHROMA_PATH), args.collection)
+        target_path = os.path.join(Config.VECTOR_NUMPY_PATH, args.collection)
+        target = NumpyBackend(target_path)
+        total = copy_collection(source, target)
+        print(f"迁移完成: {args.collection} -> {target_path}, {total} 条")
+
+    elif args.command == 'partition':
+        if not Config.VECTOR_PARTITION_ENABLED:
+            print("提示: VECTOR_PARTITION_ENABLED未开启，拆分后需要开启才会按分区查询")
+        Config.VECTOR_PARTITION_ENABLED = True
+        backend = create_configured_backend(get_collection_manager(Config.CHROMA_PATH), args.collection)
+        counts = backend.rebuild_partitions()
+        print(json.dumps({'partitions': len(counts), 'documents': sum(counts.values()), 'counts': counts},
+                         ensure_ascii=False, indent=2))
+
+
+if __name__ == '__main__':
+    main()
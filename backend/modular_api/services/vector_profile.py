@@ -0,0 +1,291 @@
+"""
+向量存储配置模块
+支持float16精度和PCA降维的紧凑向量存储，入库和查询使用同一套变换；
+附带命令行工具：从现有chroma_db语料离线拟合投影，并生成召回率-体积对比报告
+"""
+
+import logging
+import os
+import re
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+PROFILE_PATTERN = re.compile(r'^(?:pca(?P<dim>\d+))?-?(?P<dtype>float16|float32)?$')
+
+
+class StorageProfile:
+    """
+    向量存储配置
+
+    名称格式：float32（默认，不做变换）、float16、pca128、pca128-float16。
+    PCA投影后会重新做L2归一化，保证距离排序语义不变；float16表示以半精度保存，
+    Chroma内部仍以float32存储，因此float16主要缩小快照文件、内存矩阵等自有存储，
+    PCA降维则同时缩小Chroma存储和接口传输的向量。
+    """
+
+    def __init__(self, name: str = 'float32', projection: Optional[Dict[str, np.ndarray]] = None):
+        match = PROFILE_PATTERN.match(name or 'float32')
+        if not match or not name:
+            raise ValueError(f"无效的向量存储配置: {name}")
+        self.name = name
+        self.target_dim = int(match.group('dim')) if match.group('dim') else None
+        self.storage_dtype = np.float16 if match.group('dtype') == 'float16' else np.float32
+        self.mean = None
+        self.components = None
+
+        if self.target_dim is not None:
+            if projection is None:
+                raise ValueError(f"向量存储配置{name}需要PCA投影参数")
+            components = np.asarray(projection['components'], dtype=np.float32)
+            if components.shape[0] != self.target_dim:
+                raise ValueError(f"PCA投影维度不匹配: 需要{self.target_dim}, 实际{components.shape[0]}")
+            self.mean = np.asarray(projection['mean'], dtype=np.float32)
+            self.components = components
+
+    @classmethod
+    def from_config(cls, name: str, projection_path: Optional[str] = None) -> 'StorageProfile':
+        """根据配置创建存储配置，PCA投影从文件加载"""
+        match = PROFILE_PATTERN.match(name or '')
+        projection = None
+        if match and match.group('dim'):
+            projection = load_projection(projection_path)
+        return cls(name, projection)
+
+    @property
+    def is_identity(self) -> bool:
+        """是否为不做任何变换的默认配置"""
+        return self.components is None and self.storage_dtype == np.float32
+
+    def collection_name(self, base_name: str) -> str:
+        """降维后的向量维度不同，需要单独的集合"""
+        if self.target_dim is None:
+            return base_name
+        return f"{base_name}_pca{self.target_dim}"
+
+    def transform(self, vectors: Any) -> np.ndarray:
+        """
+        把原始embedding变换为存储形式（入库和查询都必须经过这里）
+
+        Args:
+            vectors: 形状为 (n, dim) 的原始向量
+
+        Returns:
+            变换后的float32向量（数值精度与storage_dtype一致）
+        """
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if self.components is not None:
+            vectors = (vectors - self.mean) @ self.components.T
+            norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+            vectors = vectors / np.clip(norms, 1e-12, None)
+        if self.storage_dtype == np.float16:
+            vectors = vectors.astype(np.float16).astype(np.float32)
+        return vectors
+
+    def bytes_per_vector(self, source_dim: int) -> int:
+        """每个向量的存储字节数"""
+        dim = self.target_dim or source_dim
+        return dim * np.dtype(self.storage_dtype).itemsize
+
+    def describe(self, source_dim: Optional[int] = None) -> Dict[str, Any]:
+        """存储配置信息"""
+        return {
+            'name': self.name,
+            'target_dim': self.target_dim,
+            'storage_dtype': np.dtype(self.storage_dtype).name,
+            'bytes_per_vector': self.bytes_per_vector(source_dim) if source_dim else None
+        }
+
+
+def fit_pca(embeddings: np.ndarray, dim: int) -> Dict[str, np.ndarray]:
+    """
+    在语料向量上拟合PCA投影
+
+    Args:
+        embeddings: 形状为 (n, source_dim) 的向量
+        dim: 目标维度
+
+    Returns:
+        包含mean、components、explained_variance_ratio的字典
+    """
+    embeddings = np.asarray(embeddings, dtype=np.float64)
+    if dim > min(embeddings.shape):
+        raise ValueError(f"目标维度{dim}超过样本数或原始维度: {embeddings.shape}")
+    mean = embeddings.mean(axis=0)
+    _, singular_values, vt = np.linalg.svd(embeddings - mean, full_matrices=False)
+    variance = singular_values ** 2
+    return {
+        'mean': mean.astype(np.float32),
+        'components': vt[:dim].astype(np.float32),
+        'explained_variance_ratio': (variance[:dim] / variance.sum()).astype(np.float32)
+    }
+
+
+def save_projection(projection: Dict[str, np.ndarray], path: str):
+    """保存PCA投影参数"""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    np.savez(path, **projection)
+    logger.info(f"PCA投影已保存: {path}")
+
+
+def load_projection(path: Optional[str]) -> Dict[str, np.ndarray]:
+    """加载PCA投影参数"""
+    if not path or not os.path.exists(path):
+        raise FileNotFoundError(f"PCA投影文件不存在: {path}，请先运行 python -m modular_api.services.vector_profile fit")
+    with np.load(path) as data:
+        return {key: data[key] for key in data.files}
+
+
+def recall_at_k(base_vectors: np.ndarray, profile_vectors: np.ndarray,
+                query_indices: np.ndarray, k: int = 10) -> float:
+    """
+    以原始float32向量的精确top-k为基准，计算变换后向量的召回率
+
+    Args:
+        base_vectors: 归一化的原始向量 (n, d)
+        profile_vectors: 变换后的向量 (n, d')
+        query_indices: 用作查询的文档下标（查询自身不计入结果）
+        k: top-k
+
+    Returns:
+        平均recall@k
+    """
+    k = min(k, len(base_vectors) - 1)
+    if k <= 0:
+        return 1.0
+    base_scores = base_vectors[query_indices] @ base_vectors.T
+    profile_scores = profile_vectors[query_indices] @ profile_vectors.T
+    rows = np.arange(len(query_indices))
+    base_scores[rows, query_indices] = -np.inf
+    profile_scores[rows, query_indices] = -np.inf
+    truth = np.argpartition(-base_scores, k - 1, axis=1)[:, :k]
+    found = np.argpartition(-profile_scores, k - 1, axis=1)[:, :k]
+    hits = [len(set(t).intersection(f)) for t, f in zip(truth, found)]
+    return float(np.mean(hits) / k)
+
+
+def build_report(embeddings: np.ndarray, dims: List[int], k: int = 10,
+                 num_queries: int = 200, seed: int = 42) -> List[Dict[str, Any]]:
+    """
+    生成各存储配置的召回率-体积对比
+
+    Args:
+        embeddings: 语料原始向量
+        dims: 参与对比的PCA维度
+        k: recall@k
+        num_queries: 抽样查询数（以语料中的文档向量作为查询）
+
+    Returns:
+        每个配置一行的报告
+    """
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    base = embeddings / np.clip(norms, 1e-12, None)
+    n, source_dim = base.shape
+    rng = np.random.default_rng(seed)
+    query_indices = rng.choice(n, size=min(num_queries, n), replace=False)
+
+    profiles = [StorageProfile('float32'), StorageProfile('float16')]
+    for dim in dims:
+        if dim >= min(n, source_dim):
+            logger.warning(f"跳过PCA维度{dim}：样本数或原始维度不足")
+            continue
+        projection = fit_pca(base, dim)
+        profiles.append(StorageProfile(f'pca{dim}', projection))
+        profiles.append(StorageProfile(f'pca{dim}-float16', projection))
+
+    report = []
+    for profile in profiles:
+        vectors = profile.transform(base)
+        size = profile.bytes_per_vector(source_dim)
+        report.append({
+            'profile': profile.name,
+            'dim': profile.target_dim or source_dim,
+            'bytes_per_vector': size,
+            'total_mb': round(size * n / 1024 / 1024, 3),
+            'size_ratio': round(size / (source_dim * 4), 3),
+            f'recall@{k}': round(recall_at_k(base, vectors, query_indices, k), 4)
+        })
+    return report
+
+
+def _load_collection_embeddings(chroma_path: str, collection_name: str, batch_size: int = 1000):
+    """分页读取集合中的全部向量（不加载模型）"""
+    import chromadb
+
+    client = chromadb.PersistentClient(path=chroma_path)
+    collection = client.get_collection(name=collection_name)
+    ids, embeddings, documents, metadatas = [], [], [], []
+    total = collection.count()
+    for offset in range(0, total, batch_size):
+        page = collection.get(offset=offset, limit=batch_size,
+                              include=['embeddings', 'documents', 'metadatas'])
+        ids.extend(page['ids'])
+        embeddings.extend(page['embeddings'])
+        documents.extend(page['documents'])
+        metadatas.extend(page['metadatas'])
+    return client, ids, np.asarray(embeddings, dtype=np.float32), documents, metadatas
+
+
+def main():
+    """命令行入口"""
+    import argparse
+    import json
+
+    from modular_api.utils.config import Config
+
+    parser = argparse.ArgumentParser(description='向量存储配置工具（PCA拟合、召回率报告、集合迁移）')
+    parser.add_argument('command', choices=['fit', 'report', 'migrate'], help='fit: 拟合PCA; report: 召回率-体积报告; migrate: 按配置重建降维集合')
+    parser.add_argument('--chroma-path', default=Config.CHROMA_PATH, help='ChromaDB路径')
+    parser.add_argument('--collection', default='travel_guides', help='源集合名称')
+    parser.add_argument('--dim', type=int, default=128, help='PCA目标维度（fit）')
+    parser.add_argument('--dims', default='64,128,192', help='参与对比的PCA维度（report）')
+    parser.add_argument('--k', type=int, default=10, help='recall@k')
+    parser.add_argument('--queries', type=int, default=200, help='抽样查询数')
+    parser.add_argument('--profile', default=Config.VECTOR_STORAGE_PROFILE, help='迁移目标存储配置（migrate）')
+    parser.add_argument('--output', default=Config.VECTOR_PCA_PATH, help='PCA投影输出路径（fit）')
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+
+    client, ids, embeddings, documents, metadatas = _load_collection_embeddings(args.chroma_path, args.collection)
+    print(f"读取集合 {args.collection}: {len(ids)} 条向量")
+    if len(ids) == 0:
+        return
+
+    if args.command == 'fit':
+        projection = fit_pca(embeddings, args.dim)
+        save_projection(projection, args.output)
+        print(f"PCA拟合完成: {embeddings.shape[1]} -> {args.dim} 维, "
+              f"保留方差 {projection['explained_variance_ratio'].sum():.2%}")
+
+    elif args.command == 'report':
+        dims = [int(d) for d in args.dims.split(',') if d.strip()]
+        report = build_report(embeddings, dims, k=args.k, num_queries=args.queries)
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+
+    elif args.command == 'migrate':
+        profile = StorageProfile.from_config(args.profile, Config.VECTOR_PCA_PATH)
+        target_name = profile.collection_name(args.collection)
+        if target_name == args.collection:
+            print("目标配置与源集合维度相同，无需迁移")
+            return
+        target = client.get_or_create_collection(name=target_name,
+                                                 metadata={"description": f"旅游攻略向量数据库（{profile.name}）"})
+        vectors = profile.transform(embeddings)
+        for start in range(0, len(ids), 1000):
+            end = start + 1000
+            target.upsert(ids=ids[start:end], embeddings=vectors[start:end].tolist(),
+                          documents=documents[start:end], metadatas=metadatas[start:end])
+        print(f"迁移完成: {args.collection} -> {target_name}, {len(ids)} 条")
+
+
+if __name__ == '__main__':
+    main()
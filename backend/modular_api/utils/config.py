@@ -28,6 +28,29 @@ class Config:
     # 大模型API配置
     DEEPSEEK_API_KEY = os.getenv('DEEPSEEK_API_KEY', '')
     ALIYUN_DASHSCOPE_API_KEY = os.getenv('ALIYUN_DASHSCOPE_API_KEY', '')
+    # 按顺序尝试的提供商（dashscope | deepseek | stub），未配置API Key的会被跳过
+    LLM_PROVIDERS = os.getenv('LLM_PROVIDERS', 'dashscope,deepseek')
+    DASHSCOPE_BASE_URL = os.getenv('DASHSCOPE_BASE_URL', 'https://dashscope.aliyuncs.com/compatible-mode/v1')
+    DASHSCOPE_MODEL = os.getenv('DASHSCOPE_MODEL', 'qwen-turbo')
+    DEEPSEEK_BASE_URL = os.getenv('DEEPSEEK_BASE_URL', 'https://api.deepseek.com')
+    DEEPSEEK_MODEL = os.getenv('DEEPSEEK_MODEL', 'deepseek-chat')
+    LLM_STUB_URL = os.getenv('LLM_STUB_URL', 'http://127.0.0.1:8765/v1')
+    LLM_CONNECT_TIMEOUT = float(os.getenv('LLM_CONNECT_TIMEOUT', 3.05))
+    LLM_READ_TIMEOUT = float(os.getenv('LLM_READ_TIMEOUT', 60))
+    LLM_MAX_RETRIES = int(os.getenv('LLM_MAX_RETRIES', 2))
+    LLM_BACKOFF_BASE = float(os.getenv('LLM_BACKOFF_BASE', 0.5))
+    LLM_BACKOFF_MAX = float(os.getenv('LLM_BACKOFF_MAX', 8))
+    LLM_POOL_SIZE = int(os.getenv('LLM_POOL_SIZE', 10))
+    LLM_TEMPERATURE = float(os.getenv('LLM_TEMPERATURE', 0.7))
+    LLM_MAX_TOKENS = int(os.getenv('LLM_MAX_TOKENS', 1024))
+
+    # 语义回复缓存配置（同一路由类型和目的地下，意图向量余弦相似度不低于阈值时复用回复）
+    SEMANTIC_CACHE_ENABLED = os.getenv('SEMANTIC_CACHE_ENABLED', 'True') == 'True'
+    SEMANTIC_CACHE_THRESHOLD = float(os.getenv('SEMANTIC_CACHE_THRESHOLD', 0.92))
+    SEMANTIC_CACHE_TTL = int(os.getenv('SEMANTIC_CACHE_TTL', 3600))
+    SEMANTIC_CACHE_MAX_ENTRIES = int(os.getenv('SEMANTIC_CACHE_MAX_ENTRIES', 2000))
+    # 聊天消息没有目的地字段，作用域无法区分城市（“成都有什么好吃的”和“重庆有什么好吃的”向量很接近），默认不走语义缓存
+    CHAT_SEMANTIC_CACHE_ENABLED = os.getenv('CHAT_SEMANTIC_CACHE_ENABLED', 'False') == 'True'
 
     # Embedding模型配置
     EMBEDDING_MODEL_PATH = os.getenv(
@@ -35,6 +58,110 @@ class Config:
         r'C:\Users\Administrator\.cache\huggingface\hub\models--sentence-transformers--all-MiniLM-L6-v2'
     )
     EMBEDDING_MODEL_NAME = os.getenv('EMBEDDING_MODEL_NAME', 'all-MiniLM-L6-v2')
+    # 推理后端: torch | onnx | onnx-int8 | hashing
+    EMBEDDING_BACKEND = os.getenv('EMBEDDING_BACKEND', 'torch')
+    EMBEDDING_ONNX_PATH = os.getenv('EMBEDDING_ONNX_PATH', './models/all-MiniLM-L6-v2-onnx')
+    EMBEDDING_ONNX_THREADS = int(os.getenv('EMBEDDING_ONNX_THREADS', 0))
+    # 哈希向量化引擎（transformer不可用时的兜底，维度与MiniLM保持一致）
+    EMBEDDING_HASHING_DIM = int(os.getenv('EMBEDDING_HASHING_DIM', 384))
+    EMBEDDING_HASHING_IDF_PATH = os.getenv('EMBEDDING_HASHING_IDF_PATH', './data/hashing_idf.npz')
+
+    # 模型预热配置（后台线程加载，启动时不阻塞）
+    MODEL_WARMUP_ASYNC = os.getenv('MODEL_WARMUP_ASYNC', 'True') == 'True'
+    MODEL_WARMUP_ON_START = os.getenv('MODEL_WARMUP_ON_START', 'True') == 'True'
+
+    # Embedding微批处理配置
+    EMBEDDING_BATCH_ENABLED = os.getenv('EMBEDDING_BATCH_ENABLED', 'True') == 'True'
+    EMBEDDING_BATCH_MAX_SIZE = int(os.getenv('EMBEDDING_BATCH_MAX_SIZE', 32))
+    EMBEDDING_BATCH_MAX_WAIT_MS = float(os.getenv('EMBEDDING_BATCH_MAX_WAIT_MS', 5))
+
+    # Embedding进程池配置（0表示在当前进程内编码）
+    EMBEDDING_WORKERS = int(os.getenv('EMBEDDING_WORKERS', 0))
+    EMBEDDING_WORKER_THREADS = int(os.getenv('EMBEDDING_WORKER_THREADS', 1))
+    EMBEDDING_WORKER_TIMEOUT = float(os.getenv('EMBEDDING_WORKER_TIMEOUT', 60))
+
+    # Embedding缓存配置（内存LRU + 磁盘持久化）
+    EMBEDDING_CACHE_ENABLED = os.getenv('EMBEDDING_CACHE_ENABLED', 'True') == 'True'
+    EMBEDDING_CACHE_MEMORY_MB = float(os.getenv('EMBEDDING_CACHE_MEMORY_MB', 64))
+    EMBEDDING_CACHE_PATH = os.getenv('EMBEDDING_CACHE_PATH', './data/embedding_cache.db')
+    EMBEDDING_CACHE_DISK_MAX_ENTRIES = int(os.getenv('EMBEDDING_CACHE_DISK_MAX_ENTRIES', 500000))
+
+    # 文本清洗配置（spaCy nlp.pipe）
+    NLP_PIPE_BATCH_SIZE = int(os.getenv('NLP_PIPE_BATCH_SIZE', 64))
+    NLP_PIPE_N_PROCESS = int(os.getenv('NLP_PIPE_N_PROCESS', 1))
+
+    # 向量存储配置: float32 | float16 | pca128 | pca128-float16（PCA投影需先离线拟合）
+    VECTOR_STORAGE_PROFILE = os.getenv('VECTOR_STORAGE_PROFILE', 'float32')
+    VECTOR_PCA_PATH = os.getenv('VECTOR_PCA_PATH', './data/vector_pca.npz')
+
+    # 向量存储后端: chroma（默认）或 numpy（进程内内存映射矩阵）
+    VECTOR_BACKEND = os.getenv('VECTOR_BACKEND', 'chroma')
+    VECTOR_NUMPY_PATH = os.getenv('VECTOR_NUMPY_PATH', './data/vector_store')
+    # 按目的地分区：带目的地过滤的查询只访问对应分区
+    VECTOR_PARTITION_ENABLED = os.getenv('VECTOR_PARTITION_ENABLED', 'False') == 'True'
+    VECTOR_PARTITION_KEY = os.getenv('VECTOR_PARTITION_KEY', 'destination')
+
+    # 向量存储快照（npz列式文件）；开启后集合为空的节点启动时直接加载快照，不再重新向量化
+    SNAPSHOT_PATH = os.getenv('SNAPSHOT_PATH', './data/snapshots/travel_guides.npz')
+    SNAPSHOT_LOAD_ON_STARTUP = os.getenv('SNAPSHOT_LOAD_ON_STARTUP', 'False') == 'True'
+    SNAPSHOT_BATCH_SIZE = int(os.getenv('SNAPSHOT_BATCH_SIZE', 5000))
+
+    # 长文本分段配置（all-MiniLM-L6-v2最大输入256个token）
+    CHUNK_ENABLED = os.getenv('CHUNK_ENABLED', 'True') == 'True'
+    CHUNK_MAX_TOKENS = int(os.getenv('CHUNK_MAX_TOKENS', 200))
+    CHUNK_OVERLAP_TOKENS = int(os.getenv('CHUNK_OVERLAP_TOKENS', 32))
+    CHUNK_SEARCH_OVERFETCH = int(os.getenv('CHUNK_SEARCH_OVERFETCH', 3))
+
+    # 混合检索配置（SQLite FTS5词法索引 + 向量检索，倒数排名融合）
+    HYBRID_SEARCH_ENABLED = os.getenv('HYBRID_SEARCH_ENABLED', 'True') == 'True'
+    HYBRID_RRF_K = int(os.getenv('HYBRID_RRF_K', 60))
+    LEXICAL_INDEX_PATH = os.getenv('LEXICAL_INDEX_PATH', '')  # 为空时放在CHROMA_PATH下
+
+    # 检索结果缓存配置（按集合版本失效，不设TTL）
+    SEARCH_CACHE_ENABLED = os.getenv('SEARCH_CACHE_ENABLED', 'True') == 'True'
+    SEARCH_CACHE_MAX_ENTRIES = int(os.getenv('SEARCH_CACHE_MAX_ENTRIES', 1024))
+
+    # MMR多样性重排配置（λ越小越偏向多样性，候选数 = limit * MMR_FETCH_FACTOR）
+    MMR_ENABLED = os.getenv('MMR_ENABLED', 'False') == 'True'
+    MMR_LAMBDA = float(os.getenv('MMR_LAMBDA', 0.7))
+    MMR_FETCH_FACTOR = int(os.getenv('MMR_FETCH_FACTOR', 4))
+
+    # 交叉编码器重排配置（按请求开启，对向量检索top-N候选在耗时预算内重排）
+    RERANK_ENABLED = os.getenv('RERANK_ENABLED', 'False') == 'True'
+    RERANK_MODEL_PATH = os.getenv('RERANK_MODEL_PATH', './models/mmarco-mMiniLMv2-L12-H384-v1')
+    RERANK_MODEL_NAME = os.getenv('RERANK_MODEL_NAME', 'cross-encoder/mmarco-mMiniLMv2-L12-H384-v1')
+    RERANK_MAX_LENGTH = int(os.getenv('RERANK_MAX_LENGTH', 256))
+    RERANK_TOP_N = int(os.getenv('RERANK_TOP_N', 20))
+    RERANK_BUDGET_MS = float(os.getenv('RERANK_BUDGET_MS', 150))
+    RERANK_MAX_BUDGET_MS = float(os.getenv('RERANK_MAX_BUDGET_MS', 1000))
+    RERANK_BATCH_SIZE = int(os.getenv('RERANK_BATCH_SIZE', 8))
+    RERANK_CACHE_MAX_ENTRIES = int(os.getenv('RERANK_CACHE_MAX_ENTRIES', 20000))
+
+    # 攻略生成检索是否做MMR多样性重排和交叉编码器重排（默认跟随MMR_ENABLED、RERANK_ENABLED）
+    GUIDE_MMR_ENABLED = os.getenv('GUIDE_MMR_ENABLED', str(MMR_ENABLED)) == 'True'
+    GUIDE_RERANK_ENABLED = os.getenv('GUIDE_RERANK_ENABLED', str(RERANK_ENABLED)) == 'True'
+
+    # 攻略生成上下文配置（检索段落按token预算组装，单段第一轮最多占预算的一定比例，近重复句子去掉）
+    GUIDE_CONTEXT_TOKEN_BUDGET = int(os.getenv('GUIDE_CONTEXT_TOKEN_BUDGET', 1200))
+    GUIDE_CONTEXT_MAX_PASSAGE_SHARE = float(os.getenv('GUIDE_CONTEXT_MAX_PASSAGE_SHARE', 0.5))
+    GUIDE_CONTEXT_DUPLICATE_THRESHOLD = float(os.getenv('GUIDE_CONTEXT_DUPLICATE_THRESHOLD', 0.8))
+
+    # 批量搜索单次请求的最大查询数
+    SEARCH_BATCH_MAX_QUERIES = int(os.getenv('SEARCH_BATCH_MAX_QUERIES', 20))
+
+    # 入库近重复检测配置（64位SimHash，海明距离不超过阈值视为重复）
+    DEDUP_ENABLED = os.getenv('DEDUP_ENABLED', 'True') == 'True'
+    DEDUP_MAX_DISTANCE = int(os.getenv('DEDUP_MAX_DISTANCE', 6))
+    DEDUP_INDEX_PATH = os.getenv('DEDUP_INDEX_PATH', '')  # 为空时放在CHROMA_PATH下
+
+    # 异步任务配置（攻略生成、自驾游规划可提交为后台任务，状态保存在SQLite中按TTL过期）
+    JOB_DB_PATH = os.getenv('JOB_DB_PATH', './data/jobs.db')
+    JOB_MAX_WORKERS = int(os.getenv('JOB_MAX_WORKERS', 4))
+    JOB_MAX_PENDING = int(os.getenv('JOB_MAX_PENDING', 32))
+    JOB_TTL_SECONDS = int(os.getenv('JOB_TTL_SECONDS', 3600))
+    JOB_STALE_SECONDS = int(os.getenv('JOB_STALE_SECONDS', 600))
+    JOB_MAX_WAIT_SECONDS = float(os.getenv('JOB_MAX_WAIT_SECONDS', 25))  # 长轮询单次最长等待
+    JOB_MODEL_WAIT_SECONDS = float(os.getenv('JOB_MODEL_WAIT_SECONDS', 120))  # 任务等待模型加载的最长时间
 
     # 内网穿透配置
     NGROK_AUTH_TOKEN = os.getenv('NGROK_AUTH_TOKEN', '')
@@ -4,10 +4,11 @@
 """
 
 import logging
+import sys
 import time
 import json
 from datetime import datetime
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Iterable, Optional
 from functools import wraps
 from .config import Config
 
@@ -37,6 +38,23 @@ class StructuredLogFormatter(logging.Formatter):
         
         return json.dumps(log_entry, ensure_ascii=False)
 
+def percentile(values: Iterable[float], q: float, digits: int = 1) -> Optional[float]:
+    """
+    最近秩分位数（各服务的耗时、相似度统计共用）
+    
+    Args:
+        values: 样本
+        q: 分位点（0~1）
+        digits: 保留的小数位数
+    
+    Returns:
+        分位数，没有样本时返回None
+    """
+    ordered = sorted(values)
+    if not ordered:
+        return None
+    return round(ordered[min(len(ordered) - 1, int(len(ordered) * q))], digits)
+
 class APIMetricsCollector:
     """API指标收集器"""
     
@@ -319,6 +337,31 @@ def performance_monitor(func):
     
     return wrapper
 
+# 路由以services.*导入服务模块，应用包和工具脚本以modular_api.services.*导入，同一服务模块可能各加载一份
+SERVICE_MODULE_PREFIXES = ('services.', 'modular_api.services.')
+
+def loaded_service_modules(module_name: str) -> list:
+    """已加载的服务模块（两种导入名都查看，未加载的跳过）"""
+    return [sys.modules[prefix + module_name] for prefix in SERVICE_MODULE_PREFIXES
+            if prefix + module_name in sys.modules]
+
+def find_service_instance(module_name: str, attribute: str) -> Optional[Any]:
+    """
+    查找服务模块中已创建的单例，不会触发创建（监控端点不应因为查询而加载模型或打开连接）
+    
+    Args:
+        module_name: services下的模块名，如 'jobs'
+        attribute: 保存单例的模块属性名，如 '_job_manager'
+    
+    Returns:
+        单例对象，尚未创建时返回None
+    """
+    for module in loaded_service_modules(module_name):
+        instance = getattr(module, attribute, None)
+        if instance is not None:
+            return instance
+    return None
+
 def create_monitoring_endpoints(app):
     """创建监控API端点"""
     from flask import Blueprint, jsonify
@@ -360,6 +403,56 @@ def create_monitoring_endpoints(app):
             })
         return jsonify({'status': 'error', 'message': '告警管理器未启用'}), 503
     
+    def stats_response(key, instance, get_stats='get_stats', **defaults):
+        """已创建的服务单例返回其统计信息，尚未创建时返回initialized=False"""
+        stats = dict(defaults, initialized=False)
+        if instance is not None:
+            stats = getattr(instance, get_stats)()
+            stats['initialized'] = True
+        return jsonify({
+            'status': 'success',
+            key: stats,
+            'timestamp': datetime.utcnow().isoformat() + 'Z'
+        })
+    
+    @monitoring_bp.route('/vector-store', methods=['GET'])
+    def get_vector_store():
+        """获取ChromaDB客户端和集合句柄的冷/热访问耗时"""
+        vector_store = {}
+        for module in loaded_service_modules('collection_manager'):
+            vector_store.update(module.get_collection_manager_stats())
+        return jsonify({
+            'status': 'success',
+            'vector_store': vector_store,
+            'timestamp': datetime.utcnow().isoformat() + 'Z'
+        })
+    
+    @monitoring_bp.route('/search-cache', methods=['GET'])
+    def get_search_cache():
+        """获取检索结果缓存的命中率和节省的耗时"""
+        return stats_response('search_cache', find_service_instance('vector', 'vector_service'),
+                              'get_search_cache_stats', enabled=False)
+    
+    @monitoring_bp.route('/reranker', methods=['GET'])
+    def get_reranker_stats():
+        """获取交叉编码器重排的就绪状态、预算耗尽次数和得分缓存命中率"""
+        return stats_response('reranker', find_service_instance('reranker', '_reranker'))
+    
+    @monitoring_bp.route('/llm', methods=['GET'])
+    def get_llm_stats():
+        """获取大模型各提供商的调用次数、重试次数、耗时分位数和token用量"""
+        return stats_response('llm', find_service_instance('llm_client', '_llm_client'))
+    
+    @monitoring_bp.route('/semantic-cache', methods=['GET'])
+    def get_semantic_cache_stats():
+        """获取语义回复缓存的命中率、条目数和相似度分布"""
+        return stats_response('semantic_cache', find_service_instance('semantic_cache', '_semantic_cache'))
+    
+    @monitoring_bp.route('/jobs', methods=['GET'])
+    def get_job_stats():
+        """获取异步任务的提交、拒绝、成功、失败次数和执行耗时"""
+        return stats_response('jobs', find_service_instance('jobs', '_job_manager'))
+    
     # 注册蓝图
     app.register_blueprint(monitoring_bp, url_prefix='/api/monitoring')
     
@@ -0,0 +1,41 @@
+"""
+流式响应工具模块
+Server-Sent Events（SSE）：客户端以 Accept: text/event-stream 请求时按事件逐步推送结果，
+否则仍返回完整的JSON响应
+"""
+
+import json
+from typing import Any, Iterable
+
+from flask import Response, request, stream_with_context
+
+
+def wants_event_stream() -> bool:
+    """客户端是否优先接受SSE（Accept中text/event-stream优先于application/json）"""
+    accept = request.accept_mimetypes
+    return accept['text/event-stream'] > accept['application/json']
+
+
+def sse_event(event: str, data: Any) -> str:
+    """编码一个SSE事件（data为JSON）"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def sse_response(events: Iterable[str]) -> Response:
+    """
+    把事件迭代器包装为流式响应（保留请求上下文，禁用代理缓冲）
+
+    Args:
+        events: sse_event编码后的事件迭代器
+
+    Returns:
+        text/event-stream响应
+    """
+    return Response(
+        stream_with_context(events),
+        mimetype='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'
+        }
+    )
@@ -0,0 +1,53 @@
+import sys
+import os
+
+import pytest
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from modular_api.services.collection_manager import CollectionManager
+from modular_api.services.vector import VectorService
+from modular_api.services.vector_profile import StorageProfile
+
+
+@pytest.fixture
+def make_vector_service(tmp_path):
+    """
+    构造一个依赖全部注入的VectorService：不加载真实模型、不读取全局配置的后端、索引和缓存
+
+    返回的工厂接收假模型服务和集合名，其余依赖（backend、chunker、lexical_index、search_cache等）
+    默认关闭，可按测试需要以关键字参数传入
+    """
+    def factory(model_service=None, collection_name='test_guides', **dependencies):
+        options = dict(collection_manager=CollectionManager(str(tmp_path / 'chroma_db')),
+                       profile=StorageProfile('float32'), backend=None, chunker=None, lexical_index=None,
+                       dedup_index=None, search_cache=None, collection_version=None)
+        options.update(dependencies)
+        return VectorService(model_service=model_service, collection_name=collection_name, **options)
+
+    return factory
+
+
+@pytest.fixture
+def cleaning_model_service():
+    """
+    只带文本清洗能力的ModelService：spaCy空白中文管道（按字切分、自带停用词表），
+    词形取原文，代替测试环境中没有安装的zh_core_web_sm
+    """
+    import spacy
+    from spacy.language import Language
+    from modular_api.services.model import ModelService
+
+    if 'copy_lemma' not in Language.factories:
+        @Language.component('copy_lemma')
+        def copy_lemma(doc):
+            for token in doc:
+                token.lemma_ = token.text
+            return doc
+
+    nlp = spacy.blank('zh')
+    nlp.add_pipe('copy_lemma')
+    service = ModelService.__new__(ModelService)
+    service.nlp = nlp
+    return service
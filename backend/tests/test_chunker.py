@@ -0,0 +1,77 @@
+import sys
+import os
+import uuid
+
+import numpy as np
+import pytest
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from modular_api.services.chunker import TextChunker, estimate_tokens
+
+LONG_GUIDE = ''.join(f'第{i}天去{name}，品尝当地美食并在附近住宿。'
+                     for i, name in enumerate(['故宫', '长城', '颐和园', '天坛', '南锣鼓巷', '798艺术区'] * 3))
+
+
+class CharModelService:
+    """按字符统计生成归一化向量的假模型服务"""
+
+    def clean_texts(self, texts):
+        return list(texts)
+
+    def encode_text(self, texts):
+        vectors = np.zeros((len(texts), 128), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for char in text:
+                vectors[row, ord(char) % 128] += 1
+        return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+@pytest.fixture
+def vector_service(make_vector_service):
+    return make_vector_service(CharModelService(), f"test_{uuid.uuid4().hex}",
+                               chunker=TextChunker(max_tokens=40, overlap_tokens=10))
+
+
+def test_short_text_is_single_passage():
+    """短文本不切分"""
+    passages = TextChunker(max_tokens=200).split('北京三日游')
+    assert len(passages) == 1
+    assert passages[0].text == '北京三日游'
+
+
+def test_long_text_respects_window_and_overlaps():
+    """每段不超过token上限，相邻段落有重叠，且覆盖全文"""
+    chunker = TextChunker(max_tokens=60, overlap_tokens=25)
+    passages = chunker.split(LONG_GUIDE)
+    assert len(passages) > 3
+    assert all(estimate_tokens(p.text) <= 60 for p in passages)
+    assert all(LONG_GUIDE[p.start:p.end] == p.text for p in passages)
+    assert all(b.start < a.end for a, b in zip(passages, passages[1:]))
+    assert passages[0].start == 0 and passages[-1].end == len(LONG_GUIDE)
+
+
+def test_sentence_longer_than_window_is_hard_split():
+    """没有标点的超长句子按token硬切分"""
+    text = '很长的一句话' * 50
+    passages = TextChunker(max_tokens=30, overlap_tokens=5).split(text)
+    assert all(estimate_tokens(p.text) <= 30 for p in passages)
+    assert passages[-1].end == len(text)
+
+
+def test_search_collapses_passages_to_documents(vector_service):
+    """长文档按段落存储，检索结果按父文档折叠，get_document可拼回原文"""
+    long_id, short_id = vector_service.add_documents(
+        [LONG_GUIDE, '成都火锅和熊猫基地'],
+        [{'destination': '北京'}, {'destination': '成都'}]
+    )
+    assert vector_service.collection.count() > 2
+
+    results = vector_service.search_similar('故宫长城美食住宿', limit=5)
+    ids = [item['id'] for item in results['results']]
+    assert ids.count(long_id) == 1
+    assert set(ids) == {long_id, short_id}
+
+    assert vector_service.get_document(long_id)['content'] == LONG_GUIDE
+    assert vector_service.get_document(short_id)['content'] == '成都火锅和熊猫基地'
@@ -0,0 +1,30 @@
+import sys
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from modular_api.services.collection_manager import CollectionManager, get_collection_manager
+
+
+def test_collection_is_opened_once_and_reused(tmp_path):
+    """并发访问只创建一个客户端和一个集合句柄，其余均为热访问"""
+    manager = CollectionManager(str(tmp_path / 'chroma_db'))
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        handles = list(executor.map(lambda _: manager.get_collection('travel_guides'), range(32)))
+
+    assert all(handle is handles[0] for handle in handles)
+    stats = manager.get_stats()
+    assert stats['cold_opens'] == 1
+    assert stats['warm_hits'] == 31
+    assert stats['client_init_ms'] is not None
+    assert stats['collections']['travel_guides']['cold_open_ms'] is not None
+    assert stats['collections']['travel_guides']['warm_avg_ms'] is not None
+
+
+def test_manager_is_shared_per_path(tmp_path):
+    """同一路径返回同一个管理器实例"""
+    path = str(tmp_path / 'shared')
+    assert get_collection_manager(path) is get_collection_manager(path)
+    assert get_collection_manager(path) is not get_collection_manager(str(tmp_path / 'other'))
@@ -0,0 +1,77 @@
+import sys
+import os
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from modular_api.services.chunker import TextChunker, estimate_tokens
+from modular_api.services.context_assembler import ContextAssembler
+
+
+LONG_GUIDE = ''.join(f"第{i}天随便走走看看风景拍拍照片。" for i in range(40)) + '成都火锅一定要吃九宫格。'
+
+
+def test_context_stays_within_budget_and_reports_usage():
+    """上下文不超过预算；排名靠前的长文不会挤掉后面的段落，截断时保留与查询相关的句子"""
+    passages = [
+        {'id': 'long', 'content': LONG_GUIDE},
+        {'id': 'short', 'content': '宽窄巷子适合傍晚去。锦里小吃很多。'}
+    ]
+    result = ContextAssembler(budget_tokens=120, max_passage_share=0.5).assemble('成都 火锅', passages)
+    report = result['report']
+
+    assert sum(estimate_tokens(line) for line in result['text'].split('\n')) == report['used_tokens'] <= 120
+    assert report['input_tokens'] > 400 and report['utilization'] > 0.8
+    assert '成都火锅一定要吃九宫格。' in result['text']
+    assert '宽窄巷子适合傍晚去。锦里小吃很多。' in result['text']
+    assert report['passages_used'] == 2 and report['truncated_passages'] == 1
+    long_report = report['passages'][0]
+    assert long_report['id'] == 'long' and long_report['truncated'] and long_report['tokens'] < 120
+
+
+def test_near_duplicate_sentences_are_dropped():
+    """与排名更靠前的句子近重复（标点、空白差异）的句子被丢弃，整段重复的段落不占预算"""
+    passages = [
+        {'id': 'a', 'content': '推荐去宽窄巷子，人少的时候去。大熊猫基地要早起！'},
+        {'id': 'b', 'content': '推荐去 宽窄巷子 人少的时候去。\n大熊猫基地要早起'},
+        {'id': 'c', 'content': '春熙路晚上很热闹。'}
+    ]
+    result = ContextAssembler(budget_tokens=500).assemble('成都景点', passages)
+    report = result['report']
+
+    assert report['duplicate_sentences'] == 2
+    assert report['dropped_passages'] == 1 and report['passages'][1]['sentences'] == 0
+    assert result['text'] == '推荐去宽窄巷子，人少的时候去。大熊猫基地要早起！\n春熙路晚上很热闹。'
+
+
+CITY_FOODS = ''.join(f"{city}的{food}非常好吃。" for city in ['成都', '重庆', '西安', '长沙', '昆明', '桂林']
+                     for food in ['火锅', '米线', '凉面', '烧烤', '豆花'])
+
+
+def test_cleaned_passages_keep_sentence_boundaries(cleaning_model_service):
+    """入库的是clean_texts的结果：句末标点保留，分段按句切分，上下文组装按句截断"""
+    cleaned = cleaning_model_service.clean_texts([CITY_FOODS + '\n锦里小吃很多'])[0]
+    assert ' ' in cleaned and '的' not in cleaned and cleaned.count('。') == 30 and '\n' in cleaned
+
+    passages = TextChunker(max_tokens=40, overlap_tokens=0).split(cleaned)
+    assert len(passages) > 1 and all(passage.text.rstrip().endswith('。') for passage in passages[:-1])
+
+    assembler = ContextAssembler(budget_tokens=60, max_passage_share=1.0)
+    assert len(assembler.split_sentences(cleaned)) == 31
+    result = assembler.assemble('昆明 米线', [{'id': 'foods', 'content': cleaned}])
+    report = result['report']['passages'][0]
+    assert report['truncated'] and 1 < report['sentences'] < 31
+    assert '昆 明 米 线 非 吃。' in result['text']
+
+
+def test_passages_without_boundaries_are_split_by_token_window(cleaning_model_service):
+    """没有句子边界的旧段落按token窗口切分，预算截断仍然生效"""
+    legacy = cleaning_model_service.clean_texts([CITY_FOODS])[0].replace('。', '')
+    assembler = ContextAssembler(budget_tokens=100, max_sentence_tokens=20)
+    windows = assembler.split_sentences(legacy)
+    assert len(windows) > 1 and all(estimate_tokens(window) <= 20 for window in windows)
+    assert ''.join(windows) == legacy
+
+    result = assembler.assemble('昆明 米线', [{'id': 'legacy', 'content': legacy}])
+    report = result['report']
+    assert report['passages'][0]['truncated'] and 0 < report['used_tokens'] <= 100
@@ -0,0 +1,102 @@
+import sys
+import os
+
+import numpy as np
+from flask import Flask
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from modular_api.routes import guide as guide_module
+from modular_api.services.dedup import NearDuplicateIndex, band_layout, hamming_distance, simhash
+
+NOTE = ('成都三日游攻略：第一天去宽窄巷子和人民公园喝茶，晚上吃火锅；第二天去大熊猫繁育研究基地，'
+        '下午逛春熙路和太古里；第三天去都江堰和青城山，记得带好雨具和运动鞋。')
+REPOST = '【转载】' + NOTE + ' #旅行 #成都'
+OTHER = '重庆两日游：洪崖洞夜景、解放碑、磁器口古镇，晚上一定要去吃一顿地道的老火锅，第二天坐长江索道，再去李子坝看轻轨穿楼。'
+
+
+class CountingModelService:
+    """记录被编码文本的假模型"""
+
+    def __init__(self):
+        self.encoded = []
+
+    def clean_texts(self, texts):
+        return list(texts)
+
+    def encode_text(self, texts):
+        self.encoded.extend(texts)
+        return np.array([[len(text) + 1.0, 1.0] for text in texts], dtype=np.float32)
+
+
+def test_simhash_tolerates_small_edits():
+    """排版差异指纹相同，转载加标签的距离很小，不同攻略距离很大"""
+    assert simhash(NOTE) == simhash(' '.join(NOTE))
+    assert hamming_distance(simhash(NOTE), simhash(REPOST)) <= 6
+    assert hamming_distance(simhash(NOTE), simhash(OTHER)) > 16
+
+
+def test_band_layout_covers_all_bits():
+    """分段数为阈值 + 1，各段覆盖全部64位"""
+    layout = band_layout(6)
+    assert len(layout) == 7
+    assert sum(width for _, width in layout) == 64
+    assert layout[-1][0] + layout[-1][1] == 64
+
+
+def test_index_detects_duplicates_within_batch_and_across_runs(tmp_path):
+    """同一批内和已入库的近重复文档都能识别；同ID重写不算重复"""
+    path = str(tmp_path / 'dedup.sqlite3')
+    index = NearDuplicateIndex(path, max_distance=6)
+    assert index.check_and_add(['a', 'b', 'c'], [NOTE, REPOST, OTHER]) == [None, 'a', None]
+    assert index.check_and_add(['a'], [NOTE]) == [None]
+
+    # 换一个阈值重新打开，分段表按新方式重建
+    reopened = NearDuplicateIndex(path, max_distance=3)
+    assert reopened.check_and_add(['d'], [NOTE]) == ['a']
+    reopened.remove(['a'])
+    assert reopened.check_and_add(['e'], [REPOST]) == [None]
+
+
+def test_add_documents_skips_near_duplicates_before_encoding(tmp_path, make_vector_service):
+    """重复文档不再编码写入，返回已有文档ID；删除后可重新写入"""
+    service = make_vector_service(CountingModelService(), 'dedup_test',
+                                  dedup_index=NearDuplicateIndex(str(tmp_path / 'dedup.sqlite3')))
+
+    ids = service.add_documents([NOTE, OTHER], [{'destination': '成都'}, {'destination': '重庆'}],
+                                ids=['note', 'other'])
+    assert ids == ['note', 'other']
+
+    ids = service.add_documents([REPOST], [{'destination': '成都'}], ids=['repost'])
+    assert ids == ['note']
+    assert service.model_service.encoded == [NOTE, OTHER]
+    assert service.collection.count() == 2
+
+    service.delete_documents(['note'])
+    assert service.add_documents([REPOST], [{'destination': '成都'}], ids=['repost']) == ['repost']
+
+
+class InfoModelService:
+    def get_model_info(self):
+        return {'state': 'ready'}
+
+
+def test_upload_guide_reports_duplicates(tmp_path, monkeypatch, make_vector_service):
+    """上传近重复攻略时返回duplicate状态和已有攻略ID，而不是假装上传成功"""
+    service = make_vector_service(CountingModelService(), 'upload_test',
+                                  dedup_index=NearDuplicateIndex(str(tmp_path / 'dedup.sqlite3')))
+    monkeypatch.setattr(guide_module, 'get_vector_service', lambda: service)
+    monkeypatch.setattr(guide_module, 'get_model_service', lambda: InfoModelService())
+    app = Flask(__name__)
+    app.register_blueprint(guide_module.bp)
+    client = app.test_client()
+    token = sys.modules['services.auth'].get_auth_service().generate_token('u1')['access_token']
+    headers = {'Authorization': f'Bearer {token}'}
+
+    first = client.post('/upload-guide', json={'text': NOTE, 'destination': '成都'}, headers=headers).get_json()
+    assert first['status'] == 'success' and 'duplicate_of' not in first
+
+    again = client.post('/upload-guide', json={'text': REPOST, 'images': ['a.jpg']}, headers=headers).get_json()
+    assert again['status'] == 'duplicate' and again['duplicate_of'] == first['id'] == again['id']
+    assert service.collection.count() == 1
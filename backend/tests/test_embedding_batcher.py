@@ -0,0 +1,100 @@
+import threading
+import sys
+import os
+
+import numpy as np
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from modular_api.services.embedding_batcher import EmbeddingBatcher
+
+
+def fake_encode(calls):
+    """返回一个记录调用批次的假encode函数，每行向量为文本长度"""
+    def encode(texts):
+        calls.append(len(texts))
+        return np.array([[float(len(t)), 1.0] for t in texts])
+    return encode
+
+
+def test_concurrent_calls_are_merged():
+    """并发的单条encode应被合并为更少的批次，且每个调用方拿回自己的行"""
+    calls = []
+    batcher = EmbeddingBatcher(fake_encode(calls), max_batch_size=64, max_wait_ms=50)
+    batcher.start()
+    try:
+        results = {}
+        barrier = threading.Barrier(16)
+
+        def worker(i):
+            barrier.wait()
+            results[i] = batcher.encode(['x' * (i + 1)])
+
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(16)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        for i in range(16):
+            assert results[i].shape == (1, 2)
+            assert results[i][0][0] == i + 1
+        assert len(calls) < 16
+        assert batcher.get_stats()['texts'] == 16
+    finally:
+        batcher.stop()
+
+
+def test_large_request_bypasses_queue():
+    """超过批次上限的请求直接在调用方线程编码"""
+    calls = []
+    batcher = EmbeddingBatcher(fake_encode(calls), max_batch_size=4, max_wait_ms=5)
+    batcher.start()
+    try:
+        vectors = batcher.encode(['a', 'bb', 'ccc', 'dddd', 'eeeee'])
+        assert vectors.shape == (5, 2)
+        assert calls == [5]
+        assert batcher.get_stats()['batches'] == 0
+    finally:
+        batcher.stop()
+
+
+def test_errors_propagate_to_callers():
+    """批量编码异常应传递给等待中的调用方"""
+    def failing_encode(texts):
+        raise ValueError("boom")
+
+    batcher = EmbeddingBatcher(failing_encode, max_batch_size=8, max_wait_ms=1)
+    batcher.start()
+    try:
+        try:
+            batcher.encode(['a'])
+            assert False, "应抛出异常"
+        except ValueError:
+            pass
+    finally:
+        batcher.stop()
+
+
+def test_encode_racing_stop_never_hangs():
+    """与stop()并发的encode要么被处理、要么以异常结束，不会永远阻塞"""
+    for _ in range(20):
+        batcher = EmbeddingBatcher(fake_encode([]), max_batch_size=8, max_wait_ms=1)
+        batcher.start()
+        outcomes = []
+
+        def worker():
+            for _ in range(20):
+                try:
+                    outcomes.append(batcher.encode(['a'], timeout=5).shape)
+                except RuntimeError:
+                    outcomes.append('stopped')
+
+        threads = [threading.Thread(target=worker) for _ in range(4)]
+        for t in threads:
+            t.start()
+        batcher.stop()
+        for t in threads:
+            t.join()
+        assert len(outcomes) == 80
@@ -0,0 +1,105 @@
+import sys
+import os
+
+import numpy as np
+import pytest
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from modular_api.services.embedding_cache import EmbeddingCache
+
+
+def test_memory_and_disk_hits(tmp_path):
+    """写入后内存命中，重新打开后从磁盘命中"""
+    db_path = str(tmp_path / 'cache.db')
+    cache = EmbeddingCache(db_path=db_path)
+    vectors = np.array([[1.0, 2.0], [3.0, 4.0]], dtype=np.float32)
+    cache.put_many('model-a', ['北京', '上海'], vectors)
+
+    hits = cache.get_many('model-a', ['上海', '杭州'])
+    assert np.allclose(hits[0], [3.0, 4.0])
+    assert hits[1] is None
+    cache.close()
+
+    reopened = EmbeddingCache(db_path=db_path)
+    hits = reopened.get_many('model-a', ['北京'])
+    assert np.allclose(hits[0], [1.0, 2.0])
+    stats = reopened.get_stats()
+    assert stats['disk_hits'] == 1
+    assert stats['disk_entries'] == 2
+    reopened.close()
+
+
+def test_keys_are_scoped_by_model():
+    """不同模型的同一文本互不命中"""
+    cache = EmbeddingCache()
+    cache.put_many('model-a', ['北京'], np.ones((1, 2)))
+    assert cache.get_many('model-b', ['北京']) == [None]
+
+
+def test_memory_budget_evicts_lru():
+    """超出字节预算时淘汰最久未使用的条目"""
+    cache = EmbeddingCache(memory_budget_bytes=2 * 4 * 4)  # 两条4维float32
+    cache.put_many('m', ['a', 'b'], np.ones((2, 4)))
+    cache.get_many('m', ['a'])
+    cache.put_many('m', ['c'], np.ones((1, 4)))
+
+    hits = cache.get_many('m', ['a', 'b', 'c'])
+    assert hits[0] is not None
+    assert hits[1] is None
+    assert hits[2] is not None
+    assert cache.get_stats()['evictions'] == 1
+
+
+def test_hits_are_read_only():
+    """命中返回的向量只读，调用方原地修改不会污染缓存"""
+    cache = EmbeddingCache()
+    cache.put_many('m', ['a'], np.ones((1, 2)))
+    hit = cache.get_many('m', ['a'])[0]
+    with pytest.raises(ValueError):
+        hit /= 2
+    assert np.allclose(cache.get_many('m', ['a'])[0], [1.0, 1.0])
+
+
+def test_disk_tier_prunes_least_recently_used(tmp_path):
+    """磁盘层超出条数上限时淘汰最久未使用的条目"""
+    cache = EmbeddingCache(db_path=str(tmp_path / 'cache.db'), memory_budget_bytes=0, max_disk_entries=10)
+    cache.put_many('m', [f't{i}' for i in range(10)], np.ones((10, 2)))
+    cache.get_many('m', ['t0'])
+    cache.put_many('m', ['t10'], np.ones((1, 2)))
+
+    stats = cache.get_stats()
+    assert stats['disk_entries'] == 9 and stats['disk_evictions'] == 2
+    assert cache.get_many('m', ['t0', 't10'])[0] is not None
+    assert sum(hit is None for hit in cache.get_many('m', [f't{i}' for i in range(1, 10)])) == 2
+    cache.close()
+
+
+def test_disk_tier_avoids_count_scans_and_per_hit_commits(tmp_path, monkeypatch):
+    """写入不再每次COUNT(*)全表；磁盘命中的访问时间攒批写回，读路径不逐次提交"""
+    from modular_api.services import embedding_cache as cache_module
+    monkeypatch.setattr(cache_module, 'TOUCH_FLUSH_BATCH', 3)
+    path = str(tmp_path / 'cache.db')
+    cache = EmbeddingCache(db_path=path, memory_budget_bytes=0, max_disk_entries=100)
+    statements = []
+    cache._conn.set_trace_callback(statements.append)
+
+    cache.put_many('m', [f't{i}' for i in range(5)], np.ones((5, 2)))
+    cache.put_many('m', ['t0', 't5'], np.full((2, 2), 2.0))
+    assert not any('COUNT' in sql for sql in statements)
+    assert cache.get_stats()['disk_entries'] == 6
+
+    statements.clear()
+    cache.get_many('m', ['t1'])
+    cache.get_many('m', ['t2'])
+    assert not any(sql.startswith(('UPDATE', 'COMMIT')) for sql in statements)
+    assert cache.get_stats()['pending_touches'] == 2
+    cache.get_many('m', ['t3'])
+    assert cache.get_stats()['pending_touches'] == 0 and any(sql.startswith('COMMIT') for sql in statements)
+    cache.close()
+
+    reopened = EmbeddingCache(db_path=path, memory_budget_bytes=0)
+    assert reopened.get_stats()['disk_entries'] == 6
+    assert reopened.get_many('m', ['t0'])[0].tolist() == [2.0, 2.0]
+    reopened.close()
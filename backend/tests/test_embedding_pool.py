@@ -0,0 +1,94 @@
+import sys
+import os
+import threading
+import time
+
+import numpy as np
+import pytest
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from modular_api.services.embedding_pool import EmbeddingWorkerPool
+
+
+class LengthModel:
+    """按文本长度生成向量的假模型，便于校验结果顺序"""
+
+    def encode(self, texts):
+        time.sleep(0.05)
+        return np.array([[float(len(t)), float(os.getpid()), 1.0] for t in texts], dtype=np.float32)
+
+
+def make_length_model():
+    return LengthModel()
+
+
+class CrashingModel(LengthModel):
+    """遇到'crash'文本时直接退出进程，模拟子进程崩溃"""
+
+    def encode(self, texts):
+        if 'crash' in texts:
+            os._exit(1)
+        return super().encode(texts)
+
+
+def make_crashing_model():
+    return CrashingModel()
+
+
+@pytest.fixture(scope='module')
+def pool():
+    worker_pool = EmbeddingWorkerPool(2, {'factory': 'test_embedding_pool:make_length_model'},
+                                      start_timeout=120, job_timeout=30)
+    assert worker_pool.start()
+    yield worker_pool
+    worker_pool.stop()
+
+
+def test_pool_returns_rows_in_order(pool):
+    """结果通过共享内存回传，且与输入顺序一致"""
+    texts = ['x' * (i + 1) for i in range(5)]
+    vectors = pool.encode(texts)
+    assert vectors.shape == (5, 3)
+    assert vectors[:, 0].tolist() == [1.0, 2.0, 3.0, 4.0, 5.0]
+
+
+def test_large_batches_are_split_across_workers(pool):
+    """大批量被切分给多个子进程并行编码"""
+    texts = ['y' * (i % 7 + 1) for i in range(200)]
+    vectors = pool.encode(texts)
+    assert vectors[:, 0].tolist() == [float(len(t)) for t in texts]
+    assert len(set(vectors[:, 1].tolist())) == 2
+    assert pool.get_stats()['alive_workers'] == 2
+
+
+def test_worker_crash_fails_in_flight_job_and_restarts():
+    """子进程崩溃时正在处理的任务立即失败（不等调用方超时，其他子进程持续返回结果也一样），子进程被重启"""
+    worker_pool = EmbeddingWorkerPool(2, {'factory': 'test_embedding_pool:make_crashing_model'},
+                                      start_timeout=120, job_timeout=60)
+    assert worker_pool.start()
+    stop = threading.Event()
+
+    def keep_busy():
+        while not stop.is_set():
+            worker_pool.encode(['ab'])
+
+    busy = threading.Thread(target=keep_busy, daemon=True)
+    busy.start()
+    try:
+        started = time.monotonic()
+        with pytest.raises(RuntimeError, match='退出'):
+            worker_pool.encode(['crash'])
+        assert time.monotonic() - started < 10
+        assert worker_pool.get_stats()['restarts'] == 1
+
+        deadline = time.monotonic() + 120
+        while worker_pool.get_stats()['ready_workers'] < 2 and time.monotonic() < deadline:
+            time.sleep(0.2)
+        assert worker_pool.get_stats()['ready_workers'] == 2
+        assert worker_pool.encode(['ab'])[0, 0] == 2.0
+    finally:
+        stop.set()
+        busy.join(timeout=60)
+        worker_pool.stop()
@@ -0,0 +1,57 @@
+import sys
+import os
+
+import numpy as np
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from modular_api.services.hashing_embedding import HashingEmbeddingModel
+from modular_api.services.model import ModelService
+from modular_api.utils.config import Config
+
+CORPUS = [
+    '北京故宫一日游攻略，建议提前预约门票',
+    '成都美食攻略：火锅、串串和兔头',
+    '杭州西湖骑行路线推荐',
+    'Beijing Forbidden City travel guide',
+]
+
+
+def test_vectors_are_deterministic_and_normalized():
+    """同一文本在不同实例、不同批次中得到完全相同的归一化向量"""
+    first = HashingEmbeddingModel(dim=384).encode(CORPUS)
+    second = HashingEmbeddingModel(dim=384).encode(CORPUS[::-1], batch_size=1)[::-1]
+    assert first.shape == (4, 384)
+    assert first.dtype == np.float32
+    assert np.array_equal(first, second)
+    assert np.allclose(np.linalg.norm(first, axis=1), 1.0, atol=1e-5)
+
+
+def test_lexical_overlap_ranks_first():
+    """字面相近的查询与对应文档最相似"""
+    model = HashingEmbeddingModel(dim=384).fit(CORPUS)
+    docs = model.encode(CORPUS)
+    queries = model.encode(['故宫门票预约', '成都火锅', '西湖骑行', 'forbidden city guide'])
+    assert (queries @ docs.T).argmax(axis=1).tolist() == [0, 1, 2, 3]
+
+
+def test_idf_round_trip(tmp_path):
+    """IDF可以保存并重新加载，维度不一致时忽略"""
+    path = str(tmp_path / 'idf.npz')
+    model = HashingEmbeddingModel(dim=128).fit(CORPUS)
+    model.save_idf(path)
+    assert np.array_equal(HashingEmbeddingModel.load(128, path).idf, model.idf)
+    assert HashingEmbeddingModel.load(256, path).idf is None
+
+
+def test_hashing_backend_skips_transformer(monkeypatch):
+    """EMBEDDING_BACKEND=hashing时直接使用哈希引擎"""
+    monkeypatch.setattr(Config, 'EMBEDDING_BACKEND', 'hashing')
+    monkeypatch.setattr(Config, 'EMBEDDING_BATCH_ENABLED', False)
+    monkeypatch.setattr(Config, 'EMBEDDING_HASHING_IDF_PATH', '')
+    monkeypatch.setattr(ModelService, '_initialize_nlp_model', lambda self: None)
+    service = ModelService(background=False)
+    assert service.embedding_backend == 'hashing'
+    assert service.embedding_cache is None
+    assert np.array_equal(service.encode_text(['北京']), service.encode_text(['北京']))
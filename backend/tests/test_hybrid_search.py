@@ -0,0 +1,82 @@
+import sys
+import os
+
+import numpy as np
+import pytest
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from modular_api.services.lexical_index import LexicalIndex, tokenize, tokenize_query
+
+GENERIC_GUIDES = [f'第{i}篇通用旅游攻略：景点、美食、住宿和交通都很方便' for i in range(10)]
+PLACE_GUIDE = '鼓浪屿环岛路和钢琴博物馆'
+
+
+class GenericBiasedModelService:
+    """让通用攻略在向量空间中更接近任何查询的假模型，模拟地名查询输给通用文本的情况"""
+
+    def clean_texts(self, texts):
+        return list(texts)
+
+    def encode_text(self, texts):
+        vectors = np.zeros((len(texts), 4), dtype=np.float32)
+        for row, text in enumerate(texts):
+            if text == PLACE_GUIDE:
+                vectors[row] = [0.2, 1.0, 0.0, 0.0]
+            elif text in GENERIC_GUIDES:
+                vectors[row] = [1.0, 0.0, 0.01 * (len(text) + row), 0.0]
+            else:
+                vectors[row] = [1.0, 0.0, 0.0, 0.1]
+        return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+@pytest.fixture
+def vector_service(tmp_path, make_vector_service):
+    service = make_vector_service(GenericBiasedModelService(), 'hybrid_test',
+                                  lexical_index=LexicalIndex(str(tmp_path / 'lexical.sqlite3')))
+    service.add_documents(GENERIC_GUIDES + [PLACE_GUIDE],
+                          [{'destination': '通用'}] * len(GENERIC_GUIDES) + [{'destination': '厦门'}],
+                          ids=[f'generic_{i}' for i in range(10)] + ['gulangyu'])
+    return service
+
+
+def test_cjk_tokenizer_emits_unigrams_and_bigrams():
+    """索引输出单字和双字，查询只用双字"""
+    assert tokenize('鼓浪屿 Day1') == ['鼓', '浪', '屿', '鼓浪', '浪屿', 'day1']
+    assert tokenize_query('稻城亚丁') == ['稻城', '城亚', '亚丁']
+
+
+def test_lexical_index_upsert_and_search(tmp_path):
+    """重复写入同一ID会覆盖旧内容"""
+    index = LexicalIndex(str(tmp_path / 'lexical.sqlite3'))
+    index.add(['a', 'b'], ['稻城亚丁徒步', '成都火锅'])
+    index.add(['b'], ['稻城亚丁自驾'], ['parent_b'])
+    hits = index.search('稻城亚丁', limit=5)
+    assert {hit[0] for hit in hits} == {'a', 'b'}
+    assert dict((hit[0], hit[1]) for hit in hits)['b'] == 'parent_b'
+    assert index.search('火锅') == []
+    assert index.count() == 2
+
+
+def test_place_name_query_is_rescued_by_fusion(vector_service):
+    """纯向量检索召回不到的地名文档，融合后进入结果"""
+    lexical_index = vector_service.lexical_index
+    vector_service.lexical_index = None
+    dense_ids = [item['id'] for item in vector_service.search_similar('鼓浪屿', limit=3)['results']]
+    assert 'gulangyu' not in dense_ids
+
+    vector_service.lexical_index = lexical_index
+    results = vector_service.search_similar('鼓浪屿', limit=3)['results']
+    by_id = {item['id']: item for item in results}
+    assert 'gulangyu' in by_id
+    assert by_id['gulangyu']['sources'] == ['lexical']
+    assert by_id['gulangyu']['metadata']['destination'] == '厦门'
+    assert -1.0 <= by_id['gulangyu']['score'] <= 1.0
+    assert len(results) == 3
+
+
+def test_lexical_hits_respect_filters(vector_service):
+    """过滤条件同样作用于仅词法命中的文档"""
+    results = vector_service.search_similar('鼓浪屿', limit=3, filters={'destination': '通用'})['results']
+    assert all(item['id'] != 'gulangyu' for item in results)
@@ -0,0 +1,104 @@
+import io
+import json
+import sys
+import os
+
+import pytest
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from modular_api.ingest import IngestPipeline, _iter_json_array, iter_records
+
+
+class FakeModelService:
+    def clean_texts(self, texts):
+        return [text.strip() for text in texts]
+
+
+class FakeVectorService:
+    """记录写入内容的假向量服务，可在第N次写入时模拟失败"""
+
+    def __init__(self, fail_on_call=None):
+        self.model_service = FakeModelService()
+        self.documents = {}
+        self.calls = 0
+        self.fail_on_call = fail_on_call
+
+    def expand_passages(self, texts, metadatas, ids):
+        return list(texts), list(metadatas), list(ids)
+
+    def embed_texts(self, texts):
+        return [[float(len(text))] for text in texts]
+
+    def add_embeddings(self, texts, embeddings, metadatas, ids=None, upsert=False):
+        self.calls += 1
+        if self.calls == self.fail_on_call:
+            raise KeyboardInterrupt()
+        for doc_id, text, metadata in zip(ids, texts, metadatas):
+            self.documents[doc_id] = (text, metadata)
+        return ids
+
+
+def write_records(path, records, jsonl=False):
+    with open(path, 'w', encoding='utf-8') as f:
+        if jsonl:
+            f.write('\n'.join(json.dumps(r, ensure_ascii=False) for r in records))
+        else:
+            json.dump(records, f, ensure_ascii=False)
+
+
+def test_json_array_is_streamed_across_chunks():
+    """顶层数组按元素流式解析，元素跨越读取块边界也能正确解析"""
+    records = [{'text': f'攻略{i}' * 5, 'destination': '北京'} for i in range(20)]
+    parsed = list(_iter_json_array(io.StringIO(json.dumps(records, ensure_ascii=False)), chunk_size=7))
+    assert parsed == records
+
+
+def test_jsonl_and_wrapped_object(tmp_path):
+    """支持JSONL和包含记录列表的顶层对象"""
+    jsonl_path = str(tmp_path / 'guides.jsonl')
+    write_records(jsonl_path, [{'text': 'a'}, {'text': 'b'}], jsonl=True)
+    wrapped_path = str(tmp_path / 'wrapped.json')
+    with open(wrapped_path, 'w', encoding='utf-8') as f:
+        json.dump({'guides': [{'text': 'c'}]}, f)
+    assert [r['text'] for r in iter_records(jsonl_path)] == ['a', 'b']
+    assert [r['text'] for r in iter_records(wrapped_path)] == ['c']
+
+
+def test_pipeline_ingests_and_skips_empty_records(tmp_path):
+    """三阶段流水线写入全部有效记录，ID确定且重复导入不会产生新文档"""
+    source = str(tmp_path / 'raw_data.json')
+    records = [{'text': f' 第{i}篇攻略 ', 'destination': '成都', 'images': ['a.jpg']} for i in range(10)]
+    records.append({'text': ''})
+    write_records(source, records)
+
+    service = FakeVectorService()
+    stats = IngestPipeline(service, batch_size=3, checkpoint_path=None).run([source])
+    assert stats['written'] == 10
+    assert stats['skipped'] == 1
+    assert 'docs_per_sec' in stats
+    text, metadata = next(iter(service.documents.values()))
+    assert text == text.strip()
+    assert json.loads(metadata['images']) == ['a.jpg']
+
+    IngestPipeline(service, batch_size=4, checkpoint_path=None).run([source])
+    assert len(service.documents) == 10
+
+
+def test_interrupted_run_resumes_from_checkpoint(tmp_path):
+    """中断后从断点续传，已写入的批次不会重复处理"""
+    source = str(tmp_path / 'guides.jsonl')
+    write_records(source, [{'text': f'攻略{i}'} for i in range(10)], jsonl=True)
+    checkpoint = str(tmp_path / 'checkpoint.json')
+
+    service = FakeVectorService(fail_on_call=3)
+    with pytest.raises(KeyboardInterrupt):
+        IngestPipeline(service, batch_size=3, checkpoint_path=checkpoint).run([source])
+    assert len(service.documents) == 6
+
+    service.fail_on_call = None
+    stats = IngestPipeline(service, batch_size=3, checkpoint_path=checkpoint).run([source])
+    assert stats['resumed_from'] == 6
+    assert stats['read'] == 4
+    assert len(service.documents) == 10
@@ -0,0 +1,152 @@
+import sys
+import os
+import threading
+import time
+
+import pytest
+from flask import Flask
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from modular_api.routes import jobs as jobs_routes
+from modular_api.routes import roadtrip as roadtrip_module
+from modular_api.utils.monitoring import APIMetricsCollector, create_monitoring_endpoints
+
+# 路由以services.*导入服务模块，测试需要修改同一个模块对象
+jobs_module = sys.modules['services.jobs']
+cache_module = sys.modules['services.cache']
+JobManager, JobStore = jobs_module.JobManager, jobs_module.JobStore
+
+
+def make_manager(tmp_path, **options):
+    return JobManager(JobStore(str(tmp_path / 'jobs.db')), **options)
+
+
+def test_jobs_run_in_bounded_pool_and_persist(tmp_path):
+    """任务在有界线程池中执行，队列满时拒绝提交；状态和结果持久化，长轮询在任务结束时返回"""
+    manager = make_manager(tmp_path, max_workers=1, max_pending=1)
+    release = threading.Event()
+
+    def slow():
+        release.wait(5)
+        return {'status': 'success', 'guide': '攻略'}
+
+    first = manager.submit('guide', slow, user_id='u1')
+    second = manager.submit('guide', lambda: 1 / 0)
+    assert first['state'] in ('queued', 'running') and first['user_id'] == 'u1'
+    with pytest.raises(jobs_module.JobQueueFullError):
+        manager.submit('guide', slow)
+
+    started = time.perf_counter()
+    assert manager.wait(first['id'], 0.2)['state'] == 'running'
+    assert time.perf_counter() - started >= 0.2
+
+    threading.Timer(0.1, release.set).start()
+    done = manager.wait(first['id'], 5)
+    assert done['state'] == 'succeeded' and done['result'] == {'status': 'success', 'guide': '攻略'}
+    failed = manager.wait(second['id'], 5)
+    assert failed['state'] == 'failed' and 'division' in failed['error']
+
+    # 另一个进程（新的存储连接）可以读到同样的结果
+    assert JobStore(str(tmp_path / 'jobs.db')).get(first['id'])['result']['guide'] == '攻略'
+    stats = manager.get_stats()
+    assert stats['submitted'] == 2 and stats['rejected'] == 1
+    assert stats['succeeded'] == 1 and stats['failed'] == 1 and stats['stored'] == {'succeeded': 1, 'failed': 1}
+    manager.shutdown()
+
+
+def test_jobs_expire_and_stale_jobs_fail(tmp_path):
+    """任务按TTL过期；没有进程在执行且长时间未更新的任务标记为失败"""
+    manager = make_manager(tmp_path, ttl_seconds=0.2, stale_seconds=0.1)
+    job = manager.submit('roadtrip', lambda: {'status': 'success'})
+    assert manager.wait(job['id'], 5)['state'] == 'succeeded'
+    time.sleep(0.3)
+    assert manager.get(job['id']) is None
+    assert manager.store.purge_expired() == 1
+
+    manager.store.create('orphan', 'guide', None, 60)
+    time.sleep(0.2)
+    orphan = manager.get('orphan')
+    assert orphan['state'] == 'failed' and '重新提交' in orphan['error']
+    manager.shutdown()
+
+
+def test_other_process_never_fails_a_job_whose_owner_is_alive(tmp_path):
+    """排队很久的任务只要执行进程还在写心跳，其他进程查询时就不会判定为中断"""
+    owner = make_manager(tmp_path, max_workers=1, stale_seconds=0.3, heartbeat_interval=0.05)
+    other = make_manager(tmp_path, stale_seconds=0.3)
+    release = threading.Event()
+    owner.submit('guide', lambda: release.wait(5) and {'status': 'success'})
+    queued = owner.submit('guide', lambda: {'status': 'success', 'guide': '排队后完成'})
+
+    time.sleep(0.6)
+    assert other.get(queued['id'])['state'] == 'queued'
+    release.set()
+    assert other.wait(queued['id'], 5)['result']['guide'] == '排队后完成'
+    owner.shutdown()
+    other.shutdown()
+
+
+def test_finished_jobs_are_never_overwritten(tmp_path):
+    """心跳中断被判定为失败的任务，执行进程之后完成也不会改写为成功"""
+    owner = make_manager(tmp_path, stale_seconds=0.1, heartbeat_interval=60)
+    other = make_manager(tmp_path, stale_seconds=0.1)
+    release = threading.Event()
+    job = owner.submit('guide', lambda: release.wait(5) and {'status': 'success'})
+
+    time.sleep(0.3)
+    assert other.get(job['id'])['state'] == 'failed'
+    release.set()
+    assert owner.wait(job['id'], 5)['state'] == 'failed'
+    assert not owner.store.update(job['id'], 'succeeded', 60, result={'status': 'success'})
+    assert other.get(job['id'])['state'] == 'failed' and owner.get_stats()['succeeded'] == 0
+    owner.shutdown()
+    other.shutdown()
+
+
+class FakeModelService:
+    def generate_response(self, prompt, **options):
+        time.sleep(0.1)
+        return '自驾攻略'
+
+
+def test_async_roadtrip_submit_poll_and_cache(tmp_path, monkeypatch):
+    """异步提交立即返回202和任务ID，长轮询拿到与同步接口相同的结果，结果写入同步请求的响应缓存"""
+    store = {}
+    monkeypatch.setattr(cache_module.cache, 'get', store.get)
+    monkeypatch.setattr(cache_module.cache, 'set', lambda key, value, ttl=3600: store.__setitem__(key, value) or True)
+    monkeypatch.setattr(jobs_module, '_job_manager', make_manager(tmp_path))
+    monkeypatch.setattr(roadtrip_module, 'ROUTE_CACHE_FILE', str(tmp_path / 'route_cache.json'))
+    monkeypatch.setattr(roadtrip_module, 'get_model_service', lambda: FakeModelService())
+
+    app = Flask(__name__)
+    app.metrics_collector = APIMetricsCollector()
+    app.register_blueprint(roadtrip_module.bp, url_prefix='/api')
+    app.register_blueprint(jobs_routes.bp, url_prefix='/api')
+    create_monitoring_endpoints(app)
+    client = app.test_client()
+    payload = {'start': '成都', 'destination': '重庆', 'route_type': 'fastest'}
+
+    submitted = client.post('/api/roadtrip', json=payload, headers={'Prefer': 'respond-async'})
+    assert submitted.status_code == 202
+    job_id = submitted.get_json()['job_id']
+    assert submitted.headers['Location'] == f'/api/jobs/{job_id}' and not store
+
+    polled = client.get(f'/api/jobs/{job_id}')
+    assert polled.get_json()['job']['state'] in ('queued', 'running') and polled.headers['Retry-After'] == '1'
+
+    job = client.get(f'/api/jobs/{job_id}?wait=5').get_json()['job']
+    assert job['state'] == 'succeeded'
+    assert job['result']['guide'] == '自驾攻略' and job['result']['route']['waypoints'][:2] == ['德阳', '绵阳']
+
+    # 同样的同步请求命中任务写入的缓存
+    assert len(store) == 1
+    assert client.post('/api/roadtrip', json=payload).get_json() == job['result']
+
+    assert client.get('/api/jobs/unknown').status_code == 404
+    assert client.get(f'/api/jobs/{job_id}?wait=abc').status_code == 400
+
+    stats = client.get('/api/monitoring/jobs').get_json()['jobs']
+    assert stats['initialized'] and stats['submitted'] == 1 and stats['succeeded'] == 1
+    jobs_module._job_manager.shutdown()
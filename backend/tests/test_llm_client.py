@@ -0,0 +1,94 @@
+import sys
+import os
+import time
+
+import pytest
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from modular_api.services import llm_client as llm_module
+from modular_api.services.llm_client import LLMClient, LLMError, LLMNotConfiguredError, StubBackend
+from modular_api.services.llm_stub import LLMStubServer
+from modular_api.services.model import ModelService
+
+
+def make_client(*servers, read_timeout=5.0, max_retries=2):
+    backends = [StubBackend(base_url=server.base_url, read_timeout=read_timeout) for server in servers]
+    return LLMClient(backends, max_retries=max_retries, backoff_base=0.01, backoff_max=0.05)
+
+
+def test_generate_records_tokens_and_reuses_connection():
+    """多次调用复用同一条长连接，记录耗时和token用量"""
+    with LLMStubServer() as server:
+        client = make_client(server)
+        for _ in range(5):
+            result = client.chat([{'role': 'user', 'content': '成都三日游怎么安排'}])
+        assert result['text'].endswith('成都三日游怎么安排')
+        assert result['provider'] == 'stub' and result['prompt_tokens'] > 0 and result['completion_tokens'] > 0
+        assert server.requests == 5 and len(server.connections) == 1
+
+        stats = client.get_stats()['stats']['stub']
+        assert stats['successes'] == 5 and stats['prompt_tokens'] == 5 * result['prompt_tokens']
+        assert stats['latency_p50_ms'] is not None
+
+
+def test_retries_with_backoff_then_fails_over():
+    """5xx/429按退避重试；重试耗尽后切换到下一个提供商；4xx不重试"""
+    with LLMStubServer() as primary, LLMStubServer() as secondary:
+        client = make_client(primary, secondary)
+        primary.fail_next(2, status=503)
+        result = client.chat([{'role': 'user', 'content': '你好'}])
+        assert result['attempts'] == 3 and primary.requests == 3
+
+        primary.fail_next(3, status=429, retry_after=0)
+        result = client.chat([{'role': 'user', 'content': '你好'}])
+        assert result['provider'] == 'stub' and secondary.requests == 1
+
+        primary.fail_next(1, status=400)
+        secondary.fail_next(1, status=401)
+        with pytest.raises(LLMError):
+            client.generate('你好')
+        stats = client.get_stats()['stats']['stub']
+        assert stats['retries'] == 4 and stats['failures'] == 3
+
+
+def test_read_timeout_and_unconfigured_client():
+    """读取超时按失败处理；没有提供商时抛出未配置错误"""
+    with LLMStubServer(delay=0.5) as server:
+        client = make_client(server, read_timeout=0.1, max_retries=0)
+        started = time.perf_counter()
+        with pytest.raises(LLMError):
+            client.generate('你好')
+        assert time.perf_counter() - started < 0.45
+
+    with pytest.raises(LLMNotConfiguredError):
+        LLMClient([]).generate('你好')
+
+
+def test_model_service_generate_response(monkeypatch):
+    """ModelService.generate_response经由共享的大模型客户端生成"""
+    with LLMStubServer() as server:
+        monkeypatch.setattr(llm_module, '_llm_client', make_client(server))
+        service = ModelService.__new__(ModelService)
+        reply = service.generate_response('推荐西安美食', system_prompt='你是旅行助手')
+        assert '推荐西安美食' in reply
+        assert server.payloads[-1]['messages'][0] == {'role': 'system', 'content': '你是旅行助手'}
+
+
+def test_stream_yields_chunks_and_fails_over_before_first_token():
+    """流式调用逐段返回文本；首个分片前的失败可重试或切换提供商，连接仍被复用"""
+    with LLMStubServer(stream_chunk_chars=2) as primary, LLMStubServer() as secondary:
+        client = make_client(primary, secondary, max_retries=0)
+        chunks = list(client.stream([{'role': 'user', 'content': '杭州西湖'}]))
+        assert len(chunks) > 3 and ''.join(chunks).endswith('杭州西湖')
+        list(client.stream([{'role': 'user', 'content': '杭州西湖'}]))
+        assert len(primary.connections) == 1
+
+        primary.fail_next(1, status=503)
+        assert ''.join(client.stream([{'role': 'user', 'content': '苏州园林'}])).endswith('苏州园林')
+        assert secondary.requests == 1
+
+        stats = client.get_stats()['stats']['stub']
+        assert stats['streams'] == 3 and stats['first_token_p50_ms'] is not None
+        assert stats['completion_tokens'] > 0
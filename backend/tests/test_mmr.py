@@ -0,0 +1,64 @@
+import sys
+import os
+
+import numpy as np
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from modular_api.services.lexical_index import LexicalIndex
+from modular_api.services.mmr import mmr_select
+
+# 三篇几乎相同的宽窄巷子帖子 + 两篇不同景点的帖子
+GUIDES = {
+    'kuanzhai_1': ([1.0, 0.00, 0.00], '宽窄巷子一日游'),
+    'kuanzhai_2': ([1.0, 0.02, 0.00], '宽窄巷子打卡'),
+    'kuanzhai_3': ([1.0, 0.00, 0.02], '宽窄巷子攻略'),
+    'panda': ([0.8, 0.6, 0.00], '大熊猫基地'),
+    'dujiangyan': ([0.8, 0.0, 0.60], '都江堰'),
+}
+
+
+class LookupModelService:
+    def clean_texts(self, texts):
+        return list(texts)
+
+    def encode_text(self, texts):
+        vectors = np.array([next((vector for vector, text in GUIDES.values() if text == item), [1.0, 0.0, 0.0])
+                            for item in texts], dtype=np.float32)
+        return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def build_service(make_vector_service, tmp_path, hybrid=False):
+    lexical_index = LexicalIndex(str(tmp_path / f'lexical_{int(hybrid)}.sqlite3')) if hybrid else None
+    service = make_vector_service(LookupModelService(), f'mmr_test_{int(hybrid)}', lexical_index=lexical_index)
+    service.add_documents([text for _, text in GUIDES.values()], [{'destination': '成都'}] * len(GUIDES),
+                          ids=list(GUIDES))
+    return service
+
+
+def test_mmr_select_trades_relevance_for_diversity():
+    """λ=1时按相关度排序，λ较小时跳过与已选结果几乎相同的候选"""
+    vectors = np.array([vector for vector, _ in GUIDES.values()], dtype=np.float32)
+    query = np.array([1.0, 0.0, 0.0])
+    assert mmr_select(query, vectors, 3, lambda_mult=1.0) == [0, 1, 2]
+    assert mmr_select(query, vectors, 3, lambda_mult=0.3) == [0, 3, 4]
+    assert mmr_select(query, vectors, 10, lambda_mult=0.3)[:1] == [0]
+    assert len(mmr_select(query, vectors, 10)) == 5
+
+
+def test_search_similar_diversify(tmp_path, make_vector_service):
+    """开启多样性重排后top-3覆盖三个不同景点，结果中不暴露内部向量"""
+    for hybrid in (False, True):
+        service = build_service(make_vector_service, tmp_path, hybrid=hybrid)
+        plain = [item['id'] for item in service.search_similar('宽窄巷子一日游', limit=3)['results']]
+        assert plain == ['kuanzhai_1', 'kuanzhai_2', 'kuanzhai_3']
+
+        results = service.search_similar('宽窄巷子一日游', limit=3, diversify=True, mmr_lambda=0.3)['results']
+        assert [item['id'] for item in results] == ['kuanzhai_1', 'panda', 'dujiangyan']
+        assert all('_embedding' not in item for item in results)
+
+        batch = service.search_batch([{'query': '宽窄巷子一日游', 'limit': 3, 'diversify': True, 'mmr_lambda': 0.3},
+                                      {'query': '宽窄巷子一日游', 'limit': 3}])
+        assert [item['id'] for item in batch[0]['results']] == ['kuanzhai_1', 'panda', 'dujiangyan']
+        assert [item['id'] for item in batch[1]['results']] == plain
@@ -0,0 +1,85 @@
+import threading
+import sys
+import os
+
+import numpy as np
+import pytest
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from modular_api.services import model as model_module
+from modular_api.services.model import ModelService, ModelNotReadyError
+
+
+class FakeEmbeddingModel:
+    def encode(self, texts):
+        return np.ones((len(texts), 3), dtype=np.float32)
+
+
+def test_background_warmup_reports_state(monkeypatch):
+    """后台加载期间encode抛出ModelNotReadyError，加载完成后状态变为ready"""
+    release = threading.Event()
+
+    def slow_initialize(self):
+        release.wait(5)
+        self.model = FakeEmbeddingModel()
+        self.use_real_model = True
+        self.nlp = object()
+
+    monkeypatch.setattr(ModelService, '_initialize_models', slow_initialize)
+    service = ModelService(background=True)
+
+    assert service.get_status()['state'] == model_module.STATE_LOADING
+    with pytest.raises(ModelNotReadyError):
+        service.encode_text('北京')
+
+    release.set()
+    assert service.wait_until_ready(timeout=5)
+    status = service.get_status()
+    assert status['state'] == model_module.STATE_READY
+    assert 'total' in status['load_times']
+    assert service.encode_text('北京').shape == (1, 3)
+
+
+def test_fallback_models_report_degraded(monkeypatch):
+    """模拟模型或NLP不可用时状态为degraded"""
+    def mock_initialize(self):
+        self.model = FakeEmbeddingModel()
+        self.use_real_model = False
+
+    monkeypatch.setattr(ModelService, '_initialize_models', mock_initialize)
+    service = ModelService(background=False)
+    assert service.get_status()['state'] == model_module.STATE_DEGRADED
+
+
+class LoadingModelService:
+    def is_ready(self):
+        return False
+
+
+def test_generate_guide_returns_503_while_model_loading(monkeypatch):
+    """模型加载期间生成攻略返回503和Retry-After（经过响应缓存装饰器），参数错误返回400，均不缓存"""
+    from flask import Flask
+    from modular_api.routes import guide as guide_module
+    from modular_api.utils.monitoring import APIMetricsCollector
+
+    cache_module = sys.modules['services.cache']
+    store = {}
+    monkeypatch.setattr(cache_module.cache, 'get', store.get)
+    monkeypatch.setattr(cache_module.cache, 'set', lambda key, value, ttl=3600: store.__setitem__(key, value) or True)
+    monkeypatch.setattr(guide_module, 'get_model_service', lambda: LoadingModelService())
+    app = Flask(__name__)
+    app.metrics_collector = APIMetricsCollector()
+    app.register_blueprint(guide_module.bp)
+    client = app.test_client()
+    token = sys.modules['services.auth'].get_auth_service().generate_token('u1')['access_token']
+    headers = {'Authorization': f'Bearer {token}'}
+
+    loading = client.post('/generate-guide', json={'destination': '成都', 'preferences': '美食'}, headers=headers)
+    assert loading.status_code == 503 and loading.headers['Retry-After'] == '5'
+    assert loading.get_json()['error_code'] == 'MODEL_LOADING'
+
+    invalid = client.post('/generate-guide', json={'destination': '成都'}, headers=headers)
+    assert invalid.status_code == 400
+    assert not store
@@ -0,0 +1,91 @@
+import sys
+import os
+
+import numpy as np
+import pytest
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+pytest.importorskip('onnxruntime')
+pytest.importorskip('onnx')
+pytest.importorskip('sentence_transformers')
+
+from modular_api.services.onnx_embedding import (
+    OnnxEmbeddingModel, export_onnx_model, quantize_onnx_model
+)
+
+SAMPLE_TEXTS = [
+    '北京三日游推荐：故宫、长城、颐和园',
+    '鼓浪屿 travel guide with local food',
+    '稻城亚丁徒步路线和高原反应注意事项',
+    'short',
+]
+
+
+def build_tiny_sentence_model(model_dir):
+    """构建一个离线可用的小型BERT句向量模型（mean pooling + 归一化）"""
+    from sentence_transformers import SentenceTransformer, models
+    from transformers import BertConfig, BertModel, BertTokenizerFast
+
+    vocab = ['[PAD]', '[UNK]', '[CLS]', '[SEP]', '[MASK]'] + list('北京三日游推荐故宫长城颐和园鼓浪屿稻城亚丁徒步路线') \
+        + ['travel', 'guide', 'with', 'local', 'food', 'short']
+    os.makedirs(model_dir, exist_ok=True)
+    with open(os.path.join(model_dir, 'vocab.txt'), 'w', encoding='utf-8') as f:
+        f.write('\n'.join(vocab))
+    BertTokenizerFast(vocab_file=os.path.join(model_dir, 'vocab.txt')).save_pretrained(model_dir)
+    config = BertConfig(vocab_size=len(vocab), hidden_size=32, num_hidden_layers=2,
+                        num_attention_heads=2, intermediate_size=64)
+    BertModel(config).save_pretrained(model_dir)
+
+    transformer = models.Transformer(model_dir, max_seq_length=64)
+    pooling = models.Pooling(transformer.get_word_embedding_dimension(), pooling_mode='mean')
+    return SentenceTransformer(modules=[transformer, pooling, models.Normalize()], device='cpu')
+
+
+@pytest.fixture(scope='module')
+def torch_model(tmp_path_factory):
+    """优先使用真实的all-MiniLM-L6-v2，本地不可用时退回小型模型"""
+    from sentence_transformers import SentenceTransformer
+    source = os.getenv('EMBEDDING_PARITY_MODEL', 'all-MiniLM-L6-v2')
+    try:
+        return SentenceTransformer(source, device='cpu')
+    except Exception:
+        return build_tiny_sentence_model(str(tmp_path_factory.mktemp('tiny-bert')))
+
+
+@pytest.fixture(scope='module')
+def onnx_dir(torch_model, tmp_path_factory):
+    output_dir = str(tmp_path_factory.mktemp('onnx'))
+    export_onnx_model(torch_model, output_dir)
+    quantize_onnx_model(output_dir)
+    return output_dir
+
+
+def cosine_rows(a, b):
+    a = a / np.linalg.norm(a, axis=1, keepdims=True)
+    b = b / np.linalg.norm(b, axis=1, keepdims=True)
+    return (a * b).sum(axis=1)
+
+
+def test_onnx_fp32_matches_torch(torch_model, onnx_dir):
+    """fp32 ONNX推理结果与PyTorch模型几乎一致"""
+    expected = torch_model.encode(SAMPLE_TEXTS)
+    actual = OnnxEmbeddingModel(onnx_dir).encode(SAMPLE_TEXTS)
+    assert actual.shape == expected.shape
+    assert cosine_rows(actual, expected).min() > 0.999
+
+
+def test_onnx_int8_keeps_cosine_agreement(torch_model, onnx_dir):
+    """int8量化模型与PyTorch模型保持较高的余弦一致性"""
+    expected = torch_model.encode(SAMPLE_TEXTS)
+    actual = OnnxEmbeddingModel(onnx_dir, quantized=True).encode(SAMPLE_TEXTS)
+    assert cosine_rows(actual, expected).min() > 0.95
+
+
+def test_onnx_batches_match_single_calls(onnx_dir):
+    """分批推理（含padding）与逐条推理结果一致"""
+    model = OnnxEmbeddingModel(onnx_dir, batch_size=2)
+    batched = model.encode(SAMPLE_TEXTS)
+    single = np.vstack([model.encode([text]) for text in SAMPLE_TEXTS])
+    assert np.allclose(batched, single, atol=1e-5)
@@ -0,0 +1,118 @@
+import sys
+import os
+
+import numpy as np
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from modular_api.services.vector_backend import NumpyBackend, PartitionedBackend, partition_name
+
+DESTINATIONS = ['成都', '重庆', '西安']
+
+
+def build_backend(root, name='guides'):
+    return PartitionedBackend(
+        NumpyBackend(os.path.join(root, name)),
+        lambda shard: NumpyBackend(os.path.join(root, shard)),
+        os.path.join(root, f'partitions_{name}.json'),
+        name
+    )
+
+
+def sample(count=30, dim=8):
+    vectors = np.random.default_rng(1).standard_normal((count, dim)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    ids = [f'doc_{i}' for i in range(count)]
+    metadatas = [{'destination': DESTINATIONS[i % 3]} for i in range(count)]
+    return ids, vectors, metadatas
+
+
+def test_filtered_queries_go_to_destination_shard(tmp_path):
+    """目的地过滤只访问对应分片，结果与全局过滤查询一致"""
+    backend = build_backend(str(tmp_path))
+    ids, vectors, metadatas = sample()
+    backend.add(ids=ids, embeddings=vectors.tolist(), documents=ids, metadatas=metadatas)
+
+    query = [vectors[4].tolist()]
+    routed = backend.query(query_embeddings=query, n_results=5, where={'destination': '成都'})
+    direct = backend.global_backend.query(query_embeddings=query, n_results=5, where={'destination': '成都'})
+    assert routed['ids'] == direct['ids']
+    assert np.allclose(routed['distances'], direct['distances'], atol=1e-6)
+
+    # 规范化后相同的目的地路由到同一分片，但仍按原值精确匹配；未登记的目的地回退到全局查询
+    assert backend.query(query_embeddings=query, n_results=5, where={'destination': ' 成都'})['ids'] == [[]]
+    assert backend.query(query_embeddings=query, n_results=5, where={'destination': '拉萨'})['ids'] == [[]]
+    stats = backend.get_stats()
+    assert stats['routed_queries'] == 2 and stats['global_queries'] == 1
+    assert stats['partitions'] == 3
+
+
+def test_upsert_and_delete_keep_shards_in_sync(tmp_path):
+    """目的地变更时从旧分区移除，删除同时作用于分区"""
+    backend = build_backend(str(tmp_path))
+    ids, vectors, metadatas = sample()
+    backend.add(ids=ids, embeddings=vectors.tolist(), documents=ids, metadatas=metadatas)
+
+    backend.upsert(ids=['doc_0'], embeddings=[vectors[0].tolist()], documents=['doc_0'],
+                   metadatas=[{'destination': '重庆'}])
+    backend.delete(ids=['doc_1'])
+
+    chengdu = backend._shard('成都', create=False)
+    chongqing = backend._shard('重庆', create=False)
+    assert 'doc_0' not in chengdu.get()['ids']
+    assert 'doc_0' in chongqing.get()['ids']
+    assert 'doc_1' not in chongqing.get()['ids']
+    assert backend.count() == 29
+
+
+def test_rebuild_splits_existing_collection(tmp_path):
+    """迁移工具把已有的全局数据拆分到各分区，重新打开后分区清单仍在"""
+    root = str(tmp_path)
+    ids, vectors, metadatas = sample()
+    NumpyBackend(os.path.join(root, 'guides')).add(ids=ids, embeddings=vectors.tolist(),
+                                                   documents=ids, metadatas=metadatas)
+
+    backend = build_backend(root)
+    assert backend.rebuild_partitions(batch_size=7) == {'成都': 10, '重庆': 10, '西安': 10}
+
+    reopened = build_backend(root)
+    shard = reopened._shard('西安', create=False)
+    assert shard.count() == 10
+    assert shard.path.endswith(partition_name('guides', '西安'))
+
+
+def test_enabling_on_populated_collection_backfills_new_shards(tmp_path):
+    """在已有数据的集合上开启分区后写入新条目，新分片先回填旧数据，过滤查询不丢结果"""
+    root = str(tmp_path)
+    ids, vectors, metadatas = sample(count=6)
+    NumpyBackend(os.path.join(root, 'guides')).add(
+        ids=['old1', 'old2', 'old3'], embeddings=vectors[:3].tolist(), documents=['old1', 'old2', 'old3'],
+        metadatas=[{'destination': '北京'}, {'destination': '北京'}, {'destination': '上海'}])
+
+    backend = build_backend(root)
+    assert not backend.get_stats()['complete']
+    backend.add(ids=['new1'], embeddings=[vectors[3].tolist()], documents=['new1'],
+                metadatas=[{'destination': '北京'}])
+
+    result = backend.query(query_embeddings=[vectors[0].tolist()], n_results=10, where={'destination': '北京'})
+    assert sorted(result['ids'][0]) == ['new1', 'old1', 'old2']
+    assert backend.get_stats()['routed_queries'] == 1
+
+    # 拆分完成后新分区不再扫描全局分片
+    backend.rebuild_partitions()
+    assert build_backend(root).get_stats()['complete']
+
+
+def test_shard_queries_keep_exact_match(tmp_path):
+    """规范化后相同但原值不同的目的地共用分片，查询结果仍与全局精确匹配一致"""
+    backend = build_backend(str(tmp_path))
+    assert backend.get_stats()['complete']
+    ids, vectors, _ = sample(count=2)
+    backend.add(ids=ids, embeddings=vectors.tolist(), documents=ids,
+                metadatas=[{'destination': 'Chengdu'}, {'destination': 'chengdu'}])
+
+    query = [vectors[0].tolist()]
+    assert backend.get_stats()['partitions'] == 1
+    assert backend.query(query_embeddings=query, n_results=5, where={'destination': 'chengdu'})['ids'] == [['doc_1']]
+    assert backend.query(query_embeddings=query, n_results=5, where={'destination': 'Chengdu'})['ids'] == [['doc_0']]
@@ -0,0 +1,97 @@
+import sys
+import os
+import time
+
+import numpy as np
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from modular_api.services.reranker import CrossEncoderReranker
+
+GUIDES = {
+    'kuanzhai_1': ([1.0, 0.00, 0.00], '宽窄巷子一日游'),
+    'kuanzhai_2': ([1.0, 0.05, 0.00], '宽窄巷子打卡'),
+    'kuanzhai_3': ([1.0, 0.00, 0.10], '宽窄巷子美食攻略'),
+    'panda': ([0.8, 0.6, 0.00], '大熊猫基地'),
+}
+
+
+class KeywordCrossEncoder:
+    """按关键词打分的交叉编码器替身，可模拟每批的推理耗时"""
+
+    def __init__(self, keyword='攻略', delay=0.0):
+        self.keyword = keyword
+        self.delay = delay
+        self.pairs = 0
+
+    def predict(self, pairs):
+        time.sleep(self.delay)
+        self.pairs += len(pairs)
+        return np.array([float(self.keyword in doc) + 0.1 * len(set(query) & set(doc)) for query, doc in pairs])
+
+
+class LookupModelService:
+    def clean_texts(self, texts):
+        return list(texts)
+
+    def encode_text(self, texts):
+        vectors = np.array([next((vector for vector, text in GUIDES.values() if text == item), [1.0, 0.0, 0.0])
+                            for item in texts], dtype=np.float32)
+        return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def candidates(count):
+    return [{'id': f'doc_{i}', 'content': '攻略' if i == count - 1 else f'帖子{i}'} for i in range(count)]
+
+
+def test_rerank_reorders_and_caches_pair_scores():
+    """重排后得分最高的候选排在最前，重复查询使用缓存得分，集合版本变化后重新打分"""
+    model = KeywordCrossEncoder()
+    reranker = CrossEncoderReranker(model=model, batch_size=2)
+    items, info = reranker.rerank('成都攻略', candidates(5), budget_ms=1000, version=1)
+    assert items[0]['id'] == 'doc_4' and items[0]['rerank_score'] > items[1]['rerank_score']
+    assert info['applied'] and info['reranked'] == 5 and info['scored'] == 5
+
+    _, info = reranker.rerank('成都攻略 ', candidates(5), budget_ms=1000, version=1)
+    assert info['cached'] == 5 and info['scored'] == 0 and model.pairs == 5
+
+    _, info = reranker.rerank('成都攻略', candidates(5), budget_ms=1000, version=2)
+    assert info['cached'] == 0 and model.pairs == 10
+
+
+def test_budget_exhaustion_keeps_dense_order_for_the_rest():
+    """预算不足时只重排已打分的前缀，其余候选保持向量检索顺序；模型未就绪时原样返回"""
+    reranker = CrossEncoderReranker(model=KeywordCrossEncoder(keyword='帖子1', delay=0.03), batch_size=2)
+    items, info = reranker.rerank('成都', candidates(6), budget_ms=40)
+    assert info['budget_exhausted'] and info['reranked'] == 2
+    assert [item['id'] for item in items] == ['doc_1', 'doc_0', 'doc_2', 'doc_3', 'doc_4', 'doc_5']
+    assert 'rerank_score' not in items[2]
+    assert reranker.get_stats()['budget_exhausted'] == 1
+
+    loading = CrossEncoderReranker()
+    items, info = loading.rerank('成都', candidates(3), budget_ms=100)
+    assert [item['id'] for item in items] == ['doc_0', 'doc_1', 'doc_2']
+    assert info['reason'] == 'model_loading' and not info['applied']
+
+
+def test_search_similar_rerank_is_per_request(make_vector_service):
+    """只有显式开启重排的请求才调用交叉编码器，单条与批量搜索结果一致"""
+    model = KeywordCrossEncoder()
+    service = make_vector_service(LookupModelService(), 'rerank_test', reranker=CrossEncoderReranker(model=model))
+    service.add_documents([text for _, text in GUIDES.values()], [{'destination': '成都'}] * len(GUIDES),
+                          ids=list(GUIDES))
+
+    plain = service.search_similar('宽窄巷子一日游', limit=2)
+    assert [item['id'] for item in plain['results']] == ['kuanzhai_1', 'kuanzhai_2']
+    assert 'rerank' not in plain and model.pairs == 0
+
+    reranked = service.search_similar('宽窄巷子一日游', limit=2, rerank=True)
+    assert [item['id'] for item in reranked['results']] == ['kuanzhai_3', 'kuanzhai_1']
+    assert reranked['rerank']['candidates'] == len(GUIDES)
+
+    batch = service.search_batch([{'query': '宽窄巷子一日游', 'limit': 2, 'rerank': True},
+                                  {'query': '宽窄巷子一日游', 'limit': 2}])
+    assert [item['id'] for item in batch[0]['results']] == ['kuanzhai_3', 'kuanzhai_1']
+    assert batch[0]['rerank']['cached'] == len(GUIDES)
+    assert [item['id'] for item in batch[1]['results']] == ['kuanzhai_1', 'kuanzhai_2']
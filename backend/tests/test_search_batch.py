@@ -0,0 +1,77 @@
+import sys
+import os
+
+import numpy as np
+import pytest
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from modular_api.services.lexical_index import LexicalIndex
+
+GUIDES = {
+    'sanya': ('三亚海边度假，亚龙湾潜水', '三亚'),
+    'qingdao': ('青岛啤酒节和栈桥海边散步', '青岛'),
+    'chengdu': ('成都火锅、宽窄巷子和大熊猫基地', '成都'),
+    'chongqing': ('重庆火锅和洪崖洞夜景', '重庆'),
+    'xian': ('西安兵马俑和回民街小吃', '西安'),
+}
+
+
+class CountingModelService:
+    """按字符哈希生成向量并记录编码次数的假模型"""
+
+    def __init__(self):
+        self.encode_calls = 0
+
+    def clean_texts(self, texts):
+        return list(texts)
+
+    def encode_text(self, texts):
+        self.encode_calls += 1
+        vectors = np.zeros((len(texts), 16), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for char in text:
+                vectors[row, ord(char) % 16] += 1.0
+        return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def build_service(make_vector_service, tmp_path, hybrid):
+    service = make_vector_service(CountingModelService(), 'batch_test',
+                                  lexical_index=LexicalIndex(str(tmp_path / 'lexical.sqlite3')) if hybrid else None)
+    service.add_documents([text for text, _ in GUIDES.values()],
+                          [{'destination': destination} for _, destination in GUIDES.values()],
+                          ids=list(GUIDES))
+    return service
+
+
+QUERIES = [
+    {'query': '海边', 'limit': 2},
+    {'query': '火锅', 'limit': 3, 'filters': {'destination': '成都'}},
+    {'query': '小吃', 'limit': 1},
+    {'query': '夜景', 'limit': 2, 'filters': {'destination': ''}},
+]
+
+
+@pytest.mark.parametrize('hybrid', [False, True])
+def test_batch_matches_individual_searches(tmp_path, monkeypatch, make_vector_service, hybrid):
+    """批量结果与逐条搜索一致，且只编码一次、按过滤条件分组查询"""
+    service = build_service(make_vector_service, tmp_path, hybrid)
+    expected = [service.search_similar(item['query'], item['limit'], item.get('filters')) for item in QUERIES]
+
+    collection_type = type(service.collection)
+    original_query = collection_type.query
+    calls = []
+
+    def counting_query(collection, *args, **kwargs):
+        calls.append(len(kwargs['query_embeddings']))
+        return original_query(collection, *args, **kwargs)
+
+    monkeypatch.setattr(collection_type, 'query', counting_query)
+    service.model_service.encode_calls = 0
+
+    results = service.search_batch(QUERIES)
+    assert results == expected
+    assert service.model_service.encode_calls == 1
+    # 空过滤条件与无过滤条件合并为一组
+    assert sorted(calls) == [1, 3]
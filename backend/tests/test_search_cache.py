@@ -0,0 +1,87 @@
+import sys
+import os
+
+import numpy as np
+import pytest
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from modular_api.services.search_cache import CollectionVersion, SearchResultCache
+
+
+class CountingModelService:
+    """记录编码次数的假模型"""
+
+    def __init__(self):
+        self.encode_calls = 0
+
+    def clean_texts(self, texts):
+        return list(texts)
+
+    def encode_text(self, texts):
+        self.encode_calls += 1
+        vectors = np.array([[len(text) % 7 + 1.0, text.count('海') + 1.0, 1.0] for text in texts], dtype=np.float32)
+        return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+@pytest.fixture
+def vector_service(tmp_path, make_vector_service):
+    version = CollectionVersion(str(tmp_path / 'versions.sqlite3'), 'cache_test')
+    service = make_vector_service(CountingModelService(), 'cache_test', collection_version=version,
+                                  search_cache=SearchResultCache(max_entries=8))
+    service.add_documents(['三亚看海', '青岛海边', '成都火锅'],
+                          [{'destination': '三亚'}, {'destination': '青岛'}, {'destination': '成都'}],
+                          ids=['sanya', 'qingdao', 'chengdu'])
+    return service
+
+
+def test_key_normalizes_query_and_filters():
+    """大小写、全角和多余空白不影响缓存键，空过滤条件等价于不过滤"""
+    key = SearchResultCache.make_key('  Beijing   故宫 ', {'destination': ''}, 5)
+    assert key == SearchResultCache.make_key('ｂｅｉｊｉｎｇ 故宫', None, 5)
+    assert key != SearchResultCache.make_key('beijing 故宫', None, 3)
+    assert key != SearchResultCache.make_key('beijing 故宫', {'destination': '北京'}, 5)
+
+
+def test_repeated_search_skips_encoding(vector_service):
+    """重复查询直接命中缓存，返回的是副本"""
+    first = vector_service.search_similar('看海', limit=2)
+    calls = vector_service.model_service.encode_calls
+    first['results'].clear()
+
+    second = vector_service.search_similar('看海 ', limit=2)
+    assert vector_service.model_service.encode_calls == calls
+    assert len(second['results']) == 2
+
+    stats = vector_service.get_search_cache_stats()
+    assert stats['hits'] == 1 and stats['misses'] == 1
+    assert stats['hit_rate'] == 0.5
+    assert stats['saved_ms'] >= 0
+
+
+def test_writes_invalidate_cached_results(vector_service):
+    """写入和删除都会递增集合版本，缓存结果随之失效"""
+    before = vector_service.search_similar('海', limit=5)
+    assert before['total'] == 3
+    version = vector_service.collection_version.get()
+
+    vector_service.add_documents(['厦门看海'], [{'destination': '厦门'}], ids=['xiamen'])
+    assert vector_service.collection_version.get() == version + 1
+    assert vector_service.search_similar('海', limit=5)['total'] == 4
+
+    vector_service.delete_documents(['xiamen', 'chengdu'])
+    assert vector_service.collection_version.get() == version + 2
+    ids = [item['id'] for item in vector_service.search_similar('海', limit=5)['results']]
+    assert sorted(ids) == ['qingdao', 'sanya']
+    assert vector_service.get_search_cache_stats()['hits'] == 0
+
+
+def test_version_is_shared_between_processes(tmp_path):
+    """不同连接（如导入工具进程）递增的版本号对API进程可见"""
+    path = str(tmp_path / 'versions.sqlite3')
+    api_side = CollectionVersion(path, 'travel_guides')
+    ingest_side = CollectionVersion(path, 'travel_guides')
+    ingest_side.bump()
+    assert api_side.get() == 1
+    assert CollectionVersion(path, 'other').get() == 0
@@ -0,0 +1,122 @@
+import sys
+import os
+
+import numpy as np
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from modular_api.services import llm_client as llm_module
+from modular_api.services import semantic_cache as semantic_module
+from modular_api.services.llm_client import LLMClient, StubBackend
+from modular_api.services.llm_stub import LLMStubServer
+from modular_api.services.model import ModelService
+from modular_api.services.semantic_cache import SemanticResponseCache, make_scope, normalize_intent
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_lookup_respects_threshold_scope_ttl_and_lru():
+    """相似度达到阈值且作用域相同才命中；条目按TTL过期、按LRU淘汰"""
+    clock = FakeClock()
+    cache = SemanticResponseCache(threshold=0.9, ttl_seconds=60, max_entries=2, clock=clock)
+    beijing = make_scope('guide', '北京')
+    cache.put([1.0, 0.0, 0.0], beijing, '三日游', '北京攻略')
+
+    assert cache.lookup([0.95, 0.1, 0.0], beijing)['response'] == '北京攻略'
+    assert cache.lookup([0.6, 0.8, 0.0], beijing) is None
+    assert cache.lookup([1.0, 0.0, 0.0], make_scope('guide', '上海')) is None
+    assert cache.lookup([1.0, 0.0, 0.0], make_scope('chat', '北京')) is None
+    # 目的地的全半角和空白差异不影响作用域
+    assert cache.lookup([1.0, 0.0, 0.0], make_scope('guide', ' 北京 ')) is not None
+
+    cache.put([0.0, 1.0, 0.0], beijing, '美食', '北京美食')
+    cache.lookup([1.0, 0.0, 0.0], beijing)
+    cache.put([0.0, 0.0, 1.0], beijing, '住宿', '北京住宿')
+    assert cache.lookup([0.0, 1.0, 0.0], beijing) is None
+    assert cache.lookup([1.0, 0.0, 0.0], beijing) is not None
+
+    clock.now += 61
+    assert cache.lookup([1.0, 0.0, 0.0], beijing) is None
+
+    stats = cache.get_stats()
+    assert stats['evictions'] == 1 and stats['expirations'] == 2 and stats['entries'] == 0
+    assert stats['hits'] == 4 and stats['lookups'] == 9
+    assert sum(stats['similarity_histogram'].values()) == stats['lookups'] - stats['empty_scope']
+    assert stats['similarity_histogram']['0.99-1.00'] == 4
+
+
+def test_normalize_intent():
+    assert normalize_intent('北京三日游，推荐！') == normalize_intent(' 北京三日游 推荐 ')
+    assert normalize_intent('ＡＢＣ Tour?') == 'abc tour'
+
+
+def test_generate_response_reuses_paraphrased_answer(monkeypatch):
+    """措辞不同但意图向量相近的请求复用回复，不再调用大模型；流式调用同样适用"""
+    vectors = {
+        normalize_intent('北京三日游推荐'): [1.0, 0.0, 0.1],
+        normalize_intent('北京玩三天去哪'): [1.0, 0.05, 0.12],
+        normalize_intent('北京美食'): [0.0, 1.0, 0.0]
+    }
+    with LLMStubServer() as server:
+        monkeypatch.setattr(llm_module, '_llm_client', LLMClient([StubBackend(base_url=server.base_url)]))
+        monkeypatch.setattr(semantic_module, '_semantic_cache', SemanticResponseCache(threshold=0.95))
+        service = ModelService.__new__(ModelService)
+        service.encode_text = lambda texts: np.array([vectors[text] for text in texts])
+
+        first = service.generate_response('prompt-1', cache_intent='北京三日游推荐', route_type='guide',
+                                          destination='北京')
+        again = service.generate_response('prompt-2', cache_intent='北京玩三天去哪', route_type='guide',
+                                          destination='北京')
+        assert again == first and server.requests == 1
+
+        streamed = ''.join(service.stream_response('北京美食', cache_intent='北京美食', route_type='guide',
+                                                   destination='北京'))
+        assert server.requests == 2
+        assert ''.join(service.stream_response('x', cache_intent='北京美食', route_type='guide',
+                                               destination='北京')) == streamed
+        assert server.requests == 2
+
+        # 未提供意图时不查缓存
+        service.generate_response('prompt-1')
+        assert server.requests == 3
+        assert semantic_module._semantic_cache.get_stats()['hits'] == 2
+
+
+def test_chat_messages_about_different_cities_never_share_a_reply(monkeypatch):
+    """聊天没有目的地作用域，默认不走语义缓存：只差城市名的两条消息即使意图向量相同也各自调用大模型"""
+    from flask import Flask
+    from modular_api.routes import chat as chat_module
+    from modular_api.utils.monitoring import APIMetricsCollector
+
+    store = {}
+    cache_module = sys.modules['services.cache']
+    monkeypatch.setattr(cache_module.cache, 'get', store.get)
+    monkeypatch.setattr(cache_module.cache, 'set', lambda key, value, ttl=3600: store.__setitem__(key, value) or True)
+    monkeypatch.setattr(chat_module, 'load_conversation_history', lambda: {})
+    monkeypatch.setattr(chat_module, 'save_conversation_history', lambda history: None)
+    with LLMStubServer() as server:
+        route_llm_module = sys.modules['services.llm_client']
+        monkeypatch.setattr(route_llm_module, '_llm_client', LLMClient([StubBackend(base_url=server.base_url)]))
+        route_semantic_module = sys.modules['services.semantic_cache']
+        monkeypatch.setattr(route_semantic_module, '_semantic_cache', SemanticResponseCache(threshold=0.92))
+        service = sys.modules['services.model'].ModelService.__new__(sys.modules['services.model'].ModelService)
+        # 最坏情况：英文模型对只差城市名的中文句子给出几乎相同的向量
+        service.encode_text = lambda texts: np.ones((len(texts), 3), dtype=np.float32)
+        monkeypatch.setattr(chat_module, 'get_model_service', lambda: service)
+
+        app = Flask(__name__)
+        app.metrics_collector = APIMetricsCollector()
+        app.register_blueprint(chat_module.bp, url_prefix='/api')
+        client = app.test_client()
+        for message in ('成都有什么好吃的', '重庆有什么好吃的'):
+            assert client.post('/api/chat', json={'message': message}).get_json()['status'] == 'success'
+
+        assert server.requests == 2
+        assert route_semantic_module._semantic_cache.get_stats()['lookups'] == 0
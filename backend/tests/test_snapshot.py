@@ -0,0 +1,97 @@
+import sys
+import os
+
+import numpy as np
+import pytest
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from modular_api.services.collection_manager import CollectionManager
+from modular_api.services.snapshot import (SnapshotError, export_snapshot, import_snapshot, load_snapshot,
+                                           read_manifest)
+from modular_api.services.vector_backend import ChromaBackend, NumpyBackend
+from modular_api.utils.config import Config
+
+
+class SteppingVersion:
+    """每次读取版本号时按预设序列返回，模拟导出期间的并发写入"""
+
+    def __init__(self, values):
+        self.values = list(values)
+
+    def get(self):
+        return self.values.pop(0) if len(self.values) > 1 else self.values[0]
+
+
+def fill(backend, count=25, dim=8):
+    vectors = np.random.default_rng(3).standard_normal((count, dim)).astype(np.float32)
+    ids = [f'doc_{i}' for i in range(count)]
+    documents = [None if i == 3 else f'成都攻略{i} 🐼' for i in range(count)]
+    metadatas = [{'destination': '成都', 'likes': i, 'parent_id': f'doc_{i}'} for i in range(count)]
+    backend.add(ids=ids, embeddings=vectors.tolist(), documents=documents, metadatas=metadatas)
+    return ids, vectors
+
+
+def test_snapshot_round_trip_into_both_backends(tmp_path):
+    """快照导入NumPy和ChromaDB后端后条目、文本、元数据和检索结果与源集合一致"""
+    source = NumpyBackend(str(tmp_path / 'source'))
+    ids, vectors = fill(source)
+    path = str(tmp_path / 'snapshots' / 'guides.npz')
+    info = export_snapshot(source, path, {'profile': 'float32', 'vector_space': 'all-MiniLM-L6-v2'}, batch_size=7)
+    assert info['count'] == 25 and info['dim'] == 8
+    assert read_manifest(path)['embeddings_sha256'] == info['embeddings_sha256']
+    assert not os.path.exists(path + '.tmp')
+
+    targets = [NumpyBackend(str(tmp_path / 'target')),
+               ChromaBackend(CollectionManager(str(tmp_path / 'chroma_db')), 'snapshot_test')]
+    for target in targets:
+        assert import_snapshot(target, path, {'profile': 'float32', 'vector_space': 'all-MiniLM-L6-v2'},
+                               batch_size=10) == 25
+        restored = target.get(ids=['doc_3', 'doc_4'], include=['documents', 'metadatas'])
+        documents = dict(zip(restored['ids'], restored['documents']))
+        assert documents['doc_3'] is None and documents['doc_4'] == '成都攻略4 🐼'
+        assert {metadata['likes'] for metadata in restored['metadatas']} == {3, 4}
+        query = [vectors[5].tolist()]
+        assert target.query(query_embeddings=query, n_results=5)['ids'] == \
+            source.query(query_embeddings=query, n_results=5)['ids']
+
+
+def test_export_retries_until_consistent_and_rejects_bad_snapshots(tmp_path):
+    """导出期间版本号变化时重试；向量空间不一致或文件被篡改时拒绝导入"""
+    source = NumpyBackend(str(tmp_path / 'source'))
+    fill(source)
+    path = str(tmp_path / 'guides.npz')
+    info = export_snapshot(source, path, {'vector_space': 'all-MiniLM-L6-v2'},
+                           collection_version=SteppingVersion([1, 2, 2, 2]))
+    assert info['collection_version'] == 2
+    with pytest.raises(SnapshotError):
+        export_snapshot(source, path, collection_version=SteppingVersion(list(range(10))), max_attempts=2)
+
+    with pytest.raises(SnapshotError):
+        import_snapshot(NumpyBackend(str(tmp_path / 'target')), path, {'vector_space': 'hashing'})
+
+    snapshot = load_snapshot(path)
+    arrays = dict(np.load(path))
+    arrays['embeddings'] = snapshot['embeddings'] + 1
+    np.savez(str(tmp_path / 'tampered.npz'), **arrays)
+    with pytest.raises(SnapshotError):
+        load_snapshot(str(tmp_path / 'tampered.npz'))
+
+
+def test_vector_service_loads_startup_snapshot_into_empty_collection(tmp_path, monkeypatch, make_vector_service):
+    """集合为空时启动加载快照，集合已有数据时跳过"""
+    source = NumpyBackend(str(tmp_path / 'source'))
+    fill(source)
+    path = str(tmp_path / 'guides.npz')
+    export_snapshot(source, path, {'profile': 'float32', 'vector_space': Config.EMBEDDING_MODEL_NAME})
+    monkeypatch.setattr(Config, 'SNAPSHOT_PATH', path)
+    monkeypatch.setattr(Config, 'EMBEDDING_BACKEND', 'torch')
+
+    service = make_vector_service(collection_name='travel_guides', backend=NumpyBackend(str(tmp_path / 'node')))
+    assert service._load_startup_snapshot() is True
+    assert service.collection.count() == 25
+    assert service._load_startup_snapshot() is False
+
+    exported = service.export_snapshot(str(tmp_path / 'backup.npz'))
+    assert exported['collection'] == 'travel_guides' and exported['count'] == 25
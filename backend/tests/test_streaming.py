@@ -0,0 +1,100 @@
+import sys
+import os
+import json
+
+from flask import Flask
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from modular_api.routes import chat as chat_module
+from modular_api.services.llm_client import LLMClient, StubBackend
+from modular_api.services.llm_stub import LLMStubServer
+from modular_api.utils.monitoring import APIMetricsCollector
+
+# 路由以services.*导入服务模块，测试需要修改同一个模块对象
+llm_module = sys.modules['services.llm_client']
+cache_module = sys.modules['services.cache']
+
+
+class DictCache:
+    """进程内字典代替Redis"""
+
+    def __init__(self):
+        self.store = {}
+
+    def get(self, key):
+        return self.store.get(key)
+
+    def set(self, key, value, ttl=3600):
+        self.store[key] = value
+        return True
+
+
+def parse_events(body):
+    events = []
+    for block in body.strip().split('\n\n'):
+        lines = dict(line.split(': ', 1) for line in block.split('\n'))
+        events.append((lines['event'], json.loads(lines['data'])))
+    return events
+
+
+def build_client(tmp_path, monkeypatch, server):
+    # 语义缓存依赖embedding模型的加载进度，这里关闭以保证结果确定
+    for module_name in ('utils.config', 'modular_api.utils.config'):
+        if module_name in sys.modules:
+            monkeypatch.setattr(sys.modules[module_name].Config, 'SEMANTIC_CACHE_ENABLED', False)
+    monkeypatch.setattr(chat_module, 'CONVERSATION_HISTORY_FILE', str(tmp_path / 'history.json'))
+    monkeypatch.setattr(llm_module, '_llm_client', LLMClient([StubBackend(base_url=server.base_url)],
+                                                             max_retries=0))
+    fake_cache = DictCache()
+    monkeypatch.setattr(cache_module.cache, 'get', fake_cache.get)
+    monkeypatch.setattr(cache_module.cache, 'set', fake_cache.set)
+    app = Flask(__name__)
+    app.metrics_collector = APIMetricsCollector()
+    app.register_blueprint(chat_module.bp, url_prefix='/api')
+    return app.test_client(), fake_cache
+
+
+def test_chat_streams_tokens_then_persists_and_caches(tmp_path, monkeypatch):
+    """SSE逐段推送，流结束后才写入历史和响应缓存；之后同样的JSON请求命中缓存"""
+    with LLMStubServer(stream_chunk_chars=3) as server:
+        client, fake_cache = build_client(tmp_path, monkeypatch, server)
+        payload = {'message': '成都有什么好吃的', 'conversation_id': 'c1'}
+
+        response = client.post('/api/chat', json=payload, headers={'Accept': 'text/event-stream'})
+        assert response.mimetype == 'text/event-stream'
+        events = parse_events(response.get_data(as_text=True))
+        assert events[0] == ('meta', {'conversation_id': 'c1'})
+        tokens = [data['text'] for event, data in events if event == 'token']
+        assert len(tokens) > 3
+        assert events[-1][0] == 'done' and events[-1][1]['data']['response'] == ''.join(tokens)
+        assert server.payloads[-1]['stream'] is True
+
+        history = chat_module.load_conversation_history()['c1']
+        assert [message['role'] for message in history] == ['user', 'assistant']
+        assert history[1]['content'] == ''.join(tokens)
+        assert len(fake_cache.store) == 1
+
+        # 同一请求以JSON方式访问时直接返回流式结束后写入的缓存，不再调用大模型
+        requests_before = server.requests
+        cached = client.post('/api/chat', json=payload)
+        assert cached.get_json()['data']['response'] == ''.join(tokens)
+        assert server.requests == requests_before
+
+
+def test_chat_stream_falls_back_before_first_token(tmp_path, monkeypatch):
+    """大模型在输出前失败时回退到模拟回复；未声明SSE的请求仍返回JSON"""
+    with LLMStubServer() as server:
+        client, _ = build_client(tmp_path, monkeypatch, server)
+        server.fail_next(1, status=500)
+        response = client.post('/api/chat', json={'message': '北京景点', 'conversation_id': 'c2'},
+                               headers={'Accept': 'text/event-stream'})
+        events = parse_events(response.get_data(as_text=True))
+        assert [event for event, _ in events] == ['meta', 'token', 'done']
+        assert '故宫' in events[-1][1]['data']['response']
+
+        response = client.post('/api/chat', json={'message': '北京景点', 'conversation_id': 'c3'},
+                               headers={'Accept': 'application/json, text/event-stream;q=0.5'})
+        assert response.mimetype == 'application/json'
+        assert response.get_json()['data']['response'].startswith('【桩回复】')
@@ -0,0 +1,117 @@
+import sys
+import os
+
+import numpy as np
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from modular_api.services.collection_manager import CollectionManager
+from modular_api.services.vector_backend import ChromaBackend, NumpyBackend, copy_collection
+
+
+def random_vectors(count, dim=8, seed=0):
+    vectors = np.random.default_rng(seed).standard_normal((count, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def test_numpy_backend_topk_filters_and_persistence(tmp_path):
+    """top-k与精确检索一致，过滤、覆盖、删除生效，重新打开后数据仍在（含扩容）"""
+    backend = NumpyBackend(str(tmp_path / 'store'), initial_capacity=4)
+    vectors = random_vectors(50)
+    ids = [f'doc_{i}' for i in range(50)]
+    backend.add(ids=ids, embeddings=vectors.tolist(), documents=[f'攻略{i}' for i in range(50)],
+                metadatas=[{'destination': '成都' if i % 2 else '重庆'} for i in range(50)])
+    assert backend.count() == 50
+
+    query = vectors[7] + 0.05
+    result = backend.query(query_embeddings=[query.tolist()], n_results=5)
+    expected = np.argsort(np.sum((vectors - query) ** 2, axis=1))[:5]
+    assert result['ids'][0] == [ids[i] for i in expected]
+    assert result['distances'][0] == sorted(result['distances'][0])
+
+    filtered = backend.query(query_embeddings=[query.tolist()], n_results=5, where={'destination': '成都'})
+    assert all(metadata['destination'] == '成都' for metadata in filtered['metadatas'][0])
+
+    backend.upsert(ids=['doc_7'], embeddings=[vectors[8].tolist()], documents=['新攻略'], metadatas=[{'destination': '西安'}])
+    backend.add(ids=['doc_8'], embeddings=[vectors[0].tolist()], documents=['不会覆盖'], metadatas=[{}])
+    backend.delete(ids=['doc_9'])
+    backend.close()
+
+    reopened = NumpyBackend(str(tmp_path / 'store'))
+    assert reopened.count() == 49
+    assert reopened.get(ids=['doc_7', 'doc_9'])['documents'] == ['新攻略']
+    assert reopened.get(ids=['doc_8'])['documents'] == ['攻略8']
+    assert reopened.get(where={'destination': '西安'})['ids'] == ['doc_7']
+    assert 'doc_9' not in reopened.query(query_embeddings=[vectors[9].tolist()], n_results=3)['ids'][0]
+
+
+def test_vector_service_results_match_across_backends(tmp_path, make_vector_service):
+    """同一批文档在Chroma和NumPy后端上的检索结果一致，且可以从Chroma迁移"""
+
+    class FakeModelService:
+        def clean_texts(self, texts):
+            return list(texts)
+
+        def encode_text(self, texts):
+            vectors = np.array([[float(ord(text[0]) % 13), float(len(text)), 1.0] for text in texts], dtype=np.float32)
+            return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+    texts = ['成都火锅', '重庆小面和火锅', '西安兵马俑', '三亚海边', '青岛啤酒', '厦门鼓浪屿']
+    results = {}
+    for name in ('chroma', 'numpy'):
+        if name == 'numpy':
+            backend = NumpyBackend(str(tmp_path / 'numpy'))
+        else:
+            backend = ChromaBackend(CollectionManager(str(tmp_path / 'chroma_db')), 'backend_test')
+        service = make_vector_service(FakeModelService(), 'backend_test', backend=backend)
+        service.add_documents(texts, [{'destination': text[:2]} for text in texts],
+                              ids=[f'doc_{i}' for i in range(len(texts))])
+        results[name] = service.search_similar('火锅推荐', limit=3)['results']
+
+    assert [item['id'] for item in results['chroma']] == [item['id'] for item in results['numpy']]
+    assert np.allclose([item['score'] for item in results['chroma']],
+                       [item['score'] for item in results['numpy']], atol=1e-5)
+
+    migrated = NumpyBackend(str(tmp_path / 'migrated'))
+    assert copy_collection(ChromaBackend(CollectionManager(str(tmp_path / 'chroma_db')), 'backend_test'),
+                           migrated) == len(texts)
+    assert migrated.count() == len(texts)
+
+
+def test_numpy_backend_two_instances_share_one_directory(tmp_path):
+    """同一目录的两个实例（模拟API进程和导入CLI）交替写入不会互相覆盖，并能读到对方的写入"""
+    path = str(tmp_path / 'store')
+    vectors = random_vectors(4)
+    server, cli = NumpyBackend(path), NumpyBackend(path)
+    server.add(ids=['server-doc'], embeddings=[vectors[0].tolist()], documents=['服务端'], metadatas=[{}])
+    cli.add(ids=['cli-doc'], embeddings=[vectors[1].tolist()], documents=['命令行'], metadatas=[{}])
+    server.add(ids=['server-doc-2'], embeddings=[vectors[2].tolist()], documents=['服务端2'], metadatas=[{}])
+    cli.delete(ids=['server-doc-2'])
+
+    assert server.count() == 2
+    assert server.query(query_embeddings=[vectors[1].tolist()], n_results=1)['ids'] == [['cli-doc']]
+    assert cli.get(ids=['server-doc'])['documents'] == ['服务端']
+
+    reopened = NumpyBackend(path)
+    assert sorted(reopened.get()['ids']) == ['cli-doc', 'server-doc']
+    for name, index in (('server-doc', 0), ('cli-doc', 1)):
+        assert reopened.query(query_embeddings=[vectors[index].tolist()], n_results=1)['ids'] == [[name]]
+
+
+def test_numpy_backend_query_skips_rows_deleted_during_search(tmp_path, monkeypatch):
+    """矩阵乘法在锁外执行，期间被删除的行不会以None ID返回"""
+    backend = NumpyBackend(str(tmp_path / 'store'))
+    vectors = random_vectors(6)
+    backend.add(ids=[f'doc_{i}' for i in range(6)], embeddings=vectors.tolist(),
+                documents=[f'攻略{i}' for i in range(6)], metadatas=[{} for _ in range(6)])
+    argpartition = np.argpartition
+
+    def delete_then_partition(*args, **kwargs):
+        backend.delete(ids=['doc_0'])
+        return argpartition(*args, **kwargs)
+
+    monkeypatch.setattr(np, 'argpartition', delete_then_partition)
+    result = backend.query(query_embeddings=[vectors[0].tolist()], n_results=3)
+    assert result['ids'][0] and 'doc_0' not in result['ids'][0] and None not in result['ids'][0]
+    assert len(result['ids'][0]) == len(result['documents'][0]) == len(result['distances'][0])
@@ -0,0 +1,62 @@
+import sys
+import os
+
+import numpy as np
+import pytest
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from modular_api.services.vector_profile import (
+    StorageProfile, fit_pca, save_projection, build_report, recall_at_k
+)
+
+
+def make_corpus(n=300, dim=48, rank=8, seed=0):
+    """构造低秩+噪声的归一化语料，近似真实句向量的分布"""
+    rng = np.random.default_rng(seed)
+    vectors = rng.normal(size=(n, rank)) @ rng.normal(size=(rank, dim)) + 0.05 * rng.normal(size=(n, dim))
+    return (vectors / np.linalg.norm(vectors, axis=1, keepdims=True)).astype(np.float32)
+
+
+def test_float16_profile_keeps_dimension():
+    """float16配置只降低精度，不改变维度和集合"""
+    corpus = make_corpus()
+    profile = StorageProfile('float16')
+    vectors = profile.transform(corpus)
+    assert vectors.shape == corpus.shape
+    assert np.abs(vectors - corpus).max() < 1e-3
+    assert profile.collection_name('travel_guides') == 'travel_guides'
+    assert profile.bytes_per_vector(48) == 96
+
+
+def test_pca_profile_projects_and_normalizes(tmp_path):
+    """PCA配置降维后重新归一化，并使用单独的集合"""
+    corpus = make_corpus()
+    path = str(tmp_path / 'pca.npz')
+    save_projection(fit_pca(corpus, 16), path)
+
+    profile = StorageProfile.from_config('pca16-float16', path)
+    vectors = profile.transform(corpus)
+    assert vectors.shape == (300, 16)
+    assert np.allclose(np.linalg.norm(vectors, axis=1), 1.0, atol=1e-2)
+    assert profile.collection_name('travel_guides') == 'travel_guides_pca16'
+    assert recall_at_k(corpus, vectors, np.arange(50), k=10) > 0.8
+
+
+def test_invalid_profiles_raise(tmp_path):
+    """无效名称或缺少投影文件时报错"""
+    with pytest.raises(ValueError):
+        StorageProfile('int4')
+    with pytest.raises(FileNotFoundError):
+        StorageProfile.from_config('pca128', str(tmp_path / 'missing.npz'))
+
+
+def test_report_lists_recall_and_size():
+    """报告包含每个配置的体积和召回率，float32基准召回率为1"""
+    report = build_report(make_corpus(), dims=[16, 32], k=5, num_queries=50)
+    by_name = {row['profile']: row for row in report}
+    assert set(by_name) == {'float32', 'float16', 'pca16', 'pca16-float16', 'pca32', 'pca32-float16'}
+    assert by_name['float32']['recall@5'] == 1.0
+    assert by_name['pca16-float16']['bytes_per_vector'] == 32
+    assert by_name['pca32']['size_ratio'] == round(32 / 48, 3)